@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AccesosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accesos'
+
+    def ready(self):
+        from . import tiempo_real
+        tiempo_real.conectar_senales()
@@ -0,0 +1,420 @@
+"""Archivo frío de ``RegistroAcceso``: un archivo columnar comprimido por día.
+
+``manage.py archivar_accesos`` mueve los días anteriores a
+``ACCESOS_ARCHIVO_DIAS`` (0 = desactivado, el valor por defecto) a
+``AAAA/MM/AAAA-MM-DD.<sufijo>.rac`` en el almacenamiento ``archivo_accesos``
+(``STORAGES``; Cloud Storage en producción, el disco de Cloud Run no dura) y
+los borra de la tabla; ``ArchivoAccesos`` es el índice por día. Las filas se
+borran recién después de releer el archivo subido y comprobar que están
+todas. Los reportes leen tabla y archivo juntos con ``AccesosConArchivo``.
+
+Formato (solo stdlib)::
+
+    RAC1 | grupo 1 | grupo 2 | ... | pie (JSON con zlib) | largo del pie (uint32 LE) | RAC1
+
+Cada grupo tiene hasta ``FILAS_POR_GRUPO`` filas ordenadas por
+(fecha_hora, id), con cada columna comprimida por separado: enteros como
+int64 little-endian (id y fecha_hora en deltas), los códigos de una letra como
+bytes y ``detalles`` como un JSON por línea. El pie guarda por grupo las filas,
+la fecha mínima y máxima (µs UTC) y el offset y largo de cada columna.
+
+La lectura hace mmap del archivo y descomprime un grupo a la vez, saltando
+los grupos fuera del rango: un reporte histórico nunca carga el archivo entero
+en memoria (desde un almacenamiento remoto se descarga antes a un temporal).
+"""
+import heapq
+import json
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+import uuid
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from contextlib import contextmanager
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import connection, transaction
+from django.db.models import Q, prefetch_related_objects
+from django.utils import timezone
+
+from .models import ArchivoAccesos, RegistroAcceso
+from .services import rango_dia
+
+MAGICO = b'RAC1'
+VERSION = 1
+COLUMNAS = (
+    'id', 'fecha_hora', 'tipo_persona', 'tipo_verificacion',
+    'persona_id', 'exitoso', 'detalles', 'vehiculo_id',
+)
+FILAS_POR_GRUPO = 8192
+NIVEL_ZLIB = 6
+TAMANO_LOTE = 1000
+_COLA = struct.Struct('<I4s')
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_UN_US = timedelta(microseconds=1)
+
+
+def almacen():
+    return storages['archivo_accesos']
+
+
+def es_local():
+    """True si los archivos quedan en el disco de la instancia (sin GS_BUCKET_NAME)."""
+    try:
+        almacen().path('')
+    except NotImplementedError:
+        return False
+    return True
+
+
+@contextmanager
+def _abrir(nombre):
+    """Archivo local con el contenido de `nombre`, para leerlo con mmap.
+
+    Desde un almacenamiento remoto se descarga a un temporal que se borra al salir.
+    """
+    try:
+        local = almacen().path(nombre)
+    except NotImplementedError:
+        local = None
+    if local is not None:
+        with open(local, 'rb') as f:
+            yield f
+        return
+    with tempfile.TemporaryFile() as f:
+        with almacen().open(nombre, 'rb') as origen:
+            shutil.copyfileobj(origen, f)
+        f.flush()
+        yield f
+
+
+def _a_us(fecha_hora):
+    return (fecha_hora - _EPOCA) // _UN_US
+
+
+def _de_us(us):
+    return _EPOCA + timedelta(microseconds=us)
+
+
+# --- Codificación ------------------------------------------------------------
+
+def _enteros(valores, deltas=False):
+    arr = array('q', valores)
+    if deltas and arr:
+        arr = array('q', [arr[0]] + [b - a for a, b in zip(arr, arr[1:])])
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _leer_enteros(crudo, deltas=False):
+    arr = array('q')
+    arr.frombytes(crudo)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return list(accumulate(arr)) if deltas else arr.tolist()
+
+
+def _codificar(filas):
+    ids, fechas, tipos_p, tipos_v, personas, exitosos, detalles, vehiculos = zip(*filas)
+    columnas = (
+        _enteros(ids, deltas=True),
+        _enteros([_a_us(f) for f in fechas], deltas=True),
+        ''.join(tipos_p).encode('ascii'),
+        ''.join(tipos_v).encode('ascii'),
+        _enteros(personas),
+        bytes(1 if e else 0 for e in exitosos),
+        '\n'.join(json.dumps(d, ensure_ascii=False, separators=(',', ':')) for d in detalles).encode('utf-8'),
+        _enteros([v or 0 for v in vehiculos]),
+    )
+    return [zlib.compress(c, NIVEL_ZLIB) for c in columnas]
+
+
+def _decodificar(columnas):
+    ids, fechas, tipos_p, tipos_v, personas, exitosos, detalles, vehiculos = (zlib.decompress(c) for c in columnas)
+    return list(zip(
+        _leer_enteros(ids, deltas=True),
+        (_de_us(us) for us in _leer_enteros(fechas, deltas=True)),
+        tipos_p.decode('ascii'),
+        tipos_v.decode('ascii'),
+        _leer_enteros(personas),
+        (b == 1 for b in exitosos),
+        (json.loads(linea) for linea in detalles.decode('utf-8').split('\n')),
+        (v or None for v in _leer_enteros(vehiculos)),
+    ))
+
+
+def escribir(f, filas):
+    """Escribe en el archivo binario `f` las `filas` (tuplas en el orden de COLUMNAS,
+    ordenadas por fecha_hora, id).
+
+    Devuelve {'filas', 'id_min', 'id_max', 'tamano'}.
+    """
+    grupos = []
+    resumen = {'filas': 0, 'id_min': None, 'id_max': None}
+    filas = iter(filas)
+    f.write(MAGICO)
+    while True:
+        grupo = list(islice(filas, FILAS_POR_GRUPO))
+        if not grupo:
+            break
+        trozos = []
+        for comprimido in _codificar(grupo):
+            trozos.append((f.tell(), len(comprimido)))
+            f.write(comprimido)
+        ids = [fila[0] for fila in grupo]
+        grupos.append({
+            'filas': len(grupo),
+            'min': _a_us(grupo[0][1]), 'max': _a_us(grupo[-1][1]),
+            'trozos': trozos,
+        })
+        resumen['filas'] += len(grupo)
+        resumen['id_min'] = min(ids) if resumen['id_min'] is None else min(resumen['id_min'], *ids)
+        resumen['id_max'] = max(ids) if resumen['id_max'] is None else max(resumen['id_max'], *ids)
+    pie = zlib.compress(json.dumps(
+        {'version': VERSION, 'columnas': COLUMNAS, 'grupos': grupos}, separators=(',', ':')
+    ).encode())
+    f.write(pie)
+    f.write(_COLA.pack(len(pie), MAGICO))
+    f.flush()
+    resumen['tamano'] = f.tell()
+    return resumen
+
+
+def leer(origen, desde=None, hasta=None, descendente=False):
+    """Tuplas (en el orden de COLUMNAS) con desde <= fecha_hora <= hasta.
+
+    `origen` es el nombre en el almacenamiento. Hace mmap del archivo y
+    descomprime solo los grupos que intersectan el rango.
+    """
+    desde_us = _a_us(desde) if desde is not None else None
+    hasta_us = _a_us(hasta) if hasta is not None else None
+    with _abrir(origen) as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        largo, magico = _COLA.unpack(mm[-_COLA.size:])
+        if mm[:4] != MAGICO or magico != MAGICO:
+            raise ValueError(f'{origen}: no es un archivo de accesos')
+        fin_pie = len(mm) - _COLA.size
+        pie = json.loads(zlib.decompress(mm[fin_pie - largo:fin_pie]))
+        grupos = pie['grupos'][::-1] if descendente else pie['grupos']
+        for grupo in grupos:
+            if (desde_us is not None and grupo['max'] < desde_us) or (hasta_us is not None and grupo['min'] > hasta_us):
+                continue
+            filas = _decodificar([mm[o:o + n] for o, n in grupo['trozos']])
+            if descendente:
+                filas.reverse()
+            for fila in filas:
+                if (desde is not None and fila[1] < desde) or (hasta is not None and fila[1] > hasta):
+                    continue
+                yield fila
+
+
+# --- Archivado ---------------------------------------------------------------
+
+def _filas_tabla(inicio, fin):
+    return (
+        RegistroAcceso.objects
+        .filter(fecha_hora__gte=inicio, fecha_hora__lt=fin)
+        .order_by('fecha_hora', 'id')
+        .values_list(*[c if c != 'vehiculo_id' else 'vehiculo' for c in COLUMNAS])
+        .iterator(chunk_size=2000)
+    )
+
+
+def _borrar(inicio, fin, ids):
+    tabla = RegistroAcceso._meta.db_table
+    with connection.cursor() as cursor:
+        # DELETE sobre cada partición y no sobre el padre: los triggers por sentencia del
+        # padre (contadores del dashboard) no se disparan y el total del día se conserva
+        cursor.execute(
+            f"SELECT DISTINCT tableoid::regclass::text FROM {tabla} WHERE fecha_hora >= %s AND fecha_hora < %s",
+            [inicio, fin],
+        )
+        for (particion,) in cursor.fetchall():
+            for i in range(0, len(ids), 10000):
+                cursor.execute(
+                    f"DELETE FROM {particion} WHERE fecha_hora >= %s AND fecha_hora < %s AND id = ANY(%s)",
+                    [inicio, fin, ids[i:i + 10000].tolist()],
+                )
+
+
+def verificar(nombre, filas, ids):
+    """Relee `nombre` desde el almacenamiento y comprueba que tenga `filas` filas,
+    entre ellas todos los `ids`. Levanta ValueError (o zlib.error) si no."""
+    leidos = array('q', (fila[0] for fila in leer(nombre)))
+    if len(leidos) != filas:
+        raise ValueError(f'{nombre}: se releyeron {len(leidos)} filas de {filas}')
+    faltan = set(ids).difference(leidos)
+    if faltan:
+        raise ValueError(f'{nombre}: faltan {len(faltan)} registros')
+
+
+def archivar_dia(fecha):
+    """Mueve al archivo las filas del día local `fecha`. Devuelve cuántas salieron de la tabla.
+
+    Si el día ya estaba archivado (filas que llegaron tarde) se reescribe su
+    archivo combinando ambas fuentes. El borrado de la tabla ocurre solo si el
+    archivo subido se relee completo (``verificar``).
+    """
+    inicio, fin = rango_dia(fecha)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # Un solo archivador por día
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [zlib.crc32(b'archivo_accesos'), fecha.toordinal()])
+        anterior = ArchivoAccesos.objects.filter(fecha=fecha).first()
+        ids = array('q')
+
+        def tabla():
+            for fila in _filas_tabla(inicio, fin):
+                ids.append(fila[0])
+                yield fila
+
+        fuentes = [tabla()]
+        if anterior is not None:
+            fuentes.append(leer(anterior.archivo))
+        with tempfile.TemporaryFile() as local:
+            resumen = escribir(local, heapq.merge(*fuentes, key=lambda f: (f[1], f[0])))
+            if not ids:
+                return 0
+            local.seek(0)
+            nombre = almacen().save(f'{fecha:%Y/%m}/{fecha:%Y-%m-%d}.{uuid.uuid4().hex[:12]}.rac', File(local))
+        try:
+            verificar(nombre, resumen['filas'], ids)
+            _borrar(inicio, fin, ids)
+            ArchivoAccesos.objects.update_or_create(fecha=fecha, defaults={
+                'archivo': nombre, 'filas': resumen['filas'], 'id_min': resumen['id_min'],
+                'id_max': resumen['id_max'], 'tamano': resumen['tamano'],
+            })
+        except BaseException:
+            almacen().delete(nombre)
+            raise
+        if anterior is not None:
+            transaction.on_commit(lambda: almacen().delete(anterior.archivo))
+    return len(ids)
+
+
+def archivar(dias=None):
+    """Archiva, del más viejo al más nuevo, los días anteriores a hoy - `dias`.
+
+    Generador de (fecha, filas movidas).
+    """
+    dias = getattr(settings, 'ACCESOS_ARCHIVO_DIAS', 0) if dias is None else dias
+    if not dias or dias <= 0:
+        return
+    corte, _ = rango_dia(timezone.localdate() - timedelta(days=dias))
+    ultimo = None
+    while True:
+        primero = (
+            RegistroAcceso.objects.filter(fecha_hora__lt=corte)
+            .order_by('fecha_hora').values_list('fecha_hora', flat=True).first()
+        )
+        if primero is None:
+            return
+        fecha = timezone.localtime(primero).date()
+        if ultimo is not None and fecha <= ultimo:
+            # Filas insertadas mientras tanto en un día ya procesado: quedan para la próxima corrida
+            return
+        yield fecha, archivar_dia(fecha)
+        ultimo = fecha
+
+
+# --- Lectura combinada (tabla + archivo) ---------------------------------------
+
+def _consciente(valor):
+    if valor is not None and timezone.is_naive(valor):
+        return timezone.make_aware(valor)
+    return valor
+
+
+def dias(desde=None, hasta=None):
+    """Índices de los días archivados que intersectan [desde, hasta]."""
+    qs = ArchivoAccesos.objects.all()
+    if desde is not None:
+        qs = qs.filter(fecha__gte=timezone.localtime(_consciente(desde)).date())
+    if hasta is not None:
+        qs = qs.filter(fecha__lte=timezone.localtime(_consciente(hasta)).date())
+    return qs
+
+
+def alcanza(desde=None, hasta=None):
+    """True si el rango pedido incluye algún día archivado."""
+    return dias(desde, hasta).exists()
+
+
+def _instancia(fila):
+    obj = RegistroAcceso(**dict(zip(COLUMNAS, fila)))
+    obj._state.adding = False
+    obj._state.db = 'default'
+    return obj
+
+
+def _clave(registro):
+    return registro.fecha_hora, registro.id
+
+
+class AccesosConArchivo:
+    """Registros de la tabla más los archivados, de más reciente a más antiguo.
+
+    Se usa como el queryset de ``reportes.consultas.accesos`` cuando el rango
+    llega a días archivados: ``iterator()`` para las exportaciones y
+    ``pagina()`` para la paginación por cursor (``responder``), que se aplica
+    aunque el request no la pida. `filtro` aplica a las filas archivadas los
+    mismos filtros que ya tiene `queryset`.
+    """
+    paginar_siempre = True
+
+    def __init__(self, queryset, desde=None, hasta=None, filtro=None):
+        self.queryset = queryset.order_by('-fecha_hora', '-id')
+        self.desde = _consciente(desde)
+        self.hasta = _consciente(hasta)
+        self.filtro = filtro
+
+    def _tabla(self, antes_de=None):
+        qs = self.queryset
+        if antes_de is not None:
+            fecha, pk = antes_de
+            qs = qs.filter(Q(fecha_hora__lt=fecha) | Q(fecha_hora=fecha, id__lt=pk))
+        return qs
+
+    def _archivo(self, antes_de=None):
+        hasta = self.hasta
+        if antes_de is not None:
+            hasta = antes_de[0] if hasta is None else min(hasta, antes_de[0])
+        for indice in dias(self.desde, hasta).order_by('-fecha'):
+            lote = []
+            for fila in leer(indice.archivo, self.desde, hasta, descendente=True):
+                obj = _instancia(fila)
+                if antes_de is not None and _clave(obj) >= antes_de:
+                    continue
+                if self.filtro is not None and not self.filtro(obj):
+                    continue
+                lote.append(obj)
+                if len(lote) == TAMANO_LOTE:
+                    prefetch_related_objects(lote, 'vehiculo')
+                    yield from lote
+                    lote = []
+            if lote:
+                prefetch_related_objects(lote, 'vehiculo')
+                yield from lote
+
+    def iterator(self, chunk_size=2000):
+        return heapq.merge(
+            self._tabla().iterator(chunk_size=chunk_size), self._archivo(), key=_clave, reverse=True,
+        )
+
+    def __iter__(self):
+        return self.iterator()
+
+    def pagina(self, antes_de, n):
+        """Hasta `n` registros posteriores (en orden descendente) a la posición (fecha_hora, id)."""
+        return list(islice(heapq.merge(
+            list(self._tabla(antes_de)[:n]), islice(self._archivo(antes_de), n), key=_clave, reverse=True,
+        ), n))
+
+    def posicion(self, registro):
+        return _clave(registro)
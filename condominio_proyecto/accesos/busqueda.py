@@ -0,0 +1,187 @@
+"""Búsqueda por texto sobre una columna ``busqueda`` desnormalizada e indexada con pg_trgm.
+
+``Residente``, ``Familia``, ``Visitante`` y ``ReservaArea`` guardan en
+``busqueda`` el texto normalizado (minúsculas, sin tildes) de todos los campos
+por los que se busca, incluidos los de tablas relacionadas (usuario, familia,
+área...). Un índice GIN ``gin_trgm_ops`` sobre esa columna resuelve tanto
+``LIKE '%texto%'`` como la similitud por trigramas, sin recorrer ni unir tablas.
+
+La columna la mantiene la base (triggers de la migración 0024 de accesos): se
+calcula en cada INSERT/UPDATE de la fila, también en ``bulk_create`` y
+``update``, y los cambios de usuario, familia, área, unidad o turno se propagan
+a las filas que copian su texto, sin consultas extra desde Django.
+``manage.py reindexar_busqueda`` la recalcula completa con las mismas funciones
+SQL.
+
+``normalizar`` es la versión Python de ``busqueda_normalizar`` (SQL) y se
+aplica al texto buscado. Las funciones ``texto_*`` quedan para las migraciones
+que poblaron la columna antes de los triggers.
+"""
+import unicodedata
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Q
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).lower()
+    texto = ''.join(ch for ch in texto if not unicodedata.combining(ch))
+    return ' '.join(texto.split())
+
+
+def _unir(*partes):
+    return normalizar(' '.join(str(p) for p in partes if p))
+
+
+def _usuario(user):
+    if user is None:
+        return ()
+    return (user.first_name, user.last_name, user.username, user.email)
+
+
+def texto_familia(familia):
+    return _unir(familia.nombre, familia.departamento, familia.torre)
+
+
+def texto_residente(residente):
+    familia = residente.familia if residente.familia_id else None
+    return _unir(
+        *_usuario(residente.user), residente.documento_identidad,
+        *((familia.nombre, familia.departamento, familia.torre) if familia else ()),
+    )
+
+
+def texto_visitante(visitante):
+    return _unir(visitante.nombre_completo, visitante.documento_identidad)
+
+
+def texto_reserva(reserva):
+    residente = reserva.residente
+    return _unir(
+        *_usuario(residente.user), residente.documento_identidad,
+        reserva.familia.nombre if reserva.familia_id else None,
+        reserva.area.nombre,
+        reserva.unidad.nombre if reserva.unidad_id else None,
+        reserva.turno.titulo if reserva.turno_id else None,
+    )
+
+
+def _funciones():
+    from areas.models import ReservaArea
+    from .models import Familia, Residente, Visitante
+    # Funciones SQL de la migración 0024
+    return {
+        Familia: 'busqueda_texto_familia',
+        Residente: 'busqueda_texto_residente',
+        Visitante: 'busqueda_texto_visitante',
+        ReservaArea: 'busqueda_texto_reserva',
+    }
+
+
+def actualizar(queryset):
+    """Recalcula `busqueda` de las filas del queryset en la base; escribe solo las que cambiaron."""
+    funcion = _funciones()[queryset.model]
+    tabla = queryset.model._meta.db_table
+    ids, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {tabla} f SET busqueda = {funcion}(f) "
+            f"WHERE f.id IN ({ids}) AND f.busqueda IS DISTINCT FROM {funcion}(f)",
+            params,
+        )
+        return cursor.rowcount
+
+
+# --- Consultas ---------------------------------------------------------------
+
+def _condicion(t, campo):
+    contiene = Q()
+    for palabra in t.split():
+        contiene &= Q(**{f'{campo}__contains': palabra})
+    return contiene | Q(**{f'{campo}__trigram_word_similar': t})
+
+
+def coincidencias(queryset, texto, campo='busqueda'):
+    """Filtra por `texto`: cada palabra contenida (LIKE, con índice trigram) o similitud de palabra."""
+    t = normalizar(texto)
+    if not t:
+        return queryset
+    return queryset.filter(_condicion(t, campo))
+
+
+def buscar(queryset, texto, campo='busqueda'):
+    """`coincidencias` (o el id exacto si el texto es numérico), más parecidas primero."""
+    t = normalizar(texto)
+    if not t:
+        return queryset
+    condicion = _condicion(t, campo)
+    if t.isdigit():
+        condicion |= Q(pk=int(t))
+    return queryset.filter(condicion).annotate(
+        similitud=TrigramWordSimilarity(t, campo)
+    ).order_by('-similitud', 'pk')
+
+
+def buscar_autorizaciones(queryset, texto):
+    """AutorizacionVisita por visitante, por quien autorizó o por familia.
+
+    Cada lado se resuelve con su propio índice (subconsulta de ids) en vez de un
+    OR sobre columnas de tablas unidas.
+    """
+    from .models import Familia, Residente, Visitante
+    t = normalizar(texto)
+    if not t:
+        return queryset
+    condicion = (
+        Q(visitante__in=coincidencias(Visitante.objects.all(), t).values('pk'))
+        | Q(autorizado_por__in=coincidencias(Residente.objects.all(), t).values('pk'))
+        | Q(familia__in=coincidencias(Familia.objects.all(), t).values('pk'))
+    )
+    if t.isdigit():
+        condicion |= Q(pk=int(t))
+    # codigo_qr es único (índice btree): coincidencia exacta con el texto original
+    condicion |= Q(codigo_qr=str(texto).strip())
+    return queryset.filter(condicion)
+
+
+def criterios_accesos(texto):
+    """Partes del filtro de `buscar_accesos` (subconsultas de ids, id exacto, tipo).
+
+    Separadas para poder aplicarlas también a filas que no están en la tabla
+    (archivo de accesos, ver accesos/archivo.py). None si no hay texto.
+    """
+    from .models import Delivery, Residente, Visitante, Vehiculo
+    t = normalizar(texto)
+    if not t:
+        return None
+    # Delivery y Vehiculo no tienen columna normalizada: icontains sobre el texto original
+    crudo = ' '.join(str(texto).split())
+    return {
+        'personas': {
+            'R': coincidencias(Residente.objects.all(), t).values('pk'),
+            'V': coincidencias(Visitante.objects.all(), t).values('pk'),
+            'D': Delivery.objects.filter(
+                Q(nombre_completo__icontains=crudo) | Q(documento_identidad__icontains=crudo)
+            ).values('pk'),
+        },
+        'vehiculos': Vehiculo.objects.filter(matricula__icontains=crudo).values('pk'),
+        'id': int(t) if t.isdigit() else None,
+        'tipo_persona': t.upper() if t.upper() in ('R', 'V', 'D') else None,
+    }
+
+
+def buscar_accesos(queryset, texto):
+    """RegistroAcceso por persona (residente/visitante/delivery), matrícula o id."""
+    criterios = criterios_accesos(texto)
+    if criterios is None:
+        return queryset
+    condicion = Q(vehiculo__in=criterios['vehiculos'])
+    for tipo, ids in criterios['personas'].items():
+        condicion |= Q(tipo_persona=tipo, persona_id__in=ids)
+    if criterios['id'] is not None:
+        condicion |= Q(pk=criterios['id'])
+    if criterios['tipo_persona']:
+        condicion |= Q(tipo_persona=criterios['tipo_persona'])
+    return queryset.filter(condicion)
+
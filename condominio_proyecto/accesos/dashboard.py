@@ -0,0 +1,104 @@
+"""Snapshot de métricas del dashboard de Admin.
+
+Los totales se leen de ``ContadorDashboard``, que se mantiene por triggers de
+Postgres (migraciones 0018 y 0023) al insertar/actualizar/borrar filas de las
+tablas de origen. Leer el snapshot suma los fragmentos de unas pocas claves,
+independiente del tamaño de ``RegistroAcceso`` o ``Notificacion``; la respuesta
+completa además se guarda en caché por ``DASHBOARD_CACHE_TTL`` segundos.
+
+``visitantes_pendientes`` no es un contador: las autorizaciones vencen con el
+paso del tiempo, sin una escritura que dispare un trigger, así que se cuentan al
+leer las ACTIVA con ``fecha_fin`` futura (índice ``autorizacion_status_fin_idx``).
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import AutorizacionVisita, ContadorDashboard
+
+CLAVE_CACHE = 'accesos:dashboard:snapshot'
+
+
+def clave_accesos(fecha):
+    return f"accesos:{fecha.isoformat()}"
+
+
+def _ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', 15)
+
+
+def valores(claves=None):
+    """{clave: valor} sumando los fragmentos de cada contador."""
+    qs = ContadorDashboard.objects.all() if claves is None else ContadorDashboard.objects.filter(clave__in=claves)
+    return dict(qs.values('clave').annotate(total=Sum('valor')).values_list('clave', 'total'))
+
+
+def visitantes_pendientes(ahora=None):
+    return AutorizacionVisita.objects.filter(status='ACTIVA', fecha_fin__gte=ahora or timezone.now()).count()
+
+
+def _calcular(hoy):
+    claves = {
+        'total_usuarios': 'usuarios',
+        'total_residentes': 'residentes',
+        'accesos_hoy': clave_accesos(hoy),
+        'alertas': 'alertas_no_leidas',
+    }
+    actuales = valores(claves.values())
+    data = {campo: max(0, actuales.get(clave, 0)) for campo, clave in claves.items()}
+    data['visitantes_pendientes'] = visitantes_pendientes()
+    data['fecha'] = str(hoy)
+    data['generado_en'] = timezone.now().isoformat()
+    return data
+
+
+def snapshot(refrescar=False):
+    """Métricas resumidas con su antigüedad (`snapshot_edad_s`)."""
+    hoy = timezone.localdate()
+    data = None if refrescar else cache.get(CLAVE_CACHE)
+    if data is None or data.get('fecha') != str(hoy):
+        data = _calcular(hoy)
+        cache.set(CLAVE_CACHE, data, _ttl())
+    generado = datetime.fromisoformat(data['generado_en'])
+    return {**data, 'snapshot_edad_s': round((timezone.now() - generado).total_seconds(), 3)}
+
+
+def reconstruir():
+    """Recalcula todos los contadores desde las tablas de origen (reparación)."""
+    from django.contrib.auth.models import User
+    from django.db.models import Count
+    from django.db.models.functions import TruncDate
+    from notificaciones.lecturas import sin_leer
+    from notificaciones.models import Notificacion
+    from .models import Residente, RegistroAcceso, ArchivoAccesos
+
+    with transaction.atomic():
+        # Los triggers de transacciones concurrentes esperan al lock y suman su delta
+        # despues del commit, sobre valores que no incluian sus filas
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {ContadorDashboard._meta.db_table} IN EXCLUSIVE MODE")
+        reales = {
+            'usuarios': User.objects.count(),
+            'residentes': Residente.objects.count(),
+            'alertas_no_leidas': sin_leer(Notificacion.objects.all()).count(),
+        }
+        por_dia = (
+            RegistroAcceso.objects
+            .annotate(dia=TruncDate('fecha_hora', tzinfo=timezone.get_current_timezone()))
+            .values('dia').annotate(n=Count('id')).values_list('dia', 'n')
+        )
+        for dia, n in por_dia:
+            reales[clave_accesos(dia)] = n
+        # Días movidos al archivo frío (accesos/archivo.py)
+        for dia, n in ArchivoAccesos.objects.values_list('fecha', 'filas'):
+            reales[clave_accesos(dia)] = reales.get(clave_accesos(dia), 0) + n
+
+        # Un solo fragmento por clave; los triggers vuelven a repartir desde aquí
+        ContadorDashboard.objects.all().delete()
+        ContadorDashboard.objects.bulk_create([ContadorDashboard(clave=k, valor=v) for k, v in reales.items()])
+    cache.delete(CLAVE_CACHE)
+    return {**reales, 'visitantes_pendientes': visitantes_pendientes()}
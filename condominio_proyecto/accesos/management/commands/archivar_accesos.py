@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accesos import archivo
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve los RegistroAcceso anteriores a ACCESOS_ARCHIVO_DIAS a archivos comprimidos por día '
+        '(almacenamiento archivo_accesos) y, una vez releídos y verificados, los borra de la tabla. '
+        'Los reportes de accesos siguen leyéndolos. Desactivado con ACCESOS_ARCHIVO_DIAS=0 (por '
+        'defecto). Pensado para Cloud Scheduler/cron (diario), antes de mantener_particiones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Días que quedan en la tabla (por defecto ACCESOS_ARCHIVO_DIAS)')
+
+    def handle(self, *args, **opts):
+        if archivo.es_local():
+            self.stdout.write(self.style.WARNING(
+                'Los archivos quedan en el disco de esta instancia: en Cloud Run configurar GS_BUCKET_NAME'
+            ))
+        total = 0
+        for fecha, filas in archivo.archivar(opts['dias']):
+            self.stdout.write(f'{fecha:%Y-%m-%d}: {filas} registros archivados')
+            total += filas
+        self.stdout.write(self.style.SUCCESS(f'Registros archivados: {total}'))
@@ -0,0 +1,43 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from accesos import qr_render, qr_tokens
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark de renderizado QR: costo y tamaño PNG vs SVG (sin caché).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=200)
+
+    def handle(self, *args, **opts):
+        n = max(1, opts['iteraciones'])
+        ahora = timezone.now()
+        codigos = [
+            qr_tokens.emitir(i + 1, ahora, ahora + timezone.timedelta(hours=4), 1)
+            for i in range(n)
+        ]
+        for formato in qr_render.FORMATOS:
+            tiempos = []
+            tamanos = []
+            for codigo in codigos:
+                t0 = time.perf_counter()
+                # Llamar a la funcion sin caché para medir el render real
+                data = qr_render.renderizar.__wrapped__(codigo, formato)
+                tiempos.append(time.perf_counter() - t0)
+                tamanos.append(len(data))
+            self.stdout.write(
+                f"{formato.upper()}: {statistics.median(tiempos) * 1000:.2f} ms/render (p50), "
+                f"{statistics.mean(tamanos):.0f} bytes promedio"
+            )
+        for codigo in codigos:
+            qr_render.renderizar(codigo, 'png')
+        t0 = time.perf_counter()
+        for codigo in codigos:
+            qr_render.renderizar(codigo, 'png')
+        self.stdout.write(
+            f"PNG desde caché LRU: {(time.perf_counter() - t0) / n * 1e6:.1f} us/solicitud"
+        )
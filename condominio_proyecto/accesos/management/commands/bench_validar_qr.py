@@ -0,0 +1,95 @@
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from accesos.models import AutorizacionVisita, RegistroAcceso, Residente, Visitante
+from accesos.services import AutorizacionService
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de concurrencia de validar_qr: dispara escaneos ENTRADA en paralelo '
+        'contra un mismo código y reporta latencias p50/p99 y consumos observados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=16, help='Escaneos simultáneos por ronda')
+        parser.add_argument('--rondas', type=int, default=20, help='Rondas ENTRADA (paralelo) + SALIDA')
+
+    def handle(self, *args, **opts):
+        hilos = max(1, opts['hilos'])
+        rondas = max(1, opts['rondas'])
+        sufijo = uuid.uuid4().hex[:8]
+        ahora = timezone.now()
+
+        user = User.objects.create(username=f'bench_qr_{sufijo}')
+        residente = Residente.objects.create(user=user, documento_identidad=f'BENCH-{sufijo}')
+        visitante = Visitante.objects.create(
+            nombre_completo='Bench QR', tipo_acceso='P', autorizado_por=residente,
+            fecha_inicio=ahora, fecha_fin=ahora,
+        )
+        auth = AutorizacionVisita.objects.create(
+            visitante=visitante, autorizado_por=residente,
+            fecha_inicio=ahora - timedelta(minutes=1), fecha_fin=ahora + timedelta(hours=1),
+            entradas_permitidas=rondas,
+        )
+        codigo = auth.codigo_qr
+
+        barrera = threading.Barrier(hilos)
+
+        def escanear(evento='ENTRADA', sincronizar=True):
+            if sincronizar:
+                barrera.wait()
+            t0 = time.perf_counter()
+            data, _ = AutorizacionService.consumir_qr(codigo, evento)
+            return time.perf_counter() - t0, bool(data.get('match'))
+
+        def cerrar_conexion(_):
+            barrera.wait()
+            connection.close()
+
+        latencias = []
+        consumos = 0
+        rondas_con_doble_consumo = 0
+        try:
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                for _ in range(rondas):
+                    resultados = list(pool.map(lambda _: escanear(), range(hilos)))
+                    exitos = sum(1 for _, ok in resultados if ok)
+                    consumos += exitos
+                    if exitos > 1:
+                        rondas_con_doble_consumo += 1
+                    latencias.extend(lat for lat, _ in resultados)
+                    escanear('SALIDA', sincronizar=False)
+                list(pool.map(cerrar_conexion, range(hilos)))
+
+            auth.refresh_from_db()
+            registros = RegistroAcceso.objects.filter(
+                tipo_persona='V', persona_id=visitante.id, detalles__codigo_qr=codigo,
+            ).exclude(detalles__evento='SALIDA').count()
+        finally:
+            RegistroAcceso.objects.filter(tipo_persona='V', persona_id=visitante.id).delete()
+            user.delete()
+
+        latencias.sort()
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        self.stdout.write(f'Escaneos: {len(latencias)} ({rondas} rondas x {hilos} hilos)')
+        self.stdout.write(f'Latencia p50: {statistics.median(latencias) * 1000:.2f} ms')
+        self.stdout.write(f'Latencia p99: {p99 * 1000:.2f} ms')
+        self.stdout.write(f'Consumos observados por los clientes: {consumos} (esperado {rondas})')
+        self.stdout.write(f'entradas_consumidas en BD: {auth.entradas_consumidas}')
+        self.stdout.write(f'Registros de ENTRADA escritos: {registros}')
+        if consumos == rondas == auth.entradas_consumidas == registros and not rondas_con_doble_consumo:
+            self.stdout.write(self.style.SUCCESS('OK: ningún doble consumo'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'Inconsistencia detectada ({rondas_con_doble_consumo} rondas con doble consumo)'
+            ))
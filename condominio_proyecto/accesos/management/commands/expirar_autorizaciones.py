@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accesos.services import AutorizacionService
+
+
+class Command(BaseCommand):
+    help = (
+        'Barrido de vencimientos: marca VENCIDA las autorizaciones activas cuya fecha_fin pasó '
+        'y notifica en bloque. Pensado para Cloud Scheduler/cron, o en bucle con --intervalo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Filas por transacción')
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help='Segundos entre pasadas; 0 ejecuta una sola pasada')
+        parser.add_argument('--sin-notificar', action='store_true', help='No emitir AUTORIZACION_VENCIDA')
+
+    def handle(self, *args, **opts):
+        while True:
+            total = AutorizacionService.cancelar_autorizaciones_vencidas(
+                lote=max(1, opts['lote']), notificar=not opts['sin_notificar'],
+            )
+            self.stdout.write(f'Autorizaciones vencidas: {total}')
+            if opts['intervalo'] <= 0:
+                return
+            time.sleep(opts['intervalo'])
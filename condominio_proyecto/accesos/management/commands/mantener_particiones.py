@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accesos import particiones
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantiene las particiones mensuales de RegistroAcceso: crea los meses siguientes, mueve '
+        'a su mes las filas caídas en la partición por defecto y desacopla o elimina los meses '
+        'fuera de ACCESOS_RETENCION_MESES. Pensado para Cloud Scheduler/cron (diario).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adelante', type=int, default=None,
+                            help='Meses futuros a crear (por defecto ACCESOS_PARTICIONES_ADELANTE)')
+        parser.add_argument('--retencion', type=int, default=None,
+                            help='Meses completos a conservar (por defecto ACCESOS_RETENCION_MESES)')
+        parser.add_argument('--eliminar', action='store_true',
+                            help='DROP de las particiones vencidas; sin esto solo se desacoplan')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar las particiones vencidas')
+
+    def handle(self, *args, **opts):
+        if not particiones.particionada():
+            raise CommandError('RegistroAcceso todavía no está particionada: ejecutar particionar_accesos --cambiar')
+        if not opts['dry_run']:
+            for nombre, movidas in particiones.asegurar(opts['adelante']).items():
+                detalle = f' ({movidas} filas movidas desde la partición por defecto)' if movidas else ''
+                self.stdout.write(f'Creada {nombre}{detalle}')
+        vencidas = particiones.vencidas(opts['retencion'])
+        accion = 'Eliminada' if opts['eliminar'] else 'Desacoplada'
+        for nombre in vencidas:
+            if opts['dry_run']:
+                self.stdout.write(f'Vencida {nombre}')
+                continue
+            particiones.desacoplar(nombre, eliminar=opts['eliminar'])
+            self.stdout.write(f'{accion} {nombre}')
+        self.stdout.write(self.style.SUCCESS(f'Particiones al día ({len(vencidas)} vencidas)'))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from accesos import particiones
+
+
+class Command(BaseCommand):
+    help = (
+        'Completa la conversión de RegistroAcceso a tabla particionada (migración 0021): copia por '
+        'lotes las filas existentes (las escrituras nuevas ya las replica un trigger), compara los '
+        'conteos y, con --cambiar, reemplaza una tabla por otra con un bloqueo breve. Se puede '
+        'interrumpir y volver a ejecutar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por transacción')
+        parser.add_argument('--pausa', type=float, default=0.0, help='Segundos de espera entre lotes')
+        parser.add_argument('--desde-id', type=int, default=0, help='Retomar la copia a partir de este id')
+        parser.add_argument('--cambiar', action='store_true',
+                            help='Con la copia verificada, reemplazar la tabla vieja por la particionada')
+        parser.add_argument('--lock-timeout', default='5s',
+                            help='Espera máxima por el bloqueo del reemplazo (p. ej. 5s)')
+
+    def handle(self, *args, **opts):
+        if particiones.particionada():
+            self.stdout.write(self.style.SUCCESS('RegistroAcceso ya está particionada'))
+            return
+        if not particiones.pendiente():
+            raise CommandError('Falta aplicar la migración accesos 0021_particionar_registroacceso')
+
+        ultimo, total = opts['desde_id'], 0
+        while True:
+            hasta, filas = particiones.copiar_lote(ultimo, opts['lote'])
+            if not filas:
+                break
+            ultimo, total = hasta, total + filas
+            self.stdout.write(f'Copiadas {total} filas (hasta id {ultimo})')
+            if opts['pausa']:
+                time.sleep(opts['pausa'])
+
+        vieja, nueva = particiones.conteos()
+        if vieja != nueva:
+            raise CommandError(
+                f'Los conteos no coinciden ({vieja} en la tabla vieja, {nueva} en la particionada): '
+                f'volver a ejecutar sin --desde-id'
+            )
+        if not opts['cambiar']:
+            self.stdout.write(self.style.SUCCESS(f'Copia verificada ({vieja} filas); ejecutar con --cambiar'))
+            return
+
+        try:
+            particiones.cambiar(opts['lock_timeout'])
+        except OperationalError as e:
+            raise CommandError(f'No se obtuvo el bloqueo para el reemplazo, reintentar más tarde: {e}')
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {particiones.TABLA}')
+        self.stdout.write(self.style.SUCCESS(f'RegistroAcceso particionada ({vieja} filas)'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from accesos import dashboard
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula ContadorDashboard desde las tablas de origen. Los triggers mantienen los '
+        'contadores al día; usar tras restaurar datos o si se sospecha deriva.'
+    )
+
+    def handle(self, *args, **opts):
+        valores = dashboard.reconstruir()
+        for clave in ('usuarios', 'residentes', 'visitantes_pendientes', 'alertas_no_leidas'):
+            self.stdout.write(f'{clave}: {valores.get(clave, 0)}')
+        dias = sum(1 for clave in valores if clave.startswith('accesos:'))
+        self.stdout.write(self.style.SUCCESS(f'Contadores reconstruidos ({dias} días de accesos)'))
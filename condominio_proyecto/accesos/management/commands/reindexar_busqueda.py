@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from accesos import busqueda
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula la columna `busqueda` (texto normalizado para el índice trigram) de familias, '
+        'residentes, visitantes y reservas. Los triggers la mantienen al día; usar tras '
+        'restauraciones o cargas con los triggers deshabilitados.'
+    )
+
+    def handle(self, *args, **opts):
+        for modelo in busqueda._funciones():
+            total = busqueda.actualizar(modelo.objects.all())
+            self.stdout.write(f'{modelo._meta.label}: {total} filas actualizadas')
+        self.stdout.write(self.style.SUCCESS('Índice de búsqueda al día'))
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def limpiar_qr_image(apps, schema_editor):
+    # Las imagenes QR se renderizan bajo demanda; liberar los PNG base64 almacenados
+    AutorizacionVisita = apps.get_model('accesos', 'AutorizacionVisita')
+    AutorizacionVisita.objects.filter(qr_image__isnull=False).update(qr_image=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0016_merge_20251217_1424'),
+    ]
+
+    operations = [
+        migrations.RunPython(limpiar_qr_image, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+CONTADOR = 'accesos_contadordashboard'
+
+_UPSERT = f"""
+    INSERT INTO {CONTADOR} (clave, valor, actualizado)
+    SELECT clave, delta, now() FROM ({{origen}}) AS d(clave, delta) WHERE delta <> 0
+    ON CONFLICT (clave) DO UPDATE
+       SET valor = {CONTADOR}.valor + EXCLUDED.valor, actualizado = now();
+"""
+
+
+def _funcion(nombre, cuerpo):
+    return f"""
+    CREATE OR REPLACE FUNCTION {nombre}() RETURNS trigger AS $$
+    BEGIN
+        {cuerpo}
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+
+
+def _trigger(nombre, tabla, evento, referencias):
+    return f"""
+    CREATE TRIGGER {nombre} AFTER {evento} ON {tabla}
+    REFERENCING {referencias}
+    FOR EACH STATEMENT EXECUTE FUNCTION {nombre}();
+    """
+
+
+def _contador_filtrado(prefijo, tabla, clave, condicion):
+    """Triggers por sentencia (con tablas de transicion) que mantienen COUNT(*) WHERE condicion."""
+    sql = []
+    ins = f"SELECT '{clave}', count(*) FROM nuevas WHERE {condicion}"
+    dele = f"SELECT '{clave}', -count(*) FROM viejas WHERE {condicion}"
+    upd = (f"SELECT '{clave}', (SELECT count(*) FROM nuevas WHERE {condicion})"
+           f" - (SELECT count(*) FROM viejas WHERE {condicion})")
+    for sufijo, evento, refs, origen in [
+        ('ins', 'INSERT', 'NEW TABLE AS nuevas', ins),
+        ('del', 'DELETE', 'OLD TABLE AS viejas', dele),
+        ('upd', 'UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas', upd),
+    ]:
+        if evento == 'UPDATE' and condicion == 'TRUE':
+            continue
+        nombre = f"{prefijo}_{sufijo}"
+        sql.append(_funcion(nombre, _UPSERT.format(origen=origen)))
+        sql.append(_trigger(nombre, tabla, evento, refs))
+    return sql
+
+
+def _nombres(prefijo, tabla, con_update=True):
+    sufijos = ['ins', 'del'] + (['upd'] if con_update else [])
+    return [
+        f"DROP TRIGGER IF EXISTS {prefijo}_{s} ON {tabla}; DROP FUNCTION IF EXISTS {prefijo}_{s}();"
+        for s in sufijos
+    ]
+
+
+TZ = settings.TIME_ZONE
+DIA = f"'accesos:' || to_char(fecha_hora AT TIME ZONE '{TZ}', 'YYYY-MM-DD')"
+
+SQL = (
+    _contador_filtrado('dash_usuarios', 'auth_user', 'usuarios', 'TRUE')
+    + _contador_filtrado('dash_residentes', 'accesos_residente', 'residentes', 'TRUE')
+    + _contador_filtrado('dash_pendientes', 'accesos_autorizacionvisita', 'visitantes_pendientes', "status = 'ACTIVA'")
+    + _contador_filtrado('dash_alertas', 'notificaciones_notificacion', 'alertas_no_leidas', 'NOT leida')
+    + [
+        _funcion('dash_accesos_ins', _UPSERT.format(origen=f"SELECT {DIA}, count(*) FROM nuevas GROUP BY 1")),
+        _trigger('dash_accesos_ins', 'accesos_registroacceso', 'INSERT', 'NEW TABLE AS nuevas'),
+        _funcion('dash_accesos_del', _UPSERT.format(origen=f"SELECT {DIA}, -count(*) FROM viejas GROUP BY 1")),
+        _trigger('dash_accesos_del', 'accesos_registroacceso', 'DELETE', 'OLD TABLE AS viejas'),
+        # Valores iniciales
+        f"""
+        INSERT INTO {CONTADOR} (clave, valor, actualizado)
+        SELECT 'usuarios', count(*), now() FROM auth_user
+        UNION ALL SELECT 'residentes', count(*), now() FROM accesos_residente
+        UNION ALL SELECT 'visitantes_pendientes', count(*), now() FROM accesos_autorizacionvisita WHERE status = 'ACTIVA'
+        UNION ALL SELECT 'alertas_no_leidas', count(*), now() FROM notificaciones_notificacion WHERE NOT leida
+        UNION ALL SELECT {DIA}, count(*), now() FROM accesos_registroacceso GROUP BY 1
+        ON CONFLICT (clave) DO UPDATE SET valor = EXCLUDED.valor, actualizado = now();
+        """,
+    ]
+)
+
+REVERSE_SQL = (
+    _nombres('dash_usuarios', 'auth_user', con_update=False)
+    + _nombres('dash_residentes', 'accesos_residente', con_update=False)
+    + _nombres('dash_pendientes', 'accesos_autorizacionvisita')
+    + _nombres('dash_alertas', 'notificaciones_notificacion')
+    + _nombres('dash_accesos', 'accesos_registroacceso', con_update=False)
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0017_limpiar_qr_image'),
+        ('notificaciones', '0003_remove_notificacion_campania_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorDashboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=60, unique=True)),
+                ('valor', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:27
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transaccion
+    atomic = False
+
+    dependencies = [
+        ('accesos', '0018_contadordashboard'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='autorizacionvisita',
+            index=models.Index(fields=['status', 'fecha_fin'], name='autorizacion_status_fin_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='autorizacionvisita',
+            index=models.Index(fields=['familia', 'status'], name='autorizacion_fam_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='registroacceso',
+            index=models.Index(fields=['fecha_hora'], name='registro_fecha_hora_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='registroacceso',
+            index=models.Index(fields=['tipo_persona', 'persona_id', '-fecha_hora'], name='registro_persona_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:29
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def poblar_busqueda(apps, schema_editor):
+    from accesos.busqueda import texto_familia, texto_residente, texto_visitante
+    for nombre, texto, relacionados in (
+        ('Familia', texto_familia, ()),
+        ('Residente', texto_residente, ('user', 'familia')),
+        ('Visitante', texto_visitante, ()),
+    ):
+        modelo = apps.get_model('accesos', nombre)
+        lote = []
+        for obj in modelo.objects.select_related(*relacionados).iterator(chunk_size=1000):
+            obj.busqueda = texto(obj)
+            lote.append(obj)
+            if len(lote) == 1000:
+                modelo.objects.bulk_update(lote, ['busqueda'])
+                lote = []
+        if lote:
+            modelo.objects.bulk_update(lote, ['busqueda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0019_autorizacionvisita_autorizacion_status_fin_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='familia',
+            name='busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='residente',
+            name='busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='visitante',
+            name='busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='familia',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busqueda'], name='familia_busqueda_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='residente',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busqueda'], name='residente_busqueda_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='visitante',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busqueda'], name='visitante_busqueda_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
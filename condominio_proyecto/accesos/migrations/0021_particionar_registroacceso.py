@@ -0,0 +1,71 @@
+# Convierte accesos_registroacceso en una tabla particionada por mes (ver accesos/particiones.py).
+#
+# La migracion no copia filas ni bloquea la tabla: crea la tabla particionada
+# vacia junto a la vieja con un trigger que le replica cada escritura. La copia
+# por lotes y el reemplazo los hace `manage.py particionar_accesos` fuera del
+# arranque del contenedor. Si la tabla esta vacia (instalacion nueva, tests) el
+# reemplazo se hace aca mismo. Si la tabla ya esta particionada no hace nada.
+#
+# El estado del modelo no cambia: para Django `id` sigue siendo la clave
+# primaria. En la base la PK pasa a (id, fecha_hora), porque Postgres exige que
+# incluya la columna de particion; la unicidad de `id` la da la secuencia.
+
+from django.db import migrations
+
+from accesos import particiones
+
+TABLA = particiones.TABLA
+VIEJA = f'{TABLA}_old'
+
+
+def particionar(apps, schema_editor):
+    particiones.preparar()
+    if not particiones.pendiente():
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {TABLA})")
+        if cursor.fetchone()[0]:
+            return
+    particiones.cambiar()
+
+
+def desparticionar(apps, schema_editor):
+    if particiones.pendiente():
+        # Conversion sin terminar: la tabla vieja sigue siendo la buena
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS registro_espejo ON {TABLA}")
+        schema_editor.execute("DROP FUNCTION IF EXISTS registro_espejo()")
+        schema_editor.execute(f"DROP TABLE {particiones.NUEVA}")
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLA])
+        secuencia = cursor.fetchone()[0]
+        cursor.execute(f"SELECT last_value, is_called FROM {secuencia}")
+        last_value, is_called = cursor.fetchone()
+        cursor.execute(f"LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE")
+
+    schema_editor.execute(f"ALTER TABLE {TABLA} RENAME TO {VIEJA}")
+    schema_editor.execute(f"CREATE TABLE {TABLA} (LIKE {VIEJA} INCLUDING DEFAULTS)")
+    schema_editor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id DROP DEFAULT")
+    # Solo las particiones acopladas; las desacopladas por retencion quedan como tablas sueltas
+    schema_editor.execute(f"INSERT INTO {TABLA} SELECT * FROM {VIEJA}")
+    schema_editor.execute(f"DROP TABLE {VIEJA}")
+
+    schema_editor.execute(f"CREATE SEQUENCE {particiones.SECUENCIA} OWNED BY {TABLA}.id")
+    schema_editor.execute("SELECT setval(%s, %s, %s)", [particiones.SECUENCIA, last_value, is_called])
+    schema_editor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id SET DEFAULT nextval('{particiones.SECUENCIA}')")
+    for nombre, _, sql in particiones.objetos(pk='id'):
+        schema_editor.execute(particiones.sql_objeto(sql, nombre, TABLA))
+    for sql in particiones.TRIGGERS_DASHBOARD:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0020_familia_busqueda_residente_busqueda_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
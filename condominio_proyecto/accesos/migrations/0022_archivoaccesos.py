@@ -0,0 +1,26 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0021_particionar_registroacceso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoAccesos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('archivo', models.CharField(max_length=200)),
+                ('filas', models.PositiveIntegerField()),
+                ('id_min', models.BigIntegerField()),
+                ('id_max', models.BigIntegerField()),
+                ('tamano', models.BigIntegerField()),
+                ('fecha_archivado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:10
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+# Los contadores del dashboard dejan de ser una fila por clave: cada conexion suma
+# su delta en la fila (clave, pg_backend_pid() % FRAGMENTOS) y la lectura suma los
+# fragmentos (accesos.dashboard.valores). Una misma transaccion siempre escribe el
+# mismo fragmento, asi dos transacciones no se bloquean en orden cruzado.
+#
+# Se reescriben las funciones de los triggers de 0018 y de notificaciones 0008
+# (mismo origen de los deltas, otro UPSERT). 'visitantes_pendientes' deja de ser
+# un contador: las autorizaciones vencen sin escribir nada, asi que el dashboard
+# cuenta al leer las ACTIVA con fecha_fin futura.
+
+m0018 = import_module('accesos.migrations.0018_contadordashboard')
+m0008 = import_module('notificaciones.migrations.0008_marcalectura')
+
+CONTADOR = m0018.CONTADOR
+FRAGMENTOS = 16
+
+_UPSERT = f"""
+    INSERT INTO {CONTADOR} (clave, fragmento, valor, actualizado)
+    SELECT clave, pg_backend_pid() % {FRAGMENTOS}, delta, now() FROM ({{origen}}) AS d(clave, delta) WHERE delta <> 0
+    ON CONFLICT (clave, fragmento) DO UPDATE
+       SET valor = {CONTADOR}.valor + EXCLUDED.valor, actualizado = now();
+"""
+
+
+def _total(clave, tabla, signo=''):
+    return f"SELECT '{clave}', {signo}count(*) FROM {tabla} WHERE TRUE"
+
+
+_nuevas, _viejas = m0008._no_leidas('nuevas', True), m0008._no_leidas('viejas', True)
+ORIGENES = {
+    'dash_usuarios_ins': _total('usuarios', 'nuevas'),
+    'dash_usuarios_del': _total('usuarios', 'viejas', '-'),
+    'dash_residentes_ins': _total('residentes', 'nuevas'),
+    'dash_residentes_del': _total('residentes', 'viejas', '-'),
+    'dash_accesos_ins': f"SELECT {m0018.DIA}, count(*) FROM nuevas GROUP BY 1",
+    'dash_accesos_del': f"SELECT {m0018.DIA}, -count(*) FROM viejas GROUP BY 1",
+    'dash_alertas_ins': f"SELECT 'alertas_no_leidas', ({_nuevas})",
+    'dash_alertas_del': f"SELECT 'alertas_no_leidas', -({_viejas})",
+    'dash_alertas_upd': f"SELECT 'alertas_no_leidas', ({_nuevas}) - ({_viejas})",
+    'dash_marcas_ins': m0008._cubiertas('nuevas b', "'-infinity'", '-'),
+    'dash_marcas_upd': m0008._cubiertas('nuevas b JOIN viejas v ON v.id = b.id', 'v.leidas_hasta', '-'),
+    'dash_marcas_del': m0008._cubiertas('viejas b', "'-infinity'", ''),
+}
+
+SQL = [m0018._funcion(nombre, _UPSERT.format(origen=origen)) for nombre, origen in ORIGENES.items()]
+
+# Antes de volver a una fila por clave, juntar los fragmentos en el 0
+REVERSE_SQL = [
+    f"""
+    INSERT INTO {CONTADOR} (clave, fragmento, valor, actualizado)
+    SELECT clave, 0, sum(valor), now() FROM {CONTADOR} WHERE fragmento <> 0 GROUP BY clave
+    ON CONFLICT (clave, fragmento) DO UPDATE SET valor = {CONTADOR}.valor + EXCLUDED.valor, actualizado = now();
+    """,
+    f"DELETE FROM {CONTADOR} WHERE fragmento <> 0;",
+] + [m0018._funcion(nombre, m0018._UPSERT.format(origen=origen)) for nombre, origen in ORIGENES.items()]
+
+PENDIENTES = 'accesos_autorizacionvisita'
+SIN_PENDIENTES = m0018._nombres('dash_pendientes', PENDIENTES) + [
+    f"DELETE FROM {CONTADOR} WHERE clave = 'visitantes_pendientes';",
+]
+CON_PENDIENTES = m0018._contador_filtrado('dash_pendientes', PENDIENTES, 'visitantes_pendientes', "status = 'ACTIVA'") + [
+    f"""
+    INSERT INTO {CONTADOR} (clave, valor, actualizado)
+    SELECT 'visitantes_pendientes', count(*), now() FROM {PENDIENTES} WHERE status = 'ACTIVA';
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0022_archivoaccesos'),
+        ('notificaciones', '0009_resumendifusion'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SIN_PENDIENTES, CON_PENDIENTES),
+        migrations.AddField(
+            model_name='contadordashboard',
+            name='fragmento',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='contadordashboard',
+            name='clave',
+            field=models.CharField(max_length=60),
+        ),
+        migrations.AddConstraint(
+            model_name='contadordashboard',
+            constraint=models.UniqueConstraint(fields=('clave', 'fragmento'), name='contador_clave_fragmento'),
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
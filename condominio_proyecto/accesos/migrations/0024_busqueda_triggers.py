@@ -0,0 +1,193 @@
+# La columna `busqueda` (accesos/busqueda.py) pasa a mantenerse en la base:
+#
+# - Un trigger BEFORE INSERT OR UPDATE por fila calcula NEW.busqueda en Familia,
+#   Residente, Visitante y ReservaArea con las funciones busqueda_texto_*, que
+#   leen las tablas relacionadas (usuario, familia, area...) dentro del mismo
+#   INSERT/UPDATE, sin consultas extra desde Django.
+# - Triggers AFTER UPDATE por sentencia en auth_user, familia, residente, area,
+#   unidad y turno propagan los cambios de texto a las filas que lo copian.
+#   Solo escriben las filas cuyo texto realmente cambia, y no hacen nada si
+#   ninguna fila cambio las columnas de origen.
+# - La propagacion corre solo en sentencias directas (pg_trigger_depth() = 1).
+#   Los UPDATE que hacen otros triggers (ocupados del turno, version del
+#   calendario, esta misma propagacion) no cambian texto, y sin el corte se
+#   llamarian entre si hasta agotar la pila. Por eso auth_user refresca de una
+#   vez los residentes y sus reservas, sin esperar al trigger de residente.
+#
+# busqueda_normalizar replica accesos.busqueda.normalizar (NFKD, minusculas,
+# sin marcas diacriticas, espacios colapsados).
+
+from django.db import migrations
+
+NORMALIZAR = r"""
+    CREATE OR REPLACE FUNCTION busqueda_normalizar(texto text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT btrim(regexp_replace(
+            regexp_replace(
+                lower(normalize(coalesce(texto, ''), NFKD)),
+                '[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]', '', 'g'
+            ),
+            '\s+', ' ', 'g'
+        ))
+    $$;
+"""
+
+USUARIO = "u.first_name, u.last_name, u.username, u.email"
+
+# tabla -> (funcion de texto, cuerpo SQL que recibe la fila como `f`)
+TEXTOS = {
+    'accesos_familia': (
+        'busqueda_texto_familia',
+        "SELECT busqueda_normalizar(concat_ws(' ', f.nombre, f.departamento, f.torre))",
+    ),
+    'accesos_visitante': (
+        'busqueda_texto_visitante',
+        "SELECT busqueda_normalizar(concat_ws(' ', f.nombre_completo, f.documento_identidad))",
+    ),
+    'accesos_residente': (
+        'busqueda_texto_residente',
+        f"""
+        SELECT busqueda_normalizar(concat_ws(' ', {USUARIO}, f.documento_identidad, fa.nombre, fa.departamento, fa.torre))
+          FROM (SELECT 1) AS x
+          LEFT JOIN auth_user u ON u.id = f.user_id
+          LEFT JOIN accesos_familia fa ON fa.id = f.familia_id
+        """,
+    ),
+    'areas_reservaarea': (
+        'busqueda_texto_reserva',
+        f"""
+        SELECT busqueda_normalizar(concat_ws(' ', {USUARIO}, r.documento_identidad, fa.nombre, a.nombre, un.nombre, t.titulo))
+          FROM (SELECT 1) AS x
+          LEFT JOIN accesos_residente r ON r.id = f.residente_id
+          LEFT JOIN auth_user u ON u.id = r.user_id
+          LEFT JOIN accesos_familia fa ON fa.id = f.familia_id
+          LEFT JOIN areas_areacomun a ON a.id = f.area_id
+          LEFT JOIN areas_unidadarea un ON un.id = f.unidad_id
+          LEFT JOIN areas_turnoarea t ON t.id = f.turno_id
+        """,
+    ),
+}
+
+
+def _texto(tabla, funcion, cuerpo):
+    return f"""
+    CREATE OR REPLACE FUNCTION {funcion}(f {tabla}) RETURNS text
+    LANGUAGE sql STABLE AS $$ {cuerpo} $$;
+    """
+
+
+def _calcular(tabla, funcion):
+    nombre = f'{funcion}_fila'
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {nombre}() RETURNS trigger AS $$
+        BEGIN
+            NEW.busqueda := {funcion}(NEW);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        f"CREATE TRIGGER {nombre} BEFORE INSERT OR UPDATE ON {tabla} FOR EACH ROW EXECUTE FUNCTION {nombre}();",
+    ]
+
+
+def _refrescar(tabla, columna, cambiadas, puente=None):
+    """UPDATE de las filas de `tabla` cuyo `columna` apunta a una fila de `cambiadas` y cuyo texto cambia.
+
+    `puente` (SQL con {}) traduce los ids cambiados cuando la FK apunta a otra tabla.
+    """
+    funcion = TEXTOS[tabla][0]
+    if puente:
+        cambiadas = puente.format(cambiadas)
+    return (
+        f"UPDATE {tabla} d SET busqueda = {funcion}(d) "
+        f"WHERE d.{columna} IN ({cambiadas}) AND d.busqueda IS DISTINCT FROM {funcion}(d);"
+    )
+
+
+def _cambiadas(columnas):
+    distintas = ' OR '.join(f'n.{c} IS DISTINCT FROM v.{c}' for c in columnas)
+    return f"SELECT n.id FROM nuevas n JOIN viejas v ON v.id = n.id WHERE {distintas}"
+
+
+# tabla de origen -> (columnas que forman parte del texto, [(tabla destino, columna FK[, puente])])
+PROPAGAR = {
+    'auth_user': (
+        ('first_name', 'last_name', 'username', 'email'),
+        [
+            ('accesos_residente', 'user_id'),
+            ('areas_reservaarea', 'residente_id', "SELECT r.id FROM accesos_residente r WHERE r.user_id IN ({})"),
+        ],
+    ),
+    'accesos_familia': (
+        ('busqueda',),
+        [('accesos_residente', 'familia_id'), ('areas_reservaarea', 'familia_id')],
+    ),
+    'accesos_residente': (
+        ('busqueda',),
+        [('areas_reservaarea', 'residente_id')],
+    ),
+    'areas_areacomun': (('nombre',), [('areas_reservaarea', 'area_id')]),
+    'areas_unidadarea': (('nombre',), [('areas_reservaarea', 'unidad_id')]),
+    'areas_turnoarea': (('titulo',), [('areas_reservaarea', 'turno_id')]),
+}
+
+
+def _propagar(origen, columnas, destinos):
+    nombre = f'busqueda_propagar_{origen}'
+    cambiadas = _cambiadas(columnas)
+    cuerpo = '\n'.join(_refrescar(tabla, fk, cambiadas, *puente) for tabla, fk, *puente in destinos)
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION {nombre}() RETURNS trigger AS $$
+        BEGIN
+            IF pg_trigger_depth() > 1 OR NOT EXISTS ({cambiadas}) THEN
+                RETURN NULL;
+            END IF;
+            {cuerpo}
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        f"CREATE TRIGGER {nombre} AFTER UPDATE ON {origen} REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION {nombre}();",
+    ]
+
+
+SQL = (
+    [NORMALIZAR]
+    + [_texto(tabla, funcion, cuerpo) for tabla, (funcion, cuerpo) in TEXTOS.items()]
+    + [sql for tabla, (funcion, _) in TEXTOS.items() for sql in _calcular(tabla, funcion)]
+    + [sql for origen, (columnas, destinos) in PROPAGAR.items() for sql in _propagar(origen, columnas, destinos)]
+    # Alinear lo calculado en Python con la version SQL (difieren solo en casos raros de Unicode)
+    + [
+        f"UPDATE {tabla} f SET busqueda = {funcion}(f) WHERE f.busqueda IS DISTINCT FROM {funcion}(f);"
+        for tabla, (funcion, _) in TEXTOS.items()
+    ]
+)
+
+REVERSE_SQL = (
+    [
+        f"DROP TRIGGER IF EXISTS busqueda_propagar_{origen} ON {origen}; "
+        f"DROP FUNCTION IF EXISTS busqueda_propagar_{origen}();"
+        for origen in PROPAGAR
+    ]
+    + [
+        f"DROP TRIGGER IF EXISTS {funcion}_fila ON {tabla}; DROP FUNCTION IF EXISTS {funcion}_fila();"
+        for tabla, (funcion, _) in TEXTOS.items()
+    ]
+    + [f"DROP FUNCTION IF EXISTS {funcion}({tabla});" for tabla, (funcion, _) in TEXTOS.items()]
+    + ["DROP FUNCTION IF EXISTS busqueda_normalizar(text);"]
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0023_contadordashboard_fragmento'),
+        ('areas', '0018_versioncalendario'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
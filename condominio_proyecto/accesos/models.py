@@ -1,8 +1,18 @@
-from django.db import models
+from django.db import models, connection
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.auth.models import User
 from django.utils import timezone
-import random
-import string
+from . import qr_tokens
+
+
+def reservar_ids(model, cantidad=1):
+    """Reserva ids de la secuencia de la tabla antes de insertar (una sola consulta)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+            [model._meta.db_table, model._meta.pk.column, cantidad],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
 
 # =========================
 # Nucleo de residentes/visitas
@@ -14,6 +24,11 @@ class Familia(models.Model):
     torre = models.CharField(max_length=5, null=True, blank=True)
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Texto normalizado para busqueda (ver accesos/busqueda.py)
+    busqueda = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [GinIndex(fields=['busqueda'], opclasses=['gin_trgm_ops'], name='familia_busqueda_trgm')]
     
     def __str__(self):
         return f"Familia {self.nombre} - Dpto. {self.departamento}"
@@ -38,6 +53,11 @@ class Residente(models.Model):
     puede_reservar_areas = models.BooleanField(default=True, help_text='Puede crear reservas en áreas comunes')
     activo = models.BooleanField(default=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
+    # Texto normalizado para busqueda (ver accesos/busqueda.py)
+    busqueda = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [GinIndex(fields=['busqueda'], opclasses=['gin_trgm_ops'], name='residente_busqueda_trgm')]
 
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.documento_identidad}"
@@ -75,6 +95,11 @@ class Visitante(models.Model):
     fecha_fin = models.DateTimeField()
     activo = models.BooleanField(default=False)
     vehiculo = models.ForeignKey(Vehiculo, on_delete=models.SET_NULL, null=True, blank=True)
+    # Texto normalizado para busqueda (ver accesos/busqueda.py)
+    busqueda = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [GinIndex(fields=['busqueda'], opclasses=['gin_trgm_ops'], name='visitante_busqueda_trgm')]
 
     def __str__(self):
         return f"{self.nombre_completo} - Autorizado por: {self.autorizado_por}"
@@ -120,12 +145,23 @@ class AutorizacionVisita(models.Model):
     entradas_consumidas = models.IntegerField(default=0)
     dentro = models.BooleanField(default=False, help_text='Indica si el visitante se encuentra dentro actualmente')
 
+    class Meta:
+        indexes = [
+            # Barrido de vencimientos y conteos por estado
+            models.Index(fields=['status', 'fecha_fin'], name='autorizacion_status_fin_idx'),
+            # Listados por familia filtrados por estado
+            models.Index(fields=['familia', 'status'], name='autorizacion_fam_status_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.codigo_qr:
-            # Generar un codigo unico usando timestamp y datos del visitante
-            timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
-            random_string = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            self.codigo_qr = f"AV-{timestamp}-{random_string}"
+            # Token firmado (ver qr_tokens): necesita el id antes del INSERT
+            if self.pk is None:
+                self.pk = reservar_ids(AutorizacionVisita)[0]
+                kwargs['force_insert'] = True
+            self.codigo_qr = qr_tokens.emitir_para(self)
+        # Editar la vigencia o las entradas no cambia el código: el QR ya enviado sigue
+        # valiendo y el servidor lo resuelve por el id firmado (AutorizacionService.filtro_qr)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -150,6 +186,29 @@ class ConfiguracionAcceso(models.Model):
 
 ## Notificacion model moved to 'notificaciones' app
 
+class ContadorDashboard(models.Model):
+    """Contadores del dashboard de admin mantenidos de forma incremental por triggers
+    de Postgres (ver migraciones 0018 y 0023). Claves: 'usuarios', 'residentes',
+    'alertas_no_leidas' y 'accesos:<YYYY-MM-DD>' por dia local.
+
+    Cada clave se reparte en hasta FRAGMENTOS filas: cada conexion suma su delta en
+    la fila ``pg_backend_pid() % FRAGMENTOS``, asi escrituras concurrentes no se
+    serializan sobre una unica fila caliente. El valor es la suma de los fragmentos."""
+    FRAGMENTOS = 16
+
+    clave = models.CharField(max_length=60)
+    fragmento = models.SmallIntegerField(default=0)
+    valor = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['clave', 'fragmento'], name='contador_clave_fragmento'),
+        ]
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
+
 class RegistroAcceso(models.Model):
     TIPO_PERSONA = [
         ('R', 'Residente'),
@@ -171,10 +230,37 @@ class RegistroAcceso(models.Model):
     detalles = models.JSONField(null=True, blank=True)  # Almacena detalles adicionales del acceso
     vehiculo = models.ForeignKey(Vehiculo, on_delete=models.SET_NULL, null=True, blank=True)
 
+    # Tabla particionada por mes (accesos/particiones.py): en la base la PK es
+    # (id, fecha_hora), para Django es `id`. Sirve igual porque `id` sale de la
+    # secuencia y es único; ninguna FK apunta a este modelo.
+    class Meta:
+        indexes = [
+            # Rangos por fecha (dashboard, reportes, estadisticas)
+            models.Index(fields=['fecha_hora'], name='registro_fecha_hora_idx'),
+            # Historial de una persona (persona polimorfica), mas recientes primero
+            models.Index(fields=['tipo_persona', 'persona_id', '-fecha_hora'], name='registro_persona_idx'),
+        ]
+
     def __str__(self):
         return f"Acceso {self.get_tipo_persona_display()} - {self.fecha_hora}"
 
 
+class ArchivoAccesos(models.Model):
+    """Indice por dia local del archivo frio de RegistroAcceso (ver accesos/archivo.py).
+    Las filas de `fecha` ya no estan en la tabla: viven en `archivo`, nombre
+    dentro del almacenamiento 'archivo_accesos' (STORAGES)."""
+    fecha = models.DateField(unique=True)
+    archivo = models.CharField(max_length=200)
+    filas = models.PositiveIntegerField()
+    id_min = models.BigIntegerField()
+    id_max = models.BigIntegerField()
+    tamano = models.BigIntegerField()
+    fecha_archivado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Archivo de accesos {self.fecha} ({self.filas} filas)"
+
+
 # =========================
 # Areas comunes y reservas
 # =========================
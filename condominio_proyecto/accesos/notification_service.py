@@ -1,7 +1,6 @@
 from django.utils import timezone
-from django.db.models import Q
 from notificaciones.models import Notificacion
-from .models import AutorizacionVisita
+from .models import AutorizacionVisita, Visitante
 
 class NotificacionService:
     @staticmethod
@@ -54,23 +53,50 @@ class NotificacionService:
         )
 
     @staticmethod
-    def notificar_autorizacion_vencida(autorizacion):
-        """Notifica cuando una autorización vence"""
+    def _notificacion_vencida(residente_id, autorizacion_id, visitante_id, visitante_nombre, fecha_fin):
         mensaje = (
-            f"La autorización para {autorizacion.visitante.nombre_completo} "
-            f"ha vencido el {autorizacion.fecha_fin.strftime('%d/%m/%Y %H:%M')}"
+            f"La autorización para {visitante_nombre} "
+            f"ha vencido el {fecha_fin.strftime('%d/%m/%Y %H:%M')}"
         )
-        return NotificacionService.crear_notificacion(
-            residente=autorizacion.autorizado_por,
+        return Notificacion(
+            residente_id=residente_id,
             tipo='AUTORIZACION_VENCIDA',
             mensaje=mensaje,
             datos_extra={
-                'autorizacion_id': autorizacion.id,
-                'visitante_id': autorizacion.visitante.id,
-                'fecha_vencimiento': autorizacion.fecha_fin.isoformat()
+                'autorizacion_id': autorizacion_id,
+                'visitante_id': visitante_id,
+                'fecha_vencimiento': fecha_fin.isoformat()
             }
         )
 
+    @staticmethod
+    def notificar_autorizacion_vencida(autorizacion):
+        """Notifica cuando una autorización vence"""
+        notificacion = NotificacionService._notificacion_vencida(
+            autorizacion.autorizado_por_id, autorizacion.id, autorizacion.visitante.id,
+            autorizacion.visitante.nombre_completo, autorizacion.fecha_fin,
+        )
+        notificacion.save()
+        return notificacion
+
+    @staticmethod
+    def notificar_autorizaciones_vencidas(filas):
+        """Versión masiva: filas (autorizacion_id, residente_id, visitante_id, fecha_fin).
+        Un SELECT para los nombres y un único INSERT para todas las notificaciones."""
+        nombres = dict(Visitante.objects.filter(
+            id__in={visitante_id for _, _, visitante_id, _ in filas}
+        ).values_list('id', 'nombre_completo'))
+        from notificaciones import tiempo_real
+        creadas = Notificacion.objects.bulk_create([
+            NotificacionService._notificacion_vencida(
+                residente_id, autorizacion_id, visitante_id, nombres.get(visitante_id, ''), fecha_fin,
+            )
+            for autorizacion_id, residente_id, visitante_id, fecha_fin in filas
+        ])
+        # bulk_create no emite post_save
+        tiempo_real.publicar_notificaciones(creadas)
+        return creadas
+
     @staticmethod
     def notificar_acceso_denegado(autorizacion, motivo):
         """Notifica cuando se deniega un acceso"""
@@ -93,28 +119,45 @@ class NotificacionService:
     @staticmethod
     def obtener_notificaciones(residente, solo_no_leidas=False, limit=None):
         """Obtiene las notificaciones de un residente"""
+        from notificaciones import lecturas
         queryset = Notificacion.objects.filter(residente=residente)
         if solo_no_leidas:
+            # No leidas = leida=False posteriores a su marca de lectura (rango sobre el indice)
+            marca = lecturas.marca(residente=residente)
             queryset = queryset.filter(leida=False)
+            if marca is not None:
+                queryset = queryset.filter(fecha_creacion__gt=marca)
         if limit:
             queryset = queryset[:limit]
         return queryset
 
     @staticmethod
     def marcar_notificaciones_como_leidas(residente, ids=None):
-        """Marca notificaciones como leídas"""
-        queryset = Notificacion.objects.filter(residente=residente, leida=False)
+        """Marca notificaciones como leídas.
+
+        Sin `ids` mueve la marca de lectura del residente (una fila) en lugar de
+        actualizar cada notificación; devuelve cuántas quedaron leídas.
+        """
+        from notificaciones import lecturas
         if ids:
-            queryset = queryset.filter(id__in=ids)
-        
-        now = timezone.now()
-        return queryset.update(leida=True, fecha_lectura=now)
+            return lecturas.marcar(ids, [], residente=residente)
+        marcadas = lecturas.no_leidas(residente=residente)
+        lecturas.marcar_todas(residente=residente)
+        return marcadas
 
     @staticmethod
     def eliminar_notificaciones_antiguas(dias=30):
-        """Elimina notificaciones más antiguas que el número de días especificado"""
-        fecha_limite = timezone.now() - timezone.timedelta(days=dias)
-        return Notificacion.objects.filter(
-            Q(fecha_creacion__lt=fecha_limite),
-            Q(leida=True) | Q(tipo='AUTORIZACION_VENCIDA')
-        ).delete()
\ No newline at end of file
+        """Elimina notificaciones más antiguas que `dias` en lotes (notificaciones.retencion).
+
+        Borra las leídas, y AUTORIZACION_VENCIDA aunque no se hayan leído, como
+        siempre. Con ``dias=None`` aplica en cambio las políticas por tipo de
+        NOTIFICACIONES_RETENCION. Devuelve cuántas borró.
+        """
+        from notificaciones import retencion
+        tabla = None
+        if dias is not None:
+            tabla = {
+                tipo: {'dias': dias, 'solo_leidas': tipo != 'AUTORIZACION_VENCIDA'}
+                for tipo, _ in Notificacion.TIPO_CHOICES
+            }
+        return sum(retencion.aplicar(tabla).values())
\ No newline at end of file
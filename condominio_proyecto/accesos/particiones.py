@@ -0,0 +1,337 @@
+"""Particiones mensuales de ``RegistroAcceso`` (``PARTITION BY RANGE (fecha_hora)``).
+
+La tabla ``accesos_registroacceso`` es particionada desde la migración 0021:
+una partición por mes local (``accesos_registroacceso_pAAAAMM``) más una
+partición ``_default`` que recibe lo que no cae en ningún mes creado, para que
+un INSERT nunca falle. El modelo no cambia: los filtros por rango de
+``fecha_hora`` (reportes, estadísticas, dashboard) descartan las particiones
+que no intersectan (partition pruning) sin tocar el código que consulta.
+
+``manage.py mantener_particiones`` (programarlo a diario, como
+``expirar_autorizaciones``) crea los meses siguientes, vacía la partición por
+defecto en su mes correspondiente y desacopla o elimina los meses fuera de
+``ACCESOS_RETENCION_MESES``. Desacoplar o eliminar una partición no borra fila
+por fila: no dispara los triggers del dashboard, así que los contadores
+``accesos:AAAA-MM-DD`` de esos días se conservan.
+
+La conversión no bloquea la tabla mientras copia. La migración 0021 solo crea
+la tabla particionada vacía (``accesos_registroacceso_nueva``) y un trigger que
+le replica cada INSERT/UPDATE/DELETE de la vieja; ``manage.py
+particionar_accesos`` copia las filas existentes por lotes, compara los
+conteos y reemplaza una tabla por otra en una transacción corta. Con la tabla
+vacía (instalación nueva, tests) la migración hace el reemplazo en el acto.
+
+En la base la PK es (id, fecha_hora): Postgres exige que incluya la columna
+de partición. Para Django sigue siendo ``id``; la unicidad de ``id`` la da la
+secuencia y ninguna FK apunta a ``RegistroAcceso``.
+"""
+import re
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+TABLA = 'accesos_registroacceso'
+DEFAULT = f'{TABLA}_default'
+NUEVA = f'{TABLA}_nueva'
+SECUENCIA = f'{TABLA}_id_seq'
+_PATRON = re.compile(rf'^{TABLA}_p(\d{{4}})(\d{{2}})$')
+
+
+def sumar_meses(mes, n):
+    """(año, mes) desplazado `n` meses."""
+    indice = mes[0] * 12 + mes[1] - 1 + n
+    return indice // 12, indice % 12 + 1
+
+
+def mes_actual():
+    hoy = timezone.localdate()
+    return hoy.year, hoy.month
+
+
+def nombre(mes):
+    return f'{TABLA}_p{mes[0]:04d}{mes[1]:02d}'
+
+
+def limites(mes):
+    """[inicio, fin) del mes en hora local, como literales ISO con offset."""
+    tz = ZoneInfo(settings.TIME_ZONE)
+    inicio = datetime(mes[0], mes[1], 1, tzinfo=tz)
+    fin = datetime(*sumar_meses(mes, 1), 1, tzinfo=tz)
+    return inicio.isoformat(), fin.isoformat()
+
+
+def sql_crear(mes, tabla=TABLA):
+    desde, hasta = limites(mes)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {nombre(mes)} PARTITION OF {tabla} "
+        f"FOR VALUES FROM ('{desde}') TO ('{hasta}')"
+    )
+
+
+def existentes():
+    """{(año, mes): nombre} de las particiones mensuales acopladas."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLA],
+        )
+        meses = {}
+        for (relname,) in cursor.fetchall():
+            m = _PATRON.match(relname)
+            if m:
+                meses[(int(m.group(1)), int(m.group(2)))] = relname
+        return meses
+
+
+def meses_en_default():
+    """Meses (locales) que tienen filas en la partición por defecto."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT extract(year FROM t)::int, extract(month FROM t)::int "
+            f"FROM (SELECT fecha_hora AT TIME ZONE %s AS t FROM {DEFAULT}) AS d ORDER BY 1, 2",
+            [settings.TIME_ZONE],
+        )
+        return [tuple(fila) for fila in cursor.fetchall()]
+
+
+def crear(mes):
+    """Crea la partición del mes. Si la partición por defecto tiene filas de ese
+    mes, las mueve a la nueva antes de acoplarla (ATTACH fallaría si no).
+    Devuelve cuántas filas se movieron, o None si la partición ya existía.
+    """
+    if mes in existentes():
+        return None
+    desde, hasta = limites(mes)
+    particion = nombre(mes)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT count(*) FROM {DEFAULT} WHERE fecha_hora >= %s AND fecha_hora < %s", [desde, hasta]
+        )
+        pendientes = cursor.fetchone()[0]
+        if not pendientes:
+            cursor.execute(sql_crear(mes))
+            return 0
+        # Sobre la partición directamente: los triggers por sentencia del padre no se disparan
+        cursor.execute(f"CREATE TABLE {particion} (LIKE {TABLA} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH movidas AS (DELETE FROM {DEFAULT} WHERE fecha_hora >= %s AND fecha_hora < %s RETURNING *) "
+            f"INSERT INTO {particion} SELECT * FROM movidas",
+            [desde, hasta],
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLA} ATTACH PARTITION {particion} FOR VALUES FROM ('{desde}') TO ('{hasta}')"
+        )
+        return pendientes
+
+
+def asegurar(adelante=None):
+    """Crea el mes actual y los `adelante` siguientes, y vacía la partición por defecto.
+
+    Devuelve {nombre: filas movidas} de las particiones creadas.
+    """
+    if adelante is None:
+        adelante = getattr(settings, 'ACCESOS_PARTICIONES_ADELANTE', 3)
+    actual = mes_actual()
+    meses = {sumar_meses(actual, n) for n in range(adelante + 1)} | set(meses_en_default())
+    creadas = {}
+    for mes in sorted(meses):
+        movidas = crear(mes)
+        if movidas is not None:
+            creadas[nombre(mes)] = movidas
+    return creadas
+
+
+def vencidas(retencion_meses=None):
+    """Nombres de las particiones cuyo mes completo quedó fuera de la retención."""
+    if retencion_meses is None:
+        retencion_meses = getattr(settings, 'ACCESOS_RETENCION_MESES', None)
+    if not retencion_meses:
+        return []
+    limite = sumar_meses(mes_actual(), -retencion_meses)
+    return [particion for mes, particion in sorted(existentes().items()) if mes < limite]
+
+
+def desacoplar(particion, eliminar=False):
+    """DETACH de la partición (queda como tabla suelta) y, si `eliminar`, DROP."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLA} DETACH PARTITION {particion}")
+        if eliminar:
+            cursor.execute(f"DROP TABLE {particion}")
+
+
+# --- Conversión desde la tabla sin particionar (migración 0021) ---------------
+
+ESPEJO = f"""
+    CREATE OR REPLACE FUNCTION registro_espejo() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN
+            DELETE FROM {NUEVA} WHERE id = OLD.id AND fecha_hora = OLD.fecha_hora;
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            INSERT INTO {NUEVA} SELECT (NEW).* ON CONFLICT DO NOTHING;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Los triggers del dashboard (0018) van en la tabla que queda; las funciones ya existen
+TRIGGERS_DASHBOARD = (
+    f"CREATE TRIGGER dash_accesos_ins AFTER INSERT ON {TABLA} REFERENCING NEW TABLE AS nuevas "
+    f"FOR EACH STATEMENT EXECUTE FUNCTION dash_accesos_ins()",
+    f"CREATE TRIGGER dash_accesos_del AFTER DELETE ON {TABLA} REFERENCING OLD TABLE AS viejas "
+    f"FOR EACH STATEMENT EXECUTE FUNCTION dash_accesos_del()",
+)
+
+
+def _relkind(tabla):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [tabla])
+        fila = cursor.fetchone()
+        return fila[0] if fila else None
+
+
+def particionada():
+    """True si ``accesos_registroacceso`` ya es la tabla particionada."""
+    return _relkind(TABLA) == 'p'
+
+
+def pendiente():
+    """True si la tabla particionada existe pero todavía no reemplazó a la vieja."""
+    return _relkind(NUEVA) == 'p'
+
+
+def objetos(pk='id, fecha_hora'):
+    """(nombre, es_restricción, SQL con {nombre} y {tabla}) de la PK, la FK y los índices.
+
+    Los nombres van sin comillas (los mismos que genera Django); se citan al
+    armar el SQL con ``sql_objeto`` / ``_q``.
+    """
+    editor = connection.schema_editor()
+    return [
+        (f'{TABLA}_pkey', True, f"ALTER TABLE {{tabla}} ADD CONSTRAINT {{nombre}} PRIMARY KEY ({pk})"),
+        (
+            # Mismo nombre que _fk_constraint_name, sin citar
+            editor._create_index_name(TABLA, ['vehiculo_id'], suffix='_fk_accesos_vehiculo_id'), True,
+            "ALTER TABLE {tabla} ADD CONSTRAINT {nombre} FOREIGN KEY (vehiculo_id) "
+            "REFERENCES accesos_vehiculo (id) DEFERRABLE INITIALLY DEFERRED",
+        ),
+        (editor._create_index_name(TABLA, ['vehiculo_id']), False, "CREATE INDEX {nombre} ON {tabla} (vehiculo_id)"),
+        ('registro_fecha_hora_idx', False, "CREATE INDEX {nombre} ON {tabla} (fecha_hora)"),
+        ('registro_persona_idx', False,
+         "CREATE INDEX {nombre} ON {tabla} (tipo_persona, persona_id, fecha_hora DESC)"),
+    ]
+
+
+def _q(nombre):
+    return connection.ops.quote_name(nombre)
+
+
+def sql_objeto(sql, nombre, tabla):
+    """SQL de un elemento de ``objetos`` con el nombre citado una sola vez."""
+    return sql.format(nombre=_q(nombre), tabla=tabla)
+
+
+def _temporal(nombre):
+    # Los nombres finales siguen tomados por la tabla vieja hasta el reemplazo
+    return f'{nombre[:57]}_nueva'
+
+
+def preparar():
+    """Crea la tabla particionada vacía y el trigger que le replica las escrituras de la vieja.
+
+    Solo toma bloqueos breves (CREATE TRIGGER); la copia de las filas
+    existentes queda para ``copiar_lote``. No hace nada si la tabla ya está
+    particionada o la conversión ya está en curso.
+    """
+    if particionada() or pendiente():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(fecha_hora) FROM {TABLA}")
+        primero = cursor.fetchone()[0]
+    actual = mes_actual()
+    if primero is not None:
+        local = primero.astimezone(ZoneInfo(settings.TIME_ZONE))
+        mes = (local.year, local.month)
+    else:
+        mes = actual
+    ultimo = sumar_meses(actual, getattr(settings, 'ACCESOS_PARTICIONES_ADELANTE', 3))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {NUEVA} (LIKE {TABLA} INCLUDING DEFAULTS) PARTITION BY RANGE (fecha_hora)")
+        # Si `id` era serial, LIKE copia el nextval de la secuencia vieja
+        cursor.execute(f"ALTER TABLE {NUEVA} ALTER COLUMN id DROP DEFAULT")
+        while mes <= ultimo:
+            cursor.execute(sql_crear(mes, NUEVA))
+            mes = sumar_meses(mes, 1)
+        cursor.execute(f"CREATE TABLE {DEFAULT} PARTITION OF {NUEVA} DEFAULT")
+        for nombre_objeto, _, sql in objetos():
+            cursor.execute(sql_objeto(sql, _temporal(nombre_objeto), NUEVA))
+        cursor.execute(ESPEJO)
+        cursor.execute(
+            f"CREATE TRIGGER registro_espejo AFTER INSERT OR UPDATE OR DELETE ON {TABLA} "
+            f"FOR EACH ROW EXECUTE FUNCTION registro_espejo()"
+        )
+
+
+def copiar_lote(desde_id, tamano):
+    """Copia a la tabla particionada las siguientes `tamano` filas con id > `desde_id`.
+
+    Devuelve (último id leído, filas leídas); (None, 0) si no quedan. Cada lote
+    es una transacción corta: FOR SHARE solo demora las escrituras sobre esas
+    filas, y lo que el trigger ya replicó se saltea (ON CONFLICT DO NOTHING),
+    así que se puede repetir desde cualquier id.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH lote AS (SELECT * FROM {TABLA} WHERE id > %s ORDER BY id LIMIT %s FOR SHARE), "
+            f"copiadas AS (INSERT INTO {NUEVA} SELECT * FROM lote ON CONFLICT DO NOTHING) "
+            f"SELECT max(id), count(*) FROM lote",
+            [desde_id, tamano],
+        )
+        return cursor.fetchone()
+
+
+def conteos():
+    """(filas de la tabla vieja, filas de la particionada), leídas con la misma instantánea."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT (SELECT count(*) FROM {TABLA}), (SELECT count(*) FROM {NUEVA})")
+        return cursor.fetchone()
+
+
+def cambiar(lock_timeout='5s'):
+    """Reemplaza la tabla vieja por la particionada, ya completa (ver ``conteos``).
+
+    El ACCESS EXCLUSIVE dura lo que un DROP y unos RENAME. Con `lock_timeout`
+    no queda encolado detrás de una consulta larga frenando al resto: si vence
+    levanta OperationalError y se reintenta más tarde.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [lock_timeout])
+        cursor.execute(f"LOCK TABLE {TABLA} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLA])
+        secuencia = cursor.fetchone()[0]
+        cursor.execute(f"SELECT last_value, is_called FROM {secuencia}")
+        last_value, is_called = cursor.fetchone()
+
+        # Se lleva la secuencia vieja, el trigger espejo y los nombres de índices y restricciones
+        cursor.execute(f"DROP TABLE {TABLA}")
+        cursor.execute("DROP FUNCTION IF EXISTS registro_espejo()")
+        cursor.execute(f"ALTER TABLE {NUEVA} RENAME TO {TABLA}")
+        for nombre_objeto, restriccion, _ in objetos():
+            if restriccion:
+                cursor.execute(
+                    f"ALTER TABLE {TABLA} RENAME CONSTRAINT {_q(_temporal(nombre_objeto))} TO {_q(nombre_objeto)}"
+                )
+            else:
+                cursor.execute(f"ALTER INDEX {_q(_temporal(nombre_objeto))} RENAME TO {_q(nombre_objeto)}")
+
+        cursor.execute(f"CREATE SEQUENCE {SECUENCIA} OWNED BY {TABLA}.id")
+        cursor.execute("SELECT setval(%s, %s, %s)", [SECUENCIA, last_value, is_called])
+        cursor.execute(f"ALTER TABLE {TABLA} ALTER COLUMN id SET DEFAULT nextval('{SECUENCIA}')")
+        for sql in TRIGGERS_DASHBOARD:
+            cursor.execute(sql)
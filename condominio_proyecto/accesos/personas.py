@@ -0,0 +1,123 @@
+"""Resolución en lote de la persona polimórfica de RegistroAcceso (tipo_persona, persona_id).
+
+Agrupa los ids por tipo y carga cada tipo con una sola consulta (con su
+select_related), guardando el resultado en un mapa de identidad. Resolver una
+página de registros cuesta como máximo una consulta por tipo, sin importar su
+tamaño.
+"""
+from .models import Residente, Visitante, Delivery
+
+
+def _consulta(tipo):
+    if tipo == 'R':
+        return Residente.objects.select_related('user', 'familia')
+    if tipo == 'V':
+        return Visitante.objects.select_related('autorizado_por__user', 'autorizado_por__familia')
+    if tipo == 'D':
+        return Delivery.objects.select_related('autorizado_por__user')
+    return None
+
+
+class PersonaResolver:
+    ATRIBUTO_REQUEST = '_persona_resolver'
+
+    def __init__(self):
+        self._mapa = {}
+
+    @classmethod
+    def para_request(cls, request):
+        """Resolver compartido durante el ciclo de vida del request (mapa de identidad)."""
+        if request is None:
+            return cls()
+        resolver = getattr(request, cls.ATRIBUTO_REQUEST, None)
+        if resolver is None:
+            resolver = cls()
+            setattr(request, cls.ATRIBUTO_REQUEST, resolver)
+        return resolver
+
+    def cargar(self, registros):
+        """Precarga las personas de los registros: una consulta por tipo con ids pendientes."""
+        pendientes = {}
+        for r in registros:
+            clave = (r.tipo_persona, r.persona_id)
+            if clave not in self._mapa:
+                pendientes.setdefault(r.tipo_persona, set()).add(r.persona_id)
+        for tipo, ids in pendientes.items():
+            qs = _consulta(tipo)
+            if qs is None:
+                continue
+            encontrados = {obj.id: obj for obj in qs.filter(id__in=ids)}
+            for persona_id in ids:
+                # Guardar tambien los ausentes para no volver a consultarlos
+                self._mapa[(tipo, persona_id)] = encontrados.get(persona_id)
+        return self
+
+    def obtener(self, tipo, persona_id):
+        clave = (tipo, persona_id)
+        if clave not in self._mapa:
+            qs = _consulta(tipo)
+            self._mapa[clave] = qs.filter(id=persona_id).first() if qs is not None else None
+        return self._mapa[clave]
+
+    def nombre(self, tipo, persona_id):
+        p = self.obtener(tipo, persona_id)
+        if p is None:
+            return ''
+        if tipo == 'R':
+            u = p.user
+            return ((u.first_name or '') + ' ' + (u.last_name or '')).strip() or u.username
+        return p.nombre_completo
+
+    def documento(self, tipo, persona_id):
+        p = self.obtener(tipo, persona_id)
+        return (p.documento_identidad or '') if p is not None else ''
+
+    def describir(self, tipo, persona_id):
+        """Detalle enriquecido de la persona (formato del dashboard de admin)."""
+        p = self.obtener(tipo, persona_id)
+        if p is None:
+            return None
+        if tipo == 'R':
+            return {
+                'tipo': 'Residente',
+                'id': p.id,
+                'documento_identidad': p.documento_identidad,
+                'nombre': (p.user.get_full_name() or p.user.username),
+                'familia': _familia(p.familia),
+            }
+        ap = getattr(p, 'autorizado_por', None)
+        ap_user = getattr(ap, 'user', None)
+        autorizado_por = {
+            'id': ap.id if ap else None,
+            'documento_identidad': getattr(ap, 'documento_identidad', None),
+            'nombre': (getattr(ap_user, 'first_name', '') + ' ' + getattr(ap_user, 'last_name', '')).strip() if ap_user else None,
+            'username': getattr(ap_user, 'username', None) if ap_user else None,
+        }
+        if tipo == 'V':
+            autorizado_por['familia'] = _familia(ap.familia if ap else None)
+            return {
+                'tipo': 'Visitante',
+                'id': p.id,
+                'nombre_completo': p.nombre_completo,
+                'documento_identidad': p.documento_identidad,
+                'tipo_acceso': 'Vehicular' if p.tipo_acceso == 'V' else 'Peatonal',
+                'autorizado_por': autorizado_por,
+            }
+        return {
+            'tipo': 'Delivery',
+            'id': p.id,
+            'nombre_completo': p.nombre_completo,
+            'empresa': p.empresa,
+            'documento_identidad': p.documento_identidad,
+            'tipo_acceso': 'Vehicular' if p.tipo_acceso == 'V' else 'Peatonal',
+            'autorizado_por': autorizado_por,
+        }
+
+
+def _familia(familia):
+    return {
+        'id': familia.id if familia else None,
+        'nombre': familia.nombre if familia else None,
+        'departamento': familia.departamento if familia else None,
+        'torre': familia.torre if familia else None,
+    }
@@ -0,0 +1,86 @@
+"""Renderizado de imágenes QR bajo demanda (PNG/SVG) con caché LRU acotada.
+
+La imagen es función pura de (codigo_qr, formato, RENDER_VERSION), por lo que
+el ETag se calcula sin renderizar y las respuestas se pueden cachear como
+inmutables en el cliente.
+"""
+import hashlib
+from base64 import b64encode
+from functools import lru_cache
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.utils import timezone
+
+# Incrementar si cambian box_size/border/colores para invalidar ETags y cachés de clientes
+RENDER_VERSION = 1
+
+FORMATOS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def etag(codigo, formato):
+    digest = hashlib.sha1(f"{RENDER_VERSION}|{formato}|{codigo}".encode()).hexdigest()
+    return f'"{digest}"'
+
+
+@lru_cache(maxsize=getattr(settings, 'QR_IMAGEN_CACHE_SIZE', 512))
+def renderizar(codigo, formato='png'):
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato no soportado: {formato}')
+    fabrica = qrcode.image.svg.SvgPathImage if formato == 'svg' else None
+    qr = qrcode.QRCode(box_size=8, border=2, image_factory=fabrica)
+    qr.add_data(codigo)
+    qr.make(fit=True)
+    img = qr.make_image() if fabrica else qr.make_image(fill_color="black", back_color="white")
+    buf = BytesIO()
+    if fabrica:
+        img.save(buf)
+    else:
+        img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def data_url(codigo):
+    """PNG en data URL, para respuestas de creación que muestran el QR de inmediato."""
+    return f"data:image/png;base64,{b64encode(renderizar(codigo, 'png')).decode('utf-8')}"
+
+
+def hoja_pdf(autorizaciones, columnas=3, filas=4):
+    """Hoja imprimible (A4) con una grilla de QR vectoriales, uno por autorización."""
+    from reportlab.graphics import renderPDF
+    from reportlab.graphics.barcode.qr import QrCodeWidget
+    from reportlab.graphics.shapes import Drawing
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    ancho, alto = A4
+    margen = 36
+    celda_w = (ancho - 2 * margen) / columnas
+    celda_h = (alto - 2 * margen) / filas
+    lado = min(celda_w, celda_h) - 48
+    por_pagina = columnas * filas
+    for i, auth in enumerate(autorizaciones):
+        if i and i % por_pagina == 0:
+            c.showPage()
+        pos = i % por_pagina
+        x = margen + (pos % columnas) * celda_w
+        y = alto - margen - (pos // columnas + 1) * celda_h
+        widget = QrCodeWidget(auth.codigo_qr, barLevel='L')
+        x0, y0, x1, y1 = widget.getBounds()
+        dibujo = Drawing(lado, lado, transform=[lado / (x1 - x0), 0, 0, lado / (y1 - y0), 0, 0])
+        dibujo.add(widget)
+        renderPDF.draw(dibujo, c, x + (celda_w - lado) / 2, y + 30)
+        c.setFont('Helvetica-Bold', 9)
+        c.drawCentredString(x + celda_w / 2, y + 18, (auth.visitante.nombre_completo or '')[:40])
+        c.setFont('Helvetica', 7)
+        vigencia = f"{timezone.localtime(auth.fecha_inicio):%d/%m %H:%M} - {timezone.localtime(auth.fecha_fin):%d/%m %H:%M}"
+        c.drawCentredString(x + celda_w / 2, y + 8, vigencia)
+    c.save()
+    return buf.getvalue()
@@ -0,0 +1,143 @@
+"""Tokens QR firmados y verificables sin base de datos.
+
+Formato: ``AV2-<cuerpo base32><checksum>``
+
+El cuerpo son 21 bytes codificados en base32 (RFC 4648, sin padding):
+
+    id (uint32) | inicio (uint32, minutos epoch) | fin (uint32, minutos epoch)
+    | entradas (uint8) | HMAC-SHA256 truncado (8 bytes)
+
+El último carácter es un checksum Luhn mod 32 sobre el cuerpo, que permite
+descartar códigos mal leídos antes de calcular el HMAC. Todo el código usa
+solo caracteres del modo alfanumérico de QR, por lo que entra en un QR
+versión 2 (nivel L), rápido de decodificar para las cámaras.
+
+Los dispositivos de portería que conozcan ``QR_SIGNING_KEY`` pueden validar
+firma y vigencia localmente; la base solo se consulta para el contador de usos.
+
+El código se firma una vez, al crear la autorización, y no cambia si después
+se edita la vigencia o las entradas (el QR ya enviado sigue sirviendo). En el
+servidor la firma solo identifica la autorización (``autorizacion_id``): la
+vigencia y los usos se comprueban contra la fila, que manda sobre lo firmado.
+"""
+import base64
+import hashlib
+import hmac
+import struct
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+PREFIJO = 'AV2-'
+_ALFABETO = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567'
+_FORMATO = '>IIIB'
+_LARGO_DATOS = struct.calcsize(_FORMATO)
+_LARGO_MAC = 8
+_LARGO_CUERPO = 34  # ceil((13 + 8) * 8 / 5)
+
+TokenQR = namedtuple('TokenQR', ['autorizacion_id', 'fecha_inicio', 'fecha_fin', 'entradas'])
+
+
+class TokenQRInvalido(Exception):
+    """El código no es un token válido (mal formado, checksum o firma incorrecta)."""
+
+
+def normalizar(codigo):
+    """Forma canónica de un código escaneado o tipeado: sin espacios y, si es un
+    token, en mayúsculas (base32). Los puntos de entrada la aplican una sola vez y
+    usan el resultado para verificar, comparar y buscar en la base."""
+    codigo = str(codigo or '').strip()
+    if codigo[:len(PREFIJO)].upper() == PREFIJO:
+        return codigo.upper()
+    return codigo
+
+
+def es_token(codigo):
+    return bool(codigo) and codigo.startswith(PREFIJO)
+
+
+def _clave():
+    secreto = getattr(settings, 'QR_SIGNING_KEY', None) or settings.SECRET_KEY
+    return hashlib.sha256(b'accesos.qr|' + secreto.encode()).digest()
+
+
+def _mac(datos):
+    return hmac.new(_clave(), datos, hashlib.sha256).digest()[:_LARGO_MAC]
+
+
+def _checksum(cuerpo):
+    # Luhn mod N: detecta cualquier error de un carácter y transposiciones adyacentes
+    n = len(_ALFABETO)
+    total = 0
+    factor = 2
+    for ch in reversed(cuerpo):
+        sumando = factor * _ALFABETO.index(ch)
+        total += sumando // n + sumando % n
+        factor = 1 if factor == 2 else 2
+    return _ALFABETO[(n - total % n) % n]
+
+
+def _a_minutos(dt, redondear_arriba=False):
+    segundos = dt.timestamp()
+    minutos = int(segundos // 60)
+    if redondear_arriba and segundos % 60:
+        minutos += 1
+    return minutos
+
+
+def _desde_minutos(minutos):
+    return datetime.fromtimestamp(minutos * 60, tz=dt_timezone.utc)
+
+
+def emitir(autorizacion_id, fecha_inicio, fecha_fin, entradas):
+    """Genera el código firmado para los datos de una autorización."""
+    datos = struct.pack(
+        _FORMATO,
+        autorizacion_id,
+        _a_minutos(fecha_inicio),
+        _a_minutos(fecha_fin, redondear_arriba=True),
+        max(0, min(int(entradas), 255)),
+    )
+    cuerpo = base64.b32encode(datos + _mac(datos)).decode('ascii').rstrip('=')
+    return f"{PREFIJO}{cuerpo}{_checksum(cuerpo)}"
+
+
+def emitir_para(autorizacion):
+    return emitir(autorizacion.pk, autorizacion.fecha_inicio, autorizacion.fecha_fin, autorizacion.entradas_permitidas)
+
+
+def decodificar(codigo):
+    """Verifica formato, checksum y firma. No comprueba vigencia.
+
+    Espera el código ya normalizado (``normalizar``).
+    """
+    if not es_token(codigo):
+        raise TokenQRInvalido('Formato desconocido')
+    resto = codigo[len(PREFIJO):]
+    if len(resto) != _LARGO_CUERPO + 1 or any(ch not in _ALFABETO for ch in resto):
+        raise TokenQRInvalido('Formato inválido')
+    cuerpo, control = resto[:-1], resto[-1]
+    if _checksum(cuerpo) != control:
+        raise TokenQRInvalido('Checksum inválido')
+    crudo = base64.b32decode(cuerpo + '=' * (-len(cuerpo) % 8))
+    datos, mac = crudo[:_LARGO_DATOS], crudo[_LARGO_DATOS:]
+    if not hmac.compare_digest(mac, _mac(datos)):
+        raise TokenQRInvalido('Firma inválida')
+    autorizacion_id, inicio, fin, entradas = struct.unpack(_FORMATO, datos)
+    return TokenQR(autorizacion_id, _desde_minutos(inicio), _desde_minutos(fin), entradas)
+
+
+def verificar(codigo, ahora=None):
+    """Devuelve (token, motivo). motivo es None si el token es válido y vigente."""
+    try:
+        token = decodificar(codigo)
+    except TokenQRInvalido:
+        return None, 'QR inválido'
+    ahora = ahora or timezone.now()
+    if ahora > token.fecha_fin:
+        return token, 'Vencida'
+    if ahora < token.fecha_inicio:
+        return token, 'Aún no vigente'
+    return token, None
@@ -1,10 +1,12 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.urls import reverse
 from .models import (
     Residente, Vehiculo, Visitante, Delivery, RegistroAcceso,
     Familia, AutorizacionVisita
 )
 from notificaciones.models import Notificacion
+from .services import AutorizacionService
 
 class UserSerializer(serializers.ModelSerializer):
     # Permitir establecer la contrasena; requerida solo en creacion
@@ -61,7 +63,8 @@ class ResidenteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Residente
-        fields = '__all__'
+        # busqueda: columna interna del índice de texto (accesos.busqueda)
+        exclude = ('busqueda',)
 
     def create(self, validated_data):
     # Crear usuario anidado con contrasena correctamente hasheada
@@ -96,7 +99,8 @@ class VehiculoSerializer(serializers.ModelSerializer):
 class VisitanteSerializer(serializers.ModelSerializer):
     class Meta:
         model = Visitante
-        fields = '__all__'
+        # busqueda: columna interna del índice de texto (accesos.busqueda)
+        exclude = ('busqueda',)
 
 class DeliverySerializer(serializers.ModelSerializer):
     class Meta:
@@ -111,17 +115,33 @@ class RegistroAccesoSerializer(serializers.ModelSerializer):
 class FamiliaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Familia
-        fields = '__all__'
+        # busqueda: columna interna del índice de texto (accesos.busqueda)
+        exclude = ('busqueda',)
 
 class AutorizacionVisitaSerializer(serializers.ModelSerializer):
     autorizado_por_usuario = serializers.SerializerMethodField()
+    # La imagen se sirve aparte (accesos.views.qr_imagen); aqui solo va la URL
+    qr_url = serializers.SerializerMethodField()
 
     class Meta:
         model = AutorizacionVisita
-        fields = '__all__'
-        read_only_fields = ('codigo_qr', 'qr_image', 'status', 'fecha_creacion', 'entradas_consumidas', 'dentro')
+        exclude = ('qr_image',)
+        read_only_fields = ('codigo_qr', 'status', 'fecha_creacion', 'entradas_consumidas', 'dentro')
         depth = 1
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Reflejar vencimientos aun no persistidos por el barrido
+        data['status'] = AutorizacionService.status_efectivo(instance)
+        return data
+
+    def get_qr_url(self, obj):
+        if not obj.codigo_qr:
+            return None
+        url = reverse('qr_imagen', args=[obj.codigo_qr])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def get_autorizado_por_usuario(self, obj):
         try:
             u = obj.autorizado_por.user
@@ -137,6 +157,13 @@ class AutorizacionVisitaSerializer(serializers.ModelSerializer):
             return None
 
 
+class GenerarQRSerializer(serializers.Serializer):
+    """Parámetros numéricos de generar-qr / generar-qr-lote."""
+    # El token QR guarda las entradas en un byte (qr_tokens)
+    entradas_permitidas = serializers.IntegerField(min_value=1, max_value=255, default=1)
+    duracion_min = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
     # Area-related serializers moved to 'areas' app
 
 class NotificacionSerializer(serializers.ModelSerializer):
@@ -1,48 +1,56 @@
+from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from .models import (
     AutorizacionVisita, RegistroAcceso, Visitante,
-    ConfiguracionAcceso
+    ConfiguracionAcceso, Familia
 )
 from .notification_service import NotificacionService
-from django.db.models import Q
+from . import qr_render, qr_tokens, tiempo_real
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q, Case, When, Value, F, CharField
+from rest_framework import status
 from rest_framework.exceptions import ValidationError
-import qrcode
 import base64
-from io import BytesIO
+
+
+def rango_dia(fecha):
+    """Limites [inicio, fin) del dia local `fecha`, para filtrar fecha_hora con indice (sin __date)."""
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    fin = timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+    return inicio, fin
+
 
 class AutorizacionService:
     @staticmethod
     def generar_codigo_qr(autorizacion):
-        """Genera un código QR para una autorización"""
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        
-        # Datos para el QR
-        data = {
-            'id': str(autorizacion.id),
-            'codigo': autorizacion.codigo_qr,
-            'visitante': f"{autorizacion.visitante.nombre} {autorizacion.visitante.apellidos}",
-            'tipo_acceso': autorizacion.tipo_acceso,
-            'validez': autorizacion.fecha_fin.isoformat()
-        }
-        
-        qr.add_data(str(data))
-        qr.make(fit=True)
+        """Devuelve el PNG del QR de una autorización en base64 (renderizado bajo demanda, no se persiste)"""
+        return base64.b64encode(qr_render.renderizar(autorizacion.codigo_qr, 'png')).decode()
 
-        # Crear imagen
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convertir a base64
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
-        return base64.b64encode(buffer.getvalue()).decode()
+    @staticmethod
+    def verificar_limite_familia(familia_id, nuevas=1, ahora=None):
+        """Verifica MAX_AUTORIZACIONES_POR_FAMILIA antes de crear `nuevas` autorizaciones.
+
+        Debe llamarse dentro de la transacción que las crea: bloquea la fila de la
+        familia (SELECT ... FOR UPDATE) hasta el commit, así dos altas simultáneas
+        de la misma familia cuentan una después de la otra y no superan el límite.
+        """
+        if not familia_id:
+            return
+        ahora = ahora or timezone.now()
+        Familia.objects.select_for_update().filter(pk=familia_id).exists()
+        limite = ConfiguracionAcceso.get_valor('MAX_AUTORIZACIONES_POR_FAMILIA', 10)
+        activas = AutorizacionVisita.objects.filter(
+            familia_id=familia_id, status='ACTIVA', fecha_fin__gte=ahora
+        ).count()
+        if activas + nuevas > limite:
+            raise ValidationError({
+                'error': f'Se excede el límite de {limite} autorizaciones activas por familia ({activas} activas)'
+            })
 
     @staticmethod
+    @transaction.atomic
     def crear_autorizacion(data, residente):
         """Crea una nueva autorización de visita"""
         # Validar fechas
@@ -56,16 +64,7 @@ class AutorizacionService:
             raise ValidationError("La fecha de inicio no puede ser en el pasado")
         
     # Verificar limite de autorizaciones activas por familia
-        autorizaciones_activas = AutorizacionVisita.objects.filter(
-            familia=residente.familia,
-            status='ACTIVA'
-        ).count()
-        
-        limite_autorizaciones = ConfiguracionAcceso.get_valor('MAX_AUTORIZACIONES_POR_FAMILIA', 10)
-        if autorizaciones_activas >= limite_autorizaciones:
-            raise ValidationError(
-                f"Se ha alcanzado el límite de {limite_autorizaciones} autorizaciones activas por familia"
-            )
+        AutorizacionService.verificar_limite_familia(residente.familia_id)
 
         # Crear o actualizar visitante
         visitante_data = data.pop('visitante')
@@ -87,10 +86,6 @@ class AutorizacionService:
             **data
         )
 
-    # Generar codigo QR
-        autorizacion.qr_image = AutorizacionService.generar_codigo_qr(autorizacion)
-        autorizacion.save()
-
     # Enviar notificacion
         NotificacionService.notificar_autorizacion_creada(autorizacion)
 
@@ -240,9 +235,324 @@ class AutorizacionService:
         return queryset.order_by('-fecha_creacion')
 
     @staticmethod
-    def cancelar_autorizaciones_vencidas():
-        """Cancela automáticamente las autorizaciones vencidas"""
-        return AutorizacionVisita.objects.filter(
-            status='ACTIVA',
-            fecha_fin__lt=timezone.now()
-        ).update(status='VENCIDA')
\ No newline at end of file
+    def anotar_status_efectivo(queryset, ahora=None):
+        """Anota 'status_efectivo': VENCIDA si sigue ACTIVA pero ya pasó fecha_fin.
+
+        Permite responder con el estado correcto entre pasadas del barrido
+        (cancelar_autorizaciones_vencidas) sin escribir en las lecturas.
+        """
+        ahora = ahora or timezone.now()
+        return queryset.annotate(status_efectivo=Case(
+            When(status='ACTIVA', fecha_fin__lt=ahora, then=Value('VENCIDA')),
+            default=F('status'),
+            output_field=CharField(),
+        ))
+
+    @staticmethod
+    def status_efectivo(autorizacion, ahora=None):
+        anotado = getattr(autorizacion, 'status_efectivo', None)
+        if anotado:
+            return anotado
+        if autorizacion.status == 'ACTIVA' and autorizacion.fecha_fin < (ahora or timezone.now()):
+            return 'VENCIDA'
+        return autorizacion.status
+
+    @staticmethod
+    def cancelar_autorizaciones_vencidas(lote=500, ahora=None, notificar=True):
+        """Marca como VENCIDA las autorizaciones activas cuya fecha_fin ya pasó.
+
+        Procesa en lotes acotados (cada lote en su propia transacción, con
+        SKIP LOCKED para no esperar filas tomadas por un escaneo en curso) y
+        emite las notificaciones AUTORIZACION_VENCIDA del lote con un único
+        bulk_create. Devuelve la cantidad total de autorizaciones vencidas.
+        """
+        ahora = ahora or timezone.now()
+        total = 0
+        while True:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(_SQL_VENCER_LOTE, {'ahora': ahora, 'lote': lote})
+                    filas = cursor.fetchall()
+                if filas and notificar:
+                    NotificacionService.notificar_autorizaciones_vencidas(filas)
+            total += len(filas)
+            if len(filas) < lote:
+                return total
+
+    @staticmethod
+    def filtro_qr(codigo_qr):
+        """Filtro de la autorización de un código ya normalizado, o None si el token no es válido.
+
+        Los tokens firmados se buscan por el id que llevan (la firma se verifica
+        sin tocar la base): siguen valiendo aunque después se edite la vigencia o
+        las entradas. Los códigos anteriores a los tokens, por ``codigo_qr``.
+        """
+        if not qr_tokens.es_token(codigo_qr):
+            return {'codigo_qr': codigo_qr}
+        try:
+            return {'id': qr_tokens.decodificar(codigo_qr).autorizacion_id}
+        except qr_tokens.TokenQRInvalido:
+            return None
+
+    @staticmethod
+    def consumir_qr(codigo_qr, evento='ENTRADA', ahora=None):
+        """Consume un QR (ENTRADA/SALIDA) en un único round trip a la base.
+
+        La transición de estado y el registro en RegistroAcceso se hacen en una
+        sola sentencia (UPDATE ... RETURNING + INSERT en CTE). El WHERE del UPDATE
+        contiene todas las precondiciones, por lo que dos escaneos simultáneos del
+        mismo código no pueden consumir la misma entrada: el segundo se re-evalúa
+        sobre la fila ya actualizada y no coincide.
+
+        Devuelve (payload, http_status) con el mismo formato que validar_qr.
+        """
+        if evento not in ('ENTRADA', 'SALIDA'):
+            return {'error': 'Evento inválido'}, status.HTTP_400_BAD_REQUEST
+        codigo_qr = qr_tokens.normalizar(codigo_qr)
+        payload, http_status, registros = AutorizacionService._consumir_qr(codigo_qr, evento, ahora or timezone.now())
+        # Resultado y registro de acceso en un solo aviso
+        tiempo_real.publicar_qr(codigo_qr, evento, payload, registros)
+        return payload, http_status
+
+    @staticmethod
+    def _consumir_qr(codigo_qr, evento, ahora):
+        """(payload, http_status, registros de acceso creados para publicar)."""
+        # La firma se valida sin tocar la base: los códigos falsos no llegan a Postgres.
+        # La vigencia y los usos son los de la fila (pueden haberse editado después de firmar).
+        filtro = AutorizacionService.filtro_qr(codigo_qr)
+        if filtro is None:
+            return {'match': False, 'reason': 'QR inválido'}, status.HTTP_400_BAD_REQUEST, []
+        (campo, valor), = filtro.items()
+        with connection.cursor() as cursor:
+            cursor.execute(_SQL_CONSUMIR_QR[evento, campo], {'valor': valor, 'ahora': ahora})
+            fila = cursor.fetchone()
+        if fila:
+            _, visitante_id, status_nuevo, permitidas, consumidas, registro_id = fila
+            # El registro se insertó en SQL (sin señal): se publica con lo que ya sabemos
+            detalles = {'codigo_qr': codigo_qr, **({'evento': 'SALIDA'} if evento == 'SALIDA' else {})}
+            registros = [RegistroAcceso(
+                id=registro_id, fecha_hora=ahora, tipo_persona='V', tipo_verificacion='C',
+                persona_id=visitante_id, exitoso=True, detalles=detalles,
+            )]
+            if evento == 'ENTRADA':
+                payload = {'match': True, 'accion': 'ENTRADA', 'restantes': permitidas - consumidas}
+            else:
+                payload = {'match': True, 'accion': 'SALIDA', 'status': status_nuevo}
+            return payload, status.HTTP_200_OK, registros
+        # Camino de rechazo: averiguar el motivo (no afecta al escaneo exitoso)
+        return (*AutorizacionService._motivo_rechazo_qr(filtro, evento, ahora), [])
+
+    @staticmethod
+    def _motivo_rechazo_qr(filtro, evento, ahora):
+        auth = AutorizacionVisita.objects.filter(**filtro).only(
+            'id', 'status', 'fecha_inicio', 'fecha_fin', 'dentro',
+            'entradas_permitidas', 'entradas_consumidas',
+        ).first()
+        if auth is None:
+            return {'match': False, 'reason': 'QR no encontrado'}, status.HTTP_404_NOT_FOUND
+        if auth.status != 'ACTIVA':
+            return {'match': False, 'reason': f'Estado {auth.status}'}, status.HTTP_400_BAD_REQUEST
+        if ahora < auth.fecha_inicio:
+            # Escaneo anticipado: la autorización sigue ACTIVA para cuando empiece
+            return {'match': False, 'reason': 'Aún no vigente'}, status.HTTP_400_BAD_REQUEST
+        if ahora > auth.fecha_fin:
+            AutorizacionVisita.objects.filter(pk=auth.pk, status='ACTIVA').update(status='VENCIDA')
+            return {'match': False, 'reason': 'Vencida'}, status.HTTP_400_BAD_REQUEST
+        if evento == 'ENTRADA':
+            if auth.dentro:
+                return {'match': False, 'reason': 'QR ya está dentro'}, status.HTTP_400_BAD_REQUEST
+            return {'match': False, 'reason': 'Usos agotados'}, status.HTTP_400_BAD_REQUEST
+        return {'match': False, 'reason': 'No está dentro'}, status.HTTP_400_BAD_REQUEST
+
+
+    @staticmethod
+    def _aplicar_evento(auth, evento, ahora):
+        """Misma máquina de estados que _SQL_CONSUMIR_QR, aplicada sobre una instancia en memoria."""
+        if auth.status != 'ACTIVA':
+            return {'match': False, 'reason': f'Estado {auth.status}'}
+        if ahora < auth.fecha_inicio:
+            return {'match': False, 'reason': 'Aún no vigente'}
+        if ahora > auth.fecha_fin:
+            auth.status = 'VENCIDA'
+            return {'match': False, 'reason': 'Vencida'}
+        if evento == 'ENTRADA':
+            if auth.dentro:
+                return {'match': False, 'reason': 'QR ya está dentro'}
+            if auth.entradas_consumidas >= auth.entradas_permitidas:
+                return {'match': False, 'reason': 'Usos agotados'}
+            auth.dentro = True
+            auth.entradas_consumidas += 1
+            return {'match': True, 'accion': 'ENTRADA', 'restantes': auth.entradas_permitidas - auth.entradas_consumidas}
+        if not auth.dentro:
+            return {'match': False, 'reason': 'No está dentro'}
+        auth.dentro = False
+        if auth.entradas_consumidas >= auth.entradas_permitidas:
+            auth.status = 'UTILIZADA'
+        return {'match': True, 'accion': 'SALIDA', 'status': auth.status}
+
+    @staticmethod
+    def procesar_lote(eventos, ahora=None):
+        """Aplica en orden una lista de escaneos enviada por un controlador de portería.
+
+        Cada evento: {codigo_qr, evento, modalidad?, timestamp?}. El timestamp del
+        dispositivo se usa para evaluar la vigencia, de modo que un controlador que
+        estuvo offline pueda ponerse al día, pero solo si cae dentro de la ventana
+        offline (``QR_LOTE_VENTANA_OFFLINE_MINUTOS`` hacia atrás desde 'ahora'); uno
+        más viejo o futuro se reemplaza por la hora del servidor, así no se puede
+        antedatar un escaneo para usar un QR ya vencido. Todo el lote se
+        procesa en una transacción: las autorizaciones involucradas se bloquean con
+        una sola consulta y los registros de acceso se insertan con un único bulk_create.
+
+        Devuelve una lista de resultados, uno por evento y en el mismo orden.
+        """
+        ahora = ahora or timezone.now()
+        limite = ahora - timedelta(minutes=getattr(settings, 'QR_LOTE_VENTANA_OFFLINE_MINUTOS', 1440))
+        resultados = [None] * len(eventos)
+        pendientes = []
+        fuera_de_ventana = set()
+        for i, ev in enumerate(eventos):
+            if not isinstance(ev, dict):
+                resultados[i] = {'indice': i, 'error': 'Evento inválido'}
+                continue
+            codigo = qr_tokens.normalizar(ev.get('codigo_qr'))
+            evento = ev.get('evento', 'ENTRADA')
+            if not codigo:
+                resultados[i] = {'indice': i, 'error': 'codigo_qr requerido'}
+                continue
+            if evento not in ('ENTRADA', 'SALIDA'):
+                resultados[i] = {'indice': i, 'codigo_qr': codigo, 'error': 'Evento inválido'}
+                continue
+            momento = ahora
+            ts = ev.get('timestamp')
+            if ts:
+                dt = parse_datetime(str(ts))
+                if dt is None:
+                    resultados[i] = {'indice': i, 'codigo_qr': codigo, 'error': 'timestamp inválido'}
+                    continue
+                if timezone.is_naive(dt):
+                    dt = timezone.make_aware(dt)
+                if limite <= dt <= ahora:
+                    momento = dt
+                else:
+                    fuera_de_ventana.add(i)
+            filtro = AutorizacionService.filtro_qr(codigo)
+            if filtro is None:
+                resultados[i] = {'indice': i, 'codigo_qr': codigo, 'match': False, 'reason': 'QR inválido'}
+                continue
+            (clave,) = filtro.items()
+            pendientes.append((i, codigo, clave, evento, momento, ev.get('modalidad')))
+
+        if not pendientes:
+            return resultados
+
+        with transaction.atomic():
+            ids = {valor for _, _, (campo, valor), _, _, _ in pendientes if campo == 'id'}
+            codigos = {valor for _, _, (campo, valor), _, _, _ in pendientes if campo == 'codigo_qr'}
+            autorizaciones = {}
+            for a in AutorizacionVisita.objects.select_for_update().filter(
+                Q(id__in=ids) | Q(codigo_qr__in=codigos)
+            ).order_by('id'):
+                autorizaciones['id', a.id] = autorizaciones['codigo_qr', a.codigo_qr] = a
+            modificadas = {}
+            registros = []
+            for i, codigo, clave, evento, momento, modalidad in pendientes:
+                auth = autorizaciones.get(clave)
+                if auth is None:
+                    resultados[i] = {'indice': i, 'codigo_qr': codigo, 'match': False, 'reason': 'QR no encontrado'}
+                    continue
+                antes = (auth.status, auth.dentro, auth.entradas_consumidas)
+                resultado = AutorizacionService._aplicar_evento(auth, evento, momento)
+                if (auth.status, auth.dentro, auth.entradas_consumidas) != antes:
+                    modificadas[auth.pk] = auth
+                if resultado['match']:
+                    detalles = {'codigo_qr': codigo, 'timestamp_dispositivo': momento.isoformat(), 'lote': True}
+                    if i in fuera_de_ventana:
+                        detalles['timestamp_descartado'] = str(eventos[i].get('timestamp'))
+                    if evento == 'SALIDA':
+                        detalles['evento'] = 'SALIDA'
+                    if modalidad:
+                        detalles['modalidad'] = modalidad
+                    registros.append(RegistroAcceso(
+                        tipo_persona='V', tipo_verificacion='C', persona_id=auth.visitante_id,
+                        exitoso=True, detalles=detalles, vehiculo=None,
+                    ))
+                resultados[i] = {'indice': i, 'codigo_qr': codigo, **resultado}
+            if modificadas:
+                AutorizacionVisita.objects.bulk_update(
+                    list(modificadas.values()), ['status', 'dentro', 'entradas_consumidas']
+                )
+            if registros:
+                # bulk_create no emite post_save: los registros se publican con el resumen del lote
+                registros = RegistroAcceso.objects.bulk_create(registros)
+            tiempo_real.publicar_lote(resultados, registros)
+        return resultados
+
+_TABLA_AUTORIZACION = AutorizacionVisita._meta.db_table
+_TABLA_REGISTRO = RegistroAcceso._meta.db_table
+
+# Máquina de estados ENTRADA/SALIDA como UPDATE condicional + INSERT del registro.
+# Columnas devueltas: id, visitante_id, status, entradas_permitidas, entradas_consumidas, registro_id
+# {campo}: `id` para los tokens firmados, `codigo_qr` para los códigos antiguos (ver filtro_qr).
+_SQL_CONSUMIR_QR_EVENTO = {
+    'ENTRADA': f"""
+        WITH upd AS (
+            UPDATE {_TABLA_AUTORIZACION}
+               SET dentro = TRUE, entradas_consumidas = entradas_consumidas + 1
+             WHERE {{campo}} = %(valor)s AND status = 'ACTIVA'
+               AND fecha_inicio <= %(ahora)s AND fecha_fin >= %(ahora)s
+               AND NOT dentro AND entradas_consumidas < entradas_permitidas
+         RETURNING id, visitante_id, codigo_qr, status, entradas_permitidas, entradas_consumidas
+        ), reg AS (
+            INSERT INTO {_TABLA_REGISTRO}
+                   (fecha_hora, tipo_persona, tipo_verificacion, persona_id, exitoso, detalles, vehiculo_id)
+            SELECT %(ahora)s, 'V', 'C', upd.visitante_id, TRUE,
+                   jsonb_build_object('codigo_qr', upd.codigo_qr), NULL
+              FROM upd
+         RETURNING id
+        )
+        SELECT upd.id, upd.visitante_id, upd.status, upd.entradas_permitidas,
+               upd.entradas_consumidas, (SELECT id FROM reg)
+          FROM upd
+    """,
+    'SALIDA': f"""
+        WITH upd AS (
+            UPDATE {_TABLA_AUTORIZACION}
+               SET dentro = FALSE,
+                   status = CASE WHEN entradas_consumidas >= entradas_permitidas
+                                 THEN 'UTILIZADA' ELSE status END
+             WHERE {{campo}} = %(valor)s AND status = 'ACTIVA'
+               AND fecha_inicio <= %(ahora)s AND fecha_fin >= %(ahora)s
+               AND dentro
+         RETURNING id, visitante_id, codigo_qr, status, entradas_permitidas, entradas_consumidas
+        ), reg AS (
+            INSERT INTO {_TABLA_REGISTRO}
+                   (fecha_hora, tipo_persona, tipo_verificacion, persona_id, exitoso, detalles, vehiculo_id)
+            SELECT %(ahora)s, 'V', 'C', upd.visitante_id, TRUE,
+                   jsonb_build_object('codigo_qr', upd.codigo_qr, 'evento', 'SALIDA'), NULL
+              FROM upd
+         RETURNING id
+        )
+        SELECT upd.id, upd.visitante_id, upd.status, upd.entradas_permitidas,
+               upd.entradas_consumidas, (SELECT id FROM reg)
+          FROM upd
+    """,
+}
+
+_SQL_CONSUMIR_QR = {
+    (evento, campo): sql.format(campo=campo)
+    for evento, sql in _SQL_CONSUMIR_QR_EVENTO.items() for campo in ('id', 'codigo_qr')
+}
+
+# Barrido de vencimientos por lotes. Columnas: id, autorizado_por_id, visitante_id, fecha_fin
+_SQL_VENCER_LOTE = f"""
+    UPDATE {_TABLA_AUTORIZACION}
+       SET status = 'VENCIDA'
+     WHERE id IN (
+            SELECT id FROM {_TABLA_AUTORIZACION}
+             WHERE status = 'ACTIVA' AND fecha_fin < %(ahora)s
+             ORDER BY id
+             LIMIT %(lote)s
+               FOR UPDATE SKIP LOCKED
+           )
+ RETURNING id, autorizado_por_id, visitante_id, fecha_fin
+"""
@@ -1,3 +1,589 @@
-from django.test import TestCase
+import importlib
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import storages
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+from django.utils import timezone
+
+from areas.models import AreaComun, UnidadArea, ReservaArea
+from notificaciones.models import Notificacion
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from condominio_BackendAPI import eventos
+from condominio_BackendAPI.pagination import responder
+from . import archivo, busqueda, dashboard, particiones, qr_tokens
+from .models import (
+    ArchivoAccesos, ConfiguracionAcceso, Familia, Residente, Visitante, AutorizacionVisita, RegistroAcceso,
+    Vehiculo, reservar_ids,
+)
+from .services import AutorizacionService, rango_dia
+
+
+class PlanesConsultaTests(TestCase):
+    """Las consultas calientes deben resolverse con índice, no con Seq Scan.
+
+    Se siembran datos, se corre ANALYZE y se pide el plan con enable_seqscan=off:
+    así el planner solo elige un Seq Scan si ningún índice sirve para el filtro,
+    que es justamente la regresión que interesa detectar (p. ej. volver a
+    ``fecha_hora__date=...`` o borrar un índice de la migración).
+    """
+    N_REGISTROS = 5000
+    N_AUTORIZACIONES = 1000
+    N_NOTIFICACIONES = 2000
+    N_RESERVAS = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        ahora = timezone.now()
+        familias = Familia.objects.bulk_create([
+            Familia(nombre=f'Familia {i}', departamento=str(100 + i), torre='A') for i in range(20)
+        ])
+        usuarios = User.objects.bulk_create([User(username=f'res{i}') for i in range(20)])
+        residentes = Residente.objects.bulk_create([
+            Residente(user=u, documento_identidad=f'DOC{i}', familia=familias[i], tipo='PRINCIPAL')
+            for i, u in enumerate(usuarios)
+        ])
+        visitantes = Visitante.objects.bulk_create([
+            Visitante(
+                nombre_completo=f'Visitante {i}', tipo_acceso='P', autorizado_por=residentes[i % 20],
+                fecha_inicio=ahora, fecha_fin=ahora + timedelta(hours=4),
+            )
+            for i in range(100)
+        ])
+        ids = reservar_ids(AutorizacionVisita, cls.N_AUTORIZACIONES)
+        AutorizacionVisita.objects.bulk_create([
+            AutorizacionVisita(
+                id=pk, visitante=visitantes[i % 100], autorizado_por=residentes[i % 20], familia=familias[i % 20],
+                fecha_inicio=ahora - timedelta(days=i % 60), fecha_fin=ahora - timedelta(days=i % 60) + timedelta(hours=6),
+                status=['ACTIVA', 'VENCIDA', 'UTILIZADA', 'CANCELADA'][i % 4], codigo_qr=f'TEST-{pk}',
+            )
+            for i, pk in enumerate(ids)
+        ])
+        RegistroAcceso.objects.bulk_create([
+            RegistroAcceso(
+                tipo_persona='RVD'[i % 3], tipo_verificacion='C', persona_id=i % 300, exitoso=True,
+            )
+            for i in range(cls.N_REGISTROS)
+        ])
+        # fecha_hora es auto_now_add: repartir los registros en ~200 días
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {RegistroAcceso._meta.db_table} SET fecha_hora = now() - (id % 200) * interval '1 day'"
+            )
+        Notificacion.objects.bulk_create([
+            Notificacion(residente=residentes[i % 20], tipo='AVISO', mensaje='m', leida=bool(i % 3))
+            for i in range(cls.N_NOTIFICACIONES)
+        ])
+        area = AreaComun.objects.create(nombre='Churrasquera', tipo='UNIDADES')
+        unidades = UnidadArea.objects.bulk_create([UnidadArea(area=area, nombre=f'U{i}') for i in range(10)])
+        ReservaArea.objects.bulk_create([
+            ReservaArea(
+                area=area, residente=residentes[i % 20], unidad=unidades[i % 10], estado='CONFIRMADA',
+                fecha_inicio=ahora + timedelta(hours=3 * i), fecha_fin=ahora + timedelta(hours=3 * i + 2),
+            )
+            for i in range(cls.N_RESERVAS)
+        ])
+        with connection.cursor() as cursor:
+            for model in (RegistroAcceso, AutorizacionVisita, Notificacion, ReservaArea):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertSinSeqScan(self, queryset):
+        plan = queryset.explain()
+        tabla = queryset.model._meta.db_table
+        self.assertNotIn(f'Seq Scan on {tabla}', plan, msg=f'\n{queryset.query}\n{plan}')
+
+    def test_accesos_del_dia(self):
+        inicio, fin = rango_dia(timezone.localdate())
+        self.assertSinSeqScan(
+            RegistroAcceso.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin).order_by('-fecha_hora')[:50]
+        )
+
+    def test_accesos_por_rango_de_reporte(self):
+        ahora = timezone.now()
+        self.assertSinSeqScan(
+            RegistroAcceso.objects.filter(fecha_hora__gte=ahora - timedelta(days=7), fecha_hora__lte=ahora)
+        )
+
+    def test_fecha_hora_date_no_usa_indice(self):
+        # Control: el filtro __date envuelve la columna en una función y no es sargable
+        plan = RegistroAcceso.objects.filter(fecha_hora__date=timezone.localdate()).explain()
+        self.assertIn(f'Seq Scan on {RegistroAcceso._meta.db_table}', plan)
+
+    def test_accesos_por_persona(self):
+        self.assertSinSeqScan(
+            RegistroAcceso.objects.filter(tipo_persona='V', persona_id=7).order_by('-fecha_hora')
+        )
+
+    def test_barrido_de_vencidas(self):
+        self.assertSinSeqScan(
+            AutorizacionVisita.objects.filter(status='ACTIVA', fecha_fin__lt=timezone.now())
+        )
+
+    def test_autorizaciones_de_familia(self):
+        familia = Familia.objects.first()
+        self.assertSinSeqScan(AutorizacionVisita.objects.filter(familia=familia, status='ACTIVA'))
+
+    def test_notificaciones_no_leidas(self):
+        residente = Residente.objects.first()
+        self.assertSinSeqScan(
+            Notificacion.objects.filter(residente=residente, leida=False).order_by('-fecha_creacion')[:50]
+        )
+
+    def test_no_leidas_posteriores_a_la_marca(self):
+        residente = Residente.objects.first()
+        self.assertSinSeqScan(
+            Notificacion.objects.filter(residente=residente, leida=False, fecha_creacion__gt=timezone.now() - timedelta(days=1))
+        )
+
+    def test_solape_de_reservas(self):
+        reserva = ReservaArea.objects.first()
+        self.assertSinSeqScan(
+            ReservaArea.objects.filter(
+                area=reserva.area, unidad=reserva.unidad, estado__in=['PENDIENTE', 'CONFIRMADA'],
+                fecha_inicio__lt=reserva.fecha_fin, fecha_fin__gt=reserva.fecha_inicio,
+            )
+        )
+
+    def test_poda_de_particiones(self):
+        # Un rango de un día solo debe tocar la partición de su mes
+        inicio, fin = rango_dia(timezone.localdate())
+        plan = RegistroAcceso.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin).explain()
+        self.assertIn(particiones.nombre(particiones.mes_actual()), plan)
+        self.assertNotIn(particiones.DEFAULT, plan)
+
+    def test_crear_particion_mueve_filas_del_default(self):
+        # Los registros sembrados cubren ~200 días: los meses sin partición quedan en el default
+        mes = particiones.sumar_meses(particiones.mes_actual(), -2)
+        desde, hasta = particiones.limites(mes)
+        del_mes = RegistroAcceso.objects.filter(fecha_hora__gte=desde, fecha_hora__lt=hasta)
+        total = del_mes.count()
+        contadores = dashboard.valores()
+
+        self.assertEqual(particiones.crear(mes), total)
+        self.assertIn(mes, particiones.existentes())
+        self.assertEqual(del_mes.count(), total)
+        self.assertEqual(dashboard.valores(), contadores)
+
+
+class TokensQRTests(SimpleTestCase):
+    def test_normalizar_acepta_minusculas_y_espacios(self):
+        ahora = timezone.now()
+        codigo = qr_tokens.emitir(7, ahora, ahora + timedelta(hours=2), 1)
+        leido = qr_tokens.normalizar(f'  {codigo.lower()}\n')
+        self.assertEqual(leido, codigo)
+        self.assertEqual(qr_tokens.decodificar(leido).autorizacion_id, 7)
+
+    def test_decodificar_exige_codigo_normalizado(self):
+        ahora = timezone.now()
+        codigo = qr_tokens.emitir(7, ahora, ahora + timedelta(hours=2), 1)
+        with self.assertRaises(qr_tokens.TokenQRInvalido):
+            qr_tokens.decodificar(codigo.lower())
+
+    def test_normalizar_no_toca_codigos_antiguos(self):
+        self.assertEqual(qr_tokens.normalizar(' abc-123 '), 'abc-123')
+        self.assertEqual(qr_tokens.normalizar(None), '')
+
+
+class LoteQRTests(TestCase):
+    def setUp(self):
+        familia = Familia.objects.create(nombre='Lote', departamento='1', torre='A')
+        residente = Residente.objects.create(
+            user=User.objects.create(username='lote'), documento_identidad='L1', familia=familia, tipo='PRINCIPAL',
+        )
+        visitante = Visitante.objects.create(
+            nombre_completo='Visita', tipo_acceso='P', autorizado_por=residente,
+            fecha_inicio=timezone.now(), fecha_fin=timezone.now(),
+        )
+        # Vencida hace dos días, todavía sin barrer
+        inicio = timezone.now() - timedelta(days=3)
+        self.auth = AutorizacionVisita.objects.create(
+            visitante=visitante, autorizado_por=residente, familia=familia,
+            fecha_inicio=inicio, fecha_fin=inicio + timedelta(days=1),
+        )
+
+    def test_timestamp_fuera_de_ventana_usa_hora_del_servidor(self):
+        antedatado = (timezone.now() - timedelta(days=2, hours=12)).isoformat()
+        with self.settings(QR_LOTE_VENTANA_OFFLINE_MINUTOS=60):
+            [resultado] = AutorizacionService.procesar_lote([
+                {'codigo_qr': self.auth.codigo_qr, 'evento': 'ENTRADA', 'timestamp': antedatado},
+            ])
+        self.assertFalse(resultado['match'])
+        self.assertEqual(resultado['reason'], 'Vencida')
+
+    def test_timestamp_dentro_de_ventana(self):
+        antedatado = (timezone.now() - timedelta(days=2, hours=12)).isoformat()
+        with self.settings(QR_LOTE_VENTANA_OFFLINE_MINUTOS=4 * 1440):
+            [resultado] = AutorizacionService.procesar_lote([
+                {'codigo_qr': self.auth.codigo_qr, 'evento': 'ENTRADA', 'timestamp': antedatado},
+            ])
+        self.assertTrue(resultado['match'])
+
+
+class EdicionQRTests(TestCase):
+    def setUp(self):
+        familia = Familia.objects.create(nombre='Edicion', departamento='6', torre='A')
+        residente = Residente.objects.create(
+            user=User.objects.create(username='edicion'), documento_identidad='E1', familia=familia, tipo='PRINCIPAL',
+        )
+        visitante = Visitante.objects.create(
+            nombre_completo='Visita', tipo_acceso='P', autorizado_por=residente,
+            fecha_inicio=timezone.now(), fecha_fin=timezone.now(),
+        )
+        self.inicio = timezone.now() - timedelta(hours=1)
+        self.auth = AutorizacionVisita.objects.create(
+            visitante=visitante, autorizado_por=residente, familia=familia,
+            fecha_inicio=self.inicio, fecha_fin=self.inicio + timedelta(hours=2),
+        )
+        self.enviado = self.auth.codigo_qr
+
+    def test_editar_no_invalida_el_qr_enviado(self):
+        self.auth.fecha_fin += timedelta(days=1)
+        self.auth.entradas_permitidas = 2
+        self.auth.save()
+        self.assertEqual(self.auth.codigo_qr, self.enviado)
+
+        # Después del fin firmado pero dentro del nuevo: manda la fila
+        despues = self.inicio + timedelta(hours=5)
+        payload, http_status = AutorizacionService.consumir_qr(self.enviado, ahora=despues)
+        self.assertEqual((payload, http_status), ({'match': True, 'accion': 'ENTRADA', 'restantes': 1}, 200))
+        [resultado] = AutorizacionService.procesar_lote([{'codigo_qr': self.enviado.lower(), 'evento': 'SALIDA'}])
+        self.assertTrue(resultado['match'])
+
+    def test_token_firmado_con_otros_datos_resuelve_por_id(self):
+        # Un QR re-firmado por una edición anterior sigue identificando a la autorización
+        viejo = qr_tokens.emitir(self.auth.pk, self.inicio, self.inicio + timedelta(minutes=30), 1)
+        payload, _ = AutorizacionService.consumir_qr(viejo)
+        self.assertTrue(payload['match'])
+        payload, http_status = AutorizacionService.consumir_qr(viejo)
+        self.assertEqual((payload['reason'], http_status), ('QR ya está dentro', 400))
+
+        falso = viejo[:-2] + ('A' if viejo[-2] != 'A' else 'B') + viejo[-1]
+        self.assertEqual(AutorizacionService.consumir_qr(falso)[0]['reason'], 'QR inválido')
+
+
+class VigenciaQRTests(TestCase):
+    def setUp(self):
+        familia = Familia.objects.create(nombre='Vigencia', departamento='5', torre='A')
+        residente = Residente.objects.create(
+            user=User.objects.create(username='vigencia'), documento_identidad='V1', familia=familia, tipo='PRINCIPAL',
+        )
+        visitante = Visitante.objects.create(
+            nombre_completo='Visita', tipo_acceso='P', autorizado_por=residente,
+            fecha_inicio=timezone.now(), fecha_fin=timezone.now(),
+        )
+        # Código anterior a los tokens: la vigencia se evalúa contra la fila
+        inicio = timezone.now() + timedelta(hours=2)
+        self.auth = AutorizacionVisita.objects.create(
+            visitante=visitante, autorizado_por=residente, familia=familia, codigo_qr='ANTIGUO-1',
+            fecha_inicio=inicio, fecha_fin=inicio + timedelta(hours=4),
+        )
+
+    def test_escaneo_anticipado_no_vence(self):
+        payload, http_status = AutorizacionService.consumir_qr('ANTIGUO-1')
+        self.assertEqual((payload['reason'], http_status), ('Aún no vigente', 400))
+        self.auth.refresh_from_db()
+        self.assertEqual(self.auth.status, 'ACTIVA')
+
+        payload, _ = AutorizacionService.consumir_qr('ANTIGUO-1', ahora=self.auth.fecha_inicio + timedelta(hours=1))
+        self.assertTrue(payload['match'])
+        payload, _ = AutorizacionService.consumir_qr('ANTIGUO-1', ahora=self.auth.fecha_fin + timedelta(minutes=1))
+        self.assertEqual(payload['reason'], 'Vencida')
+        self.auth.refresh_from_db()
+        self.assertEqual(self.auth.status, 'VENCIDA')
+
+    def test_escaneo_publica_un_solo_aviso(self):
+        ahora = self.auth.fecha_inicio + timedelta(minutes=1)
+        with self.settings(EVENTOS_BROKER='postgres'), \
+                mock.patch.object(eventos.BrokerPostgres, '_notificar') as notificar, \
+                self.captureOnCommitCallbacks(execute=True):
+            payload, _ = AutorizacionService.consumir_qr('ANTIGUO-1', ahora=ahora)
+        self.assertTrue(payload['match'])
+        (textos,) = notificar.call_args.args
+        notificar.assert_called_once()
+        self.assertEqual([json.loads(t)['tipo'] for t in textos], ['acceso', 'qr'])
+
+    def test_lote_anticipado_no_cambia_el_estado(self):
+        [resultado] = AutorizacionService.procesar_lote([{'codigo_qr': 'ANTIGUO-1', 'evento': 'ENTRADA'}])
+        self.assertEqual(resultado['reason'], 'Aún no vigente')
+        self.auth.refresh_from_db()
+        self.assertEqual((self.auth.status, self.auth.entradas_consumidas), ('ACTIVA', 0))
+
+
+class LimiteFamiliaTests(TestCase):
+    def test_limite_de_autorizaciones_activas(self):
+        familia = Familia.objects.create(nombre='Limite', departamento='2', torre='A')
+        residente = Residente.objects.create(
+            user=User.objects.create(username='limite'), documento_identidad='L2', familia=familia, tipo='PRINCIPAL',
+        )
+        ConfiguracionAcceso.objects.update_or_create(clave='MAX_AUTORIZACIONES_POR_FAMILIA', defaults={'valor': 1})
+        ahora = timezone.now()
+        visitante = Visitante.objects.create(
+            nombre_completo='Visita', tipo_acceso='P', autorizado_por=residente, fecha_inicio=ahora, fecha_fin=ahora,
+        )
+        with transaction.atomic():
+            AutorizacionService.verificar_limite_familia(familia.id, 1, ahora)
+            AutorizacionVisita.objects.create(
+                visitante=visitante, autorizado_por=residente, familia=familia,
+                fecha_inicio=ahora, fecha_fin=ahora + timedelta(hours=1),
+            )
+        with self.assertRaises(ValidationError), transaction.atomic():
+            AutorizacionService.verificar_limite_familia(familia.id, 1, ahora)
+
+
+class DashboardTests(TestCase):
+    def test_pendientes_excluye_vencidas_sin_barrer(self):
+        familia = Familia.objects.create(nombre='Dash', departamento='3', torre='A')
+        residente = Residente.objects.create(
+            user=User.objects.create(username='dash'), documento_identidad='D1', familia=familia, tipo='PRINCIPAL',
+        )
+        ahora = timezone.now()
+        visitante = Visitante.objects.create(
+            nombre_completo='Visita', tipo_acceso='P', autorizado_por=residente, fecha_inicio=ahora, fecha_fin=ahora,
+        )
+        for fin in (ahora + timedelta(hours=1), ahora - timedelta(hours=1)):
+            AutorizacionVisita.objects.create(
+                visitante=visitante, autorizado_por=residente, familia=familia,
+                fecha_inicio=ahora - timedelta(hours=2), fecha_fin=fin,
+            )
+        self.assertEqual(dashboard.snapshot(refrescar=True)['visitantes_pendientes'], 1)
+
+    def test_contadores_suman_fragmentos(self):
+        antes = dashboard.valores(['usuarios']).get('usuarios', 0)
+        User.objects.bulk_create([User(username=f'frag{i}') for i in range(3)])
+        User.objects.create(username='frag3')
+        self.assertEqual(dashboard.valores(['usuarios'])['usuarios'], antes + 4)
+        self.assertEqual(dashboard.reconstruir()['usuarios'], antes + 4)
+        self.assertEqual(dashboard.valores(['usuarios'])['usuarios'], antes + 4)
+
+
+class BusquedaTests(TestCase):
+    def test_normalizar_sql_coincide_con_python(self):
+        with connection.cursor() as cursor:
+            for texto in ('  José  PÉREZ\tÑandú ', 'Ｔｏｒｒｅ Ａ', 'Ça va', ''):
+                cursor.execute('SELECT busqueda_normalizar(%s)', [texto])
+                self.assertEqual(cursor.fetchone()[0], busqueda.normalizar(texto))
+
+    def test_triggers_mantienen_y_propagan_el_texto(self):
+        familia = Familia.objects.create(nombre='Rojas', departamento='4', torre='B')
+        user = User.objects.create(username='busca', first_name='Ana')
+        residente = Residente.objects.create(user=user, documento_identidad='B1', familia=familia, tipo='PRINCIPAL')
+        [visitante] = Visitante.objects.bulk_create([Visitante(
+            nombre_completo='Núñez', tipo_acceso='P', autorizado_por=residente,
+            fecha_inicio=timezone.now(), fecha_fin=timezone.now(),
+        )])
+        area = AreaComun.objects.create(nombre='Quincho', tipo='UNIDADES')
+        reserva = ReservaArea.objects.create(
+            area=area, residente=residente, familia=familia, estado='CONFIRMADA',
+            fecha_inicio=timezone.now(), fecha_fin=timezone.now() + timedelta(hours=1),
+        )
+        texto = lambda modelo, pk: modelo.objects.values_list('busqueda', flat=True).get(pk=pk)
+        self.assertEqual(texto(Visitante, visitante.pk), 'nunez')
+        self.assertIn('ana', texto(Residente, residente.pk))
+
+        user.first_name = 'Beatriz'
+        user.save()
+        area.nombre = 'Salón'
+        area.save()
+        self.assertIn('beatriz', texto(Residente, residente.pk))
+        self.assertIn('beatriz', texto(ReservaArea, reserva.pk))
+        self.assertIn('salon', texto(ReservaArea, reserva.pk))
+        self.assertEqual(busqueda.actualizar(ReservaArea.objects.all()), 0)
+
+
+class RegistroParticionadoTests(TestCase):
+    """La PK de la base es (id, fecha_hora); para Django sigue siendo `id`."""
+
+    def _registro(self, **extra):
+        return RegistroAcceso.objects.create(
+            tipo_persona='R', tipo_verificacion='M', persona_id=1, exitoso=True, **extra,
+        )
+
+    def test_tabla_particionada_sin_conversion_pendiente(self):
+        self.assertTrue(particiones.particionada())
+        self.assertFalse(particiones.pendiente())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT array_agg(a.attname ORDER BY a.attnum) FROM pg_constraint c "
+                "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = ANY (c.conkey) "
+                "WHERE c.conrelid = %s::regclass AND c.contype = 'p'",
+                [particiones.TABLA],
+            )
+            self.assertEqual(cursor.fetchone()[0], ['id', 'fecha_hora'])
+
+    def test_get_save_y_delete_por_pk(self):
+        registro = self._registro()
+        otro = self._registro()
+        self.assertNotEqual(registro.pk, otro.pk)
+        self.assertEqual(RegistroAcceso.objects.get(pk=registro.pk).persona_id, 1)
+
+        registro.exitoso = False
+        registro.save()
+        registro.refresh_from_db()
+        self.assertFalse(registro.exitoso)
+        self.assertTrue(RegistroAcceso.objects.get(pk=otro.pk).exitoso)
+
+        registro.delete()
+        self.assertFalse(RegistroAcceso.objects.filter(pk=registro.pk).exists())
+        self.assertTrue(RegistroAcceso.objects.filter(pk=otro.pk).exists())
+
+    def test_fk_a_vehiculo(self):
+        familia = Familia.objects.create(nombre='Part', departamento='9', torre='A')
+        residente = Residente.objects.create(
+            user=User.objects.create(username='part'), documento_identidad='P1', familia=familia, tipo='PRINCIPAL',
+        )
+        vehiculo = Vehiculo.objects.create(residente=residente, matricula='ABC123', marca='M', modelo='X', tipo='R')
+        registro = self._registro(vehiculo=vehiculo)
+        self.assertEqual(list(vehiculo.registroacceso_set.values_list('pk', flat=True)), [registro.pk])
+
+        vehiculo.delete()
+        registro.refresh_from_db()
+        self.assertIsNone(registro.vehiculo_id)
+
+    def test_conversion_desde_tabla_sin_particionar(self):
+        migracion = importlib.import_module('accesos.migrations.0021_particionar_registroacceso')
+        hace_un_anio = timezone.now() - timedelta(days=365)
+        # Todo corre en la transacción del test: sin chequeos de FK diferidos pendientes se puede hacer DROP
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        self._registro()
+        with connection.schema_editor() as editor:
+            migracion.desparticionar(apps, editor)
+        self.assertFalse(particiones.particionada())
+        viejo = self._registro()
+        RegistroAcceso.objects.filter(pk=viejo.pk).update(fecha_hora=hace_un_anio)
+
+        particiones.preparar()
+        self.assertTrue(particiones.pendiente())
+        # Lo escrito durante la copia lo replica el trigger espejo
+        self._registro()
+        desde_id, filas = particiones.copiar_lote(0, 2)
+        self.assertEqual(filas, 2)
+        while filas:
+            desde_id, filas = particiones.copiar_lote(desde_id, 2)
+        self.assertEqual(particiones.conteos(), (3, 3))
+
+        particiones.cambiar()
+        self.assertTrue(particiones.particionada())
+        self.assertFalse(particiones.pendiente())
+        self.assertEqual(RegistroAcceso.objects.count(), 3)
+        self.assertEqual(RegistroAcceso.objects.get(pk=viejo.pk).fecha_hora, hace_un_anio)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass "
+                "UNION ALL SELECT indexname FROM pg_indexes WHERE tablename = %s",
+                [particiones.TABLA, particiones.TABLA],
+            )
+            nombres = {fila[0] for fila in cursor.fetchall()}
+        self.assertLessEqual({n for n, _, _ in particiones.objetos()}, nombres)
+        self.assertFalse([n for n in nombres if n.endswith('_nueva')])
+
+
+class ArchivoAccesosTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, True)
+        almacenes = {
+            **settings.STORAGES,
+            'archivo_accesos': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': directorio},
+            },
+        }
+        ajuste = override_settings(STORAGES=almacenes)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.fecha = timezone.localdate() - timedelta(days=10)
+        self.inicio, self.fin = rango_dia(self.fecha)
+        for i in range(5):
+            self._registro(i)
+
+    def _registro(self, hora):
+        registro = RegistroAcceso.objects.create(
+            tipo_persona='RVD'[hora % 3], tipo_verificacion='C', persona_id=hora,
+            exitoso=bool(hora % 2), detalles={'n': hora, 'texto': 'ñandú'},
+        )
+        # fecha_hora es auto_now_add: moverlo al día a archivar
+        RegistroAcceso.objects.filter(pk=registro.pk).update(fecha_hora=self.inicio + timedelta(hours=hora))
+        return registro
+
+    def _del_dia(self):
+        return RegistroAcceso.objects.filter(fecha_hora__gte=self.inicio, fecha_hora__lt=self.fin)
+
+    def _filas(self):
+        return list(self._del_dia().order_by('fecha_hora', 'id').values_list(
+            *[c if c != 'vehiculo_id' else 'vehiculo' for c in archivo.COLUMNAS]
+        ))
+
+    def _guardados(self):
+        return storages['archivo_accesos'].listdir(f'{self.fecha:%Y/%m}')[1]
+
+    def test_ida_y_vuelta(self):
+        originales = self._filas()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archivo.archivar_dia(self.fecha), 5)
+
+        self.assertFalse(self._del_dia().exists())
+        indice = ArchivoAccesos.objects.get(fecha=self.fecha)
+        self.assertEqual(indice.filas, 5)
+        self.assertEqual([indice.archivo.rsplit('/', 1)[1]], self._guardados())
+        self.assertEqual(list(archivo.leer(indice.archivo)), originales)
+
+    def test_no_borra_si_la_verificacion_falla(self):
+        with mock.patch.object(archivo, 'verificar', side_effect=ValueError('corrupto')):
+            with self.assertRaises(ValueError):
+                archivo.archivar_dia(self.fecha)
+
+        self.assertEqual(self._del_dia().count(), 5)
+        self.assertFalse(ArchivoAccesos.objects.exists())
+        self.assertEqual(self._guardados(), [])
+
+    def test_verificar_detecta_registros_faltantes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            archivo.archivar_dia(self.fecha)
+        indice = ArchivoAccesos.objects.get(fecha=self.fecha)
+        with self.assertRaises(ValueError):
+            archivo.verificar(indice.archivo, indice.filas, [indice.id_max + 1])
+
+    def test_dia_ya_archivado_se_reescribe_y_borra_el_anterior(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            archivo.archivar_dia(self.fecha)
+        anterior = ArchivoAccesos.objects.get(fecha=self.fecha).archivo
+        tardio = self._registro(20)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archivo.archivar_dia(self.fecha), 1)
+
+        indice = ArchivoAccesos.objects.get(fecha=self.fecha)
+        self.assertEqual(indice.filas, 6)
+        self.assertEqual(indice.id_max, tardio.pk)
+        self.assertFalse(storages['archivo_accesos'].exists(anterior))
+        self.assertEqual(len(self._guardados()), 1)
+
+    def test_desactivado_por_defecto(self):
+        with override_settings(ACCESOS_ARCHIVO_DIAS=0):
+            self.assertEqual(list(archivo.archivar()), [])
+        self.assertEqual(self._del_dia().count(), 5)
+
+    def test_fuente_con_archivo_siempre_se_pagina(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            archivo.archivar_dia(self.fecha)
+        fuente = archivo.AccesosConArchivo(RegistroAcceso.objects.all(), self.inicio, self.fin)
+        request = Request(APIRequestFactory().get('/', {'page_size': 2}))
+
+        respuesta = responder(request, fuente, lambda filas: [r.id for r in filas], ('-fecha_hora', '-id'))
+
+        self.assertEqual(len(respuesta.data['results']), 2)
+        self.assertIsNotNone(respuesta.data['next'])
@@ -0,0 +1,67 @@
+"""Feed en vivo de portería: eventos del canal ``staff`` (ver ``condominio_BackendAPI.eventos``).
+
+- ``acceso``: cada ``RegistroAcceso`` creado. Los ``create`` lo publican por
+  señal (``conectar_senales``); ``bulk_create`` y el INSERT en SQL de
+  ``consumir_qr`` no emiten señales y los publican junto con el evento
+  ``qr``/``qr_lote``.
+- ``qr``: resultado de cada validación de QR, aceptada o rechazada.
+- ``qr_lote``: resumen de un lote de escaneos de un controlador.
+
+Los eventos de un mismo escaneo o lote se publican juntos
+(``eventos.publicar_varios``): con broker, un solo ``pg_notify``.
+"""
+from django.db.models.signals import post_save
+
+from condominio_BackendAPI import eventos
+
+CANAL = 'staff'
+# Rechazos incluidos en el resumen de un lote
+MAX_RECHAZOS_LOTE = 20
+
+
+def datos_acceso(registro):
+    return {
+        'id': registro.id,
+        'fecha_hora': registro.fecha_hora,
+        'tipo_persona': registro.tipo_persona,
+        'persona_id': registro.persona_id,
+        'tipo_verificacion': registro.tipo_verificacion,
+        'exitoso': registro.exitoso,
+        'vehiculo_id': registro.vehiculo_id,
+        'detalles': registro.detalles,
+    }
+
+
+def _accesos(registros):
+    return [eventos.crear_evento(CANAL, 'acceso', datos_acceso(registro)) for registro in registros]
+
+
+def publicar_accesos(registros):
+    eventos.publicar_varios(_accesos(registros))
+
+
+def publicar_qr(codigo_qr, evento, resultado, registros=()):
+    """Resultado del escaneo y, si entró o salió, su registro de acceso."""
+    eventos.publicar_varios(_accesos(registros) + [
+        eventos.crear_evento(CANAL, 'qr', {'codigo_qr': codigo_qr, 'evento': evento, **resultado}),
+    ])
+
+
+def publicar_lote(resultados, registros=()):
+    aceptados = sum(1 for r in resultados if r and r.get('match'))
+    rechazos = [r for r in resultados if r and not r.get('match')]
+    eventos.publicar_varios(_accesos(registros) + [eventos.crear_evento(CANAL, 'qr_lote', {
+        'procesados': len(resultados), 'aceptados': aceptados, 'rechazados': len(rechazos),
+        'rechazos': rechazos[:MAX_RECHAZOS_LOTE],
+    })])
+
+
+def _registro_creado(sender, instance, created, **kwargs):
+    if created:
+        publicar_accesos([instance])
+
+
+def conectar_senales():
+    from .models import RegistroAcceso
+
+    post_save.connect(_registro_creado, sender=RegistroAcceso, dispatch_uid='tiempo_real_registro')
@@ -5,7 +5,7 @@ from .views import (
     VisitanteViewSet, DeliveryViewSet, RegistroAccesoViewSet,
     FamiliaViewSet, AutorizacionVisitaViewSet, me_view,
     abrir_porton, cerrar_porton, reconocimiento_facial, reconocimiento_placa,
-    abrir_puerta_peatonal, cerrar_puerta_peatonal, validar_qr, admin_metrics
+    abrir_puerta_peatonal, cerrar_puerta_peatonal, validar_qr, validar_qr_lote, qr_imagen, admin_metrics
 )
 
 router = DefaultRouter()
@@ -30,6 +30,9 @@ urlpatterns = [
     path('ia/peatonal/reconocer/', reconocimiento_facial, name='ia_reconocer_facial'),
     path('ia/vehicular/placa/', reconocimiento_placa, name='ia_reconocer_placa'),
     path('ia/qr/validar/', validar_qr, name='ia_validar_qr'),
+    path('ia/qr/validar-lote/', validar_qr_lote, name='ia_validar_qr_lote'),
+    # Imagen QR bajo demanda (PNG/SVG)
+    path('qr/<str:codigo>/', qr_imagen, name='qr_imagen'),
     # Metricas admin
     path('admin/metrics/', admin_metrics, name='admin_metrics'),
     path('auth/', include('accesos.authentication_urls')),
@@ -5,25 +5,32 @@ from django.contrib.auth import authenticate, login, logout
 from django.middleware.csrf import get_token
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
-from django.db import models
+from django.http import HttpResponse
+from django.db import models, transaction
+from django.db.models.functions import ExtractHour
+from django.urls import reverse
+from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 from .models import (
     Residente, Vehiculo, Visitante, Delivery, RegistroAcceso,
-    AutorizacionVisita, Familia
+    AutorizacionVisita, Familia, reservar_ids
 )
 from notificaciones.models import Notificacion
+from notificaciones.lecturas import sin_leer
 from notificaciones.serializers import NotificacionSerializer
 from .serializers import (
     ResidenteSerializer, VehiculoSerializer, VisitanteSerializer,
     DeliverySerializer, RegistroAccesoSerializer, UserSerializer,
-    FamiliaSerializer, AutorizacionVisitaSerializer
+    FamiliaSerializer, AutorizacionVisitaSerializer, GenerarQRSerializer
 )
 from .permissions import IsAdminUser, IsResidentePrincipal, IsFamilyMember, CanManageVisitors
+from .services import AutorizacionService, rango_dia
+from . import dashboard
+from .personas import PersonaResolver
+from . import busqueda
+from . import qr_render, qr_tokens
 from django.utils import timezone as djtz
-from base64 import b64encode
-from io import BytesIO
-import qrcode
 from rest_framework.exceptions import PermissionDenied, AuthenticationFailed
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -38,78 +45,25 @@ def admin_metrics(request):
     """Devuelve métricas agregadas y opcionalmente detalles para el dashboard de Admin.
 
     Si se pasa ?detail=accesos|visitantes|alertas|usuarios, devuelve lista detallada correspondiente.
+    Sin detail, devuelve el snapshot de contadores (ver accesos/dashboard.py); ?refrescar=true ignora la caché.
     """
-    today = djtz.now().date()
+    today = djtz.localdate()
     now = djtz.now()
     detail = request.query_params.get('detail')
 
     if detail == 'accesos':
     # Ultimos accesos de hoy (limit 50) con detalles enriquecidos
-        qs = RegistroAcceso.objects.select_related('vehiculo').filter(fecha_hora__date=today).order_by('-fecha_hora')[:50]
+        inicio, fin = rango_dia(today)
+        qs = list(RegistroAcceso.objects.select_related('vehiculo').filter(
+            fecha_hora__gte=inicio, fecha_hora__lt=fin
+        ).order_by('-fecha_hora')[:50])
+        # Personas resueltas en lote: una consulta por tipo (R/V/D) para toda la pagina
+        personas = PersonaResolver.para_request(request).cargar(qs)
         items = []
         MAP_TP = {'R': 'Residente', 'V': 'Visitante', 'D': 'Delivery'}
         MAP_TV = {'F': 'Facial', 'C': 'Credencial', 'M': 'Manual'}
         for r in qs:
-            persona = None
-            try:
-                if r.tipo_persona == 'R':
-                    res = Residente.objects.select_related('user', 'familia').get(pk=r.persona_id)
-                    persona = {
-                        'tipo': 'Residente',
-                        'id': res.id,
-                        'documento_identidad': res.documento_identidad,
-                        'nombre': (res.user.get_full_name() or res.user.username),
-                        'familia': {
-                            'id': res.familia.id if res.familia else None,
-                            'nombre': res.familia.nombre if res.familia else None,
-                            'departamento': res.familia.departamento if res.familia else None,
-                            'torre': res.familia.torre if res.familia else None,
-                        }
-                    }
-                elif r.tipo_persona == 'V':
-                    vis = Visitante.objects.select_related('autorizado_por__user').get(pk=r.persona_id)
-                    ap = getattr(vis, 'autorizado_por', None)
-                    ap_user = getattr(ap, 'user', None)
-                    persona = {
-                        'tipo': 'Visitante',
-                        'id': vis.id,
-                        'nombre_completo': vis.nombre_completo,
-                        'documento_identidad': vis.documento_identidad,
-                        'tipo_acceso': 'Vehicular' if vis.tipo_acceso == 'V' else 'Peatonal',
-                        'autorizado_por': {
-                            'id': ap.id if ap else None,
-                            'documento_identidad': getattr(ap, 'documento_identidad', None),
-                            'nombre': (getattr(ap_user, 'first_name', '') + ' ' + getattr(ap_user, 'last_name', '')).strip() if ap_user else None,
-                            'username': getattr(ap_user, 'username', None) if ap_user else None,
-                            'familia': {
-                                'id': ap.familia.id if ap and ap.familia else None,
-                                'nombre': ap.familia.nombre if ap and ap.familia else None,
-                                'departamento': ap.familia.departamento if ap and ap.familia else None,
-                                'torre': ap.familia.torre if ap and ap.familia else None,
-                            }
-                        }
-                    }
-                elif r.tipo_persona == 'D':
-                    from .models import Delivery
-                    de = Delivery.objects.select_related('autorizado_por__user').get(pk=r.persona_id)
-                    ap = getattr(de, 'autorizado_por', None)
-                    ap_user = getattr(ap, 'user', None)
-                    persona = {
-                        'tipo': 'Delivery',
-                        'id': de.id,
-                        'nombre_completo': de.nombre_completo,
-                        'empresa': de.empresa,
-                        'documento_identidad': de.documento_identidad,
-                        'tipo_acceso': 'Vehicular' if de.tipo_acceso == 'V' else 'Peatonal',
-                        'autorizado_por': {
-                            'id': ap.id if ap else None,
-                            'documento_identidad': getattr(ap, 'documento_identidad', None),
-                            'nombre': (getattr(ap_user, 'first_name', '') + ' ' + getattr(ap_user, 'last_name', '')).strip() if ap_user else None,
-                            'username': getattr(ap_user, 'username', None) if ap_user else None,
-                        }
-                    }
-            except Exception:
-                persona = None
+            persona = personas.describir(r.tipo_persona, r.persona_id)
 
             vehiculo = None
             if r.vehiculo_id:
@@ -138,11 +92,6 @@ def admin_metrics(request):
             })
         return Response({'items': items, 'fecha': str(today)})
     if detail == 'visitantes':
-        # Expirar autorizaciones vencidas antes de listar
-        try:
-            AutorizacionVisita.objects.filter(status='ACTIVA', fecha_fin__lt=now).update(status='VENCIDA')
-        except Exception:
-            pass
         # Autorizaciones activas y vigentes recientes (limit 50) con datos del creador
         qs = AutorizacionVisita.objects.select_related('visitante', 'autorizado_por__user').filter(
             status='ACTIVA', fecha_inicio__lte=now, fecha_fin__gte=now
@@ -170,8 +119,8 @@ def admin_metrics(request):
             })
         return Response({'items': items})
     if detail == 'alertas':
-    # Notificaciones no leidas (limit 50)
-        qs = Notificacion.objects.filter(leida=False).order_by('-fecha_creacion')[:50]
+    # Notificaciones no leidas (limit 50), sin las cubiertas por la marca de lectura de su destinatario
+        qs = sin_leer(Notificacion.objects.all()).order_by('-fecha_creacion')[:50]
         data = NotificacionSerializer(qs, many=True).data
         return Response({'items': data})
     if detail == 'usuarios':
@@ -192,26 +141,8 @@ def admin_metrics(request):
         ]
         return Response({'items': data})
 
-    # Expirar autorizaciones vencidas antes de contar
-    try:
-        AutorizacionVisita.objects.filter(status='ACTIVA', fecha_fin__lt=now).update(status='VENCIDA')
-    except Exception:
-        pass
-
-    total_usuarios = User.objects.count()
-    total_residentes = Residente.objects.count()
-    accesos_hoy = RegistroAcceso.objects.filter(fecha_hora__date=today).count()
-    visitantes_pendientes = AutorizacionVisita.objects.filter(status='ACTIVA').count()
-    alertas_no_leidas = Notificacion.objects.filter(leida=False).count()
-
-    return Response({
-        'total_usuarios': total_usuarios,
-        'total_residentes': total_residentes,
-        'accesos_hoy': accesos_hoy,
-        'visitantes_pendientes': visitantes_pendientes,
-        'alertas': alertas_no_leidas,
-        'fecha': str(today),
-    })
+    refrescar = str(request.query_params.get('refrescar', '')).lower() in ('1', 'true', 'yes')
+    return Response(dashboard.snapshot(refrescar=refrescar))
 
 ## Notificaciones ahora se gestionan en la app 'notificaciones'
 
@@ -413,6 +344,7 @@ class VisitanteViewSet(viewsets.ModelViewSet):
 class DeliveryViewSet(viewsets.ModelViewSet):
     queryset = Delivery.objects.all()
     serializer_class = DeliverySerializer
+    cursor_ordering = ('-fecha_hora', '-id')
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
@@ -428,6 +360,7 @@ class DeliveryViewSet(viewsets.ModelViewSet):
 class FamiliaViewSet(viewsets.ModelViewSet):
     queryset = Familia.objects.all()
     serializer_class = FamiliaSerializer
+    cursor_ordering = ('nombre', 'id')
 
     def get_permissions(self):
         if self.action in ['create']:
@@ -446,10 +379,7 @@ class FamiliaViewSet(viewsets.ModelViewSet):
             # Admin puede buscar por nombre/departamento/torre
             search = self.request.query_params.get('search')
             if search:
-                s = search.strip()
-                qs = qs.filter(
-                    models.Q(nombre__icontains=s) | models.Q(departamento__icontains=s) | models.Q(torre__icontains=s)
-                )
+                qs = busqueda.buscar(qs, search)
             return qs
         try:
             residente = user.residente
@@ -592,16 +522,7 @@ class VisitanteViewSet(viewsets.ModelViewSet):
             # Admin: filtros de busqueda y tipo
             search = self.request.query_params.get('search')
             if search:
-                s = search.strip()
-                qs = qs.filter(
-                    models.Q(user__first_name__icontains=s) |
-                    models.Q(user__last_name__icontains=s) |
-                    models.Q(user__username__icontains=s) |
-                    models.Q(documento_identidad__icontains=s) |
-                    models.Q(familia__nombre__icontains=s) |
-                    models.Q(familia__departamento__icontains=s) |
-                    models.Q(familia__torre__icontains=s)
-                )
+                qs = busqueda.buscar(qs, search)
             tipo = self.request.query_params.get('tipo')  # 'PRINCIPAL' o 'FAMILIAR'
             if tipo in ['PRINCIPAL', 'FAMILIAR']:
                 qs = qs.filter(tipo=tipo)
@@ -623,9 +544,10 @@ class VisitanteViewSet(viewsets.ModelViewSet):
 class AutorizacionVisitaViewSet(viewsets.ModelViewSet):
     queryset = AutorizacionVisita.objects.all()
     serializer_class = AutorizacionVisitaSerializer
+    cursor_ordering = ('-fecha_creacion', '-id')
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'cancelar', 'generar_qr']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'cancelar', 'generar_qr', 'generar_qr_lote']:
             permission_classes = [CanManageVisitors]
         else:
             permission_classes = [permissions.IsAuthenticated, IsFamilyMember]
@@ -642,14 +564,10 @@ class AutorizacionVisitaViewSet(viewsets.ModelViewSet):
             except:
                 qs = AutorizacionVisita.objects.none()
 
-        # Refrescar estados vencidos al consultar (si siguen marcadas ACTIVA pero ya pasaron)
+        # Estado efectivo calculado en la lectura; el barrido periodico
+        # (manage.py expirar_autorizaciones) persiste el VENCIDA
         now = djtz.now()
-        try:
-            AutorizacionVisita.objects.filter(
-                id__in=qs.values('id'), status='ACTIVA', fecha_fin__lt=now
-            ).update(status='VENCIDA')
-        except Exception:
-            pass
+        qs = AutorizacionService.anotar_status_efectivo(qs, now)
 
         # Filtros opcionales
         familia_id = self.request.query_params.get('familia_id')
@@ -662,7 +580,7 @@ class AutorizacionVisitaViewSet(viewsets.ModelViewSet):
         if familia_id:
             qs = qs.filter(familia_id=familia_id)
         if status_f:
-            qs = qs.filter(status=status_f)
+            qs = qs.filter(status_efectivo=status_f)
         if vigente is not None:
             # vigente=true => now between inicio and fin; vigente=false => fuera del rango
             if vigente.lower() == 'true':
@@ -670,14 +588,7 @@ class AutorizacionVisitaViewSet(viewsets.ModelViewSet):
             elif vigente.lower() == 'false':
                 qs = qs.exclude(fecha_inicio__lte=now, fecha_fin__gte=now)
         if search_q:
-            s = search_q.strip()
-            qs = qs.filter(
-                models.Q(visitante__nombre_completo__icontains=s) |
-                models.Q(visitante__documento_identidad__icontains=s) |
-                models.Q(autorizado_por__user__first_name__icontains=s) |
-                models.Q(autorizado_por__user__last_name__icontains=s) |
-                models.Q(autorizado_por__documento_identidad__icontains=s)
-            )
+            qs = busqueda.buscar_autorizaciones(qs, search_q)
         # Rango de fechas (por fecha_creacion o vigencia)
         from datetime import datetime as _dt
         def _parse_date(d):
@@ -697,12 +608,30 @@ class AutorizacionVisitaViewSet(viewsets.ModelViewSet):
         return qs
 
     def perform_create(self, serializer):
-        serializer.save(autorizado_por=self.request.user.residente)
+        residente = self.request.user.residente
+        with transaction.atomic():
+            AutorizacionService.verificar_limite_familia(residente.familia_id)
+            serializer.save(autorizado_por=residente)
+
+    @staticmethod
+    def _con_imagen(response):
+        # Detalle y creacion llevan la imagen inline (data URL) como antes; los
+        # listados solo la qr_url para no renderizar un PNG por fila
+        codigo = response.data.get('codigo_qr') if isinstance(response.data, dict) else None
+        if codigo:
+            response.data['qr_image'] = qr_render.data_url(codigo)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._con_imagen(super().retrieve(request, *args, **kwargs))
+
+    def create(self, request, *args, **kwargs):
+        return self._con_imagen(super().create(request, *args, **kwargs))
 
     @action(detail=True, methods=['post'])
     def cancelar(self, request, pk=None):
         autorizacion = self.get_object()
-        if autorizacion.status not in ['USADA', 'VENCIDA', 'CANCELADA']:
+        if AutorizacionService.status_efectivo(autorizacion) not in ['USADA', 'VENCIDA', 'CANCELADA']:
             autorizacion.status = 'CANCELADA'
             autorizacion.save()
             return Response({'status': 'Autorización cancelada'})
@@ -711,6 +640,40 @@ class AutorizacionVisitaViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    @staticmethod
+    def _validar_permiso_tipo(residente, tipo_acceso):
+        if residente.tipo != 'PRINCIPAL':
+            if tipo_acceso == 'P' and not getattr(residente, 'puede_generar_qr_peatonal', False):
+                return Response({'error': 'No autorizado a generar QR peatonal'}, status=status.HTTP_403_FORBIDDEN)
+            if tipo_acceso == 'V' and not getattr(residente, 'puede_generar_qr_vehicular', False):
+                return Response({'error': 'No autorizado a generar QR vehicular'}, status=status.HTTP_403_FORBIDDEN)
+        return None
+
+    @staticmethod
+    def _rango_validez(fecha_inicio, fecha_fin, duracion_min):
+        """Devuelve (inicio, fin, error_response)."""
+        def _parse_iso_local(s):
+            try:
+                dt = datetime.fromisoformat(s)
+                # Asumimos hora local; hacerla timezone-aware
+                return djtz.make_aware(dt) if djtz.is_naive(dt) else dt
+            except Exception:
+                return None
+
+        inicio = djtz.now() if not fecha_inicio else _parse_iso_local(fecha_inicio)
+        if inicio is None:
+            return None, None, Response({'error': 'fecha_inicio inválida'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if duracion_min and not fecha_fin:
+            fin = inicio + timedelta(minutes=int(duracion_min))
+        else:
+            fin = djtz.now() + timedelta(hours=4) if not fecha_fin else _parse_iso_local(fecha_fin)
+        if fin is None:
+            return None, None, Response({'error': 'fecha_fin inválida'}, status=status.HTTP_400_BAD_REQUEST)
+        if fin <= inicio:
+            return None, None, Response({'error': 'fecha_fin debe ser mayor a fecha_inicio'}, status=status.HTTP_400_BAD_REQUEST)
+        return inicio, fin, None
+
     @action(detail=False, methods=['post'], url_path='generar-qr')
     def generar_qr(self, request):
         """Crear visitante + autorización con QR y límites de uso/tiempo."""
@@ -720,79 +683,154 @@ class AutorizacionVisitaViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Residente no válido'}, status=status.HTTP_400_BAD_REQUEST)
 
         data = request.data or {}
+        parametros = GenerarQRSerializer(data=data)
+        parametros.is_valid(raise_exception=True)
         nombre = data.get('nombre_completo')
         documento = data.get('documento_identidad')  # opcional
         tipo_acceso = (data.get('tipo_acceso') or 'P').upper()
-        entradas = int(data.get('entradas_permitidas', 1))
+        entradas = parametros.validated_data['entradas_permitidas']
         fecha_inicio = data.get('fecha_inicio')
         fecha_fin = data.get('fecha_fin')
-        duracion_min = data.get('duracion_min')
+        duracion_min = parametros.validated_data.get('duracion_min')
 
         if not nombre:
             return Response({'error': 'nombre_completo es requerido'}, status=status.HTTP_400_BAD_REQUEST)
         # documento_identidad es opcional; no generamos temporales
 
         # Validar permisos por tipo
-        if residente.tipo != 'PRINCIPAL':
-            if tipo_acceso == 'P' and not getattr(residente, 'puede_generar_qr_peatonal', False):
-                return Response({'error': 'No autorizado a generar QR peatonal'}, status=status.HTTP_403_FORBIDDEN)
-            if tipo_acceso == 'V' and not getattr(residente, 'puede_generar_qr_vehicular', False):
-                return Response({'error': 'No autorizado a generar QR vehicular'}, status=status.HTTP_403_FORBIDDEN)
-
-        # Crear o usar visitante temporal
-        visitante = Visitante.objects.create(
-            nombre_completo=nombre,
-            documento_identidad=documento or None,
-            tipo_acceso=tipo_acceso,
-            autorizado_por=residente,
-            fecha_inicio=djtz.now(),
-            fecha_fin=djtz.now(),
-            activo=False,
-        )
+        error = self._validar_permiso_tipo(residente, tipo_acceso)
+        if error:
+            return error
 
         # Rango de validez
-        def _parse_iso_local(s):
-            try:
-                dt = datetime.fromisoformat(s)
-                # Asumimos hora local; hacerla timezone-aware
-                return djtz.make_aware(dt) if djtz.is_naive(dt) else dt
-            except Exception:
-                return None
+        inicio, fin, error = self._rango_validez(fecha_inicio, fecha_fin, duracion_min)
+        if error:
+            return error
+
+        with transaction.atomic():
+            AutorizacionService.verificar_limite_familia(residente.familia_id)
+            # Crear o usar visitante temporal
+            visitante = Visitante.objects.create(
+                nombre_completo=nombre,
+                documento_identidad=documento or None,
+                tipo_acceso=tipo_acceso,
+                autorizado_por=residente,
+                fecha_inicio=djtz.now(),
+                fecha_fin=djtz.now(),
+                activo=False,
+            )
 
-        inicio = djtz.now() if not fecha_inicio else _parse_iso_local(fecha_inicio)
-        if inicio is None:
-            return Response({'error': 'fecha_inicio inválida'}, status=status.HTTP_400_BAD_REQUEST)
+            auth = AutorizacionVisita.objects.create(
+                visitante=visitante,
+                autorizado_por=residente,
+                familia=residente.familia,
+                fecha_inicio=inicio,
+                fecha_fin=fin,
+                status='ACTIVA',
+                entradas_permitidas=entradas,
+            )
+        # La imagen ya no se persiste: se renderiza bajo demanda (ver qr_imagen).
+        # En la respuesta de creacion se incluye inline para mostrarla de inmediato.
+        data = AutorizacionVisitaSerializer(auth, context={'request': request}).data
+        data['qr_image'] = qr_render.data_url(auth.codigo_qr)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='generar-qr-lote')
+    def generar_qr_lote(self, request):
+        """Genera visitantes + autorizaciones para una lista de invitados (eventos).
+
+        Body: { invitados: [{nombre_completo, documento_identidad?}], tipo_acceso,
+                entradas_permitidas, fecha_inicio?, fecha_fin?, duracion_min? }
+        Permisos y límite por familia se evalúan una vez para todo el lote; las filas
+        se crean con bulk_create y las imágenes se sirven bajo demanda (qr_url) o
+        en una hoja imprimible (hoja_url).
+        """
+        try:
+            residente = request.user.residente
+        except Exception:
+            return Response({'error': 'Residente no válido'}, status=status.HTTP_400_BAD_REQUEST)
 
-        if duracion_min and not fecha_fin:
-            fin = inicio + timedelta(minutes=int(duracion_min))
-        else:
-            fin = djtz.now() + timedelta(hours=4) if not fecha_fin else _parse_iso_local(fecha_fin)
-        if fin is None:
-            return Response({'error': 'fecha_fin inválida'}, status=status.HTTP_400_BAD_REQUEST)
-        if fin <= inicio:
-            return Response({'error': 'fecha_fin debe ser mayor a fecha_inicio'}, status=status.HTTP_400_BAD_REQUEST)
-
-        auth = AutorizacionVisita.objects.create(
-            visitante=visitante,
-            autorizado_por=residente,
-            familia=residente.familia,
-            fecha_inicio=inicio,
-            fecha_fin=fin,
-            status='ACTIVA',
-            entradas_permitidas=max(1, entradas),
+        data = request.data or {}
+        parametros = GenerarQRSerializer(data=data)
+        parametros.is_valid(raise_exception=True)
+        invitados = data.get('invitados')
+        tipo_acceso = (data.get('tipo_acceso') or 'P').upper()
+        entradas = parametros.validated_data['entradas_permitidas']
+
+        if not isinstance(invitados, list) or not invitados:
+            return Response({'error': 'invitados es requerido (lista)'}, status=status.HTTP_400_BAD_REQUEST)
+        max_lote = getattr(settings, 'QR_LOTE_MAX_INVITADOS', 200)
+        if len(invitados) > max_lote:
+            return Response({'error': f'Máximo {max_lote} invitados por lote'}, status=status.HTTP_400_BAD_REQUEST)
+        for i, inv in enumerate(invitados):
+            if not isinstance(inv, dict) or not (inv.get('nombre_completo') or '').strip():
+                return Response({'error': f'invitados[{i}].nombre_completo es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        error = self._validar_permiso_tipo(residente, tipo_acceso)
+        if error:
+            return error
+        inicio, fin, error = self._rango_validez(
+            data.get('fecha_inicio'), data.get('fecha_fin'), parametros.validated_data.get('duracion_min'),
         )
-    # Generar imagen PNG del QR con el codigo unico de autorizacion
-        qr = qrcode.QRCode(version=1, box_size=8, border=2)
-        qr.add_data(auth.codigo_qr)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        buf = BytesIO()
-        img.save(buf, format='PNG')
-        png_b64 = b64encode(buf.getvalue()).decode('utf-8')
-        auth.qr_image = f"data:image/png;base64,{png_b64}"
-        auth.save(update_fields=['qr_image'])
-
-        return Response(AutorizacionVisitaSerializer(auth).data, status=status.HTTP_201_CREATED)
+        if error:
+            return error
+
+        now = djtz.now()
+        with transaction.atomic():
+            AutorizacionService.verificar_limite_familia(residente.familia_id, len(invitados), now)
+            visitantes = [
+                Visitante(
+                    nombre_completo=inv['nombre_completo'].strip(),
+                    documento_identidad=inv.get('documento_identidad') or None,
+                    tipo_acceso=tipo_acceso,
+                    autorizado_por=residente,
+                    fecha_inicio=now,
+                    fecha_fin=now,
+                    activo=False,
+                )
+                for inv in invitados
+            ]
+            visitantes = Visitante.objects.bulk_create(visitantes)
+            autorizaciones = []
+            for auth_id, visitante in zip(reservar_ids(AutorizacionVisita, len(visitantes)), visitantes):
+                auth = AutorizacionVisita(
+                    pk=auth_id,
+                    visitante=visitante,
+                    autorizado_por=residente,
+                    familia=residente.familia,
+                    fecha_inicio=inicio,
+                    fecha_fin=fin,
+                    status='ACTIVA',
+                    entradas_permitidas=entradas,
+                )
+                auth.codigo_qr = qr_tokens.emitir_para(auth)
+                autorizaciones.append(auth)
+            AutorizacionVisita.objects.bulk_create(autorizaciones)
+
+        ids = ','.join(str(a.id) for a in autorizaciones)
+        return Response({
+            'creadas': len(autorizaciones),
+            'autorizaciones': AutorizacionVisitaSerializer(autorizaciones, many=True, context={'request': request}).data,
+            'hoja_url': request.build_absolute_uri(f"{reverse('autorizacionvisita-hoja-qr')}?ids={ids}"),
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'], url_path='hoja-qr')
+    def hoja_qr(self, request):
+        """PDF imprimible con los QR de las autorizaciones indicadas (?ids=1,2,3)."""
+        try:
+            ids = [int(x) for x in (request.query_params.get('ids') or '').split(',') if x.strip()]
+        except ValueError:
+            return Response({'error': 'ids inválidos'}, status=status.HTTP_400_BAD_REQUEST)
+        max_lote = getattr(settings, 'QR_LOTE_MAX_INVITADOS', 200)
+        if not ids or len(ids) > max_lote:
+            return Response({'error': f'Indique entre 1 y {max_lote} ids'}, status=status.HTTP_400_BAD_REQUEST)
+        autorizaciones = list(self.get_queryset().filter(id__in=ids).order_by('id'))
+        if not autorizaciones:
+            return Response({'error': 'No se encontraron autorizaciones'}, status=status.HTTP_404_NOT_FOUND)
+        pdf = qr_render.hoja_pdf(autorizaciones)
+        resp = HttpResponse(pdf, content_type='application/pdf')
+        resp['Content-Disposition'] = 'inline; filename="qr_invitados.pdf"'
+        return resp
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -805,53 +843,68 @@ def validar_qr(request):
     if not codigo_qr:
         return Response({'error': 'codigo_qr requerido'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        auth = AutorizacionVisita.objects.select_related('visitante').get(codigo_qr=codigo_qr)
-    except AutorizacionVisita.DoesNotExist:
-        return Response({'match': False, 'reason': 'QR no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    data, http_status = AutorizacionService.consumir_qr(codigo_qr, evento)
+    return Response(data, status=http_status)
 
-    now = djtz.now()
-    if auth.status != 'ACTIVA':
-        return Response({'match': False, 'reason': f'Estado {auth.status}'}, status=status.HTTP_400_BAD_REQUEST)
-    if not (auth.fecha_inicio <= now <= auth.fecha_fin):
-        auth.status = 'VENCIDA'
-        auth.save(update_fields=['status'])
-        return Response({'match': False, 'reason': 'Vencida'}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Logica de entrada/salida por turnos, consumiendo entradas
-    if evento == 'ENTRADA':
-        if auth.dentro:
-            return Response({'match': False, 'reason': 'QR ya está dentro'}, status=status.HTTP_400_BAD_REQUEST)
-        if auth.entradas_consumidas >= auth.entradas_permitidas:
-            return Response({'match': False, 'reason': 'Usos agotados'}, status=status.HTTP_400_BAD_REQUEST)
-        auth.dentro = True
-        auth.entradas_consumidas += 1
-        auth.save(update_fields=['dentro', 'entradas_consumidas'])
-        # Registrar acceso
-        RegistroAcceso.objects.create(
-            tipo_persona='V', tipo_verificacion='C', persona_id=auth.visitante.id,
-            exitoso=True, detalles={'codigo_qr': auth.codigo_qr}, vehiculo=None
-        )
-        return Response({'match': True, 'accion': 'ENTRADA', 'restantes': auth.entradas_permitidas - auth.entradas_consumidas})
-    elif evento == 'SALIDA':
-        if not auth.dentro:
-            return Response({'match': False, 'reason': 'No está dentro'}, status=status.HTTP_400_BAD_REQUEST)
-        auth.dentro = False
-    # Si ya no quedan entradas por consumir y salio, marcar utilizada
-        if auth.entradas_consumidas >= auth.entradas_permitidas:
-            auth.status = 'UTILIZADA'
-        auth.save(update_fields=['dentro', 'status'])
-        RegistroAcceso.objects.create(
-            tipo_persona='V', tipo_verificacion='C', persona_id=auth.visitante.id,
-            exitoso=True, detalles={'codigo_qr': auth.codigo_qr, 'evento': 'SALIDA'}, vehiculo=None
-        )
-        return Response({'match': True, 'accion': 'SALIDA', 'status': auth.status})
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsAdminUser])
+def validar_qr_lote(request):
+    """Ingesta por lotes de escaneos para controladores de portería.
+
+    Solo guardias o controladores autenticados (cuenta staff): el lote acepta
+    timestamps del dispositivo, que se acotan a la ventana offline.
+
+    Body: {"eventos": [{"codigo_qr", "evento", "modalidad", "timestamp"}, ...]}
+    Los eventos se aplican en orden dentro de una transacción y se devuelve un
+    resultado por evento (mismo formato que validar_qr, más 'indice').
+    """
+    eventos = request.data.get('eventos')
+    if not isinstance(eventos, list) or not eventos:
+        return Response({'error': 'eventos requerido (lista)'}, status=status.HTTP_400_BAD_REQUEST)
+    max_lote = getattr(settings, 'QR_LOTE_MAX_EVENTOS', 500)
+    if len(eventos) > max_lote:
+        return Response({'error': f'Máximo {max_lote} eventos por lote'}, status=status.HTTP_400_BAD_REQUEST)
+    resultados = AutorizacionService.procesar_lote(eventos)
+    return Response({
+        'procesados': len(resultados),
+        'exitosos': sum(1 for r in resultados if r.get('match')),
+        'resultados': resultados,
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def qr_imagen(request, codigo):
+    """Imagen del QR (PNG por defecto, ?formato=svg) renderizada desde codigo_qr.
+
+    Respuesta inmutable con ETag fuerte: si el cliente envía If-None-Match no se
+    renderiza ni se consulta la base. Solo se sirven códigos firmados válidos o
+    códigos legacy existentes, para no funcionar como generador de QR arbitrarios.
+    """
+    codigo = qr_tokens.normalizar(codigo)
+    formato = (request.query_params.get('formato') or 'png').lower()
+    if formato not in qr_render.FORMATOS:
+        return Response({'error': 'formato debe ser png o svg'}, status=status.HTTP_400_BAD_REQUEST)
+    tag = qr_render.etag(codigo, formato)
+    cache_control = f"private, max-age={60 * 60 * 24 * 365}, immutable"
+    if tag in [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]:
+        resp = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
     else:
-        return Response({'error': 'Evento inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        if qr_tokens.es_token(codigo):
+            try:
+                qr_tokens.decodificar(codigo)
+            except qr_tokens.TokenQRInvalido:
+                return Response({'error': 'QR no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        elif not AutorizacionVisita.objects.filter(codigo_qr=codigo).exists():
+            return Response({'error': 'QR no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        resp = HttpResponse(qr_render.renderizar(codigo, formato), content_type=qr_render.FORMATOS[formato])
+    resp['ETag'] = tag
+    resp['Cache-Control'] = cache_control
+    return resp
 
 class RegistroAccesoViewSet(viewsets.ModelViewSet):
     queryset = RegistroAcceso.objects.all()
     serializer_class = RegistroAccesoSerializer
+    cursor_ordering = ('-fecha_hora', '-id')
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -881,7 +934,7 @@ class RegistroAccesoViewSet(viewsets.ModelViewSet):
         try:
             tipo_acceso = request.data.get('tipo_acceso')
             modalidad = request.data.get('modalidad')
-            codigo_qr = request.data.get('codigo_qr')
+            codigo_qr = qr_tokens.normalizar(request.data.get('codigo_qr'))
             
             if not all([tipo_acceso, modalidad]):
                 return Response(
@@ -889,12 +942,15 @@ class RegistroAccesoViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Si se proporciona codigo QR, buscar autorizacion
+            # Si se proporciona codigo QR, buscar autorizacion (los tokens, por el id firmado)
             if codigo_qr:
                 try:
+                    filtro = AutorizacionService.filtro_qr(codigo_qr)
+                    if filtro is None:
+                        raise AutorizacionVisita.DoesNotExist
                     autorizacion = AutorizacionVisita.objects.get(
-                        codigo_qr=codigo_qr,
-                        status='ACTIVA'
+                        status='ACTIVA',
+                        **filtro
                     )
                     # Verificar que la autorizacion este vigente
                     if timezone.now() > autorizacion.fecha_fin:
@@ -973,9 +1029,10 @@ class RegistroAccesoViewSet(viewsets.ModelViewSet):
             if isinstance(fecha_fin, str):
                 fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
             
-            # Obtener registros del periodo
+            # Obtener registros del periodo (rango sobre fecha_hora para usar el indice)
             registros = self.get_queryset().filter(
-                fecha_hora__date__range=[fecha_inicio, fecha_fin]
+                fecha_hora__gte=rango_dia(fecha_inicio)[0],
+                fecha_hora__lt=rango_dia(fecha_fin)[1],
             )
             
             stats = {
@@ -991,10 +1048,13 @@ class RegistroAccesoViewSet(viewsets.ModelViewSet):
                 'por_hora': {}
             }
             
-            # Calcular accesos por hora
+            # Calcular accesos por hora (una sola consulta agrupada)
+            por_hora = dict(
+                registros.annotate(hora=ExtractHour('fecha_hora')).values('hora')
+                .annotate(n=models.Count('id')).values_list('hora', 'n')
+            )
             for hora in range(24):
-                count = registros.filter(fecha_hora__hour=hora).count()
-                stats['por_hora'][f"{hora:02d}:00"] = count
+                stats['por_hora'][f"{hora:02d}:00"] = por_hora.get(hora, 0)
             
             return Response(stats)
             
@@ -0,0 +1,150 @@
+"""Calendario de un área con ventana acotada, agrupación por día, caché y ETag.
+
+Sin ``desde``/``hasta`` la ventana es ``AREAS_CALENDARIO_DIAS`` días desde hoy
+(y nunca más de ``AREAS_CALENDARIO_MAX_DIAS``); fechas inválidas o ``desde``
+posterior a ``hasta`` responden 400. ``agrupar='dia'`` devuelve un resumen de
+ocupación por día local en lugar de las filas.
+
+``VersionCalendario`` guarda una versión por área y día (UTC) que sube con cada
+cambio de reservas o turnos de ese día (triggers de la migración 0018). La suma
+de las versiones de los días de la ventana forma parte de la clave de caché y
+del ETag: un cambio invalida solo las ventanas que toca, sin borrar nada y sin
+depender de que todos los procesos compartan la caché. Validar un ETag no
+consulta más que esas filas.
+"""
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import ReservaArea, TurnoArea, UnidadArea, VersionCalendario
+from .services import ESTADOS_ACTIVOS
+
+AGRUPACIONES = ('dia',)
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def _fecha(campo, valor):
+    if not valor:
+        return None
+    try:
+        dt = datetime.fromisoformat(valor)
+        if timezone.is_naive(dt):
+            dt = timezone.make_aware(dt)
+    except (ValueError, OverflowError):
+        raise ValidationError({campo: 'Fecha inválida, use ISO 8601'})
+    return dt
+
+
+def ventana(desde, hasta):
+    """(desde, hasta) acotados a partir de los parámetros ISO (o None) del request.
+
+    Lanza ValidationError (400) si una fecha no es válida o `desde` es posterior a `hasta`.
+    """
+    dias = timedelta(days=_config('AREAS_CALENDARIO_DIAS', 31))
+    maximo = timedelta(days=_config('AREAS_CALENDARIO_MAX_DIAS', 366))
+    desde, hasta = _fecha('desde', desde), _fecha('hasta', hasta)
+    if desde is not None and hasta is not None and desde > hasta:
+        raise ValidationError({'hasta': 'Debe ser posterior a desde'})
+    if desde is None and hasta is None:
+        desde = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    if desde is None:
+        desde = hasta - dias
+    if hasta is None:
+        hasta = desde + dias
+    if hasta - desde > maximo:
+        hasta = desde + maximo
+    return desde, hasta
+
+
+def version(area, desde, hasta):
+    """Suma de las versiones de los días (UTC) de la ventana: sube con cualquier cambio que la toque."""
+    dias = (desde.astimezone(dt_timezone.utc).date(), hasta.astimezone(dt_timezone.utc).date())
+    return VersionCalendario.objects.filter(area=area, dia__range=dias).aggregate(
+        total=Coalesce(Sum('version'), 0),
+    )['total']
+
+
+def etag(area, desde, hasta, agrupar):
+    parametros = f'{desde.isoformat()}|{hasta.isoformat()}|{agrupar or ""}'
+    return f'"cal-{area.id}-{version(area, desde, hasta)}-{hashlib.sha1(parametros.encode()).hexdigest()[:16]}"'
+
+
+def _reservas(area, desde, hasta):
+    return ReservaArea.objects.filter(
+        area=area, estado__in=ESTADOS_ACTIVOS, fecha_fin__gte=desde, fecha_inicio__lte=hasta,
+    )
+
+
+def _turnos(area, desde, hasta):
+    return TurnoArea.objects.filter(area=area, activo=True, fecha_fin__gte=desde, fecha_inicio__lte=hasta)
+
+
+def _filas(area, desde, hasta):
+    if area.tipo == 'UNIDADES':
+        data = []
+        for r in _reservas(area, desde, hasta).select_related('unidad', 'residente__user').order_by('fecha_inicio'):
+            data.append({
+                'id': r.id,
+                'unidad_id': r.unidad_id,
+                'unidad_nombre': getattr(r.unidad, 'nombre', None),
+                'fecha_inicio': r.fecha_inicio,
+                'fecha_fin': r.fecha_fin,
+                'estado': r.estado,
+                'creado_en': r.fecha_creacion,
+                'residente': getattr(r.residente.user, 'get_full_name', lambda: None)(),
+            })
+        return {'reservas': data}
+    from .serializers import TurnoAreaSerializer
+    return {'turnos': TurnoAreaSerializer(_turnos(area, desde, hasta).order_by('fecha_inicio'), many=True).data}
+
+
+def _por_dia(area, desde, hasta):
+    # Cada reserva o turno cuenta en el día local en que empieza
+    if area.tipo == 'UNIDADES':
+        filas = (
+            _reservas(area, desde, hasta).annotate(dia=TruncDate('fecha_inicio')).values('dia')
+            .annotate(reservas=Count('id'), unidades_ocupadas=Count('unidad', distinct=True),
+                      duracion=Sum(F('fecha_fin') - F('fecha_inicio')))
+            .order_by('dia')
+        )
+        return {
+            'unidades': UnidadArea.objects.filter(area=area, activo=True).count(),
+            'dias': [
+                {
+                    'fecha': f['dia'], 'reservas': f['reservas'], 'unidades_ocupadas': f['unidades_ocupadas'],
+                    'horas_reservadas': round(f['duracion'].total_seconds() / 3600, 2) if f['duracion'] else 0,
+                }
+                for f in filas
+            ],
+        }
+    filas = (
+        _turnos(area, desde, hasta).annotate(dia=TruncDate('fecha_inicio')).values('dia')
+        # `disponibles` primero: después `capacidad` y `ocupados` ya nombran las sumas
+        .annotate(disponibles=Sum(Greatest(F('capacidad') - F('ocupados'), Value(0))))
+        .annotate(turnos=Count('id'), capacidad=Sum('capacidad'), ocupados=Sum('ocupados'))
+        .order_by('dia')
+    )
+    return {'dias': [{'fecha': f.pop('dia'), **f} for f in filas]}
+
+
+def obtener(area, desde, hasta, agrupar=None, etiqueta=None):
+    """Respuesta del calendario, desde la caché si la versión de la ventana no cambió.
+
+    `etiqueta` es el ETag ya calculado para esta ventana (evita repetir la consulta).
+    """
+    clave = f'areas:calendario:{etiqueta or etag(area, desde, hasta, agrupar)}'
+    data = cache.get(clave)
+    if data is None:
+        cuerpo = _por_dia(area, desde, hasta) if agrupar == 'dia' else _filas(area, desde, hasta)
+        data = {'tipo': area.tipo, 'desde': desde, 'hasta': hasta, **cuerpo}
+        cache.set(clave, data, _config('AREAS_CALENDARIO_CACHE_TTL', 300))
+    return data
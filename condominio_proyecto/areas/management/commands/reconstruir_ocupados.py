@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from areas.models import TurnoArea
+from areas.services import ReservaService
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula TurnoArea.ocupados desde las reservas PENDIENTE/CONFIRMADA. Los triggers lo '
+        'mantienen al día; usar tras restaurar datos o si la ocupación de un turno no cuadra.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--area', type=int, default=None, help='Solo los turnos de esta área')
+        parser.add_argument('--desde', default=None, help='Solo turnos que terminan desde esta fecha (ISO)')
+
+    def handle(self, *args, **opts):
+        turnos = TurnoArea.objects.all()
+        if opts['area']:
+            turnos = turnos.filter(area_id=opts['area'])
+        if opts['desde']:
+            turnos = turnos.filter(fecha_fin__gte=opts['desde'])
+        corregidos = ReservaService.reconstruir_ocupados(turnos)
+        self.stdout.write(self.style.SUCCESS(f'Turnos corregidos: {corregidos}'))
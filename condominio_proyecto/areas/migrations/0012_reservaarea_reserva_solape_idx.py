@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:27
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transaccion
+    atomic = False
+
+    dependencies = [
+        ('accesos', '0019_autorizacionvisita_autorizacion_status_fin_idx_and_more'),
+        ('areas', '0011_permisoarea'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='reservaarea',
+            index=models.Index(fields=['area', 'unidad', 'estado', 'fecha_inicio', 'fecha_fin'], name='reserva_solape_idx'),
+        ),
+    ]
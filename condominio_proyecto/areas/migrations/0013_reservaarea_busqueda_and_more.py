@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:29
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def poblar_busqueda(apps, schema_editor):
+    from accesos.busqueda import texto_reserva
+    ReservaArea = apps.get_model('areas', 'ReservaArea')
+    lote = []
+    qs = ReservaArea.objects.select_related('residente__user', 'familia', 'area', 'unidad', 'turno')
+    for obj in qs.iterator(chunk_size=1000):
+        obj.busqueda = texto_reserva(obj)
+        lote.append(obj)
+        if len(lote) == 1000:
+            ReservaArea.objects.bulk_update(lote, ['busqueda'])
+            lote = []
+    if lote:
+        ReservaArea.objects.bulk_update(lote, ['busqueda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0020_familia_busqueda_residente_busqueda_and_more'),
+        ('areas', '0012_reservaarea_reserva_solape_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservaarea',
+            name='busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='reservaarea',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busqueda'], name='reserva_busqueda_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
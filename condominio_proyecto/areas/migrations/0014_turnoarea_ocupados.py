@@ -0,0 +1,72 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+TURNOS = 'areas_turnoarea'
+RESERVAS = 'areas_reservaarea'
+ACTIVA = "estado IN ('PENDIENTE', 'CONFIRMADA') AND turno_id IS NOT NULL"
+
+
+def _funcion(nombre, origen):
+    # `origen` devuelve (turno_id, delta) de los cupos activos que cambia la sentencia
+    return f"""
+    CREATE OR REPLACE FUNCTION {nombre}() RETURNS trigger AS $$
+    BEGIN
+        UPDATE {TURNOS} t SET ocupados = GREATEST(t.ocupados + d.delta, 0)
+        FROM ({origen}) AS d(turno_id, delta)
+        WHERE t.id = d.turno_id AND d.delta <> 0;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+
+
+def _trigger(nombre, evento, referencias):
+    return f"""
+    CREATE TRIGGER {nombre} AFTER {evento} ON {RESERVAS}
+    REFERENCING {referencias}
+    FOR EACH STATEMENT EXECUTE FUNCTION {nombre}();
+    """
+
+
+SQL = [
+    _funcion('turno_ocupados_ins', f"SELECT turno_id, sum(cupos) FROM nuevas WHERE {ACTIVA} GROUP BY 1"),
+    _trigger('turno_ocupados_ins', 'INSERT', 'NEW TABLE AS nuevas'),
+    _funcion('turno_ocupados_upd', f"""
+        SELECT turno_id, sum(delta) FROM (
+            SELECT turno_id, cupos AS delta FROM nuevas WHERE {ACTIVA}
+            UNION ALL
+            SELECT turno_id, -cupos FROM viejas WHERE {ACTIVA}
+        ) cambios GROUP BY 1
+    """),
+    _trigger('turno_ocupados_upd', 'UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas'),
+    _funcion('turno_ocupados_del', f"SELECT turno_id, -sum(cupos) FROM viejas WHERE {ACTIVA} GROUP BY 1"),
+    _trigger('turno_ocupados_del', 'DELETE', 'OLD TABLE AS viejas'),
+    # Valor inicial
+    f"""
+    UPDATE {TURNOS} t SET ocupados = r.total
+    FROM (SELECT turno_id, sum(cupos) AS total FROM {RESERVAS} WHERE {ACTIVA} GROUP BY 1) r
+    WHERE t.id = r.turno_id;
+    """,
+]
+
+REVERSE_SQL = [
+    f"DROP TRIGGER IF EXISTS turno_ocupados_{s} ON {RESERVAS}; DROP FUNCTION IF EXISTS turno_ocupados_{s}();"
+    for s in ('ins', 'upd', 'del')
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0013_reservaarea_busqueda_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turnoarea',
+            name='ocupados',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
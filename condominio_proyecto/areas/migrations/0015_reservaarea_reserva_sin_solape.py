@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:55
+
+from bisect import bisect_left
+
+import areas.models
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+from django.utils import timezone
+
+ACTIVAS = ('PENDIENTE', 'CONFIRMADA')
+NOTA = '[Cancelada al migrar: se solapaba con otra reserva anterior de la unidad]'
+
+
+def cancelar_solapadas(apps, schema_editor):
+    """Deja sin solapes las reservas de unidad ya guardadas, para poder crear la restriccion.
+
+    Se recorren por unidad en orden de creacion (id) y se conserva cada reserva
+    que no choca con las ya conservadas: en una cadena A-B-C (A y C no se
+    tocan) se cancela solo B. Cada cancelada queda anotada en sus notas y su
+    residente recibe una notificacion.
+    """
+    ReservaArea = apps.get_model('areas', 'ReservaArea')
+    Notificacion = apps.get_model('notificaciones', 'Notificacion')
+    reservas = (
+        ReservaArea.objects.filter(
+            estado__in=ACTIVAS, unidad__isnull=False, fecha_inicio__isnull=False, fecha_fin__gt=models.F('fecha_inicio'),
+        )
+        .order_by('unidad_id', 'id').values_list('id', 'unidad_id', 'fecha_inicio', 'fecha_fin')
+    )
+    canceladas = []
+    unidad = None
+    for reserva_id, unidad_id, inicio, fin in reservas.iterator():
+        if unidad_id != unidad:
+            # Intervalos conservados de la unidad, sin solapes entre si y ordenados por inicio
+            unidad, inicios, fines = unidad_id, [], []
+        k = bisect_left(inicios, inicio)
+        if (k > 0 and fines[k - 1] > inicio) or (k < len(inicios) and inicios[k] < fin):
+            canceladas.append(reserva_id)
+            continue
+        inicios.insert(k, inicio)
+        fines.insert(k, fin)
+
+    for reserva in ReservaArea.objects.filter(id__in=canceladas).select_related('area', 'unidad').order_by('id'):
+        reserva.estado = 'CANCELADA'
+        reserva.notas = '\n'.join(filter(None, [reserva.notas, NOTA]))
+        reserva.save(update_fields=['estado', 'notas'])
+        fecha = timezone.localtime(reserva.fecha_inicio).strftime('%d/%m/%Y %H:%M')
+        Notificacion.objects.create(
+            residente_id=reserva.residente_id, tipo='AVISO', titulo='Reserva cancelada',
+            mensaje=(
+                f'Tu reserva de {reserva.area.nombre} ({reserva.unidad.nombre}) del {fecha} fue cancelada '
+                'porque se solapaba con otra reserva anterior de la misma unidad.'
+            ),
+            datos_extra={'reserva_id': reserva.id, 'area_id': reserva.area_id, 'unidad_id': reserva.unidad_id},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0022_archivoaccesos'),
+        ('areas', '0014_turnoarea_ocupados'),
+        ('notificaciones', '0005_notificacion_notif_tipo_fecha_idx'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.RunPython(cancelar_solapadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reservaarea',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('estado__in', ['PENDIENTE', 'CONFIRMADA']), ('fecha_fin__gt', models.F('fecha_inicio')), ('fecha_inicio__isnull', False), ('unidad__isnull', False)), expressions=[(areas.models.TsTzRange('fecha_inicio', 'fecha_fin'), '&&'), ('unidad', '=')], name='reserva_sin_solape'),
+        ),
+    ]
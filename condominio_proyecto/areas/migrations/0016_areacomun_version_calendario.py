@@ -0,0 +1,70 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:56
+
+from django.db import migrations, models
+
+AREAS = 'areas_areacomun'
+TABLAS = ('areas_reservaarea', 'areas_turnoarea')
+
+
+def _funcion(nombre, origen):
+    # `origen` devuelve los area_id tocados por la sentencia; una fila de area por sentencia.
+    # Solo sentencias directas: los UPDATE anidados (ocupados del turno, texto de busqueda)
+    # ya los cuenta la sentencia que los origino, y sin el corte se disparan entre si.
+    return f"""
+    CREATE OR REPLACE FUNCTION {nombre}() RETURNS trigger AS $$
+    BEGIN
+        IF pg_trigger_depth() > 1 THEN
+            RETURN NULL;
+        END IF;
+        UPDATE {AREAS} SET version_calendario = version_calendario + 1
+        WHERE id IN ({origen});
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+
+
+def _trigger(tabla, sufijo, evento, referencias):
+    return f"""
+    CREATE TRIGGER calendario_version_{sufijo} AFTER {evento} ON {tabla}
+    REFERENCING {referencias}
+    FOR EACH STATEMENT EXECUTE FUNCTION calendario_version_{sufijo}();
+    """
+
+
+SQL = [
+    _funcion('calendario_version_ins', 'SELECT area_id FROM nuevas'),
+    _funcion('calendario_version_upd', 'SELECT area_id FROM nuevas UNION SELECT area_id FROM viejas'),
+    _funcion('calendario_version_del', 'SELECT area_id FROM viejas'),
+] + [
+    sql
+    for tabla in TABLAS
+    for sql in (
+        _trigger(tabla, 'ins', 'INSERT', 'NEW TABLE AS nuevas'),
+        _trigger(tabla, 'upd', 'UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas'),
+        _trigger(tabla, 'del', 'DELETE', 'OLD TABLE AS viejas'),
+    )
+]
+
+REVERSE_SQL = [
+    f"DROP TRIGGER IF EXISTS calendario_version_{s} ON {tabla};"
+    for tabla in TABLAS for s in ('ins', 'upd', 'del')
+] + [
+    f"DROP FUNCTION IF EXISTS calendario_version_{s}();" for s in ('ins', 'upd', 'del')
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0015_reservaarea_reserva_sin_solape'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='areacomun',
+            name='version_calendario',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:28
+
+from django.db import migrations, models
+
+# Turnos ya sobrevendidos (antes del bloqueo en verificar_aforo): la capacidad sube a los
+# cupos reservados para que la restriccion se pueda crear; las reservas no se tocan
+AJUSTAR = "UPDATE areas_turnoarea SET capacidad = ocupados WHERE capacidad < ocupados;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0016_areacomun_version_calendario'),
+    ]
+
+    operations = [
+        migrations.RunSQL(AJUSTAR, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='turnoarea',
+            constraint=models.CheckConstraint(condition=models.Q(('capacidad__gte', models.F('ocupados'))), name='turno_capacidad_cubre_ocupados'),
+        ),
+    ]
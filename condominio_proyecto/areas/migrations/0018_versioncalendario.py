@@ -0,0 +1,111 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:31
+
+import importlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# La version del calendario pasa de una columna de areas_areacomun (que los triggers de
+# 0016 actualizaban en cada escritura, y dos veces al insertar una reserva de turno por
+# el trigger de ocupados) a una fila por area y dia en areas_versioncalendario.
+#
+# - Una vez por sentencia: INSERT ... ON CONFLICT con los (area, dia) distintos que tocan
+#   las filas cambiadas (dias UTC de fecha_inicio a fecha_fin; las reservas de turno
+#   usan las fechas del turno).
+# - Solo sentencias directas (pg_trigger_depth() = 1): los cambios que hacen otros
+#   triggers (ocupados del turno, texto de busqueda) ya los cuenta la sentencia que los
+#   origino.
+# - Dos reservas concurrentes solo compiten por la fila de su area y dia, no por el area.
+VERSIONES = 'areas_versioncalendario'
+ANTERIOR = importlib.import_module('areas.migrations.0016_areacomun_version_calendario')
+
+RESERVAS = """
+    SELECT r.area_id, coalesce(r.fecha_inicio, t.fecha_inicio), coalesce(r.fecha_fin, t.fecha_fin)
+      FROM {filas} r LEFT JOIN areas_turnoarea t ON t.id = r.turno_id
+"""
+TURNOS = "SELECT area_id, fecha_inicio, fecha_fin FROM {filas}"
+TABLAS = {'reserva': ('areas_reservaarea', RESERVAS), 'turno': ('areas_turnoarea', TURNOS)}
+EVENTOS = {
+    'ins': ('INSERT', 'NEW TABLE AS nuevas', ('nuevas',)),
+    'upd': ('UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas', ('nuevas', 'viejas')),
+    'del': ('DELETE', 'OLD TABLE AS viejas', ('viejas',)),
+}
+
+
+def _funcion(nombre, origen):
+    return f"""
+    CREATE OR REPLACE FUNCTION {nombre}() RETURNS trigger AS $$
+    BEGIN
+        IF pg_trigger_depth() > 1 THEN
+            RETURN NULL;
+        END IF;
+        INSERT INTO {VERSIONES} AS v (area_id, dia, version)
+        SELECT DISTINCT f.area_id, d.dia::date, 1
+          FROM ({origen}) AS f(area_id, inicio, fin)
+          CROSS JOIN LATERAL generate_series(
+              (f.inicio AT TIME ZONE 'UTC')::date::timestamp,
+              (greatest(f.inicio, f.fin) AT TIME ZONE 'UTC')::date::timestamp,
+              interval '1 day'
+          ) AS d(dia)
+         WHERE f.inicio IS NOT NULL
+        ON CONFLICT (area_id, dia) DO UPDATE SET version = v.version + 1;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+
+
+def _trigger(nombre, tabla, evento, referencias):
+    return f"""
+    CREATE TRIGGER {nombre} AFTER {evento} ON {tabla}
+    REFERENCING {referencias}
+    FOR EACH STATEMENT EXECUTE FUNCTION {nombre}();
+    """
+
+
+SQL = [
+    sql
+    for prefijo, (tabla, filas) in TABLAS.items()
+    for sufijo, (evento, referencias, transiciones) in EVENTOS.items()
+    for sql in (
+        _funcion(
+            f'calendario_{prefijo}_{sufijo}',
+            ' UNION '.join(filas.format(filas=t) for t in transiciones),
+        ),
+        _trigger(f'calendario_{prefijo}_{sufijo}', tabla, evento, referencias),
+    )
+]
+
+REVERSE_SQL = [
+    f"DROP TRIGGER IF EXISTS calendario_{prefijo}_{sufijo} ON {tabla}; "
+    f"DROP FUNCTION IF EXISTS calendario_{prefijo}_{sufijo}();"
+    for prefijo, (tabla, _) in TABLAS.items() for sufijo in EVENTOS
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('areas', '0017_turnoarea_capacidad_cubre_ocupados'),
+    ]
+
+    operations = [
+        migrations.RunSQL(ANTERIOR.REVERSE_SQL, ANTERIOR.SQL),
+        migrations.RemoveField(
+            model_name='areacomun',
+            name='version_calendario',
+        ),
+        migrations.CreateModel(
+            name='VersionCalendario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('area', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='areas.areacomun')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('area', 'dia'), name='version_calendario_area_dia_uniq')],
+            },
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
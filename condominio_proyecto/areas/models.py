@@ -1,4 +1,12 @@
 from django.db import models
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GinIndex
+
+
+class TsTzRange(models.Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
 
 
 class AreaComun(models.Model):
@@ -44,9 +52,31 @@ class TurnoArea(models.Model):
     fecha_fin = models.DateTimeField()
     capacidad = models.PositiveIntegerField(default=1)
     activo = models.BooleanField(default=True)
+    # Cupos de reservas PENDIENTE/CONFIRMADA; lo mantienen los triggers de ReservaArea
+    # (migracion 0014). manage.py reconstruir_ocupados lo recalcula
+    ocupados = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['fecha_inicio']
+        constraints = [
+            # Ni un cambio de capacidad ni una reserva pueden dejar el turno sobrevendido
+            models.CheckConstraint(
+                check=models.Q(capacidad__gte=models.F('ocupados')),
+                name='turno_capacidad_cubre_ocupados',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # No pisar `ocupados` con el valor leido al cargar la instancia
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'ocupados'
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def disponibles(self):
+        return max(self.capacidad - self.ocupados, 0)
 
     def __str__(self):
         rango = f"{self.fecha_inicio.strftime('%d/%m %H:%M')}-{self.fecha_fin.strftime('%H:%M')}"
@@ -75,11 +105,53 @@ class ReservaArea(models.Model):
     # Modalidad AFORO
     turno = models.ForeignKey(TurnoArea, on_delete=models.CASCADE, null=True, blank=True, related_name='reservas')
     cupos = models.PositiveIntegerField(default=1, help_text='Cantidad de asistentes (solo AFORO)')
+    # Texto normalizado para busqueda (ver accesos/busqueda.py)
+    busqueda = models.TextField(blank=True, default='', editable=False)
 
     class Meta:
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Verificacion de solapes de la modalidad UNIDADES
+            models.Index(fields=['area', 'unidad', 'estado', 'fecha_inicio', 'fecha_fin'], name='reserva_solape_idx'),
+            GinIndex(fields=['busqueda'], opclasses=['gin_trgm_ops'], name='reserva_busqueda_trgm'),
+        ]
+        constraints = [
+            # Modalidad UNIDADES: dos reservas activas de la misma unidad no pueden solaparse
+            # ([inicio, fin) con GiST; la igualdad de unidad usa btree_gist)
+            ExclusionConstraint(
+                name='reserva_sin_solape',
+                expressions=[
+                    (TsTzRange('fecha_inicio', 'fecha_fin'), RangeOperators.OVERLAPS),
+                    ('unidad', RangeOperators.EQUAL),
+                ],
+                condition=models.Q(
+                    estado__in=['PENDIENTE', 'CONFIRMADA'], unidad__isnull=False,
+                    fecha_inicio__isnull=False, fecha_fin__gt=models.F('fecha_inicio'),
+                ),
+            ),
+        ]
 
     def __str__(self):
         if self.turno_id:
             return f"Reserva {self.area.nombre} (turno)"
         return f"Reserva {self.area.nombre} - {self.unidad and self.unidad.nombre}"
+
+
+class VersionCalendario(models.Model):
+    """Version del calendario de un area en un dia (UTC) (ver areas/calendario.py).
+
+    La escriben los triggers de ReservaArea y TurnoArea (migracion 0018): una
+    vez por sentencia sube la version de cada dia que tocan las filas cambiadas.
+    Sin FK en la base: al borrar un area sus reservas pueden volver a escribir
+    filas mientras se borra; las que quedan huerfanas no molestan."""
+    area = models.ForeignKey(AreaComun, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    dia = models.DateField()
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['area', 'dia'], name='version_calendario_area_dia_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.area_id} {self.dia}: {self.version}"
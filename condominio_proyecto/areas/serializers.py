@@ -15,29 +15,14 @@ class UnidadAreaSerializer(serializers.ModelSerializer):
 
 
 class TurnoAreaSerializer(serializers.ModelSerializer):
-    ocupados = serializers.SerializerMethodField()
-    disponibles = serializers.SerializerMethodField()
+    # Columna mantenida por triggers (ver TurnoArea.ocupados): sin consultas por fila
+    ocupados = serializers.IntegerField(read_only=True)
+    disponibles = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = TurnoArea
         fields = '__all__'
 
-    def get_ocupados(self, obj):
-        try:
-            from django.db.models import Sum
-            total = obj.reservas.filter(estado__in=['PENDIENTE', 'CONFIRMADA']).aggregate(total=Sum('cupos'))['total'] or 0
-            return total
-        except Exception:
-            return 0
-
-    def get_disponibles(self, obj):
-        try:
-            ocupados = self.get_ocupados(obj)
-            disp = obj.capacidad - (ocupados or 0)
-            return disp if disp > 0 else 0
-        except Exception:
-            return 0
-
 
 class ReservaAreaSerializer(serializers.ModelSerializer):
     turno_detalle = serializers.SerializerMethodField()
@@ -48,7 +33,7 @@ class ReservaAreaSerializer(serializers.ModelSerializer):
     familia_nombre = serializers.SerializerMethodField()
     class Meta:
         model = ReservaArea
-        fields = '__all__'
+        exclude = ('busqueda',)
         # residente y familia se asignan desde el backend (usuario autenticado)
         read_only_fields = ('fecha_creacion', 'residente', 'familia')
 
@@ -63,8 +48,7 @@ class ReservaAreaSerializer(serializers.ModelSerializer):
                 'fecha_inicio': t.fecha_inicio,
                 'fecha_fin': t.fecha_fin,
                 'capacidad': t.capacidad,
-                # campos dinamicos para mostrar ocupacion actual
-                'ocupados': t.reservas.filter(estado__in=['PENDIENTE', 'CONFIRMADA']).aggregate(total=__import__('django').db.models.Sum('cupos'))['total'] or 0,
+                'ocupados': t.ocupados,
             }
         except Exception:
             return None
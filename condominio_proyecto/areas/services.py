@@ -0,0 +1,173 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import ReservaArea, TurnoArea, UnidadArea
+
+# Estados de reserva que ocupan cupos o unidades
+ESTADOS_ACTIVOS = ('PENDIENTE', 'CONFIRMADA')
+# Restricción de exclusión de ReservaArea (solape de una misma unidad)
+RESTRICCION_SOLAPE = 'reserva_sin_solape'
+# Restricción de TurnoArea: capacidad >= ocupados
+RESTRICCION_CAPACIDAD = 'turno_capacidad_cubre_ocupados'
+
+
+def ventanas_horario(area, desde, hasta):
+    """Ventanas [inicio, fin) del horario del área para cada día local de `desde` a `hasta` (inclusive).
+
+    Sin horario, el día completo. Si horario_fin <= horario_inicio la ventana
+    termina al día siguiente.
+    """
+    apertura = area.horario_inicio or time.min
+    ventanas = []
+    dia = desde
+    while dia <= hasta:
+        inicio = timezone.make_aware(datetime.combine(dia, apertura))
+        if area.horario_fin and area.horario_fin > apertura:
+            fin = timezone.make_aware(datetime.combine(dia, area.horario_fin))
+        else:
+            fin = timezone.make_aware(datetime.combine(dia + timedelta(days=1), area.horario_fin or time.min))
+        ventanas.append((inicio, fin))
+        dia += timedelta(days=1)
+    return ventanas
+
+
+def restar(ventanas, ocupados):
+    """Tramos de `ventanas` no cubiertos por `ocupados`; ambas listas ordenadas por inicio.
+
+    Un solo barrido: cada intervalo ocupado se descarta en cuanto termina antes
+    de la posición actual, así el costo es lineal en ventanas + ocupados.
+    """
+    libres = []
+    j = 0
+    for inicio, fin in ventanas:
+        cursor = inicio
+        while j < len(ocupados) and ocupados[j][1] <= cursor:
+            j += 1
+        k = j
+        while k < len(ocupados) and ocupados[k][0] < fin:
+            ocupado_inicio, ocupado_fin = ocupados[k]
+            if ocupado_inicio > cursor:
+                libres.append((cursor, ocupado_inicio))
+            cursor = max(cursor, ocupado_fin)
+            k += 1
+        if cursor < fin:
+            libres.append((cursor, fin))
+    return libres
+
+
+class ReservaService:
+    @staticmethod
+    def _restriccion(error):
+        diag = getattr(error.__cause__, 'diag', None)
+        return getattr(diag, 'constraint_name', None)
+
+    @staticmethod
+    def es_solape(error):
+        """True si el IntegrityError viene de la restricción de solape de unidades."""
+        return ReservaService._restriccion(error) == RESTRICCION_SOLAPE
+
+    @staticmethod
+    def es_capacidad(error):
+        """True si el IntegrityError viene de la restricción capacidad >= ocupados del turno."""
+        return ReservaService._restriccion(error) == RESTRICCION_CAPACIDAD
+
+    @staticmethod
+    def verificar_aforo(turno_id, cupos, estado, instance=None):
+        """Bloquea los turnos que toca la reserva (SELECT ... FOR UPDATE) y verifica que entren `cupos` más.
+
+        Debe llamarse dentro de la transacción que guarda la reserva: el bloqueo
+        se mantiene hasta el commit, así dos reservas simultáneas del mismo turno
+        se verifican una después de la otra y la segunda ya ve los cupos de la
+        primera en `ocupados` (lo actualizan los triggers de ReservaArea).
+
+        En una edición se bloquea primero la reserva y después su turno actual
+        y el nuevo, siempre en orden de pk: los triggers actualizan los dos y
+        dos ediciones cruzadas (A→B y B→A) no se bloquean mutuamente.
+        """
+        try:
+            turno_id = int(turno_id)
+        except (TypeError, ValueError):
+            raise ValidationError({'turno': 'No existe o inactivo'})
+        ids = {turno_id}
+        actual = None
+        if instance is not None:
+            actual = ReservaArea.objects.select_for_update().filter(pk=instance.pk).values('turno_id', 'estado', 'cupos').first()
+            if actual and actual['turno_id']:
+                ids.add(actual['turno_id'])
+        bloqueados = {t.pk: t for t in TurnoArea.objects.select_for_update().filter(pk__in=ids).order_by('pk')}
+        turno = bloqueados.get(turno_id)
+        if turno is None or not turno.activo:
+            raise ValidationError({'turno': 'No existe o inactivo'})
+        ocupados = turno.ocupados
+        # En una edición, la reserva actual deja de contar
+        if actual and actual['turno_id'] == turno.id and actual['estado'] in ESTADOS_ACTIVOS:
+            ocupados -= actual['cupos']
+        aporte = cupos if estado in ESTADOS_ACTIVOS else 0
+        if ocupados + aporte > turno.capacidad:
+            raise ValidationError({'cupos': 'Capacidad del turno excedida'})
+        return turno
+
+    @staticmethod
+    def verificar_capacidad(turno, capacidad):
+        """Bloquea `turno` y rechaza una `capacidad` menor que sus cupos ocupados.
+
+        Debe llamarse dentro de la transacción que guarda el turno; la
+        restricción turno_capacidad_cubre_ocupados lo garantiza igual en la base.
+        """
+        ocupados = TurnoArea.objects.select_for_update().values_list('ocupados', flat=True).get(pk=turno.pk)
+        if capacidad < ocupados:
+            raise ValidationError({'capacidad': f'Hay {ocupados} cupos reservados; la capacidad no puede ser menor'})
+
+    @staticmethod
+    def reconstruir_ocupados(turnos=None):
+        """Recalcula `ocupados` desde las reservas activas; devuelve cuántos turnos corrigió.
+
+        Bloquea los turnos antes de sumar: las reservas concurrentes esperan y
+        aplican su delta después, sobre el valor ya corregido.
+        """
+        turnos = TurnoArea.objects.all() if turnos is None else turnos
+        activos = (
+            ReservaArea.objects.filter(turno=OuterRef('pk'), estado__in=ESTADOS_ACTIVOS)
+            .values('turno').annotate(total=Sum('cupos')).values('total')
+        )
+        with transaction.atomic():
+            ids = list(turnos.select_for_update().order_by('pk').values_list('pk', flat=True))
+            desfasados = (
+                TurnoArea.objects.filter(pk__in=ids)
+                .annotate(real=Coalesce(Subquery(activos), 0)).exclude(ocupados=F('real'))
+            )
+            corregidos = list(desfasados.values_list('pk', flat=True))
+            TurnoArea.objects.filter(pk__in=corregidos).update(ocupados=Coalesce(Subquery(activos), 0))
+        return len(corregidos)
+
+    @staticmethod
+    def disponibilidad(area, desde, hasta):
+        """Ventanas libres por unidad activa de un área UNIDADES entre dos fechas locales (inclusive).
+
+        Dos consultas para todo el rango (unidades y reservas activas que lo
+        tocan, ordenadas por unidad e inicio) y un barrido por unidad.
+        """
+        ventanas = ventanas_horario(area, desde, hasta)
+        if not ventanas:
+            return []
+        unidades = list(UnidadArea.objects.filter(area=area, activo=True).order_by('nombre').values_list('id', 'nombre'))
+        ocupados = {unidad_id: [] for unidad_id, _ in unidades}
+        reservas = ReservaArea.objects.filter(
+            area=area, unidad__isnull=False, estado__in=ESTADOS_ACTIVOS,
+            fecha_inicio__lt=ventanas[-1][1], fecha_fin__gt=ventanas[0][0],
+        ).order_by('unidad_id', 'fecha_inicio').values_list('unidad_id', 'fecha_inicio', 'fecha_fin')
+        for unidad_id, inicio, fin in reservas:
+            if unidad_id in ocupados:
+                ocupados[unidad_id].append((inicio, fin))
+        return [
+            {
+                'id': unidad_id, 'nombre': nombre,
+                'libres': [{'inicio': i, 'fin': f} for i, f in restar(ventanas, ocupados[unidad_id])],
+            }
+            for unidad_id, nombre in unidades
+        ]
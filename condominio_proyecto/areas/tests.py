@@ -0,0 +1,230 @@
+import importlib
+from datetime import datetime, time, timedelta
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from accesos.models import Familia, Residente
+from notificaciones.models import Notificacion
+from . import calendario
+from .models import AreaComun, ReservaArea, TurnoArea, UnidadArea, VersionCalendario
+from .services import RESTRICCION_SOLAPE, ReservaService
+
+
+def _residente():
+    familia = Familia.objects.create(nombre='Rojas', departamento='1', torre='A')
+    return Residente.objects.create(
+        user=User.objects.create(username='ana'), documento_identidad='DOC-ana', familia=familia, tipo='PRINCIPAL',
+    )
+
+
+class AforoTests(TestCase):
+    def setUp(self):
+        self.residente = _residente()
+        self.area = AreaComun.objects.create(nombre='Piscina', tipo='AFORO')
+        self.ahora = timezone.now()
+
+    def _turno(self, capacidad, horas=0):
+        inicio = self.ahora + timedelta(hours=horas)
+        return TurnoArea.objects.create(area=self.area, fecha_inicio=inicio, fecha_fin=inicio + timedelta(hours=2), capacidad=capacidad)
+
+    def _reservar(self, turno, cupos, estado='CONFIRMADA'):
+        return ReservaArea.objects.create(area=self.area, residente=self.residente, turno=turno, cupos=cupos, estado=estado)
+
+    def test_ocupados_de_turno(self):
+        turno = self._turno(5)
+        reserva = self._reservar(turno, 3)
+        self._reservar(turno, 2, estado='PENDIENTE')
+        turno.refresh_from_db()
+        self.assertEqual((turno.ocupados, turno.disponibles), (5, 0))
+        with self.assertRaises(ValidationError):
+            ReservaService.verificar_aforo(turno.id, 1, 'CONFIRMADA')
+        # Editar la propia reserva no cuenta sus cupos dos veces
+        ReservaService.verificar_aforo(turno.id, 3, 'CONFIRMADA', instance=reserva)
+        # Guardar el turno no pisa el contador
+        turno.titulo = 'Mañana'
+        turno.save()
+        reserva.estado = 'CANCELADA'
+        reserva.save()
+        turno.refresh_from_db()
+        self.assertEqual(turno.ocupados, 2)
+        TurnoArea.objects.filter(pk=turno.pk).update(ocupados=0)
+        self.assertEqual(ReservaService.reconstruir_ocupados(TurnoArea.objects.filter(pk=turno.pk)), 1)
+        turno.refresh_from_db()
+        self.assertEqual(turno.ocupados, 2)
+
+    def test_mover_reserva_de_turno(self):
+        lleno, destino = self._turno(3), self._turno(3, horas=4)
+        reserva = self._reservar(lleno, 3)
+        self._reservar(destino, 1)
+
+        self.assertEqual(ReservaService.verificar_aforo(str(destino.id), 2, 'CONFIRMADA', instance=reserva), destino)
+        with self.assertRaises(ValidationError):
+            ReservaService.verificar_aforo(destino.id, 3, 'CONFIRMADA', instance=reserva)
+        with self.assertRaises(ValidationError):
+            ReservaService.verificar_aforo('no-es-id', 1, 'CONFIRMADA', instance=reserva)
+
+        reserva.turno, reserva.cupos = destino, 2
+        reserva.save()
+        lleno.refresh_from_db()
+        destino.refresh_from_db()
+        self.assertEqual((lleno.ocupados, destino.ocupados), (0, 3))
+
+    def test_capacidad_no_baja_de_los_ocupados(self):
+        turno = self._turno(5)
+        self._reservar(turno, 3)
+        with self.assertRaises(IntegrityError) as error, transaction.atomic():
+            TurnoArea.objects.filter(pk=turno.pk).update(capacidad=2)
+        self.assertTrue(ReservaService.es_capacidad(error.exception))
+        # Una reserva que no pasa por verificar_aforo tampoco puede sobrevender
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._reservar(turno, 3)
+
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        url = reverse('turnoarea-detail', args=[turno.pk])
+        respuesta = cliente.patch(url, {'capacidad': 2}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('capacidad', respuesta.json())
+        self.assertEqual(cliente.patch(url, {'capacidad': 3}, format='json').status_code, 200)
+        turno.refresh_from_db()
+        self.assertEqual((turno.capacidad, turno.ocupados), (3, 3))
+
+
+class UnidadesTests(TestCase):
+    def setUp(self):
+        self.residente = _residente()
+        self.area = AreaComun.objects.create(
+            nombre='Churrasquera', tipo='UNIDADES', horario_inicio=time(8), horario_fin=time(22),
+        )
+        self.unidades = UnidadArea.objects.bulk_create([UnidadArea(area=self.area, nombre=f'U{i}') for i in range(3)])
+        self.hoy = timezone.localdate()
+
+    def _hora(self, dias, hora):
+        return timezone.make_aware(datetime.combine(self.hoy + timedelta(days=dias), time(hora)))
+
+    def _reservar(self, unidad, dias, desde, hasta, estado='CONFIRMADA'):
+        return ReservaArea.objects.create(
+            area=self.area, residente=self.residente, unidad=unidad, estado=estado,
+            fecha_inicio=self._hora(dias, desde), fecha_fin=self._hora(dias, hasta),
+        )
+
+    def test_disponibilidad_por_unidad(self):
+        for i in range(10):
+            self._reservar(self.unidades[i % 3], i, 10 + i % 4, 12 + i % 4)
+        self._reservar(self.unidades[0], 1, 8, 9, estado='CANCELADA')
+
+        unidades = ReservaService.disponibilidad(self.area, self.hoy, self.hoy + timedelta(days=9))
+        self.assertEqual([u['nombre'] for u in unidades], ['U0', 'U1', 'U2'])
+        for unidad in unidades:
+            reservas = ReservaArea.objects.filter(unidad_id=unidad['id'], estado__in=['PENDIENTE', 'CONFIRMADA'])
+            for libre in unidad['libres']:
+                self.assertLess(libre['inicio'], libre['fin'])
+                self.assertFalse(reservas.filter(fecha_inicio__lt=libre['fin'], fecha_fin__gt=libre['inicio']).exists())
+
+    def test_ventanas_recortadas_al_horario(self):
+        self._reservar(self.unidades[0], 0, 10, 12)
+        u0, u1, _ = ReservaService.disponibilidad(self.area, self.hoy, self.hoy)
+        self.assertEqual(
+            [(l['inicio'], l['fin']) for l in u0['libres']],
+            [(self._hora(0, 8), self._hora(0, 10)), (self._hora(0, 12), self._hora(0, 22))],
+        )
+        self.assertEqual([(l['inicio'], l['fin']) for l in u1['libres']], [(self._hora(0, 8), self._hora(0, 22))])
+
+    def test_restriccion_de_solape(self):
+        reserva = self._reservar(self.unidades[0], 0, 10, 12)
+        solapada = ReservaArea(
+            area=self.area, residente=self.residente, unidad=reserva.unidad,
+            fecha_inicio=self._hora(0, 11), fecha_fin=self._hora(0, 13),
+        )
+        with self.assertRaises(IntegrityError) as error, transaction.atomic():
+            solapada.save()
+        self.assertTrue(ReservaService.es_solape(error.exception))
+        # Contigua ([inicio, fin) no se toca), en otra unidad o cancelada: se acepta
+        self._reservar(self.unidades[0], 0, 12, 13)
+        self._reservar(self.unidades[1], 0, 11, 13)
+        solapada.estado = 'CANCELADA'
+        solapada.save()
+
+    def test_migracion_conserva_las_primeras_sin_solape(self):
+        migracion = importlib.import_module('areas.migrations.0015_reservaarea_reserva_sin_solape')
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {ReservaArea._meta.db_table} DROP CONSTRAINT {RESTRICCION_SOLAPE}')
+        # Cadena A-B-C: B choca con A y con C, pero A y C no se tocan
+        a = self._reservar(self.unidades[0], 0, 10, 12)
+        b = self._reservar(self.unidades[0], 0, 11, 14)
+        c = self._reservar(self.unidades[0], 0, 13, 15)
+        d = self._reservar(self.unidades[0], 0, 9, 16)
+        otra = self._reservar(self.unidades[1], 0, 11, 14)
+
+        migracion.cancelar_solapadas(apps, None)
+
+        estados = dict(ReservaArea.objects.values_list('id', 'estado'))
+        self.assertEqual(
+            [estados[r.id] for r in (a, b, c, d, otra)],
+            ['CONFIRMADA', 'CANCELADA', 'CONFIRMADA', 'CANCELADA', 'CONFIRMADA'],
+        )
+        self.assertIn(migracion.NOTA, ReservaArea.objects.get(pk=b.pk).notas)
+        avisos = Notificacion.objects.filter(residente=self.residente, titulo='Reserva cancelada')
+        self.assertEqual(sorted(n.datos_extra['reserva_id'] for n in avisos), [b.id, d.id])
+
+
+class CalendarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.residente = _residente()
+        self.area = AreaComun.objects.create(nombre='Piscina', tipo='AFORO')
+        self.desde, self.hasta = calendario.ventana(None, None)
+        inicio = self.desde + timedelta(days=1, hours=10)
+        self.turno = TurnoArea.objects.create(
+            area=self.area, fecha_inicio=inicio, fecha_fin=inicio + timedelta(hours=2), capacidad=10,
+        )
+
+    def _version(self):
+        return calendario.version(self.area, self.desde, self.hasta)
+
+    def test_reserva_sube_la_version_una_vez(self):
+        antes = self._version()
+        # El INSERT también actualiza `ocupados` del turno (trigger anidado): no cuenta dos veces
+        reserva = ReservaArea.objects.create(area=self.area, residente=self.residente, turno=self.turno, cupos=2)
+        self.assertEqual(self._version(), antes + 1)
+        reserva.estado = 'CANCELADA'
+        reserva.save()
+        self.assertEqual(self._version(), antes + 2)
+        # Cambios del área (nombre, texto de búsqueda de sus reservas) no tocan el calendario
+        self.area.nombre = 'Piscina techada'
+        self.area.save()
+        self.assertEqual(self._version(), antes + 2)
+
+    def test_solo_cambian_los_dias_tocados(self):
+        version = self._version()
+        fuera = self.hasta + timedelta(days=5)
+        TurnoArea.objects.create(area=self.area, fecha_inicio=fuera, fecha_fin=fuera + timedelta(hours=1), capacidad=1)
+        self.assertEqual(self._version(), version)
+        self.assertEqual(VersionCalendario.objects.filter(area=self.area).count(), 2)
+
+        antes = calendario.etag(self.area, self.desde, self.hasta, 'dia')
+        self.assertEqual(calendario.obtener(self.area, self.desde, self.hasta, 'dia')['dias'][0]['ocupados'], 0)
+        ReservaArea.objects.create(area=self.area, residente=self.residente, turno=self.turno, cupos=3)
+        despues = calendario.etag(self.area, self.desde, self.hasta, 'dia')
+        self.assertNotEqual(despues, antes)
+        self.assertEqual(calendario.obtener(self.area, self.desde, self.hasta, 'dia', despues)['dias'][0]['ocupados'], 3)
+
+    def test_ventana_invalida(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.residente.user)
+        url = reverse('areacomun-calendario', args=[self.area.pk])
+        self.assertEqual(cliente.get(url, {'desde': '2026-02-10', 'hasta': '2026-02-01'}).status_code, 400)
+        self.assertEqual(cliente.get(url, {'desde': 'mañana'}).status_code, 400)
+        self.assertEqual(cliente.get(url, {'hasta': '2026-13-01'}).status_code, 400)
+
+        respuesta = cliente.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(cliente.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
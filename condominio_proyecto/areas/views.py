@@ -1,5 +1,6 @@
-from datetime import datetime
-from django.db import models
+from datetime import date, datetime, timedelta
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -8,12 +9,19 @@ from .models import AreaComun, UnidadArea, TurnoArea, ReservaArea
 from .serializers import (
     AreaComunSerializer, UnidadAreaSerializer, TurnoAreaSerializer, ReservaAreaSerializer
 )
+from .services import ReservaService
+from . import calendario
+from accesos import busqueda
 from accesos.permissions import IsAdminUser, IsResidentePrincipal, IsFamilyMember
 
+# Días máximos por consulta de /areas/<id>/disponibilidad/ (una vista de mes cabe holgada)
+MAX_DIAS_DISPONIBILIDAD = 62
+
 
 class AreaComunViewSet(viewsets.ModelViewSet):
     queryset = AreaComun.objects.all()
     serializer_class = AreaComunSerializer
+    cursor_ordering = ('nombre', 'id')
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -38,56 +46,60 @@ class AreaComunViewSet(viewsets.ModelViewSet):
         Devuelve disponibilidad y reservas para el área indicada.
         - Para UNIDADES: lista de reservas por unidad con sus rangos de fechas
         - Para AFORO: lista de turnos con capacidad, ocupados y disponibles
-        Opcional: filtrar por rango ?desde=ISO&hasta=ISO
+        Rango ?desde=ISO&hasta=ISO; por defecto AREAS_CALENDARIO_DIAS días desde hoy.
+        Con ?agrupar=dia devuelve la ocupación por día en lugar de las filas.
+        Fechas inválidas o desde > hasta: 400.
+        Responde 304 si If-None-Match coincide con el ETag (ver areas/calendario.py).
         """
         try:
             area = AreaComun.objects.get(pk=pk)
         except AreaComun.DoesNotExist:
             return Response({'detail': 'Área no encontrada'}, status=status.HTTP_404_NOT_FOUND)
 
-        desde = request.query_params.get('desde')
-        hasta = request.query_params.get('hasta')
-        try:
-            desde_dt = datetime.fromisoformat(desde) if desde else None
-            hasta_dt = datetime.fromisoformat(hasta) if hasta else None
-        except Exception:
-            desde_dt = None
-            hasta_dt = None
+        agrupar = request.query_params.get('agrupar') or None
+        if agrupar and agrupar not in calendario.AGRUPACIONES:
+            return Response({'detail': 'agrupar inválido (use dia)'}, status=status.HTTP_400_BAD_REQUEST)
+        desde_dt, hasta_dt = calendario.ventana(request.query_params.get('desde'), request.query_params.get('hasta'))
+        etag = calendario.etag(area, desde_dt, hasta_dt, agrupar)
+        cabeceras = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        vistos = {e.strip() for e in request.headers.get('If-None-Match', '').split(',')}
+        if etag in vistos or f'W/{etag}' in vistos:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+        return Response(calendario.obtener(area, desde_dt, hasta_dt, agrupar, etag), headers=cabeceras)
 
-        if area.tipo == 'UNIDADES':
-            reservas = ReservaArea.objects.filter(area=area, estado__in=['PENDIENTE', 'CONFIRMADA'])
-            if desde_dt:
-                reservas = reservas.filter(fecha_fin__gte=desde_dt)
-            if hasta_dt:
-                reservas = reservas.filter(fecha_inicio__lte=hasta_dt)
-            data = []
-            for r in reservas.select_related('unidad', 'residente__user').all():
-                data.append({
-                    'id': r.id,
-                    'unidad_id': r.unidad_id,
-                    'unidad_nombre': getattr(r.unidad, 'nombre', None),
-                    'fecha_inicio': r.fecha_inicio,
-                    'fecha_fin': r.fecha_fin,
-                    'estado': r.estado,
-                    'creado_en': r.fecha_creacion,
-                    'residente': getattr(r.residente.user, 'get_full_name', lambda: None)(),
-                })
-            return Response({'tipo': 'UNIDADES', 'reservas': data})
-        else:
-            turnos = TurnoArea.objects.filter(area=area, activo=True)
-            if desde_dt:
-                turnos = turnos.filter(fecha_fin__gte=desde_dt)
-            if hasta_dt:
-                turnos = turnos.filter(fecha_inicio__lte=hasta_dt)
-            # incluir ocupados/disponibles
-            from .serializers import TurnoAreaSerializer
-            ser = TurnoAreaSerializer(turnos, many=True)
-            return Response({'tipo': 'AFORO', 'turnos': ser.data})
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def disponibilidad(self, request, pk=None):
+        """
+        Ventanas libres por unidad (solo áreas UNIDADES), recortadas al horario del área.
+        ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD (inclusive; por defecto los próximos 7 días,
+        máximo MAX_DIAS_DISPONIBILIDAD).
+        """
+        try:
+            area = AreaComun.objects.get(pk=pk)
+        except AreaComun.DoesNotExist:
+            return Response({'detail': 'Área no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+        if area.tipo != 'UNIDADES':
+            return Response({'detail': 'Solo para áreas por unidades'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            desde = date.fromisoformat(request.query_params['desde']) if request.query_params.get('desde') else timezone.localdate()
+            hasta = date.fromisoformat(request.query_params['hasta']) if request.query_params.get('hasta') else desde + timedelta(days=6)
+        except ValueError:
+            return Response({'detail': 'Fechas inválidas, use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if hasta < desde or (hasta - desde).days >= MAX_DIAS_DISPONIBILIDAD:
+            return Response(
+                {'detail': f'Rango inválido (máximo {MAX_DIAS_DISPONIBILIDAD} días)'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({
+            'area': area.id, 'desde': desde, 'hasta': hasta,
+            'horario_inicio': area.horario_inicio, 'horario_fin': area.horario_fin,
+            'unidades': ReservaService.disponibilidad(area, desde, hasta),
+        })
 
 
 class UnidadAreaViewSet(viewsets.ModelViewSet):
     queryset = UnidadArea.objects.all()
     serializer_class = UnidadAreaSerializer
+    cursor_ordering = ('nombre', 'id')
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -110,6 +122,7 @@ class UnidadAreaViewSet(viewsets.ModelViewSet):
 class TurnoAreaViewSet(viewsets.ModelViewSet):
     queryset = TurnoArea.objects.all()
     serializer_class = TurnoAreaSerializer
+    cursor_ordering = ('fecha_inicio', 'id')
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -137,10 +150,25 @@ class TurnoAreaViewSet(viewsets.ModelViewSet):
             pass
         return qs
 
+    def perform_update(self, serializer):
+        # Bloquea el turno hasta el commit: ninguna reserva entra entre la verificación y el guardado
+        try:
+            with transaction.atomic():
+                capacidad = serializer.validated_data.get('capacidad')
+                if capacidad is not None:
+                    ReservaService.verificar_capacidad(serializer.instance, capacidad)
+                serializer.save()
+        except IntegrityError as e:
+            if not ReservaService.es_capacidad(e):
+                raise
+            from rest_framework.exceptions import ValidationError
+            raise ValidationError({'capacidad': 'La capacidad no puede ser menor que los cupos reservados'})
+
 
 class ReservaAreaViewSet(viewsets.ModelViewSet):
     queryset = ReservaArea.objects.all()
     serializer_class = ReservaAreaSerializer
+    cursor_ordering = ('-fecha_creacion', '-id')
 
     def get_permissions(self):
         if self.action in ['destroy']:
@@ -191,16 +219,7 @@ class ReservaAreaViewSet(viewsets.ModelViewSet):
             qs = qs.filter(models.Q(fecha_inicio__lte=hasta_dt) | models.Q(turno__fecha_inicio__lte=hasta_dt))
         q = params.get('q')
         if q:
-            qs = qs.filter(
-                models.Q(residente__user__first_name__icontains=q) |
-                models.Q(residente__user__last_name__icontains=q) |
-                models.Q(residente__user__username__icontains=q) |
-                models.Q(residente__user__email__icontains=q) |
-                models.Q(familia__nombre__icontains=q) |
-                models.Q(area__nombre__icontains=q) |
-                models.Q(unidad__nombre__icontains=q) |
-                models.Q(turno__titulo__icontains=q)
-            )
+            qs = busqueda.buscar(qs, q)
     # optimizacion
         qs = qs.select_related('residente__user', 'familia', 'area', 'unidad', 'turno')
         return qs
@@ -227,46 +246,30 @@ class ReservaAreaViewSet(viewsets.ModelViewSet):
             if not fi or not ff:
                 from rest_framework.exceptions import ValidationError
                 raise ValidationError({'fecha_inicio/fin': 'Requeridos para áreas por unidades'})
-            solapes = ReservaArea.objects.filter(
-                area=area, unidad_id=unidad_id, estado__in=['PENDIENTE', 'CONFIRMADA']
-            )
-            if instance:
-                solapes = solapes.exclude(pk=instance.pk)
             try:
                 fi_dt = datetime.fromisoformat(fi) if isinstance(fi, str) else fi
                 ff_dt = datetime.fromisoformat(ff) if isinstance(ff, str) else ff
+                if timezone.is_naive(fi_dt):
+                    fi_dt = timezone.make_aware(fi_dt)
+                if timezone.is_naive(ff_dt):
+                    ff_dt = timezone.make_aware(ff_dt)
             except Exception:
                 from rest_framework.exceptions import ValidationError
                 raise ValidationError({'fecha_inicio/fin': 'Formato inválido, use ISO 8601'})
-            solapes = solapes.filter(
-                models.Q(fecha_inicio__lt=ff_dt) & models.Q(fecha_fin__gt=fi_dt)
-            )
-            if solapes.exists():
+            if ff_dt <= fi_dt:
                 from rest_framework.exceptions import ValidationError
-                raise ValidationError({'solapado': 'Ya existe una reserva en ese rango'})
+                raise ValidationError({'fecha_inicio/fin': 'fecha_fin debe ser posterior a fecha_inicio'})
+            # Los solapes los rechaza la restricción reserva_sin_solape al guardar (ver _guardar)
         else:
             turno_id = data.get('turno') or getattr(instance, 'turno_id', None)
             cupos = int(data.get('cupos', getattr(instance, 'cupos', 1)))
             if not turno_id:
                 from rest_framework.exceptions import ValidationError
                 raise ValidationError({'turno': 'Requerido para áreas por aforo'})
-            from .models import TurnoArea
-            try:
-                turno = TurnoArea.objects.get(pk=turno_id, activo=True)
-            except TurnoArea.DoesNotExist:
-                from rest_framework.exceptions import ValidationError
-                raise ValidationError({'turno': 'No existe o inactivo'})
-            usados_qs = ReservaArea.objects.filter(area=area, turno=turno, estado__in=['PENDIENTE', 'CONFIRMADA'])
-            # excluir la propia reserva en actualizacion para no contar doble
-            if instance:
-                usados_qs = usados_qs.exclude(pk=instance.pk)
-            usados = usados_qs.aggregate(total=models.Sum('cupos'))['total'] or 0
             # si el nuevo estado es CANCELADA, no aporta cupos
             nuevo_estado = data.get('estado', getattr(instance, 'estado', 'CONFIRMADA'))
-            aporte = cupos if nuevo_estado in ['PENDIENTE', 'CONFIRMADA'] else 0
-            if usados + aporte > turno.capacidad:
-                from rest_framework.exceptions import ValidationError
-                raise ValidationError({'cupos': 'Capacidad del turno excedida'})
+            # Bloquea el turno hasta el commit del guardado (perform_create/perform_update)
+            ReservaService.verificar_aforo(turno_id, cupos, nuevo_estado, instance=instance)
 
     def perform_create(self, serializer):
         try:
@@ -283,8 +286,7 @@ class ReservaAreaViewSet(viewsets.ModelViewSet):
         for k, v in list(data.items()):
             if isinstance(v, list) and len(v) == 1:
                 data[k] = v[0]
-        self._validate_and_normalize(data)
-        serializer.save(residente=residente, familia=residente.familia)
+        self._guardar(serializer, data, residente=residente, familia=residente.familia)
 
     def perform_update(self, serializer):
         instance = self.get_object()
@@ -302,5 +304,19 @@ class ReservaAreaViewSet(viewsets.ModelViewSet):
         for k, v in list(data.items()):
             if isinstance(v, list) and len(v) == 1:
                 data[k] = v[0]
-        self._validate_and_normalize(data, instance=instance)
-        serializer.save()
+        self._guardar(serializer, data, instance=instance)
+
+    def _guardar(self, serializer, data, instance=None, **extra):
+        # Validación y guardado en una transacción: el bloqueo del turno (AFORO) dura
+        # hasta el commit y el INSERT/UPDATE verifica el solape de unidades en la base
+        try:
+            with transaction.atomic():
+                self._validate_and_normalize(data, instance=instance)
+                serializer.save(**extra)
+        except IntegrityError as e:
+            from rest_framework.exceptions import ValidationError
+            if ReservaService.es_capacidad(e):
+                raise ValidationError({'cupos': 'Capacidad del turno excedida'})
+            if not ReservaService.es_solape(e):
+                raise
+            raise ValidationError({'solapado': 'Ya existe una reserva en ese rango'})
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'condominio_BackendAPI.settings')
 
 application = get_asgi_application()
+
+# Solo el servidor que atiende los streams exige el broker; manage.py no pasa por aca
+from condominio_BackendAPI.eventos import comprobar_configuracion  # noqa: E402
+
+comprobar_configuracion()
@@ -0,0 +1,293 @@
+"""Eventos en tiempo real (Server-Sent Events sobre ASGI).
+
+Los productores llaman a ``publicar(canal, tipo, datos)``; el evento se
+entrega al confirmarse la transacción. Cada proceso tiene un ``Bus`` en
+memoria: un buffer circular con los últimos ``EVENTOS_BUFFER`` eventos (para
+retomar con ``Last-Event-ID``) y las suscripciones abiertas, cada una con su
+cola asyncio y un filtro.
+
+Con varios procesos/instancias, ``EVENTOS_BROKER = 'postgres'`` publica con
+``pg_notify`` y cada proceso escucha con ``LISTEN`` y reparte a su bus; sin
+broker el bus local hace de broker (solo desarrollo: con DEBUG=False el
+arranque falla sin broker, ver ``comprobar_configuracion``). El broker es
+intercambiable: basta con ``enviar(eventos)`` y ``escuchar(bus)``.
+
+Los canales son cadenas: ``residente:<id>``, ``usuario:<id>``, ``difusiones``,
+``staff``. La vista que atiende el stream está en ``notificaciones.views.stream_eventos``
+y necesita el servidor ASGI (uvicorn); bajo WSGI el stream no termina.
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+CANAL_PG = 'condominio_eventos'
+# pg_notify acepta hasta 8000 bytes de payload
+MAX_PAYLOAD = 7900
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+class Suscripcion:
+    def __init__(self, canales, filtro, loop, maximo):
+        self.canales = frozenset(canales)
+        self.filtro = filtro
+        self.loop = loop
+        self.cola = asyncio.Queue(maxsize=maximo)
+        # Cliente demasiado lento: se corta y vuelve a conectar con Last-Event-ID
+        self.desbordada = False
+
+    def acepta(self, evento):
+        return evento['canal'] in self.canales and (self.filtro is None or self.filtro(evento))
+
+    def _encolar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.desbordada = True
+
+
+class Bus:
+    """Pub/sub en memoria de un proceso. `entregar` es seguro desde cualquier hilo."""
+
+    def __init__(self, tamano=1000, cola=500):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=tamano)
+        self._suscripciones = set()
+        self._cola = cola
+
+    def entregar(self, evento):
+        with self._lock:
+            self._buffer.append(evento)
+            suscripciones = [s for s in self._suscripciones if s.acepta(evento)]
+        for s in suscripciones:
+            try:
+                s.loop.call_soon_threadsafe(s._encolar, evento)
+            except RuntimeError:
+                # Loop cerrado: la suscripción ya no tiene quien la lea
+                self.desuscribir(s)
+
+    def suscribir(self, canales, filtro=None, ultimo_id=None):
+        """Devuelve (suscripcion, pendientes, completo).
+
+        `pendientes` son los eventos del buffer posteriores a `ultimo_id` que
+        acepta la suscripción; `completo` es False si `ultimo_id` ya no está en
+        el buffer (el cliente perdió eventos y debe recargar por REST). El
+        registro y la copia del buffer se hacen bajo el mismo lock: no hay
+        huecos ni duplicados entre lo repetido y lo que llega en vivo.
+        """
+        suscripcion = Suscripcion(canales, filtro, asyncio.get_running_loop(), self._cola)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if not ultimo_id:
+                return suscripcion, [], True
+            eventos = list(self._buffer)
+        ids = [e['id'] for e in eventos]
+        if ultimo_id not in ids:
+            return suscripcion, [], False
+        posteriores = eventos[ids.index(ultimo_id) + 1:]
+        return suscripcion, [e for e in posteriores if suscripcion.acepta(e)], True
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+
+class BrokerPostgres:
+    """Reparte los eventos entre procesos con LISTEN/NOTIFY de la base principal.
+
+    Cada aviso lleva una lista de eventos: los publicados juntos
+    (``publicar_varios``) viajan en un solo ``pg_notify`` mientras entren en
+    ``MAX_PAYLOAD``.
+    """
+
+    def enviar(self, eventos):
+        paquete, tamano = [], 2
+        for evento in eventos:
+            texto = json.dumps(evento)
+            largo = len(texto.encode()) + 1
+            if largo + 2 > MAX_PAYLOAD:
+                logger.warning('Evento %s demasiado grande para pg_notify; se descarta', evento['tipo'])
+                continue
+            if paquete and tamano + largo > MAX_PAYLOAD:
+                self._notificar(paquete)
+                paquete, tamano = [], 2
+            paquete.append(texto)
+            tamano += largo
+        if paquete:
+            self._notificar(paquete)
+
+    def _notificar(self, textos):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CANAL_PG, f"[{','.join(textos)}]"])
+
+    async def escuchar(self, bus):
+        import psycopg
+        db = settings.DATABASES['default']
+        parametros = {
+            'dbname': db['NAME'], 'user': db.get('USER'), 'password': db.get('PASSWORD'),
+            'host': db.get('HOST') or None, 'port': db.get('PORT') or None,
+        }
+        while True:
+            try:
+                conexion = await psycopg.AsyncConnection.connect(autocommit=True, **parametros)
+                async with conexion:
+                    await conexion.execute(f'LISTEN {CANAL_PG}')
+                    async for aviso in conexion.notifies():
+                        recibido = json.loads(aviso.payload)
+                        # Un aviso de un proceso sin actualizar trae un solo evento
+                        for evento in recibido if isinstance(recibido, list) else [recibido]:
+                            bus.entregar(evento)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('LISTEN %s interrumpido; reintentando', CANAL_PG)
+                await asyncio.sleep(2)
+
+
+BROKERS = ('postgres',)
+
+_bus = None
+_broker = None
+_escucha = None
+_lock = threading.Lock()
+
+
+def bus():
+    global _bus
+    with _lock:
+        if _bus is None:
+            _bus = Bus(_config('EVENTOS_BUFFER', 1000), _config('EVENTOS_COLA', 500))
+        return _bus
+
+
+def broker():
+    """Broker compartido configurado, o None para entregar solo en este proceso."""
+    global _broker
+    nombre = _config('EVENTOS_BROKER', '')
+    if not nombre:
+        return None
+    with _lock:
+        if _broker is None:
+            if nombre not in BROKERS:
+                raise ImproperlyConfigured(f'EVENTOS_BROKER desconocido: {nombre}')
+            _broker = BrokerPostgres()
+        return _broker
+
+
+def comprobar_configuracion():
+    """Falla al arrancar si la configuración de eventos no sirve (se llama desde asgi.py).
+
+    Sin broker cada proceso entrega solo sus propios eventos: con varias
+    instancias los clientes los pierden sin ningún error, así que fuera de
+    DEBUG el broker es obligatorio. Solo lo exige el servidor ASGI, que es el
+    que atiende los streams: los comandos de gestión (migrate, collectstatic en
+    el build) no lo necesitan.
+    """
+    nombre = _config('EVENTOS_BROKER', '')
+    if nombre and nombre not in BROKERS:
+        raise ImproperlyConfigured(f'EVENTOS_BROKER desconocido: {nombre}')
+    if not nombre and not settings.DEBUG:
+        raise ImproperlyConfigured(
+            'EVENTOS_BROKER=postgres es obligatorio con DEBUG=False: sin broker los eventos '
+            'no llegan a los clientes conectados a otros procesos o instancias.'
+        )
+
+
+def asegurar_escucha():
+    """Arranca (una vez por proceso) la tarea que trae los eventos del broker al bus local."""
+    global _escucha
+    compartido = broker()
+    if compartido is None:
+        return
+    with _lock:
+        if _escucha is None or _escucha.done():
+            _escucha = asyncio.get_running_loop().create_task(compartido.escuchar(bus()))
+
+
+def _enviar(eventos):
+    compartido = broker()
+    if compartido is None:
+        for evento in eventos:
+            bus().entregar(evento)
+        return
+    try:
+        compartido.enviar(eventos)
+    except Exception:
+        # Un fallo del canal en tiempo real no debe romper la operación que lo originó
+        logger.exception('No se pudieron publicar los eventos %s', ', '.join(e['tipo'] for e in eventos))
+
+
+def crear_evento(canal, tipo, datos, audiencia=None):
+    """Arma un evento sin publicarlo (ver ``publicar_varios``).
+
+    `audiencia` viaja con el evento para los filtros de las suscripciones pero
+    no se envía a los clientes.
+    """
+    nuevo = {
+        'id': uuid.uuid4().hex,
+        'canal': canal,
+        'tipo': tipo,
+        'datos': json.loads(json.dumps(datos, cls=DjangoJSONEncoder)),
+    }
+    if audiencia is not None:
+        nuevo['audiencia'] = audiencia
+    return nuevo
+
+
+def publicar_varios(eventos):
+    """Publica los eventos, en orden, al confirmarse la transacción actual (o ya, en autocommit).
+
+    Con broker se envían juntos: un solo ``pg_notify`` en lugar de uno por evento.
+    """
+    eventos = list(eventos)
+    if eventos:
+        transaction.on_commit(lambda: _enviar(eventos))
+    return eventos
+
+
+def publicar(canal, tipo, datos, audiencia=None):
+    """Publica un evento al confirmarse la transacción actual (o ya, en autocommit)."""
+    (publicado,) = publicar_varios([crear_evento(canal, tipo, datos, audiencia)])
+    return publicado
+
+
+def formatear(evento):
+    """Evento en formato text/event-stream."""
+    datos = json.dumps(evento['datos'], ensure_ascii=False)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+async def flujo(suscripcion, pendientes, completo):
+    """Generador async del stream SSE de una suscripción; se desuscribe al cerrar."""
+    keepalive = _config('EVENTOS_KEEPALIVE', 20)
+    limite = _config('EVENTOS_MAX_SEGUNDOS', 240)
+    loop = asyncio.get_running_loop()
+    fin = loop.time() + limite
+    try:
+        yield f"retry: {_config('EVENTOS_RETRY_MS', 3000)}\n\n"
+        if not completo:
+            # Se perdieron eventos: el cliente debe recargar su estado por REST
+            yield 'event: reinicio\ndata: {}\n\n'
+        for evento in pendientes:
+            yield formatear(evento)
+        while loop.time() < fin and not suscripcion.desbordada:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            yield formatear(evento)
+    finally:
+        bus().desuscribir(suscripcion)
@@ -0,0 +1,113 @@
+"""Paginación por cursor (keyset), opcional.
+
+Solo se activa si el request trae ``?cursor=`` o ``?paginar=cursor``; sin esos
+parámetros los endpoints siguen devolviendo la lista completa, como antes
+(salvo ``CursorOpcional(..., siempre=True)``, que pagina siempre; lo usan las
+fuentes con ``paginar_siempre``).
+
+Cada vista declara su orden natural en ``cursor_ordering`` (por ejemplo
+``('-fecha_hora', '-id')``); los resultados de una búsqueda por similitud se
+paginan por ``('-similitud', 'pk')``. El cursor codifica la posición del último
+elemento entregado, así que pedir la página N cuesta lo mismo que la primera
+(``WHERE campo < posicion ORDER BY ... LIMIT n``, sin OFFSET) y los cursores
+siguen siendo válidos aunque se inserten filas nuevas.
+
+``responder`` también acepta fuentes que no son querysets pero exponen
+``pagina(posicion, n)`` y ``posicion(obj)`` (p. ej.
+``accesos.archivo.AccesosConArchivo`` o ``notificaciones.difusiones.Feed``):
+el cursor es entonces la posición (fecha, clave) del último elemento y solo se
+avanza hacia adelante (``previous`` es null). Las fuentes con
+``paginar_siempre`` (el archivo de accesos) se paginan aunque no se pida: no
+se cargan enteras en memoria.
+"""
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorOpcional(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-pk',)
+
+    def __init__(self, ordering=None, siempre=False):
+        if ordering:
+            self.ordering = ordering
+        # Fuentes que no conviene cargar enteras (p. ej. el archivo de accesos): paginar aunque no se pida
+        self.siempre = siempre
+
+    def activa(self, request):
+        params = request.query_params
+        return self.siempre or self.cursor_query_param in params or params.get('paginar') == 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.activa(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        # Búsqueda por similitud (accesos.busqueda.buscar): el puntaje encabeza el
+        # orden y es la clave del cursor, así paginar no pierde el ranking
+        if 'similitud' in queryset.query.annotations:
+            return ('-similitud', 'pk')
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+
+def responder(request, queryset, serializar, ordering):
+    """Para vistas de función: pagina por cursor si se pidió, si no devuelve todo.
+
+    `serializar` recibe la lista/queryset a serializar y devuelve los datos.
+    """
+    if hasattr(queryset, 'pagina'):
+        return _responder_fuente(request, queryset, serializar)
+    paginador = CursorOpcional(ordering)
+    pagina = paginador.paginate_queryset(queryset, request)
+    if pagina is None:
+        return Response(serializar(queryset))
+    return paginador.get_paginated_response(serializar(pagina))
+
+
+def _codificar_posicion(posicion):
+    fecha, clave = posicion
+    return b64encode(json.dumps([fecha.isoformat(), clave]).encode()).decode('ascii')
+
+
+def _decodificar_posicion(cursor):
+    try:
+        fecha, clave = json.loads(b64decode(cursor.encode('ascii')))
+        if not isinstance(clave, (int, str)):
+            raise ValueError(clave)
+        return datetime.fromisoformat(fecha), clave
+    except (TypeError, ValueError, UnicodeError):
+        raise NotFound(CursorPagination.invalid_cursor_message)
+
+
+def _responder_fuente(request, fuente, serializar):
+    paginador = CursorOpcional(siempre=getattr(fuente, 'paginar_siempre', False))
+    if not paginador.activa(request):
+        return Response(serializar(list(fuente)))
+    cursor = request.query_params.get(paginador.cursor_query_param)
+    posicion = _decodificar_posicion(cursor) if cursor else None
+    n = paginador.get_page_size(request)
+    try:
+        filas = fuente.pagina(posicion, n + 1)
+    except (TypeError, ValueError):
+        # Clave de otra fuente (cursor manipulado o de otro endpoint)
+        raise NotFound(CursorPagination.invalid_cursor_message)
+    siguiente = None
+    if len(filas) > n:
+        filas = filas[:n]
+        siguiente = replace_query_param(
+            request.build_absolute_uri(), paginador.cursor_query_param, _codificar_posicion(fuente.posicion(filas[-1])),
+        )
+    return Response(OrderedDict([('next', siguiente), ('previous', None), ('results', serializar(filas))]))
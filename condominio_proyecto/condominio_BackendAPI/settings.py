@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -34,6 +35,76 @@ SECRET_KEY = os.environ.get("SECRET_KEY")
 if not SECRET_KEY:
     SECRET_KEY = 'django-insecure-dev-key-fallback'
 
+# Clave para firmar los tokens QR de visitas (accesos.qr_tokens).
+# Los dispositivos de porteria que validan offline deben compartir esta clave.
+QR_SIGNING_KEY = os.environ.get("QR_SIGNING_KEY", SECRET_KEY)
+# Maximo de escaneos aceptados por llamada a /api/ia/qr/validar-lote/
+QR_LOTE_MAX_EVENTOS = int(os.environ.get("QR_LOTE_MAX_EVENTOS", "500"))
+# Ventana offline de los controladores: un timestamp de escaneo mas viejo (o futuro)
+# se reemplaza por la hora del servidor al procesar el lote
+QR_LOTE_VENTANA_OFFLINE_MINUTOS = int(os.environ.get("QR_LOTE_VENTANA_OFFLINE_MINUTOS", "1440"))
+# Maximo de invitados por llamada a /api/autorizaciones/generar-qr-lote/
+QR_LOTE_MAX_INVITADOS = int(os.environ.get("QR_LOTE_MAX_INVITADOS", "200"))
+# Segundos que se sirve el snapshot del dashboard de Admin desde la cache
+DASHBOARD_CACHE_TTL = int(os.environ.get("DASHBOARD_CACHE_TTL", "15"))
+# Filas maximas en reportes ?format=pdf (CSV/NDJSON no tienen limite)
+REPORTES_PDF_MAX_FILAS = int(os.environ.get("REPORTES_PDF_MAX_FILAS", "20000"))
+# Trabajos de reportes: hilos por proceso (0 = solo el comando procesar_trabajos_reporte),
+# vigencia de los archivos y tiempo tras el cual un trabajo EN_PROCESO se considera abandonado.
+# Los hilos siguen trabajando despues de responder: en Cloud Run el servicio debe
+# desplegarse con CPU siempre asignada (--no-cpu-throttling, ver deploy.yml) o
+# con REPORTES_TRABAJOS_HILOS=0 y el comando como Cloud Run job
+REPORTES_TRABAJOS_HILOS = int(os.environ.get("REPORTES_TRABAJOS_HILOS", "2"))
+REPORTES_TRABAJOS_TTL = int(os.environ.get("REPORTES_TRABAJOS_TTL", "3600"))
+REPORTES_TRABAJOS_TIMEOUT = int(os.environ.get("REPORTES_TRABAJOS_TIMEOUT", "1800"))
+# Particiones mensuales de RegistroAcceso (manage.py mantener_particiones): meses futuros
+# creados por adelantado y meses completos conservados (vacio = sin limite)
+ACCESOS_PARTICIONES_ADELANTE = int(os.environ.get("ACCESOS_PARTICIONES_ADELANTE", "3"))
+ACCESOS_RETENCION_MESES = int(os.environ.get("ACCESOS_RETENCION_MESES") or 0) or None
+# Archivo frio de RegistroAcceso (manage.py archivar_accesos): dias que quedan en la tabla
+# (0 = desactivado). Debe ser menor que la retencion de particiones. Los archivos van al
+# almacenamiento 'archivo_accesos' (STORAGES): en Cloud Run activarlo solo con GS_BUCKET_NAME
+ACCESOS_ARCHIVO_DIAS = int(os.environ.get("ACCESOS_ARCHIVO_DIAS", "0"))
+# Retencion de notificaciones por tipo (manage.py aplicar_retencion_notificaciones):
+# dias de vida y si solo se borran las ya leidas. Tipos ausentes no se borran nunca.
+# NOTIFICACIONES_RETENCION en el entorno (JSON) reemplaza la tabla completa
+NOTIFICACIONES_RETENCION = json.loads(os.environ.get("NOTIFICACIONES_RETENCION") or "null") or {
+    'ACCESO_DENEGADO': {'dias': 30},
+    'AUTORIZACION_VENCIDA': {'dias': 30},
+    'AUTORIZACION_CREADA': {'dias': 90, 'solo_leidas': True},
+    'AUTORIZACION_EXTENDIDA': {'dias': 90, 'solo_leidas': True},
+    'AUTORIZACION_UTILIZADA': {'dias': 90, 'solo_leidas': True},
+    'ACTIVIDAD': {'dias': 180, 'solo_leidas': True},
+    'AVISO': {'dias': 365, 'solo_leidas': True},
+    'EMERGENCIA': {'dias': 365, 'solo_leidas': True},
+    'MULTA': {'dias': 1825, 'solo_leidas': True},
+}
+# Filas por lote, pausa entre lotes (s) y directorio donde se guardan (NDJSON gzip) las
+# notificaciones borradas; vacio = borrar sin archivar
+NOTIFICACIONES_RETENCION_LOTE = int(os.environ.get("NOTIFICACIONES_RETENCION_LOTE", "500"))
+NOTIFICACIONES_RETENCION_PAUSA = float(os.environ.get("NOTIFICACIONES_RETENCION_PAUSA", "0.2"))
+NOTIFICACIONES_ARCHIVO_DIR = os.environ.get("NOTIFICACIONES_ARCHIVO_DIR") or None
+# Calendario de areas (/api/areas/<id>/calendario/): dias de la ventana por defecto,
+# maximo de dias por consulta y segundos en cache de cada respuesta (la version de los dias
+# de la ventana la invalida antes si cambian sus reservas o turnos)
+AREAS_CALENDARIO_DIAS = int(os.environ.get("AREAS_CALENDARIO_DIAS", "31"))
+AREAS_CALENDARIO_MAX_DIAS = int(os.environ.get("AREAS_CALENDARIO_MAX_DIAS", "366"))
+AREAS_CALENDARIO_CACHE_TTL = int(os.environ.get("AREAS_CALENDARIO_CACHE_TTL", "300"))
+# Eventos en tiempo real (/api/eventos/, condominio_BackendAPI/eventos.py). EVENTOS_BROKER=postgres
+# (LISTEN/NOTIFY) reparte los eventos entre procesos e instancias; vacio = solo en memoria, que
+# solo se admite con DEBUG (sin broker falla el arranque del servidor ASGI; manage.py no lo exige).
+# Eventos recientes guardados para retomar con Last-Event-ID, eventos en cola por cliente,
+# segundos entre keepalives y duracion maxima de una conexion (el cliente reconecta solo).
+# EVENTOS_MAX_SEGUNDOS debe quedar por debajo del timeout de request de Cloud Run (300 s
+# por defecto): si no, Cloud Run corta el stream con error en lugar de cerrarlo el servidor.
+EVENTOS_BROKER = os.environ.get("EVENTOS_BROKER", "")
+EVENTOS_BUFFER = int(os.environ.get("EVENTOS_BUFFER", "1000"))
+EVENTOS_COLA = int(os.environ.get("EVENTOS_COLA", "500"))
+EVENTOS_KEEPALIVE = int(os.environ.get("EVENTOS_KEEPALIVE", "20"))
+EVENTOS_MAX_SEGUNDOS = int(os.environ.get("EVENTOS_MAX_SEGUNDOS", "240"))
+# Segundos de validez del ticket de un solo uso para abrir el stream (?ticket=)
+EVENTOS_TICKET_SEGUNDOS = int(os.environ.get("EVENTOS_TICKET_SEGUNDOS", "30"))
+
 # SECURITY WARNING: don't run with debug turned on in production!
 # Debug is True if explicitly set OR if we are using the fallback key
 DEBUG = os.environ.get("DEBUG", "False") == "True" or SECRET_KEY == 'django-insecure-dev-key-fallback'
@@ -57,6 +128,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'coreapi',
@@ -104,7 +176,10 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    # Revalidacion del calendario de areas (ETag/304)
+    'if-none-match',
 ]
+CORS_EXPOSE_HEADERS = ['etag']
 
 # REST Framework configuration
 REST_FRAMEWORK = {
@@ -114,6 +189,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Opcional: solo pagina con ?cursor= o ?paginar=cursor (ver condominio_BackendAPI/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'condominio_BackendAPI.pagination.CursorOpcional',
 }
 
 # JWT Settings
@@ -218,6 +295,32 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Archivos generados (reportes). En Cloud Run el disco es efimero y de cada
+# instancia: con GS_BUCKET_NAME se guardan en Cloud Storage (django-storages) y
+# cualquier instancia puede servir la descarga
+GS_BUCKET_NAME = os.environ.get("GS_BUCKET_NAME", "")
+
+
+def _almacen(carpeta, directorio=None):
+    if GS_BUCKET_NAME:
+        return {
+            "BACKEND": "storages.backends.gcloud.GoogleCloudStorage",
+            "OPTIONS": {"bucket_name": GS_BUCKET_NAME, "location": carpeta},
+        }
+    return {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": directorio or MEDIA_ROOT / carpeta},
+    }
+
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "reportes": _almacen("reportes"),
+    # Sin bucket, ACCESOS_ARCHIVO_DIR permite apuntar a un disco persistente
+    "archivo_accesos": _almacen("archivo_accesos", os.environ.get("ACCESOS_ARCHIVO_DIR")),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -5,3 +5,7 @@ class NotificacionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notificaciones'
     verbose_name = 'Notificaciones'
+
+    def ready(self):
+        from .tiempo_real import conectar_senales
+        conectar_senales()
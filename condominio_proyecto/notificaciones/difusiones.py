@@ -0,0 +1,270 @@
+"""Envíos masivos con fan-out en lectura.
+
+Un envío (``crear``) guarda una sola fila ``Difusion`` con el mensaje, las
+reglas de audiencia y los ids de residentes y usuarios que esas reglas
+alcanzan en ese momento (``audiencia_residentes``/``audiencia_usuarios``),
+sin importar a cuántos destinatarios llegue. La bandeja de cada
+residente/admin se arma al leer: sus ``Notificacion`` personales más las
+difusiones cuya audiencia guardada lo incluye (``visibles``, sobre índices
+GIN), mezcladas por fecha en ``Feed``. El estado por destinatario
+(``EstadoDifusion``) solo se escribe cuando alguien lee o descarta una
+difusión.
+
+Como la audiencia se fija al enviar, igual que cuando se creaba una copia por
+destinatario, un residente que llega, cambia de familia o deja de ser
+principal después del envío no cambia quién lo recibió.
+
+En la bandeja las difusiones se exponen como notificaciones con id
+``b-<uuid>`` (ver ``como_notificacion``).
+"""
+import heapq
+import uuid
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from accesos.models import Residente
+from .models import Difusion, EstadoDifusion, MarcaLectura, Notificacion, ResumenDifusion
+
+PREFIJO = 'b-'
+
+
+def destinatario(user):
+    """Filtro del destinatario para `user`: {'residente': r} o {'usuario': user}."""
+    residente = getattr(user, 'residente', None)
+    if residente is not None:
+        return {'residente': residente}
+    return {'usuario': user}
+
+
+def id_difusion(valor):
+    """UUID de un id de bandeja ``b-<uuid>``; None si no es una difusión."""
+    if not isinstance(valor, str) or not valor.startswith(PREFIJO):
+        return None
+    try:
+        return uuid.UUID(valor[len(PREFIJO):])
+    except ValueError:
+        return None
+
+
+def _audiencia_residentes(difusion):
+    """Residentes que alcanzan las reglas de `difusion` (se evalúa al crearla)."""
+    condicion = Q(id__in=difusion.residentes)
+    registrados = Q(user__is_active=True, fecha_registro__lte=difusion.fecha_creacion)
+    if difusion.todos_residentes:
+        condicion |= registrados
+    elif difusion.familias:
+        condicion |= registrados & Q(familia_id__in=difusion.familias)
+    qs = Residente.objects.filter(condicion)
+    if difusion.solo_principales:
+        qs = qs.filter(tipo='PRINCIPAL')
+    return qs
+
+
+def _audiencia_usuarios(difusion):
+    """Usuarios (admins) que alcanzan las reglas de `difusion` (se evalúa al crearla)."""
+    condicion = Q(id__in=difusion.usuarios)
+    if difusion.incluir_admins:
+        condicion |= Q(is_staff=True, is_active=True, date_joined__lte=difusion.fecha_creacion)
+    return User.objects.filter(condicion)
+
+
+def destinatarios_residentes(difusion):
+    """Residentes que recibieron `difusion` (audiencia guardada al enviar)."""
+    return Residente.objects.filter(id__in=difusion.audiencia_residentes)
+
+
+def destinatarios_admins(difusion):
+    """Usuarios admin que recibieron `difusion` (audiencia guardada al enviar)."""
+    return User.objects.filter(id__in=difusion.audiencia_usuarios)
+
+
+def crear(tipo, mensaje, titulo='', datos_extra=None, todos_residentes=False, familias=(),
+          residentes=(), solo_principales=False, incluir_admins=False, enviado_por=None):
+    """Crea la difusión, con su audiencia resuelta, y su resumen (dos INSERT)."""
+    if residentes:
+        # Como antes: los residentes explícitos sin usuario activo no reciben el envío
+        residentes = Residente.objects.filter(id__in=residentes, user__is_active=True).values_list('id', flat=True)
+    difusion = Difusion(
+        tipo=tipo, titulo=titulo or '', mensaje=mensaje, datos_extra=datos_extra,
+        todos_residentes=todos_residentes, solo_principales=solo_principales, incluir_admins=incluir_admins,
+        familias=[] if todos_residentes else sorted(set(familias)), residentes=sorted(set(residentes)),
+        enviado_por=enviado_por, fecha_creacion=timezone.now(),
+    )
+    with transaction.atomic():
+        difusion.audiencia_residentes = list(_audiencia_residentes(difusion).order_by('id').values_list('id', flat=True))
+        difusion.audiencia_usuarios = list(_audiencia_usuarios(difusion).order_by('id').values_list('id', flat=True))
+        difusion.save()
+        difusion.resumen = ResumenDifusion.objects.create(
+            difusion=difusion, tipo=difusion.tipo, titulo=difusion.titulo, fecha_creacion=difusion.fecha_creacion,
+            total=len(difusion.audiencia_residentes) + len(difusion.audiencia_usuarios),
+        )
+    return difusion
+
+
+def alcance(residente=None, usuario=None):
+    """Difusiones cuya audiencia guardada incluye al destinatario (descartadas incluidas)."""
+    if residente is not None:
+        return Difusion.objects.filter(audiencia_residentes__contains=[residente.id])
+    return Difusion.objects.filter(audiencia_usuarios__contains=[usuario.id])
+
+
+def estados_de(residente=None, usuario=None):
+    """EstadoDifusion del destinatario para la difusión externa (OuterRef('pk'))."""
+    quien = {'residente': residente} if residente is not None else {'usuario': usuario}
+    return EstadoDifusion.objects.filter(difusion=OuterRef('pk'), **quien)
+
+
+def visibles(residente=None, usuario=None):
+    """Difusiones de la bandeja del destinatario, sin las descartadas, con `leida_en` anotado."""
+    qs = alcance(residente, usuario)
+    estados = estados_de(residente, usuario)
+    return qs.exclude(Exists(estados.filter(descartada_en__isnull=False))).annotate(
+        leida_en=Subquery(estados.values('leida_en')[:1]),
+    )
+
+
+def registrar(difusiones, campo, residente=None, usuario=None, ahora=None):
+    """Marca `campo` ('leida_en' o 'descartada_en') en las difusiones dadas; devuelve cuántas.
+
+    Un solo INSERT ... ON CONFLICT: crea el estado o actualiza el existente.
+    """
+    ahora = ahora or timezone.now()
+    ids = list(difusiones)
+    if not ids:
+        return 0
+    quien = 'residente' if residente is not None else 'usuario'
+    EstadoDifusion.objects.bulk_create(
+        [EstadoDifusion(difusion_id=pk, residente=residente, usuario=usuario, **{campo: ahora}) for pk in ids],
+        update_conflicts=True, unique_fields=[quien, 'difusion'], update_fields=[campo],
+    )
+    return len(ids)
+
+
+def leidas_por_marca(ids):
+    """{difusion_id: destinatarios cuya marca de "todo leído" cubre la difusión y no la leyeron una por una}.
+
+    Una consulta para todas las `ids`: cruza la audiencia guardada de cada
+    difusión con MarcaLectura (una fila por destinatario que alguna vez marcó
+    todo), así marcar todo no escribe nada por difusión. La audiencia se
+    despliega con unnest para que el cruce sea por igualdad (hash join por
+    destinatario y anti join por (difusión, destinatario)) y no un `= ANY`
+    evaluado marca por marca.
+    """
+    ids = list(ids)
+    if not ids:
+        return {}
+    partes = [
+        f"""
+        SELECT d.id AS difusion_id
+          FROM {Difusion._meta.db_table} d
+         CROSS JOIN LATERAL unnest(d.{audiencia}) AS a(destinatario_id)
+          JOIN {MarcaLectura._meta.db_table} m
+            ON m.{columna} = a.destinatario_id AND m.leidas_hasta >= d.fecha_creacion
+         WHERE d.id = ANY (%s)
+           AND NOT EXISTS (
+               SELECT 1 FROM {EstadoDifusion._meta.db_table} e
+                WHERE e.difusion_id = d.id AND e.{columna} = a.destinatario_id AND e.leida_en IS NOT NULL
+           )
+        """
+        for audiencia, columna in (('audiencia_residentes', 'residente_id'), ('audiencia_usuarios', 'usuario_id'))
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT difusion_id, count(*) FROM ({' UNION ALL '.join(partes)}) AS x GROUP BY difusion_id",
+            [ids, ids],
+        )
+        return dict(cursor.fetchall())
+
+
+def leidas(difusion):
+    """Destinatarios que leyeron `difusion`: una por una (EstadoDifusion) o con su marca de "todo leído"."""
+    return difusion.estados.filter(leida_en__isnull=False).count() + leidas_por_marca([difusion.id]).get(difusion.id, 0)
+
+
+def reconstruir_resumen(difusion):
+    """Recalcula el resumen de `difusion` desde su audiencia y sus lecturas individuales (reparación).
+
+    Bloquea la fila antes de contar: las lecturas concurrentes esperan y suman
+    su delta después, sobre un valor que no las incluía.
+    """
+    with transaction.atomic():
+        ResumenDifusion.objects.select_for_update().filter(difusion=difusion).first()
+        resumen, _ = ResumenDifusion.objects.update_or_create(difusion=difusion, defaults={
+            'tipo': difusion.tipo, 'titulo': difusion.titulo, 'fecha_creacion': difusion.fecha_creacion,
+            'total': len(difusion.audiencia_residentes) + len(difusion.audiencia_usuarios),
+            'leidas': difusion.estados.filter(leida_en__isnull=False).count(),
+        })
+    return resumen
+
+
+def como_notificacion(difusion, residente=None, usuario=None, leida_en=None):
+    """Notificacion (sin guardar) que representa `difusion` en la bandeja de un destinatario."""
+    if leida_en is None:
+        leida_en = getattr(difusion, 'leida_en', None)
+    notificacion = Notificacion(
+        broadcast_id=str(difusion.id), residente=residente, usuario=usuario,
+        tipo=difusion.tipo, titulo=difusion.titulo, mensaje=difusion.mensaje, datos_extra=difusion.datos_extra,
+        fecha_creacion=difusion.fecha_creacion, leida=leida_en is not None, fecha_lectura=leida_en,
+    )
+    notificacion.id_bandeja = f'{PREFIJO}{difusion.id}'
+    notificacion.clave_bandeja = f'b{difusion.id.hex}'
+    return notificacion
+
+
+def _clave(obj):
+    return obj.fecha_creacion, getattr(obj, 'clave_bandeja', None) or f'n{obj.id:019d}'
+
+
+class Feed:
+    """Bandeja de un destinatario: notificaciones personales y difusiones, más recientes primero.
+
+    Orden total por (fecha_creacion, clave), con clave ``n<id>`` para las
+    personales y ``b<uuid>`` para las difusiones; ``pagina``/``posicion`` lo
+    usan como cursor (ver ``condominio_BackendAPI.pagination.responder``).
+    `filtrar(qs)` aplica los mismos filtros a ambos querysets.
+    """
+
+    def __init__(self, residente=None, usuario=None, filtrar=None):
+        self.residente = residente
+        self.usuario = usuario
+        filtrar = filtrar or (lambda qs: qs)
+        quien = {'residente': residente} if residente is not None else {'usuario': usuario}
+        self.notificaciones = filtrar(Notificacion.objects.filter(**quien)).order_by('-fecha_creacion', '-id')
+        self.difusiones = filtrar(visibles(residente, usuario)).order_by('-fecha_creacion', '-id')
+
+    def _envolver(self, difusiones):
+        for difusion in difusiones:
+            yield como_notificacion(difusion, self.residente, self.usuario)
+
+    def _desde(self, antes_de):
+        notificaciones, difusiones = self.notificaciones, self.difusiones
+        if antes_de is None:
+            return notificaciones, difusiones
+        fecha, clave = antes_de
+        # En la misma fecha las personales ('n') van antes que las difusiones ('b')
+        if isinstance(clave, str) and clave.startswith('n'):
+            notificaciones = notificaciones.filter(Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=int(clave[1:])))
+            difusiones = difusiones.filter(fecha_creacion__lte=fecha)
+        else:
+            notificaciones = notificaciones.filter(fecha_creacion__lt=fecha)
+            difusiones = difusiones.filter(Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=uuid.UUID(clave[1:])))
+        return notificaciones, difusiones
+
+    def __iter__(self):
+        return heapq.merge(
+            self.notificaciones.iterator(), self._envolver(self.difusiones.iterator()), key=_clave, reverse=True,
+        )
+
+    def pagina(self, antes_de, n):
+        """Hasta `n` elementos posteriores a la posición `antes_de` (fecha_creacion, clave)."""
+        notificaciones, difusiones = self._desde(antes_de)
+        return list(islice(heapq.merge(
+            list(notificaciones[:n]), list(self._envolver(difusiones[:n])), key=_clave, reverse=True,
+        ), n))
+
+    def posicion(self, obj):
+        return _clave(obj)
@@ -0,0 +1,141 @@
+"""Estado de lectura por destinatario: marca de "todo leído" más excepciones.
+
+Cada residente/admin tiene a lo sumo una ``MarcaLectura``: todo lo creado hasta
+``leidas_hasta`` (notificaciones personales y difusiones) cuenta como leído.
+Lo posterior a la marca solo está leído si se marcó una por una: ``leida`` en
+``Notificacion`` y ``leida_en`` en ``EstadoDifusion`` son el conjunto de
+excepciones, que queda acotado a lo recibido desde la última vez que se marcó
+todo.
+
+- "Marcar todo como leído" escribe una sola fila (``marcar_todas``), sin
+  importar cuántas notificaciones o difusiones tenga el destinatario. Las
+  lecturas que la marca cubre en cada difusión se cuentan al leer el
+  historial (``difusiones.leidas_por_marca``).
+- Las no leídas (``no_leidas``) son un rango sobre los índices
+  ``notif_*_leida_idx`` (leida=False, fecha_creacion > marca) más las
+  difusiones posteriores a la marca.
+- El contador ``alertas_no_leidas`` del dashboard sigue la misma regla
+  (triggers de la migración 0008).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, Max, OuterRef, Q
+from django.utils import timezone
+
+from . import difusiones
+from .models import MarcaLectura, Notificacion
+
+
+def marca(residente=None, usuario=None):
+    """`leidas_hasta` del destinatario, o None si nunca marcó todo."""
+    quien = {'residente': residente} if residente is not None else {'usuario': usuario}
+    return MarcaLectura.objects.filter(**quien).values_list('leidas_hasta', flat=True).first()
+
+
+def ultima_recibida(residente=None, usuario=None, hasta=None):
+    """fecha_creacion más reciente entre las notificaciones y difusiones del destinatario (<= `hasta`)."""
+    quien = {'residente': residente} if residente is not None else {'usuario': usuario}
+    fuentes = [Notificacion.objects.filter(**quien), difusiones.alcance(residente, usuario)]
+    if hasta is not None:
+        fuentes = [qs.filter(fecha_creacion__lte=hasta) for qs in fuentes]
+    fechas = [qs.aggregate(ultima=Max('fecha_creacion'))['ultima'] for qs in fuentes]
+    return max((f for f in fechas if f is not None), default=None)
+
+
+def marcar_todas(residente=None, usuario=None, hasta=None):
+    """Marca como leído todo lo recibido: un UPDATE (o INSERT la primera vez) de una fila.
+
+    La marca queda en la fecha_creacion más reciente que el destinatario tiene
+    (``ultima_recibida``, leída en la misma transacción que la escribe), no en
+    la hora actual: lo que se confirme después con una fecha_creacion anterior
+    a este momento no queda marcado sin haberse mostrado. `hasta` acota lo que
+    se marca. Devuelve la marca resultante (None si no hay nada que marcar).
+    """
+    quien = {'residente': residente} if residente is not None else {'usuario': usuario}
+    with transaction.atomic():
+        anterior = MarcaLectura.objects.select_for_update().filter(**quien).values_list('leidas_hasta', flat=True).first()
+        nueva = ultima_recibida(residente, usuario, hasta)
+        # La marca nunca retrocede (los triggers del dashboard cuentan con eso)
+        if nueva is None or (anterior is not None and anterior >= nueva):
+            return anterior
+        if anterior is None:
+            try:
+                with transaction.atomic():
+                    MarcaLectura.objects.create(leidas_hasta=nueva, **quien)
+            except IntegrityError:
+                # Otra petición creó la marca entre el SELECT y el INSERT: repetir sobre esa fila
+                return marcar_todas(residente, usuario, hasta)
+        else:
+            MarcaLectura.objects.filter(**quien).update(leidas_hasta=nueva, actualizado=timezone.now())
+    return nueva
+
+
+def _posteriores(qs, desde):
+    return qs if desde is None else qs.filter(fecha_creacion__gt=desde)
+
+
+def pendientes(residente=None, usuario=None, desde=None):
+    """(notificaciones, difusiones) sin leer del destinatario, posteriores a la marca `desde`."""
+    quien = {'residente': residente} if residente is not None else {'usuario': usuario}
+    return (
+        _posteriores(Notificacion.objects.filter(leida=False, **quien), desde),
+        _posteriores(difusiones.visibles(residente, usuario).filter(leida_en__isnull=True), desde),
+    )
+
+
+def no_leidas(residente=None, usuario=None):
+    """Cantidad de notificaciones y difusiones sin leer del destinatario."""
+    notificaciones, difs = pendientes(residente, usuario, marca(residente, usuario))
+    return notificaciones.count() + difs.count()
+
+
+def marcar(ids_notificaciones, ids_difusiones, residente=None, usuario=None, ahora=None):
+    """Marca leídas individuales (excepciones); ignora lo ya cubierto por la marca. Devuelve cuántas."""
+    ahora = ahora or timezone.now()
+    notificaciones, difs = pendientes(residente, usuario, marca(residente, usuario))
+    with transaction.atomic():
+        marcadas = notificaciones.filter(id__in=ids_notificaciones).update(leida=True, fecha_lectura=ahora)
+        marcadas += difusiones.registrar(
+            difs.filter(pk__in=ids_difusiones).values_list('pk', flat=True), 'leida_en',
+            residente=residente, usuario=usuario, ahora=ahora,
+        )
+    return marcadas
+
+
+def _cubierta():
+    cubiertas = MarcaLectura.objects.filter(leidas_hasta__gte=OuterRef('fecha_creacion'))
+    return (
+        Exists(cubiertas.filter(residente=OuterRef('residente')))
+        | Exists(cubiertas.filter(usuario=OuterRef('usuario')))
+    )
+
+
+def sin_leer(qs):
+    """Filtra un queryset de Notificacion a las no leídas, teniendo en cuenta las marcas."""
+    return qs.filter(leida=False).exclude(_cubierta())
+
+
+def leidas(qs):
+    """Filtra un queryset de Notificacion a las leídas: una por una o cubiertas por la marca."""
+    return qs.filter(Q(leida=True) | _cubierta())
+
+
+def completar(notificaciones):
+    """Aplica las marcas de sus destinatarios a `leida`/`fecha_lectura` (una consulta)."""
+    notificaciones = list(notificaciones)
+    residentes = {n.residente_id for n in notificaciones if n.residente_id}
+    usuarios = {n.usuario_id for n in notificaciones if n.usuario_id}
+    if not residentes and not usuarios:
+        return notificaciones
+    por_residente, por_usuario = {}, {}
+    marcas = MarcaLectura.objects.filter(residente_id__in=residentes) | MarcaLectura.objects.filter(usuario_id__in=usuarios)
+    for residente_id, usuario_id, leidas_hasta in marcas.values_list('residente_id', 'usuario_id', 'leidas_hasta'):
+        if residente_id:
+            por_residente[residente_id] = leidas_hasta
+        if usuario_id:
+            por_usuario[usuario_id] = leidas_hasta
+    for n in notificaciones:
+        hasta = por_residente.get(n.residente_id) or por_usuario.get(n.usuario_id)
+        if not n.leida and hasta is not None and n.fecha_creacion <= hasta:
+            n.leida = True
+            n.fecha_lectura = hasta
+    return notificaciones
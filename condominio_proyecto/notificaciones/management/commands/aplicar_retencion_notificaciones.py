@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notificaciones import retencion
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra (o archiva y borra) notificaciones según NOTIFICACIONES_RETENCION, por tipo, en lotes '
+        'pequeños con pausa y retomando desde la última posición. Pensado para Cloud Scheduler/cron, '
+        'o en bucle con --intervalo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None, help='Filas por transacción')
+        parser.add_argument('--pausa', type=float, default=None, help='Segundos entre lotes')
+        parser.add_argument('--max-segundos', type=float, default=None,
+                            help='Cortar la corrida tras este tiempo; la siguiente retoma desde ahí')
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help='Segundos entre pasadas; 0 ejecuta una sola pasada')
+
+    def handle(self, *args, **opts):
+        while True:
+            totales = retencion.aplicar(
+                lote=opts['lote'], pausa=opts['pausa'], max_segundos=opts['max_segundos'],
+            )
+            for tipo, borradas in totales.items():
+                if borradas:
+                    self.stdout.write(f'{tipo}: {borradas}')
+            self.stdout.write(f'Notificaciones borradas: {sum(totales.values())}')
+            if opts['intervalo'] <= 0:
+                return
+            time.sleep(opts['intervalo'])
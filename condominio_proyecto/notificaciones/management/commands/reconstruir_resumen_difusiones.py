@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from notificaciones import difusiones
+from notificaciones.models import Difusion
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula ResumenDifusion (total de destinatarios y leídas una por una) desde la audiencia '
+        'guardada de cada difusión y sus EstadoDifusion. Los triggers lo mantienen al día; usar tras '
+        'restauraciones o si los totales del historial no cuadran.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', default=None, help='Solo difusiones creadas desde esta fecha (ISO)')
+
+    def handle(self, *args, **opts):
+        qs = Difusion.objects.order_by('fecha_creacion')
+        if opts['desde']:
+            qs = qs.filter(fecha_creacion__gte=opts['desde'])
+        total = 0
+        for difusion in qs.iterator():
+            difusiones.reconstruir_resumen(difusion)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes reconstruidos: {total}'))
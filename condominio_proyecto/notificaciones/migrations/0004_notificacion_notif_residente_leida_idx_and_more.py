@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:27
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transaccion
+    atomic = False
+
+    dependencies = [
+        ('accesos', '0019_autorizacionvisita_autorizacion_status_fin_idx_and_more'),
+        ('notificaciones', '0003_remove_notificacion_campania_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='notificacion',
+            index=models.Index(fields=['residente', 'leida', '-fecha_creacion'], name='notif_residente_leida_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', 'leida', '-fecha_creacion'], name='notif_usuario_leida_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transaccion
+    atomic = False
+
+    dependencies = [
+        ('notificaciones', '0004_notificacion_notif_residente_leida_idx_and_more'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='notificacion',
+            index=models.Index(fields=['tipo', 'fecha_creacion', 'id'], name='notif_tipo_fecha_idx'),
+        ),
+    ]
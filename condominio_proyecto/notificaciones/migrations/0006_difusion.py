@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:39
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0022_archivoaccesos'),
+        ('notificaciones', '0005_notificacion_notif_tipo_fecha_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Difusion',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('AUTORIZACION_CREADA', 'Nueva Autorización'), ('AUTORIZACION_EXTENDIDA', 'Autorización Extendida'), ('AUTORIZACION_VENCIDA', 'Autorización Vencida'), ('AUTORIZACION_UTILIZADA', 'Autorización Utilizada'), ('ACCESO_DENEGADO', 'Acceso Denegado'), ('EMERGENCIA', 'Emergencia'), ('MULTA', 'Multa'), ('ACTIVIDAD', 'Actividad'), ('AVISO', 'Aviso General')], max_length=50)),
+                ('titulo', models.CharField(blank=True, max_length=150)),
+                ('mensaje', models.TextField()),
+                ('datos_extra', models.JSONField(blank=True, null=True)),
+                ('todos_residentes', models.BooleanField(default=False)),
+                ('solo_principales', models.BooleanField(default=False)),
+                ('incluir_admins', models.BooleanField(default=False)),
+                ('familias', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None)),
+                ('residentes', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None)),
+                ('usuarios', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None)),
+                ('total_destinatarios', models.PositiveIntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('enviado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='difusiones_enviadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadoDifusion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leida_en', models.DateTimeField(blank=True, null=True)),
+                ('descartada_en', models.DateTimeField(blank=True, null=True)),
+                ('difusion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estados', to='notificaciones.difusion')),
+                ('residente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='estados_difusion', to='accesos.residente')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='estados_difusion', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='difusion',
+            index=models.Index(fields=['-fecha_creacion'], name='difusion_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='difusion',
+            index=models.Index(fields=['tipo', 'fecha_creacion'], name='difusion_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='difusion',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['familias'], name='difusion_familias_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='difusion',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['residentes'], name='difusion_residentes_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='difusion',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['usuarios'], name='difusion_usuarios_gin'),
+        ),
+        migrations.AddConstraint(
+            model_name='estadodifusion',
+            constraint=models.CheckConstraint(condition=models.Q(('residente__isnull', False), ('usuario__isnull', False), _connector='OR'), name='estado_difusion_destinatario_requerido'),
+        ),
+        migrations.AddConstraint(
+            model_name='estadodifusion',
+            constraint=models.UniqueConstraint(fields=('residente', 'difusion'), name='estado_difusion_residente_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='estadodifusion',
+            constraint=models.UniqueConstraint(fields=('usuario', 'difusion'), name='estado_difusion_usuario_uniq'),
+        ),
+    ]
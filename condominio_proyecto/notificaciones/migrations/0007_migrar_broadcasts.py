@@ -0,0 +1,102 @@
+# Convierte los envios masivos existentes (una Notificacion por destinatario con el
+# mismo broadcast_id) en una Difusion con audiencia explicita mas EstadoDifusion
+# para las copias ya leidas, y borra las copias.
+
+import uuid
+
+from django.db import migrations
+from django.db.models import Min
+
+LOTE = 1000
+
+
+def _uuid(valor):
+    try:
+        return uuid.UUID(str(valor))
+    except ValueError:
+        return uuid.uuid4()
+
+
+def migrar(apps, schema_editor):
+    Notificacion = apps.get_model('notificaciones', 'Notificacion')
+    Difusion = apps.get_model('notificaciones', 'Difusion')
+    EstadoDifusion = apps.get_model('notificaciones', 'EstadoDifusion')
+
+    grupos = (
+        Notificacion.objects.exclude(broadcast_id__isnull=True)
+        .values('broadcast_id').annotate(fecha=Min('fecha_creacion')).order_by('fecha')
+    )
+    for grupo in grupos.iterator():
+        copias = list(
+            Notificacion.objects.filter(broadcast_id=grupo['broadcast_id'])
+            .order_by('id').values('id', 'residente_id', 'usuario_id', 'tipo', 'titulo', 'mensaje',
+                                   'datos_extra', 'leida', 'fecha_lectura', 'fecha_creacion')
+        )
+        primera = copias[0]
+        difusion = Difusion.objects.create(
+            id=_uuid(grupo['broadcast_id']),
+            tipo=primera['tipo'], titulo=primera['titulo'] or '', mensaje=primera['mensaje'],
+            datos_extra=primera['datos_extra'],
+            residentes=sorted({c['residente_id'] for c in copias if c['residente_id']}),
+            usuarios=sorted({c['usuario_id'] for c in copias if c['usuario_id']}),
+            total_destinatarios=len(copias),
+        )
+        # auto_now_add pisa el valor al crear
+        Difusion.objects.filter(pk=difusion.pk).update(fecha_creacion=grupo['fecha'])
+        EstadoDifusion.objects.bulk_create([
+            EstadoDifusion(
+                difusion=difusion, residente_id=c['residente_id'], usuario_id=c['usuario_id'],
+                leida_en=c['fecha_lectura'] or c['fecha_creacion'],
+            )
+            for c in copias if c['leida']
+        ], batch_size=LOTE, ignore_conflicts=True)
+        ids = [c['id'] for c in copias]
+        for i in range(0, len(ids), LOTE):
+            Notificacion.objects.filter(id__in=ids[i:i + LOTE]).delete()
+
+
+def revertir(apps, schema_editor):
+    Notificacion = apps.get_model('notificaciones', 'Notificacion')
+    Difusion = apps.get_model('notificaciones', 'Difusion')
+    EstadoDifusion = apps.get_model('notificaciones', 'EstadoDifusion')
+    Residente = apps.get_model('accesos', 'Residente')
+    User = apps.get_model('auth', 'User')
+
+    for difusion in Difusion.objects.order_by('fecha_creacion').iterator():
+        residentes = Residente.objects.filter(id__in=difusion.residentes)
+        if difusion.todos_residentes:
+            residentes = residentes | Residente.objects.filter(user__is_active=True, fecha_registro__lte=difusion.fecha_creacion)
+        elif difusion.familias:
+            residentes = residentes | Residente.objects.filter(
+                familia_id__in=difusion.familias, user__is_active=True, fecha_registro__lte=difusion.fecha_creacion,
+            )
+        if difusion.solo_principales:
+            residentes = residentes.filter(tipo='PRINCIPAL')
+        usuarios = User.objects.filter(id__in=difusion.usuarios)
+        if difusion.incluir_admins:
+            usuarios = usuarios | User.objects.filter(is_staff=True, is_active=True, date_joined__lte=difusion.fecha_creacion)
+        leidas_r = dict(EstadoDifusion.objects.filter(difusion=difusion, residente__isnull=False, leida_en__isnull=False)
+                        .values_list('residente_id', 'leida_en'))
+        leidas_u = dict(EstadoDifusion.objects.filter(difusion=difusion, usuario__isnull=False, leida_en__isnull=False)
+                        .values_list('usuario_id', 'leida_en'))
+        comunes = dict(broadcast_id=str(difusion.id), tipo=difusion.tipo, titulo=difusion.titulo,
+                       mensaje=difusion.mensaje, datos_extra=difusion.datos_extra)
+        creadas = Notificacion.objects.bulk_create(
+            [Notificacion(residente_id=r, leida=r in leidas_r, fecha_lectura=leidas_r.get(r), **comunes)
+             for r in residentes.distinct().values_list('id', flat=True)]
+            + [Notificacion(usuario_id=u, leida=u in leidas_u, fecha_lectura=leidas_u.get(u), **comunes)
+               for u in usuarios.distinct().values_list('id', flat=True)],
+            batch_size=LOTE,
+        )
+        Notificacion.objects.filter(id__in=[n.id for n in creadas]).update(fecha_creacion=difusion.fecha_creacion)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0006_difusion'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrar, revertir),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# El contador 'alertas_no_leidas' del dashboard (accesos, migracion 0018) pasa a
+# contar las notificaciones con leida=False posteriores a la marca de lectura de
+# su destinatario: los triggers de Notificacion comparan contra la marca y los de
+# MarcaLectura descuentan (o devuelven) las no leidas que la marca cubre.
+
+CONTADOR = 'accesos_contadordashboard'
+NOTIF = 'notificaciones_notificacion'
+MARCAS = 'notificaciones_marcalectura'
+
+_UPSERT = f"""
+    INSERT INTO {CONTADOR} (clave, valor, actualizado)
+    SELECT clave, delta, now() FROM ({{origen}}) AS d(clave, delta) WHERE delta <> 0
+    ON CONFLICT (clave) DO UPDATE
+       SET valor = {CONTADOR}.valor + EXCLUDED.valor, actualizado = now();
+"""
+
+
+def _funcion(nombre, origen):
+    return f"""
+    CREATE OR REPLACE FUNCTION {nombre}() RETURNS trigger AS $$
+    BEGIN
+        {_UPSERT.format(origen=origen)}
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+
+
+def _no_leidas(tabla, con_marca):
+    sql = f"SELECT count(*) FROM {tabla} t WHERE NOT t.leida"
+    if con_marca:
+        sql += (
+            f" AND t.fecha_creacion > COALESCE((SELECT max(m.leidas_hasta) FROM {MARCAS} m"
+            f" WHERE m.residente_id = t.residente_id OR m.usuario_id = t.usuario_id), '-infinity')"
+        )
+    return sql
+
+
+def _alertas(con_marca):
+    nuevas, viejas = _no_leidas('nuevas', con_marca), _no_leidas('viejas', con_marca)
+    return [
+        _funcion('dash_alertas_ins', f"SELECT 'alertas_no_leidas', ({nuevas})"),
+        _funcion('dash_alertas_del', f"SELECT 'alertas_no_leidas', -({viejas})"),
+        _funcion('dash_alertas_upd', f"SELECT 'alertas_no_leidas', ({nuevas}) - ({viejas})"),
+    ]
+
+
+def _cubiertas(origen, desde, signo):
+    """No leidas de los destinatarios de `origen` (alias b) con fecha en (desde, b.leidas_hasta]."""
+    partes = [
+        f"(SELECT count(*) FROM {origen} JOIN {NOTIF} n ON n.{columna} = b.{columna} "
+        f"WHERE NOT n.leida AND n.fecha_creacion > {desde} AND n.fecha_creacion <= b.leidas_hasta)"
+        for columna in ('residente_id', 'usuario_id')
+    ]
+    return f"SELECT 'alertas_no_leidas', {signo}({' + '.join(partes)})"
+
+
+SQL = _alertas(True) + [
+    _funcion('dash_marcas_ins', _cubiertas('nuevas b', "'-infinity'", '-')),
+    f"CREATE TRIGGER dash_marcas_ins AFTER INSERT ON {MARCAS} REFERENCING NEW TABLE AS nuevas "
+    f"FOR EACH STATEMENT EXECUTE FUNCTION dash_marcas_ins();",
+    # La marca solo avanza (lecturas.marcar_todas usa GREATEST)
+    _funcion('dash_marcas_upd', _cubiertas('nuevas b JOIN viejas v ON v.id = b.id', 'v.leidas_hasta', '-')),
+    f"CREATE TRIGGER dash_marcas_upd AFTER UPDATE ON {MARCAS} REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas "
+    f"FOR EACH STATEMENT EXECUTE FUNCTION dash_marcas_upd();",
+    # Sin la marca, lo que cubria vuelve a estar sin leer (si la notificacion todavia existe)
+    _funcion('dash_marcas_del', _cubiertas('viejas b', "'-infinity'", '')),
+    f"CREATE TRIGGER dash_marcas_del AFTER DELETE ON {MARCAS} REFERENCING OLD TABLE AS viejas "
+    f"FOR EACH STATEMENT EXECUTE FUNCTION dash_marcas_del();",
+]
+
+REVERSE_SQL = [
+    f"DROP TRIGGER IF EXISTS dash_marcas_{s} ON {MARCAS}; DROP FUNCTION IF EXISTS dash_marcas_{s}();"
+    for s in ('ins', 'upd', 'del')
+] + _alertas(False) + [
+    f"""
+    UPDATE {CONTADOR} SET valor = (SELECT count(*) FROM {NOTIF} WHERE NOT leida), actualizado = now()
+    WHERE clave = 'alertas_no_leidas';
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accesos', '0022_archivoaccesos'),
+        ('notificaciones', '0007_migrar_broadcasts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaLectura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leidas_hasta', models.DateTimeField()),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('residente', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='marca_lectura', to='accesos.residente')),
+                ('usuario', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='marca_lectura', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.CheckConstraint(condition=models.Q(('residente__isnull', False), ('usuario__isnull', False), _connector='OR'), name='marca_lectura_destinatario_requerido')],
+            },
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
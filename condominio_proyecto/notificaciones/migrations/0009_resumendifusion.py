@@ -0,0 +1,102 @@
+# Generated by Django 5.2.6 on 2026-10-18 07:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+RESUMEN = 'notificaciones_resumendifusion'
+ESTADOS = 'notificaciones_estadodifusion'
+
+
+def _funcion(nombre, origen):
+    # `origen` devuelve (difusion_id, delta) de las lecturas individuales de la sentencia
+    return f"""
+    CREATE OR REPLACE FUNCTION {nombre}() RETURNS trigger AS $$
+    BEGIN
+        UPDATE {RESUMEN} r SET leidas = GREATEST(r.leidas + d.delta, 0)
+        FROM ({origen}) AS d(difusion_id, delta)
+        WHERE r.difusion_id = d.difusion_id AND d.delta <> 0;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+
+
+def _trigger(nombre, evento, referencias):
+    return f"""
+    CREATE TRIGGER {nombre} AFTER {evento} ON {ESTADOS}
+    REFERENCING {referencias}
+    FOR EACH STATEMENT EXECUTE FUNCTION {nombre}();
+    """
+
+
+SQL = [
+    _funcion('resumen_leidas_ins', "SELECT difusion_id, count(*) FROM nuevas WHERE leida_en IS NOT NULL GROUP BY 1"),
+    _trigger('resumen_leidas_ins', 'INSERT', 'NEW TABLE AS nuevas'),
+    _funcion('resumen_leidas_upd', """
+        SELECT n.difusion_id, sum(CASE WHEN n.leida_en IS NOT NULL THEN 1 ELSE 0 END
+                                  - CASE WHEN v.leida_en IS NOT NULL THEN 1 ELSE 0 END)
+        FROM nuevas n JOIN viejas v ON v.id = n.id GROUP BY 1
+    """),
+    _trigger('resumen_leidas_upd', 'UPDATE', 'OLD TABLE AS viejas NEW TABLE AS nuevas'),
+    _funcion('resumen_leidas_del', "SELECT difusion_id, -count(*) FROM viejas WHERE leida_en IS NOT NULL GROUP BY 1"),
+    _trigger('resumen_leidas_del', 'DELETE', 'OLD TABLE AS viejas'),
+]
+
+REVERSE_SQL = [
+    f"DROP TRIGGER IF EXISTS resumen_leidas_{s} ON {ESTADOS}; DROP FUNCTION IF EXISTS resumen_leidas_{s}();"
+    for s in ('ins', 'upd', 'del')
+]
+
+
+def crear_resumenes(apps, schema_editor):
+    # Las lecturas cubiertas por marcas de lectura (0008) no se cuentan aqui:
+    # manage.py reconstruir_resumen_difusiones las incluye
+    Difusion = apps.get_model('notificaciones', 'Difusion')
+    ResumenDifusion = apps.get_model('notificaciones', 'ResumenDifusion')
+    difusiones = Difusion.objects.annotate(n_leidas=Count('estados', filter=Q(estados__leida_en__isnull=False)))
+    ResumenDifusion.objects.bulk_create([
+        ResumenDifusion(
+            difusion_id=d.id, tipo=d.tipo, titulo=d.titulo, fecha_creacion=d.fecha_creacion,
+            total=d.total_destinatarios, leidas=d.n_leidas,
+        )
+        for d in difusiones.iterator()
+    ], batch_size=1000)
+
+
+def restaurar_totales(apps, schema_editor):
+    Difusion = apps.get_model('notificaciones', 'Difusion')
+    ResumenDifusion = apps.get_model('notificaciones', 'ResumenDifusion')
+    for difusion_id, total in ResumenDifusion.objects.values_list('difusion_id', 'total').iterator():
+        Difusion.objects.filter(pk=difusion_id).update(total_destinatarios=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0008_marcalectura'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDifusion',
+            fields=[
+                ('difusion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='notificaciones.difusion')),
+                ('tipo', models.CharField(choices=[('AUTORIZACION_CREADA', 'Nueva Autorización'), ('AUTORIZACION_EXTENDIDA', 'Autorización Extendida'), ('AUTORIZACION_VENCIDA', 'Autorización Vencida'), ('AUTORIZACION_UTILIZADA', 'Autorización Utilizada'), ('ACCESO_DENEGADO', 'Acceso Denegado'), ('EMERGENCIA', 'Emergencia'), ('MULTA', 'Multa'), ('ACTIVIDAD', 'Actividad'), ('AVISO', 'Aviso General')], max_length=50)),
+                ('titulo', models.CharField(blank=True, max_length=150)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('leidas', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['-fecha_creacion'], name='resumen_difusion_fecha_idx'), models.Index(fields=['tipo', '-fecha_creacion'], name='resumen_difusion_tipo_idx')],
+            },
+        ),
+        migrations.RunPython(crear_resumenes, restaurar_totales),
+        migrations.RemoveField(
+            model_name='difusion',
+            name='total_destinatarios',
+        ),
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:21
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+# Clave que usaba la retencion en ConfiguracionAcceso antes de tener su propio modelo
+CLAVE_ANTERIOR = 'retencion_notificaciones'
+
+
+def mover_posiciones(apps, schema_editor):
+    ConfiguracionAcceso = apps.get_model('accesos', 'ConfiguracionAcceso')
+    PosicionRetencion = apps.get_model('notificaciones', 'PosicionRetencion')
+    config = ConfiguracionAcceso.objects.filter(clave=CLAVE_ANTERIOR).first()
+    if config is None:
+        return
+    PosicionRetencion.objects.bulk_create([
+        PosicionRetencion(clave=clave, fecha_creacion=parse_datetime(fecha), ultimo_id=str(pk))
+        for clave, (fecha, pk) in (config.valor or {}).items()
+    ])
+    config.delete()
+
+
+def devolver_posiciones(apps, schema_editor):
+    ConfiguracionAcceso = apps.get_model('accesos', 'ConfiguracionAcceso')
+    PosicionRetencion = apps.get_model('notificaciones', 'PosicionRetencion')
+    valor = {p.clave: [p.fecha_creacion.isoformat(), p.ultimo_id] for p in PosicionRetencion.objects.all()}
+    if valor:
+        ConfiguracionAcceso.objects.update_or_create(
+            clave=CLAVE_ANTERIOR,
+            defaults={'valor': valor, 'descripcion': 'Posición de la retención de notificaciones por tipo'},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0009_resumendifusion'),
+        ('accesos', '0003_configuracionacceso_familia_autorizacionvisita_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosicionRetencion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=80, unique=True)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('ultimo_id', models.CharField(max_length=40)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(mover_posiciones, devolver_posiciones),
+    ]
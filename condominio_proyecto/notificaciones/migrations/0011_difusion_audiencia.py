@@ -0,0 +1,74 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:22
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def resolver_audiencia(apps, schema_editor):
+    """Fija la audiencia de las difusiones existentes con la regla que se evaluaba al leer."""
+    Difusion = apps.get_model('notificaciones', 'Difusion')
+    Residente = apps.get_model('accesos', 'Residente')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    for difusion in Difusion.objects.all().iterator(chunk_size=200):
+        condicion = Q(id__in=difusion.residentes)
+        registrados = Q(user__is_active=True, fecha_registro__lte=difusion.fecha_creacion)
+        if difusion.todos_residentes:
+            condicion |= registrados
+        elif difusion.familias:
+            condicion |= registrados & Q(familia_id__in=difusion.familias)
+        residentes = Residente.objects.filter(condicion)
+        if difusion.solo_principales:
+            residentes = residentes.filter(tipo='PRINCIPAL')
+        usuarios = Q(id__in=difusion.usuarios)
+        if difusion.incluir_admins:
+            usuarios |= Q(is_staff=True, is_active=True, date_joined__lte=difusion.fecha_creacion)
+        Difusion.objects.filter(pk=difusion.pk).update(
+            audiencia_residentes=list(residentes.order_by('id').values_list('id', flat=True)),
+            audiencia_usuarios=list(User.objects.filter(usuarios).order_by('id').values_list('id', flat=True)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0010_posicionretencion'),
+        ('accesos', '0024_busqueda_triggers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='difusion',
+            name='difusion_familias_gin',
+        ),
+        migrations.RemoveIndex(
+            model_name='difusion',
+            name='difusion_residentes_gin',
+        ),
+        migrations.RemoveIndex(
+            model_name='difusion',
+            name='difusion_usuarios_gin',
+        ),
+        migrations.AddField(
+            model_name='difusion',
+            name='audiencia_residentes',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='difusion',
+            name='audiencia_usuarios',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunPython(resolver_audiencia, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='difusion',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['audiencia_residentes'], name='difusion_aud_residentes_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='difusion',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['audiencia_usuarios'], name='difusion_aud_usuarios_gin'),
+        ),
+    ]
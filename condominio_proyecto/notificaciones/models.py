@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 import uuid
 
 
@@ -37,6 +39,153 @@ class Notificacion(models.Model):
                 name='notificacion_destinatario_requerido'
             )
         ]
+        indexes = [
+            # Bandeja (y no leidas) de cada destinatario, mas recientes primero
+            models.Index(fields=['residente', 'leida', '-fecha_creacion'], name='notif_residente_leida_idx'),
+            models.Index(fields=['usuario', 'leida', '-fecha_creacion'], name='notif_usuario_leida_idx'),
+            # Recorrido por lotes de la retencion (notificaciones/retencion.py)
+            models.Index(fields=['tipo', 'fecha_creacion', 'id'], name='notif_tipo_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.fecha_creacion.strftime('%d/%m/%Y %H:%M')}"
+
+
+class Difusion(models.Model):
+    """Envio masivo guardado una sola vez (fan-out en lectura, ver notificaciones/difusiones.py).
+
+    Las reglas de audiencia (todos los residentes y/o familias, residentes y
+    usuarios explicitos, admins) se resuelven al enviar: audiencia_residentes y
+    audiencia_usuarios guardan los ids de ese momento, y la bandeja y los totales
+    se leen de ahi. Mudanzas, bajas o altas posteriores no cambian quien la
+    recibio. El estado por destinatario (leida/descartada) solo existe cuando alguien
+    lee o descarta la difusion (EstadoDifusion)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=50, choices=Notificacion.TIPO_CHOICES)
+    titulo = models.CharField(max_length=150, blank=True)
+    mensaje = models.TextField()
+    datos_extra = models.JSONField(null=True, blank=True)
+    # Audiencia
+    todos_residentes = models.BooleanField(default=False)
+    solo_principales = models.BooleanField(default=False)
+    incluir_admins = models.BooleanField(default=False)
+    familias = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    residentes = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    usuarios = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    # Audiencia resuelta al enviar
+    audiencia_residentes = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    audiencia_usuarios = ArrayField(models.BigIntegerField(), default=list, blank=True)
+    enviado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='difusiones_enviadas')
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['-fecha_creacion'], name='difusion_fecha_idx'),
+            models.Index(fields=['tipo', 'fecha_creacion'], name='difusion_tipo_fecha_idx'),
+            GinIndex(fields=['audiencia_residentes'], name='difusion_aud_residentes_gin'),
+            GinIndex(fields=['audiencia_usuarios'], name='difusion_aud_usuarios_gin'),
+        ]
+
+    def __str__(self):
+        return f"Difusion {self.get_tipo_display()} - {self.fecha_creacion.strftime('%d/%m/%Y %H:%M')}"
+
+
+class ResumenDifusion(models.Model):
+    """Totales de una Difusion para el historial de envios.
+
+    `total` se fija al enviar; `leidas` cuenta las lecturas una por una y lo
+    mantienen los triggers de EstadoDifusion (migracion 0009). Las cubiertas por
+    una marca de "todo leido" se suman al leer (difusiones.leidas_por_marca).
+    tipo/titulo/fecha_creacion se copian de la difusion para paginar el
+    historial sin join. Se reconstruye con manage.py reconstruir_resumen_difusiones."""
+    difusion = models.OneToOneField(Difusion, on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    tipo = models.CharField(max_length=50, choices=Notificacion.TIPO_CHOICES)
+    titulo = models.CharField(max_length=150, blank=True)
+    fecha_creacion = models.DateTimeField()
+    total = models.PositiveIntegerField(default=0)
+    leidas = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['-fecha_creacion'], name='resumen_difusion_fecha_idx'),
+            models.Index(fields=['tipo', '-fecha_creacion'], name='resumen_difusion_tipo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.difusion_id}: {self.leidas}/{self.total}"
+
+
+class EstadoDifusion(models.Model):
+    """Lectura o descarte de una Difusion por un destinatario (residente o admin)."""
+    difusion = models.ForeignKey(Difusion, on_delete=models.CASCADE, related_name='estados')
+    residente = models.ForeignKey('accesos.Residente', on_delete=models.CASCADE, related_name='estados_difusion', null=True, blank=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='estados_difusion', null=True, blank=True)
+    leida_en = models.DateTimeField(null=True, blank=True)
+    descartada_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=(models.Q(residente__isnull=False) | models.Q(usuario__isnull=False)),
+                name='estado_difusion_destinatario_requerido'
+            ),
+            models.UniqueConstraint(fields=['residente', 'difusion'], name='estado_difusion_residente_uniq'),
+            models.UniqueConstraint(fields=['usuario', 'difusion'], name='estado_difusion_usuario_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.difusion_id} - {self.residente_id or self.usuario_id}"
+
+
+class MarcaLectura(models.Model):
+    """Marca de "todo leído" de un destinatario (ver notificaciones/lecturas.py).
+
+    Toda notificación o difusión con fecha_creacion <= leidas_hasta está leída;
+    las posteriores solo si se leyeron una por una (Notificacion.leida /
+    EstadoDifusion.leida_en)."""
+    residente = models.OneToOneField('accesos.Residente', on_delete=models.CASCADE, related_name='marca_lectura', null=True, blank=True)
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='marca_lectura', null=True, blank=True)
+    leidas_hasta = models.DateTimeField()
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=(models.Q(residente__isnull=False) | models.Q(usuario__isnull=False)),
+                name='marca_lectura_destinatario_requerido'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.residente_id or self.usuario_id} - {self.leidas_hasta:%d/%m/%Y %H:%M}"
+
+
+class TicketEventos(models.Model):
+    """Ticket de un solo uso para abrir /api/eventos/ (ver notificaciones/tiempo_real.py).
+
+    EventSource no envia headers: en lugar del JWT en la URL (quedaria en los
+    logs de acceso) el cliente pide un ticket y lo pasa en ?ticket=. Se guarda
+    solo el hash; vence a los EVENTOS_TICKET_SEGUNDOS y se borra al usarse."""
+    clave = models.CharField(max_length=64, unique=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tickets_eventos')
+    expira = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.usuario_id} - {self.expira:%d/%m/%Y %H:%M:%S}"
+
+
+class PosicionRetencion(models.Model):
+    """Posición de la retención por recorrido (ver notificaciones/retencion.py).
+
+    `clave` es el tipo (notificaciones) o difusion:<tipo>; la fila guarda el
+    último (fecha_creacion, id) borrado de la pasada en curso y se elimina al
+    completarla."""
+    clave = models.CharField(max_length=80, unique=True)
+    fecha_creacion = models.DateTimeField()
+    ultimo_id = models.CharField(max_length=40)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.clave}: {self.fecha_creacion:%d/%m/%Y %H:%M} #{self.ultimo_id}"
@@ -0,0 +1,158 @@
+"""Retención de notificaciones por tipo.
+
+Cada tipo tiene su política en ``NOTIFICACIONES_RETENCION``
+(``{'dias': N, 'solo_leidas': bool}``; un entero equivale a ``{'dias': N}``).
+Los tipos sin política no se borran.
+
+El borrado recorre cada tipo en lotes de ``NOTIFICACIONES_RETENCION_LOTE``
+filas en orden (fecha_creacion, id) sobre el índice ``notif_tipo_fecha_idx``,
+con una transacción corta por lote y una pausa entre lotes, para no retener
+locks ni generar un pico de WAL/bloat. Tras cada lote se guarda la posición en
+``PosicionRetencion``, en la misma transacción que el borrado: una corrida
+interrumpida (o cortada con ``max_segundos``) retoma desde ahí, y al completar
+la pasada de un tipo su posición se borra para que la próxima empiece de cero
+(p. ej. para alcanzar notificaciones que se leyeron después).
+
+Las difusiones (``Difusion``) siguen la misma tabla por tipo, por antigüedad
+solamente (``solo_leidas`` no aplica: no tienen un estado de lectura único), con
+su posición bajo ``difusion:<tipo>``.
+
+Si ``NOTIFICACIONES_ARCHIVO_DIR`` está definido, cada lote se escribe antes
+de borrarlo como NDJSON gzip en su propio archivo,
+``<prefijo>/AAAA-MM-DD/<tipo>-<primer id>.ndjson.gz`` (prefijo
+``notificaciones`` o ``difusiones``), y se elimina si la transacción del lote
+no llega a confirmarse. Un lote repetido tras una caída reescribe el mismo
+archivo, y si aun así un id aparece en dos archivos es la misma fila: quien
+los lea debe quedarse con un registro por id.
+"""
+import gzip
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import lecturas
+from .models import Difusion, Notificacion, PosicionRetencion
+
+
+def politicas(tabla=None):
+    """{tipo: {'dias': int, 'solo_leidas': bool}} normalizado desde `tabla` o settings."""
+    tabla = getattr(settings, 'NOTIFICACIONES_RETENCION', {}) if tabla is None else tabla
+    normalizadas = {}
+    for tipo, politica in tabla.items():
+        if isinstance(politica, int):
+            politica = {'dias': politica}
+        if not politica or politica.get('dias') is None:
+            continue
+        normalizadas[tipo] = {'dias': int(politica['dias']), 'solo_leidas': bool(politica.get('solo_leidas'))}
+    return normalizadas
+
+
+def _posicion(clave):
+    """(fecha_creacion, id) del último borrado de la pasada en curso, o None."""
+    return PosicionRetencion.objects.filter(clave=clave).values_list('fecha_creacion', 'ultimo_id').first()
+
+
+def _guardar_posicion(clave, fila):
+    PosicionRetencion.objects.update_or_create(
+        clave=clave, defaults={'fecha_creacion': fila['fecha_creacion'], 'ultimo_id': str(fila['id'])},
+    )
+
+
+def _terminar(clave):
+    # Pasada completa: la próxima corrida empieza desde el principio
+    PosicionRetencion.objects.filter(clave=clave).delete()
+
+
+def _archivar(filas, ahora, prefijo, tipo):
+    """Escribe el lote en su archivo (ver docstring del módulo); devuelve la ruta o None."""
+    directorio = getattr(settings, 'NOTIFICACIONES_ARCHIVO_DIR', None)
+    if not directorio or not filas:
+        return None
+    carpeta = os.path.join(directorio, prefijo, f'{timezone.localdate(ahora):%Y-%m-%d}')
+    os.makedirs(carpeta, exist_ok=True)
+    destino = os.path.join(carpeta, f'{tipo}-{filas[0]["id"]}.ndjson.gz')
+    # Temporal + rename: el archivo final nunca queda a medio escribir
+    fd, temporal = tempfile.mkstemp(dir=carpeta, suffix='.parcial')
+    try:
+        with os.fdopen(fd, 'wb') as crudo, gzip.open(crudo, 'wt', encoding='utf-8') as f:
+            for fila in filas:
+                f.write(json.dumps(fila, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        os.replace(temporal, destino)
+    except BaseException:
+        os.remove(temporal)
+        raise
+    return destino
+
+
+def _descartar(archivado):
+    if archivado and os.path.exists(archivado):
+        os.remove(archivado)
+
+
+def _candidatas(tipo, politica, ahora):
+    qs = Notificacion.objects.filter(tipo=tipo, fecha_creacion__lt=ahora - timedelta(days=politica['dias']))
+    if politica['solo_leidas']:
+        qs = lecturas.leidas(qs)
+    return qs.order_by('fecha_creacion', 'id')
+
+
+def _recorridos(tabla, ahora):
+    """(tipo, modelo, clave de la posición, prefijo del archivo, candidatas) por política."""
+    normalizadas = politicas(tabla)
+    for tipo, politica in normalizadas.items():
+        yield tipo, Notificacion, tipo, 'notificaciones', _candidatas(tipo, politica, ahora)
+    for tipo, politica in normalizadas.items():
+        difusiones = Difusion.objects.filter(
+            tipo=tipo, fecha_creacion__lt=ahora - timedelta(days=politica['dias']),
+        ).order_by('fecha_creacion', 'id')
+        yield tipo, Difusion, f'difusion:{tipo}', 'difusiones', difusiones
+
+
+def aplicar(tabla=None, lote=None, pausa=None, max_segundos=None, ahora=None, reportar=None):
+    """Aplica las políticas; devuelve {tipo: borradas}. `reportar(tipo, borradas)` tras cada lote."""
+    lote = lote or getattr(settings, 'NOTIFICACIONES_RETENCION_LOTE', 500)
+    pausa = getattr(settings, 'NOTIFICACIONES_RETENCION_PAUSA', 0.2) if pausa is None else pausa
+    ahora = ahora or timezone.now()
+    inicio = time.monotonic()
+    totales = {}
+    for tipo, modelo, clave, prefijo, candidatas in _recorridos(tabla, ahora):
+        totales.setdefault(tipo, 0)
+        while True:
+            qs = candidatas
+            posicion = _posicion(clave)
+            if posicion:
+                fecha, pk = posicion
+                qs = qs.filter(Q(fecha_creacion__gt=fecha) | Q(fecha_creacion=fecha, id__gt=pk))
+            archivado = None
+            try:
+                with transaction.atomic():
+                    filas = list(qs.values()[:lote])
+                    if not filas:
+                        _terminar(clave)
+                        break
+                    archivado = _archivar(filas, ahora, prefijo, tipo)
+                    modelo.objects.filter(id__in=[f['id'] for f in filas]).delete()
+                    _guardar_posicion(clave, filas[-1])
+            except BaseException:
+                # Sin commit las filas siguen en la tabla: el archivo del lote sobra
+                _descartar(archivado)
+                raise
+            totales[tipo] += len(filas)
+            if reportar:
+                reportar(tipo, len(filas))
+            if max_segundos is not None and time.monotonic() - inicio >= max_segundos:
+                return totales
+            if len(filas) < lote:
+                _terminar(clave)
+                break
+            if pausa:
+                time.sleep(pausa)
+    return totales
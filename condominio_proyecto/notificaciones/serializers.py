@@ -3,6 +3,8 @@ from .models import Notificacion
 
 
 class NotificacionSerializer(serializers.ModelSerializer):
+    # Las difusiones en la bandeja llevan id "b-<uuid>" (ver notificaciones/difusiones.py)
+    id = serializers.SerializerMethodField()
     residente_nombre = serializers.SerializerMethodField()
     usuario_username = serializers.SerializerMethodField()
     residente_documento = serializers.SerializerMethodField()
@@ -12,6 +14,9 @@ class NotificacionSerializer(serializers.ModelSerializer):
         model = Notificacion
         fields = '__all__'
 
+    def get_id(self, obj):
+        return getattr(obj, 'id_bandeja', None) or obj.id
+
     def get_residente_nombre(self, obj):
         try:
             return obj.residente.user.get_full_name() or obj.residente.user.username
@@ -44,4 +49,4 @@ class NotificacionSerializer(serializers.ModelSerializer):
             return None
 
 
-## Campanas removidas; usamos broadcast_id en Notificacion
+## Campanas removidas; los envios masivos son Difusion (broadcast_id = id de la difusion)
@@ -0,0 +1,428 @@
+import asyncio
+import gzip
+import importlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accesos import dashboard
+from accesos.models import Familia, Residente
+from accesos.notification_service import NotificacionService
+from condominio_BackendAPI import eventos
+from . import difusiones, lecturas, retencion, tiempo_real
+from .models import Difusion, MarcaLectura, Notificacion, PosicionRetencion, TicketEventos
+from .views import stream_eventos
+
+
+class RetencionTests(TestCase):
+    TABLA = {'AVISO': {'dias': 30, 'solo_leidas': True}}
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='admin', is_staff=True)
+        self.ahora = timezone.now()
+
+    def _crear(self, n, dias, leida=True, tipo='AVISO'):
+        creadas = Notificacion.objects.bulk_create([
+            Notificacion(usuario=self.usuario, tipo=tipo, mensaje=f'm{i}', leida=leida) for i in range(n)
+        ])
+        # fecha_creacion es auto_now_add
+        Notificacion.objects.filter(id__in=[c.id for c in creadas]).update(
+            fecha_creacion=self.ahora - timedelta(days=dias),
+        )
+        return creadas
+
+    def _aplicar(self, **extra):
+        return retencion.aplicar(self.TABLA, lote=2, pausa=0, ahora=self.ahora, **extra)
+
+    def test_borra_por_politica(self):
+        self._crear(5, 40)
+        self._crear(2, 40, leida=False)
+        self._crear(3, 10)
+
+        self.assertEqual(self._aplicar()['AVISO'], 5)
+        self.assertEqual(Notificacion.objects.count(), 5)
+        self.assertFalse(PosicionRetencion.objects.exists())
+
+    def test_corrida_cortada_retoma_desde_la_posicion(self):
+        viejas = self._crear(5, 40)
+
+        self.assertEqual(self._aplicar(max_segundos=0)['AVISO'], 2)
+        posicion = PosicionRetencion.objects.get(clave='AVISO')
+        self.assertEqual(posicion.ultimo_id, str(viejas[1].id))
+
+        self.assertEqual(self._aplicar()['AVISO'], 3)
+        self.assertFalse(PosicionRetencion.objects.exists())
+
+    def test_archiva_cada_lote_en_su_archivo(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, True)
+        viejas = self._crear(3, 40)
+
+        with override_settings(NOTIFICACIONES_ARCHIVO_DIR=directorio):
+            self._aplicar()
+
+        carpeta = os.path.join(directorio, 'notificaciones', f'{timezone.localdate(self.ahora):%Y-%m-%d}')
+        self.assertEqual(
+            sorted(os.listdir(carpeta)), sorted(f'AVISO-{viejas[i].id}.ndjson.gz' for i in (0, 2)),
+        )
+        ids = []
+        for nombre in os.listdir(carpeta):
+            with gzip.open(os.path.join(carpeta, nombre), 'rt', encoding='utf-8') as f:
+                ids += [json.loads(linea)['id'] for linea in f]
+        self.assertEqual(sorted(ids), [v.id for v in viejas])
+
+    def test_lote_sin_commit_no_deja_archivo(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, True)
+        self._crear(2, 40)
+
+        with override_settings(NOTIFICACIONES_ARCHIVO_DIR=directorio), \
+                mock.patch.object(retencion, '_guardar_posicion', side_effect=RuntimeError('caida')):
+            with self.assertRaises(RuntimeError):
+                self._aplicar()
+
+        self.assertEqual(Notificacion.objects.count(), 2)
+        carpeta = os.path.join(directorio, 'notificaciones', f'{timezone.localdate(self.ahora):%Y-%m-%d}')
+        self.assertEqual(os.listdir(carpeta), [])
+
+    def test_eliminar_antiguas_conserva_los_30_dias(self):
+        self._crear(2, 40)
+        self._crear(1, 40, leida=False, tipo='AUTORIZACION_VENCIDA')
+        self._crear(1, 40, leida=False)
+        self._crear(2, 20)
+
+        self.assertEqual(NotificacionService.eliminar_notificaciones_antiguas(), 3)
+        self.assertEqual(Notificacion.objects.count(), 3)
+
+
+def _residente(nombre, familia=None, tipo='PRINCIPAL'):
+    return Residente.objects.create(
+        user=User.objects.create(username=nombre), documento_identidad=f'DOC-{nombre}', familia=familia, tipo=tipo,
+    )
+
+
+class DifusionesTests(TestCase):
+    def setUp(self):
+        self.familia = Familia.objects.create(nombre='Rojas', departamento='1', torre='A')
+        self.otra = Familia.objects.create(nombre='Vaca', departamento='2', torre='A')
+        self.principal = _residente('ana', self.familia)
+        self.familiar = _residente('beto', self.familia, tipo='FAMILIAR')
+        self.vecino = _residente('caro', self.otra)
+        self.admin = User.objects.create(username='admin', is_staff=True)
+
+    def _bandeja(self, user, **params):
+        cliente = APIClient()
+        cliente.force_authenticate(user)
+        return cliente.get(reverse('notificacion-list'), params).json()
+
+    def test_audiencia_se_fija_al_enviar(self):
+        difusion = difusiones.crear('AVISO', 'asamblea', familias=[self.familia.id], solo_principales=True)
+        self.assertEqual(difusion.audiencia_residentes, [self.principal.id])
+        self.assertEqual(difusion.resumen.total, 1)
+
+        # Cambios posteriores no alteran quién la recibió
+        self.principal.familia = self.otra
+        self.principal.save()
+        self.familiar.tipo = 'PRINCIPAL'
+        self.familiar.save()
+        _residente('dani', self.familia)
+
+        self.assertEqual(list(difusiones.alcance(residente=self.principal)), [difusion])
+        self.assertFalse(difusiones.alcance(residente=self.familiar).exists())
+        self.assertEqual(difusiones.reconstruir_resumen(difusion).total, 1)
+
+    def test_residente_posterior_no_la_recibe(self):
+        difusion = difusiones.crear('AVISO', 'corte de agua', todos_residentes=True, incluir_admins=True)
+        nuevo = _residente('eli', self.familia)
+        self.assertEqual(difusion.resumen.total, 4)
+        self.assertFalse(difusiones.alcance(residente=nuevo).exists())
+        self.assertTrue(difusiones.alcance(usuario=self.admin).exists())
+
+    def test_bandeja_mezcla_personales_y_difusiones(self):
+        personal = Notificacion.objects.create(residente=self.principal, tipo='AVISO', mensaje='personal')
+        difusion = difusiones.crear('AVISO', 'corte de agua', todos_residentes=True)
+        otra = Notificacion.objects.create(residente=self.vecino, tipo='AVISO', mensaje='ajena')
+
+        ids = [n['id'] for n in self._bandeja(self.principal.user)]
+        self.assertEqual(ids, [f'b-{difusion.id}', personal.id])
+        self.assertNotIn(otra.id, ids)
+
+        pagina = self._bandeja(self.principal.user, paginar='cursor', page_size=1)
+        self.assertEqual([n['id'] for n in pagina['results']], [f'b-{difusion.id}'])
+        siguiente = APIClient()
+        siguiente.force_authenticate(self.principal.user)
+        resto = siguiente.get(pagina['next']).json()
+        self.assertEqual([n['id'] for n in resto['results']], [personal.id])
+        self.assertIsNone(resto['next'])
+
+    def test_ids_de_difusion(self):
+        difusion = difusiones.crear('AVISO', 'corte de agua', todos_residentes=True)
+        self.assertEqual(difusiones.id_difusion(f'b-{difusion.id}'), difusion.id)
+        self.assertIsNone(difusiones.id_difusion(str(difusion.id)))
+        self.assertIsNone(difusiones.id_difusion('b-no-es-uuid'))
+        self.assertIsNone(difusiones.id_difusion(12))
+
+        cliente = APIClient()
+        cliente.force_authenticate(self.vecino.user)
+        detalle = cliente.get(reverse('notificacion-detail', args=[f'b-{difusion.id}']))
+        self.assertEqual(detalle.json()['id'], f'b-{difusion.id}')
+        cliente.force_authenticate(self.admin)
+        self.assertEqual(cliente.get(reverse('notificacion-detail', args=[f'b-{difusion.id}'])).status_code, 404)
+
+    def test_estado_de_lectura_y_descarte(self):
+        difusion = difusiones.crear('AVISO', 'corte de agua', todos_residentes=True)
+        self.assertEqual(lecturas.no_leidas(residente=self.principal), 1)
+
+        self.assertEqual(lecturas.marcar([], [difusion.id], residente=self.principal), 1)
+        self.assertIsNotNone(difusiones.visibles(residente=self.principal).get().leida_en)
+        self.assertEqual(lecturas.no_leidas(residente=self.principal), 0)
+        self.assertEqual(lecturas.no_leidas(residente=self.vecino), 1)
+
+        difusiones.registrar([difusion.id], 'descartada_en', residente=self.vecino)
+        self.assertFalse(difusiones.visibles(residente=self.vecino).exists())
+        self.assertEqual(self._bandeja(self.vecino.user), [])
+
+    def test_migracion_resuelve_la_audiencia_existente(self):
+        migracion = importlib.import_module('notificaciones.migrations.0011_difusion_audiencia')
+        difusion = difusiones.crear('AVISO', 'asamblea', familias=[self.familia.id], incluir_admins=True)
+        Difusion.objects.filter(pk=difusion.pk).update(audiencia_residentes=[], audiencia_usuarios=[])
+
+        migracion.resolver_audiencia(apps, None)
+
+        difusion.refresh_from_db()
+        self.assertEqual(difusion.audiencia_residentes, sorted([self.principal.id, self.familiar.id]))
+        self.assertEqual(difusion.audiencia_usuarios, [self.admin.id])
+
+    def _historial(self, **params):
+        cliente = APIClient()
+        cliente.force_authenticate(self.admin)
+        return cliente.get(reverse('notificacion-historial'), params).json()
+
+    def test_leidas_por_marca_se_cuentan_al_leer(self):
+        difusion = difusiones.crear('AVISO', 'corte de agua', todos_residentes=True)
+        self.assertEqual(difusion.resumen.total, 3)
+        # Lectura individual (trigger de EstadoDifusion) y "todo leído" (marcar_todas)
+        lecturas.marcar([], [difusion.pk], residente=self.principal)
+        lecturas.marcar_todas(residente=self.familiar)
+        lecturas.marcar_todas(residente=self.principal)
+
+        # marcar_todas no escribe en el resumen: solo cuenta la lectura individual
+        difusion.resumen.refresh_from_db()
+        self.assertEqual(difusion.resumen.leidas, 1)
+        self.assertEqual(difusiones.reconstruir_resumen(difusion).leidas, 1)
+        self.assertEqual(difusiones.leidas(difusion), 2)
+        item = self._historial()['items'][0]
+        self.assertEqual((item['leidas'], item['no_leidas']), (2, 1))
+
+    def test_leidas_por_marca_de_usuarios(self):
+        difusion = difusiones.crear('AVISO', 'mantenimiento', familias=[self.otra.id], incluir_admins=True)
+        otra = difusiones.crear('AVISO', 'solo vecinos', familias=[self.otra.id])
+        lecturas.marcar_todas(usuario=self.admin)
+        lecturas.marcar_todas(residente=self.vecino)
+        self.assertEqual(difusiones.leidas_por_marca([difusion.id, otra.id]), {difusion.id: 2, otra.id: 1})
+        # Quien además la leyó una por una no se cuenta dos veces
+        lecturas.marcar([], [difusion.pk], usuario=self.admin)
+        self.assertEqual(difusiones.leidas(difusion), 2)
+
+    def test_historial_pagina_solo_si_se_pide(self):
+        for i in range(3):
+            difusiones.crear('AVISO', f'aviso {i}', todos_residentes=True)
+
+        completo = self._historial()
+        self.assertEqual(set(completo), {'items'})
+        self.assertEqual(len(completo['items']), 3)
+        pagina = self._historial(paginar='cursor', page_size=2)
+        self.assertEqual(len(pagina['items']), 2)
+        self.assertIsNotNone(pagina['next'])
+
+
+class LecturasTests(TestCase):
+    def setUp(self):
+        self.residente = _residente('ana', Familia.objects.create(nombre='Rojas', departamento='1', torre='A'))
+
+    def _notificar(self, n=1):
+        return Notificacion.objects.bulk_create([
+            Notificacion(residente=self.residente, tipo='AVISO', mensaje=f'm{i}') for i in range(n)
+        ])
+
+    def test_marcar_todas_mueve_la_marca_y_el_contador(self):
+        contador = lambda: dashboard.valores(['alertas_no_leidas']).get('alertas_no_leidas', 0)
+        self._notificar(3)
+        antes = contador()
+        self.assertEqual(lecturas.no_leidas(residente=self.residente), 3)
+
+        lecturas.marcar_todas(residente=self.residente)
+
+        self.assertEqual(lecturas.no_leidas(residente=self.residente), 0)
+        # Las filas no se tocan: solo la marca
+        self.assertEqual(Notificacion.objects.filter(residente=self.residente, leida=False).count(), 3)
+        self.assertEqual(contador(), antes - 3)
+        self._notificar()
+        self.assertEqual(lecturas.no_leidas(residente=self.residente), 1)
+        self.assertEqual(contador(), antes - 2)
+
+    def test_marca_en_la_ultima_recibida_y_no_en_la_hora_actual(self):
+        ultima = self._notificar(2)[-1]
+        difusion = difusiones.crear('AVISO', 'asamblea', todos_residentes=True)
+        Difusion.objects.filter(pk=difusion.pk).update(fecha_creacion=ultima.fecha_creacion - timedelta(seconds=1))
+        ultima.refresh_from_db()
+
+        self.assertEqual(lecturas.marcar_todas(residente=self.residente), ultima.fecha_creacion)
+        self.assertEqual(lecturas.marca(residente=self.residente), ultima.fecha_creacion)
+
+        # Confirmada después, con fecha anterior a "ahora" pero posterior a la marca: sigue sin leer
+        tardia = self._notificar()[0]
+        Notificacion.objects.filter(pk=tardia.pk).update(fecha_creacion=ultima.fecha_creacion + timedelta(microseconds=1))
+        self.assertEqual(lecturas.no_leidas(residente=self.residente), 1)
+
+    def test_sin_nada_recibido_no_crea_marca(self):
+        self.assertIsNone(lecturas.marcar_todas(residente=self.residente))
+        self.assertFalse(MarcaLectura.objects.exists())
+
+    def test_la_marca_no_retrocede(self):
+        primera = self._notificar()[0]
+        lecturas.marcar_todas(residente=self.residente)
+        Notificacion.objects.filter(pk=primera.pk).delete()
+        self.assertEqual(lecturas.marcar_todas(residente=self.residente), primera.fecha_creacion)
+
+
+def _evento(canal='a', tipo='notificacion'):
+    return {'id': uuid.uuid4().hex, 'canal': canal, 'tipo': tipo, 'datos': {}}
+
+
+class BusEventosTests(SimpleTestCase):
+    def test_retoma_desde_el_ultimo_id(self):
+        bus = eventos.Bus(tamano=3)
+        primero, *resto = [_evento('a'), _evento('b'), _evento('a'), _evento('a')]
+        bus.entregar(primero)
+        for evento in resto:
+            bus.entregar(evento)
+
+        async def suscribir(ultimo_id):
+            suscripcion, pendientes, completo = bus.suscribir(['a'], ultimo_id=ultimo_id)
+            bus.desuscribir(suscripcion)
+            return pendientes, completo
+
+        # `primero` ya salió del buffer circular: el cliente debe recargar
+        self.assertEqual(asyncio.run(suscribir(primero['id'])), ([], False))
+        self.assertEqual(asyncio.run(suscribir(resto[0]['id'])), (resto[1:], True))
+        self.assertEqual(asyncio.run(suscribir(None)), ([], True))
+
+    def test_entrega_en_vivo_filtra_y_corta_al_desbordar(self):
+        bus = eventos.Bus(cola=1)
+
+        async def escuchar():
+            suscripcion, _, _ = bus.suscribir(['a'], filtro=lambda e: e['tipo'] != 'oculto')
+            bus.entregar(_evento('a', 'oculto'))
+            bus.entregar(_evento('b'))
+            visible = _evento('a')
+            bus.entregar(visible)
+            await asyncio.sleep(0)
+            self.assertEqual(suscripcion.cola.get_nowait(), visible)
+            self.assertFalse(suscripcion.desbordada)
+            bus.entregar(_evento('a'))
+            bus.entregar(_evento('a'))
+            await asyncio.sleep(0)
+            return suscripcion
+
+        self.assertTrue(asyncio.run(escuchar()).desbordada)
+
+    @override_settings(EVENTOS_MAX_SEGUNDOS=0, EVENTOS_RETRY_MS=1000)
+    def test_flujo_repite_pendientes_y_se_desuscribe(self):
+        bus = eventos.Bus()
+        pendiente = _evento('a')
+
+        async def leer():
+            suscripcion, _, _ = bus.suscribir(['a'])
+            return [parte async for parte in eventos.flujo(suscripcion, [pendiente], False)]
+
+        with mock.patch.object(eventos, '_bus', bus):
+            partes = asyncio.run(leer())
+        self.assertEqual(partes, ['retry: 1000\n\n', 'event: reinicio\ndata: {}\n\n', eventos.formatear(pendiente)])
+        self.assertFalse(bus._suscripciones)
+
+    def test_broker_agrupa_eventos_en_avisos_acotados(self):
+        chicos = [_evento('a') for _ in range(3)]
+        grande = {**_evento('a'), 'datos': {'texto': 'x' * 3000}}
+        enorme = {**_evento('a'), 'datos': {'texto': 'x' * eventos.MAX_PAYLOAD}}
+        with mock.patch.object(eventos.BrokerPostgres, '_notificar') as notificar, \
+                self.assertLogs('condominio_BackendAPI.eventos', 'WARNING'):
+            eventos.BrokerPostgres().enviar(chicos)
+            eventos.BrokerPostgres().enviar([grande, grande, enorme, grande])
+        avisos = [[json.loads(t) for t in llamada.args[0]] for llamada in notificar.call_args_list]
+        # El demasiado grande se descarta; el resto se agrupa en orden sin pasar MAX_PAYLOAD
+        self.assertEqual(avisos, [chicos, [grande, grande], [grande]])
+
+    def test_sin_broker_falla_fuera_de_debug(self):
+        with override_settings(DEBUG=False, EVENTOS_BROKER=''):
+            with self.assertRaises(ImproperlyConfigured):
+                eventos.comprobar_configuracion()
+        with override_settings(DEBUG=True, EVENTOS_BROKER='redis'):
+            with self.assertRaises(ImproperlyConfigured):
+                eventos.comprobar_configuracion()
+        with override_settings(DEBUG=False, EVENTOS_BROKER='postgres'):
+            eventos.comprobar_configuracion()
+
+
+@override_settings(EVENTOS_BROKER='')
+class StreamEventosTests(TestCase):
+    def setUp(self):
+        self.residente = _residente('ana')
+        self.bus = eventos.Bus()
+        parche = mock.patch.object(eventos, '_bus', self.bus)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _ticket(self, user):
+        cliente = APIClient()
+        cliente.force_authenticate(user)
+        respuesta = cliente.post(reverse('eventos-ticket'))
+        self.assertEqual(respuesta.status_code, 201)
+        return respuesta.json()['ticket']
+
+    def _abrir(self, headers=None, **params):
+        request = AsyncRequestFactory().get(reverse('eventos'), params, headers=headers)
+        return async_to_sync(stream_eventos)(request)
+
+    def test_ticket_de_un_solo_uso(self):
+        ticket = self._ticket(self.residente.user)
+        self.assertEqual(TicketEventos.objects.get().usuario, self.residente.user)
+
+        respuesta = self._abrir(ticket=ticket)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        (suscripcion,) = self.bus._suscripciones
+        self.assertEqual(suscripcion.canales, {tiempo_real.canal(self.residente.id), tiempo_real.CANAL_DIFUSIONES})
+
+        self.assertEqual(self._abrir(ticket=ticket).status_code, 401)
+        self.assertFalse(TicketEventos.objects.exists())
+
+    def test_ticket_vencido(self):
+        ticket = self._ticket(self.residente.user)
+        TicketEventos.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self._abrir(ticket=ticket).status_code, 401)
+
+    def test_jwt_solo_por_header(self):
+        token = str(AccessToken.for_user(self.residente.user))
+        self.assertEqual(self._abrir(token=token).status_code, 401)
+        self.assertEqual(self._abrir(headers={'Authorization': f'Bearer {token}'}).status_code, 200)
+
+    def test_publicar_entrega_al_confirmar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            evento = eventos.publicar('a', 'notificacion', {'fecha': timezone.now()})
+            self.assertFalse(self.bus._buffer)
+        self.assertEqual(list(self.bus._buffer), [evento])
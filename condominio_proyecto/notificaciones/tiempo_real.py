@@ -0,0 +1,143 @@
+"""Notificaciones en vivo (ver ``condominio_BackendAPI.eventos``).
+
+- ``notificacion``: cada ``Notificacion`` personal, en el canal de su
+  destinatario (``residente:<id>`` o ``usuario:<id>``). Los ``create`` la
+  publican por señal; ``bulk_create`` debe llamar a ``publicar_notificaciones``.
+- ``difusion``: cada ``Difusion`` en el canal ``difusiones``, con la audiencia
+  aparte para que cada suscripción filtre (``alcanza``) sin consultar la base.
+
+Los datos son los de la bandeja (mismo ``id`` que el listado, ``b-<uuid>``
+para las difusiones); el mensaje se recorta a ``MAX_MENSAJE`` y el cliente
+puede pedir el detalle por REST.
+
+Para abrir el stream desde el navegador (EventSource no envía headers) el
+cliente pide un ticket de un solo uso (``emitir_ticket``) y lo pasa en
+``?ticket=``: el JWT nunca viaja en la URL.
+"""
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from condominio_BackendAPI import eventos
+from . import difusiones
+from .models import TicketEventos
+
+CANAL_DIFUSIONES = 'difusiones'
+MAX_MENSAJE = 1000
+
+
+def canal(residente_id=None, usuario_id=None):
+    return f'residente:{residente_id}' if residente_id else f'usuario:{usuario_id}'
+
+
+def canales_de(user):
+    """Canales de notificaciones que puede escuchar `user`."""
+    residente = getattr(user, 'residente', None)
+    propio = canal(residente.id) if residente is not None else canal(usuario_id=user.id)
+    return [propio, CANAL_DIFUSIONES]
+
+
+def _datos(id_bandeja, obj):
+    mensaje = obj.mensaje or ''
+    return {
+        'id': id_bandeja, 'tipo': obj.tipo, 'titulo': obj.titulo, 'mensaje': mensaje[:MAX_MENSAJE],
+        'mensaje_recortado': len(mensaje) > MAX_MENSAJE, 'datos_extra': obj.datos_extra,
+        'fecha_creacion': obj.fecha_creacion, 'leida': False,
+    }
+
+
+def publicar_notificaciones(notificaciones):
+    for n in notificaciones:
+        eventos.publicar(canal(n.residente_id, n.usuario_id), 'notificacion', _datos(n.id, n))
+
+
+def publicar_difusion(difusion):
+    eventos.publicar(
+        CANAL_DIFUSIONES, 'difusion', _datos(f'{difusiones.PREFIJO}{difusion.id}', difusion),
+        audiencia={
+            'todos_residentes': difusion.todos_residentes, 'familias': difusion.familias,
+            'residentes': difusion.residentes, 'solo_principales': difusion.solo_principales,
+            'incluir_admins': difusion.incluir_admins, 'usuarios': difusion.usuarios,
+        },
+    )
+
+
+def alcanza(audiencia, residente=None, usuario=None):
+    """Las reglas de audiencia de una difusión recién creada, que coinciden con la
+    audiencia que ``difusiones.crear`` acaba de guardar (el evento no lleva la
+    lista de ids: NOTIFY limita el tamaño del mensaje).
+
+    Las fechas de registro no se comparan: todo destinatario ya existente es
+    anterior a la difusión.
+    """
+    if residente is not None:
+        if audiencia['solo_principales'] and residente.tipo != 'PRINCIPAL':
+            return False
+        return (
+            residente.id in audiencia['residentes'] or audiencia['todos_residentes']
+            or (residente.familia_id is not None and residente.familia_id in audiencia['familias'])
+        )
+    return usuario.id in audiencia['usuarios'] or (usuario.is_staff and audiencia['incluir_admins'])
+
+
+def filtro(user):
+    """Filtro de suscripción: descarta las difusiones cuya audiencia no incluye a `user`."""
+    residente = getattr(user, 'residente', None)
+
+    def aceptar(evento):
+        if evento['canal'] != CANAL_DIFUSIONES:
+            return True
+        return alcanza(evento['audiencia'], residente, None if residente is not None else user)
+    return aceptar
+
+
+def _hash(ticket):
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+
+def emitir_ticket(user):
+    """Ticket de un solo uso para abrir el stream de `user`; devuelve (ticket, segundos de validez)."""
+    segundos = getattr(settings, 'EVENTOS_TICKET_SEGUNDOS', 30)
+    ahora = timezone.now()
+    ticket = secrets.token_urlsafe(32)
+    TicketEventos.objects.filter(expira__lte=ahora).delete()
+    TicketEventos.objects.create(clave=_hash(ticket), usuario=user, expira=ahora + timedelta(seconds=segundos))
+    return ticket, segundos
+
+
+def canjear_ticket(ticket):
+    """Usuario del ticket, o None si no existe, venció o el usuario está inactivo.
+
+    El ticket se borra bajo bloqueo: dos conexiones con el mismo ticket no
+    pueden usarlo las dos.
+    """
+    with transaction.atomic():
+        fila = TicketEventos.objects.select_for_update().select_related('usuario').filter(clave=_hash(ticket)).first()
+        if fila is None:
+            return None
+        fila.delete()
+    if fila.expira <= timezone.now() or not fila.usuario.is_active:
+        return None
+    return fila.usuario
+
+
+def _notificacion_creada(sender, instance, created, **kwargs):
+    if created:
+        publicar_notificaciones([instance])
+
+
+def _difusion_creada(sender, instance, created, **kwargs):
+    if created:
+        publicar_difusion(instance)
+
+
+def conectar_senales():
+    from .models import Difusion, Notificacion
+
+    post_save.connect(_notificacion_creada, sender=Notificacion, dispatch_uid='tiempo_real_notificacion')
+    post_save.connect(_difusion_creada, sender=Difusion, dispatch_uid='tiempo_real_difusion')
@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import NotificacionViewSet
+from .views import NotificacionViewSet, stream_eventos, ticket_eventos
 
 router = DefaultRouter()
 router.register(r'notificaciones', NotificacionViewSet)
 
 urlpatterns = [
+    path('eventos/', stream_eventos, name='eventos'),
+    path('eventos/ticket/', ticket_eventos, name='eventos-ticket'),
     path('', include(router.urls)),
 ]
@@ -1,18 +1,48 @@
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
-from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from django.core.exceptions import ValidationError
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
-from django.db import transaction
-from accesos.models import Residente, Familia
-from .models import Notificacion
+from accesos import busqueda
+from accesos import tiempo_real as tiempo_real_accesos
+from condominio_BackendAPI import eventos
+from condominio_BackendAPI.pagination import CursorOpcional, responder
+from . import difusiones, lecturas, tiempo_real
+from .models import Notificacion, Difusion, ResumenDifusion
 from .serializers import NotificacionSerializer
 from accesos.permissions import IsAdminUser
 
 
+def _serializar(notificaciones):
+    return NotificacionSerializer(lecturas.completar(notificaciones), many=True).data
+
+
+def _cubierta(destinatario, difusion):
+    # leidas_hasta si la marca de lectura del destinatario cubre la difusion
+    marca = getattr(destinatario, 'marca_lectura', None)
+    if marca is not None and marca.leidas_hasta >= difusion.fecha_creacion:
+        return marca.leidas_hasta
+    return None
+
+
+def _ids_personales(ids):
+    return [i for i in ids if isinstance(i, int) or (isinstance(i, str) and i.isdigit())]
+
+
+def _ids_difusiones(ids):
+    return [b for b in map(difusiones.id_difusion, ids) if b is not None]
+
+
 class NotificacionViewSet(viewsets.ModelViewSet):
     queryset = Notificacion.objects.all().order_by('-fecha_creacion')
     serializer_class = NotificacionSerializer
+    cursor_ordering = ('-fecha_creacion', '-id')
 
     def get_permissions(self):
         if self.action in ['destroy', 'create', 'update', 'partial_update']:
@@ -21,9 +51,7 @@ class NotificacionViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-    def get_queryset(self):
-        user = self.request.user
-        qs = Notificacion.objects.all().order_by('-fecha_creacion')
+    def _filtrar(self, qs):
         # Filtros comunes: tipo y rango de fechas
         tipo = self.request.query_params.get('tipo')  # AVISO, ACTIVIDAD, etc
         if tipo:
@@ -34,6 +62,11 @@ class NotificacionViewSet(viewsets.ModelViewSet):
             qs = qs.filter(fecha_creacion__gte=desde)
         if hasta:
             qs = qs.filter(fecha_creacion__lte=hasta)
+        return qs
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = self._filtrar(Notificacion.objects.all().order_by('-fecha_creacion'))
         if user.is_staff:
             # Por defecto, mostrar solo las suyas como admin; permitir ?all=true para ver todo
             if self.request.query_params.get('all') == 'true':
@@ -45,24 +78,67 @@ class NotificacionViewSet(viewsets.ModelViewSet):
         except Exception:
             return Notificacion.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        """Bandeja del usuario: sus notificaciones más las difusiones que le llegan.
+        Con ?all=true un admin ve todas las notificaciones personales (sin difusiones)."""
+        if request.user.is_staff and request.query_params.get('all') == 'true':
+            queryset = self.filter_queryset(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(_serializar(page))
+            return Response(_serializar(queryset))
+        feed = difusiones.Feed(filtrar=self._filtrar, **difusiones.destinatario(request.user))
+        return responder(request, feed, _serializar, self.cursor_ordering)
+
+    def retrieve(self, request, *args, **kwargs):
+        bid = difusiones.id_difusion(kwargs.get('pk'))
+        if bid is None:
+            return Response(_serializar([self.get_object()])[0])
+        quien = difusiones.destinatario(request.user)
+        difusion = get_object_or_404(difusiones.visibles(**quien), pk=bid)
+        return Response(_serializar([difusiones.como_notificacion(difusion, **quien)])[0])
+
+    def destroy(self, request, *args, **kwargs):
+        bid = difusiones.id_difusion(kwargs.get('pk'))
+        if bid is None:
+            return super().destroy(request, *args, **kwargs)
+        # Borra la difusion para todos sus destinatarios
+        get_object_or_404(Difusion, pk=bid).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(detail=False, methods=['post'], url_path='marcar-leidas')
     def marcar_leidas(self, request):
+        """Marca como leídas las notificaciones indicadas en `ids` (personales o "b-<uuid>"), o todas.
+        Sin `ids` solo se mueve la marca de lectura del usuario (ver notificaciones/lecturas.py)."""
         ids = request.data.get('ids')
-        user = request.user
         # marcar del usuario (residente o admin)
-        qs = Notificacion.objects.filter(leida=False)
-        if hasattr(user, 'residente'):
-            qs = qs.filter(residente=user.residente)
-        else:
-            qs = qs.filter(usuario=user)
+        quien = difusiones.destinatario(request.user)
         if isinstance(ids, list):
-            qs = qs.filter(id__in=ids)
-        updated = qs.update(leida=True, fecha_lectura=timezone.now())
+            updated = lecturas.marcar(_ids_personales(ids), _ids_difusiones(ids), **quien)
+        else:
+            updated = lecturas.no_leidas(**quien)
+            lecturas.marcar_todas(**quien)
         return Response({'marcadas': updated})
 
+    @action(detail=False, methods=['get'], url_path='no-leidas')
+    def no_leidas(self, request):
+        """Cantidad de notificaciones sin leer del usuario (para el badge)."""
+        return Response({'no_leidas': lecturas.no_leidas(**difusiones.destinatario(request.user))})
+
+    @action(detail=False, methods=['post'], url_path='descartar')
+    def descartar(self, request):
+        """Quita difusiones (ids "b-<uuid>") de la bandeja del usuario."""
+        ids = request.data.get('ids')
+        if not isinstance(ids, list):
+            return Response({'detail': 'ids es requerido'}, status=status.HTTP_400_BAD_REQUEST)
+        quien = difusiones.destinatario(request.user)
+        visibles = difusiones.visibles(**quien).filter(pk__in=_ids_difusiones(ids))
+        descartadas = difusiones.registrar(visibles.values_list('pk', flat=True), 'descartada_en', **quien)
+        return Response({'descartadas': descartadas})
+
     @action(detail=False, methods=['post'], url_path='enviar')
     def enviar(self, request):
-        """Envía notificaciones sin entidad 'campaña'. Targets por flags y listas.
+        """Envía una difusión (una sola fila, ver notificaciones/difusiones.py). Targets por flags y listas.
         Body esperado: {
           tipo, titulo, mensaje, datos_extra?, incluir_todos_residentes?, incluir_admins?, familias?:[], residentes?:[]
         }
@@ -72,103 +148,66 @@ class NotificacionViewSet(viewsets.ModelViewSet):
         if not request.user.is_staff:
             return Response({'detail': 'Solo administradores'}, status=status.HTTP_403_FORBIDDEN)
         tipo = data.get('tipo')
-        titulo = data.get('titulo')
         mensaje = data.get('mensaje')
-        datos_extra = data.get('datos_extra')
-        incluir_todos = bool(data.get('incluir_todos_residentes'))
-        incluir_admins = bool(data.get('incluir_admins'))
-        familias_ids = data.get('familias') or []
-        residentes_ids = data.get('residentes') or []
-        solo_principales = bool(data.get('solo_principales'))
-
         if not tipo or not mensaje:
             return Response({'detail': 'tipo y mensaje son requeridos'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            familias_ids = [int(x) for x in data.get('familias') or []]
+            residentes_ids = [int(x) for x in data.get('residentes') or []]
+        except (TypeError, ValueError):
+            return Response({'detail': 'familias y residentes deben ser listas de ids'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # determinar destinatarios
-        res_qs = Residente.objects.none()
-        if incluir_todos:
-            res_qs = Residente.objects.filter(user__is_active=True)
-        else:
-            if familias_ids:
-                res_qs = Residente.objects.filter(familia_id__in=familias_ids, user__is_active=True)
-            if residentes_ids:
-                res_qs = (res_qs | Residente.objects.filter(id__in=residentes_ids, user__is_active=True)).distinct()
-
-        if solo_principales:
-            res_qs = res_qs.filter(tipo='PRINCIPAL')
-
-        # generar broadcast_id para agrupar
-        import uuid
-        bid = str(uuid.uuid4())
-        total = 0
-        with transaction.atomic():
-            for r in res_qs:
-                Notificacion.objects.create(
-                    broadcast_id=bid,
-                    residente=r,
-                    tipo=tipo,
-                    titulo=titulo,
-                    mensaje=mensaje,
-                    datos_extra=datos_extra,
-                )
-                total += 1
-            if incluir_admins:
-                for admin_user in User.objects.filter(is_staff=True, is_active=True):
-                    Notificacion.objects.create(
-                        broadcast_id=bid,
-                        usuario=admin_user,
-                        tipo=tipo,
-                        titulo=titulo,
-                        mensaje=mensaje,
-                        datos_extra=datos_extra,
-                    )
-                    total += 1
-
-        return Response({'broadcast_id': bid, 'entregas_creadas': total})
+        difusion = difusiones.crear(
+            tipo=tipo,
+            titulo=data.get('titulo'),
+            mensaje=mensaje,
+            datos_extra=data.get('datos_extra'),
+            todos_residentes=bool(data.get('incluir_todos_residentes')),
+            familias=familias_ids,
+            residentes=residentes_ids,
+            solo_principales=bool(data.get('solo_principales')),
+            incluir_admins=bool(data.get('incluir_admins')),
+            enviado_por=request.user,
+        )
+        return Response({'broadcast_id': str(difusion.id), 'entregas_creadas': difusion.resumen.total})
 
     @action(detail=False, methods=['get'], url_path='historial')
     def historial(self, request):
-        """Resumen de envíos agrupados por broadcast_id, con filtros de tipo y fecha.
+        """Resumen de envíos (ResumenDifusion), con filtros de tipo y fecha.
         Devuelve items con: broadcast_id, fecha, tipo, titulo, total, leidas, no_leidas.
+        Con ?cursor= o ?paginar=cursor pagina por cursor y agrega next/previous
+        (?page_size=, por defecto 50).
         Solo admins."""
         if not request.user.is_staff:
             return Response({'detail': 'Solo administradores'}, status=status.HTTP_403_FORBIDDEN)
-    # No usar get_queryset (filtra por usuario admin). Queremos ver TODOS los envios.
-        qs = Notificacion.objects.all()
-        # Aplicar filtros de tipo/fecha si vienen
-        tipo = request.query_params.get('tipo')
-        if tipo:
-            qs = qs.filter(tipo=tipo)
-        desde = request.query_params.get('desde')
-        hasta = request.query_params.get('hasta')
-        if desde:
-            qs = qs.filter(fecha_creacion__gte=desde)
-        if hasta:
-            qs = qs.filter(fecha_creacion__lte=hasta)
-        qs = qs.exclude(broadcast_id__isnull=True)
-        # Agrupar
-        from django.db.models import Count, Sum, Case, When, IntegerField, Max
-        agg = qs.values('broadcast_id', 'tipo', 'titulo').annotate(
-            fecha=Max('fecha_creacion'),
-            total=Count('id'),
-            leidas=Sum(Case(When(leida=True, then=1), default=0, output_field=IntegerField())),
-        ).order_by('-fecha')
+        qs = self._filtrar(ResumenDifusion.objects.all()).order_by('-fecha_creacion')
+        paginador = CursorOpcional(('-fecha_creacion',))
+        pagina = paginador.paginate_queryset(qs, request)
+        resumenes = list(qs if pagina is None else pagina)
+        por_marca = difusiones.leidas_por_marca(r.difusion_id for r in resumenes)
         items = []
-        for row in agg:
+        for r in resumenes:
+            leidas = r.leidas + por_marca.get(r.difusion_id, 0)
             items.append({
-                'broadcast_id': row['broadcast_id'],
-                'tipo': row['tipo'],
-                'titulo': row['titulo'],
-                'fecha': row['fecha'],
-                'total': row['total'],
-                'leidas': row['leidas'] or 0,
-                'no_leidas': (row['total'] - (row['leidas'] or 0)),
+                'broadcast_id': str(r.difusion_id),
+                'tipo': r.tipo,
+                'titulo': r.titulo,
+                'fecha': r.fecha_creacion,
+                'total': r.total,
+                'leidas': leidas,
+                'no_leidas': max(r.total - leidas, 0),
             })
-        return Response({'items': items})
+        if pagina is None:
+            return Response({'items': items})
+        return Response({
+            'items': items,
+            'next': paginador.get_next_link(),
+            'previous': paginador.get_previous_link(),
+        })
 
     @action(detail=False, methods=['get'], url_path='historial/(?P<bid>[^/]+)')
     def historial_detalle(self, request, bid=None):
-        """Detalle de un envío (broadcast_id): lista completa de notificaciones, con filtros de búsqueda de residente/familia/documento/username.
+        """Detalle de un envío (broadcast_id): una entrega por destinatario, con filtros de búsqueda de residente/familia/documento/username.
         Solo admins.
         Query params:
           search: texto libre
@@ -176,25 +215,27 @@ class NotificacionViewSet(viewsets.ModelViewSet):
         """
         if not request.user.is_staff:
             return Response({'detail': 'Solo administradores'}, status=status.HTTP_403_FORBIDDEN)
-        qs = Notificacion.objects.filter(broadcast_id=bid).select_related('residente__user', 'residente__familia', 'usuario').order_by('-fecha_creacion')
+        try:
+            difusion = Difusion.objects.get(pk=bid)
+        except (Difusion.DoesNotExist, ValidationError):
+            return Response({'detail': 'No encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+        residentes = difusiones.destinatarios_residentes(difusion).select_related('user', 'familia', 'marca_lectura').order_by('id')
+        admins = difusiones.destinatarios_admins(difusion).select_related('marca_lectura').order_by('id')
         search = request.query_params.get('search')
         if search:
-            from django.db.models import Q
-            s = search.strip()
-            qs = qs.filter(
-                Q(residente__user__first_name__icontains=s) |
-                Q(residente__user__last_name__icontains=s) |
-                Q(residente__user__username__icontains=s) |
-                Q(residente__documento_identidad__icontains=s) |
-                Q(residente__familia__nombre__icontains=s) |
-                Q(residente__familia__departamento__icontains=s) |
-                Q(residente__familia__torre__icontains=s) |
-                Q(usuario__username__icontains=s)
-            )
+            residentes = busqueda.coincidencias(residentes, search)
+            admins = admins.filter(username__icontains=search.strip())
+        estados = difusion.estados.filter(leida_en__isnull=False)
+        leidas_r = dict(estados.filter(residente__isnull=False).values_list('residente_id', 'leida_en'))
+        leidas_u = dict(estados.filter(usuario__isnull=False).values_list('usuario_id', 'leida_en'))
+        entregas = [difusiones.como_notificacion(difusion, residente=r, leida_en=leidas_r.get(r.id) or _cubierta(r, difusion))
+                    for r in residentes]
+        entregas += [difusiones.como_notificacion(difusion, usuario=u, leida_en=leidas_u.get(u.id) or _cubierta(u, difusion))
+                     for u in admins]
         leida = request.query_params.get('leida')
         if leida in ['true', 'false']:
-            qs = qs.filter(leida=(leida == 'true'))
-        data = NotificacionSerializer(qs, many=True).data
+            entregas = [e for e in entregas if e.leida == (leida == 'true')]
+        data = NotificacionSerializer(entregas, many=True).data
         return Response({'items': data})
 
     @action(detail=False, methods=['get'], url_path='admins-count')
@@ -203,3 +244,68 @@ class NotificacionViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Solo administradores'}, status=status.HTTP_403_FORBIDDEN)
         count = User.objects.filter(is_staff=True, is_active=True).count()
         return Response({'admins': count})
+
+
+# Grupos de canales que se pueden pedir con ?canales=notificaciones,accesos
+GRUPOS_EVENTOS = ('notificaciones', 'accesos')
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def ticket_eventos(request):
+    """POST /api/eventos/ticket/: ticket de un solo uso para abrir el stream con ?ticket=."""
+    ticket, segundos = tiempo_real.emitir_ticket(request.user)
+    return Response({'ticket': ticket, 'expira_en': segundos}, status=status.HTTP_201_CREATED)
+
+
+def _usuario_del_stream(request):
+    # Los EventSource del navegador no envían headers: usan ?ticket= (ver ticket_eventos).
+    # El JWT no se acepta en la URL: quedaría en los logs de acceso.
+    ticket = request.GET.get('ticket')
+    if ticket:
+        user = tiempo_real.canjear_ticket(ticket)
+    else:
+        try:
+            resultado = JWTAuthentication().authenticate(request)
+        except (InvalidToken, AuthenticationFailed):
+            return None
+        user = resultado[0] if resultado else None
+    if user is not None:
+        getattr(user, 'residente', None)  # carga el residente fuera del loop async
+    return user
+
+
+async def stream_eventos(request):
+    """GET /api/eventos/: stream SSE (text/event-stream) con las notificaciones del usuario
+    y, para admins, el feed de portería (ver condominio_BackendAPI/eventos.py).
+    Se autentica con ?ticket= (POST /api/eventos/ticket/) o con el header Authorization.
+
+    Reconectando con el header Last-Event-ID se repiten los eventos perdidos; si
+    ya no están en el buffer llega un evento `reinicio` y el cliente debe recargar.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    user = await sync_to_async(_usuario_del_stream)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Ticket o token inválido o ausente'}, status=401)
+    grupos = set(GRUPOS_EVENTOS)
+    if request.GET.get('canales'):
+        grupos &= {g.strip() for g in request.GET['canales'].split(',')}
+    canales = []
+    if 'notificaciones' in grupos:
+        canales += tiempo_real.canales_de(user)
+    if 'accesos' in grupos and user.is_staff:
+        canales.append(tiempo_real_accesos.CANAL)
+    if not canales:
+        return JsonResponse({'detail': 'Sin canales disponibles'}, status=400)
+    eventos.asegurar_escucha()
+    suscripcion, pendientes, completo = eventos.bus().suscribir(
+        canales, tiempo_real.filtro(user), request.headers.get('Last-Event-ID'),
+    )
+    response = StreamingHttpResponse(
+        eventos.flujo(suscripcion, pendientes, completo), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Que nginx / el balanceador no acumulen la respuesta
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,128 @@
+"""Querysets filtrados de cada reporte.
+
+Reciben los parámetros (QueryDict o dict) en lugar del request para poder
+reutilizarse en las respuestas JSON, en las exportaciones y fuera de un request.
+"""
+from django.db.models import Count
+from django.utils.dateparse import parse_datetime
+
+from accesos import archivo, busqueda
+from accesos.models import Residente, Familia, RegistroAcceso, AutorizacionVisita
+from accesos.services import AutorizacionService
+from areas.models import ReservaArea
+
+
+def parse_range(params):
+    desde = params.get('desde')
+    hasta = params.get('hasta')
+    try:
+        d = parse_datetime(desde) if desde else None
+        h = parse_datetime(hasta) if hasta else None
+    except Exception:
+        d = h = None
+    return d, h
+
+
+def _filtrar_rango(qs, params, campo):
+    d, h = parse_range(params)
+    if d:
+        qs = qs.filter(**{f'{campo}__gte': d})
+    if h:
+        qs = qs.filter(**{f'{campo}__lte': h})
+    return qs
+
+
+def residentes(params):
+    qs = Residente.objects.select_related('user','familia').all()
+    activo = params.get('activo')
+    tipo = params.get('tipo')
+    q = params.get('q')
+    if activo in ('true','false'):
+        qs = qs.filter(activo=(activo=='true'))
+    if tipo in ('PRINCIPAL','FAMILIAR'):
+        qs = qs.filter(tipo=tipo)
+    if q:
+        qs = busqueda.buscar(qs, q)
+    return _filtrar_rango(qs, params, 'fecha_registro')
+
+
+def familias(params):
+    qs = Familia.objects.all().annotate(residentes_count=Count('residentes'))
+    activo = params.get('activo')
+    q = params.get('q')
+    if activo in ('true','false'):
+        qs = qs.filter(activo=(activo=='true'))
+    if q:
+        qs = busqueda.buscar(qs, q)
+    return _filtrar_rango(qs, params, 'fecha_creacion')
+
+
+def accesos(params):
+    qs = RegistroAcceso.objects.select_related('vehiculo').all()
+    tipo_persona = params.get('tipo_persona')  # R, V, D
+    exitoso = params.get('exitoso')
+    q = params.get('q')
+    if tipo_persona in ('R','V','D'):
+        qs = qs.filter(tipo_persona=tipo_persona)
+    if exitoso in ('true','false'):
+        qs = qs.filter(exitoso=(exitoso=='true'))
+    qs = _filtrar_rango(qs, params, 'fecha_hora')
+    if q:
+        qs = busqueda.buscar_accesos(qs, q)
+    d, h = parse_range(params)
+    if archivo.alcanza(d, h):
+        # El rango llega a días archivados: tabla + archivo, con los mismos filtros
+        return archivo.AccesosConArchivo(qs, d, h, _filtro_archivo(tipo_persona, exitoso, q))
+    return qs
+
+
+def _filtro_archivo(tipo_persona, exitoso, q):
+    """Los filtros de `accesos` como predicado sobre registros archivados."""
+    criterios = busqueda.criterios_accesos(q) if q else None
+    if criterios is not None:
+        personas = {tipo: set(ids.values_list('pk', flat=True)) for tipo, ids in criterios['personas'].items()}
+        vehiculos = set(criterios['vehiculos'].values_list('pk', flat=True))
+
+    def filtro(registro):
+        if tipo_persona in ('R','V','D') and registro.tipo_persona != tipo_persona:
+            return False
+        if exitoso in ('true','false') and registro.exitoso != (exitoso == 'true'):
+            return False
+        if criterios is None:
+            return True
+        return (
+            registro.persona_id in personas[registro.tipo_persona]
+            or registro.vehiculo_id in vehiculos
+            or registro.id == criterios['id']
+            or registro.tipo_persona == criterios['tipo_persona']
+        )
+    return filtro
+
+
+def reservas(params):
+    qs = ReservaArea.objects.select_related('area','residente__user','familia','unidad','turno').all()
+    estado = params.get('estado')
+    area_id = params.get('area')
+    q = params.get('q')
+    if estado in ('PENDIENTE','CONFIRMADA','CANCELADA'):
+        qs = qs.filter(estado=estado)
+    if area_id and str(area_id).isdigit():
+        qs = qs.filter(area_id=int(area_id))
+    qs = _filtrar_rango(qs, params, 'fecha_creacion')
+    if q:
+        qs = busqueda.buscar(qs, q)
+    return qs
+
+
+def visitas(params):
+    qs = AutorizacionService.anotar_status_efectivo(
+        AutorizacionVisita.objects.select_related('visitante','autorizado_por__user','familia').all()
+    )
+    status_f = params.get('status')
+    q = params.get('q')
+    if status_f in ('ACTIVA','VENCIDA','CANCELADA','UTILIZADA'):
+        qs = qs.filter(status_efectivo=status_f)
+    qs = _filtrar_rango(qs, params, 'fecha_creacion')
+    if q:
+        qs = busqueda.buscar_autorizaciones(qs, q)
+    return qs
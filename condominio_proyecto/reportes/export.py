@@ -0,0 +1,263 @@
+"""Exportación de los reportes (``?format=csv|ndjson|pdf``).
+
+Dos caminos:
+
+* Reportes planos en CSV: ``COPY (SELECT ...) TO STDOUT`` sobre el mismo
+  queryset filtrado. Postgres genera el CSV y los bloques se reenvían al
+  cliente tal como llegan, sin instanciar modelos.
+* El resto (NDJSON, y accesos, cuya persona es polimórfica): iteración con
+  cursor del lado del servidor (``iterator(chunk_size=...)``), serializando
+  lote por lote con los serializers de ``reportes``.
+
+En ambos casos la memoria queda acotada por el tamaño de lote y el primer
+byte sale en cuanto la base entrega la primera fila. El PDF (ver pdf.py)
+consume las mismas filas por lotes.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import CharField, F, Func, TextField, Value
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf, Trim
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+from accesos.personas import PersonaResolver
+from . import pdf
+from .serializers import (
+    ResidenteReporteSerializer,
+    FamiliaReporteSerializer,
+    RegistroAccesoReporteSerializer,
+    ReservaAreaReporteSerializer,
+    AutorizacionVisitaReporteSerializer,
+)
+
+TAMANO_LOTE = 2000
+
+
+# Renderers solo para la negociación de ?format=: las exportaciones devuelven
+# StreamingHttpResponse; si la vista falla antes, el error sale como JSON.
+class CSVRenderer(JSONRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(JSONRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class PDFRenderer(JSONRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, CSVRenderer, NDJSONRenderer, PDFRenderer]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'pdf': 'application/pdf',
+}
+
+
+def formato(request):
+    """Formato de exportación pedido (csv/ndjson/pdf) o None para la respuesta JSON normal."""
+    fmt = getattr(getattr(request, 'accepted_renderer', None), 'format', None)
+    return fmt if fmt in CONTENT_TYPES else None
+
+
+# --- Columnas para COPY -----------------------------------------------------
+
+def _texto(campo):
+    return Cast(F(campo), TextField())
+
+
+def _fecha(campo):
+    # Mismo instante que en JSON, en hora local y sin depender del TimeZone de la sesión
+    return Func(
+        F(campo),
+        template=f"to_char(%(expressions)s AT TIME ZONE '{settings.TIME_ZONE}', 'YYYY-MM-DD\"T\"HH24:MI:SS')",
+        output_field=CharField(),
+    )
+
+
+def _nombre_usuario(prefijo):
+    nombre = Trim(Concat(F(f'{prefijo}first_name'), Value(' '), F(f'{prefijo}last_name'), output_field=CharField()))
+    return Coalesce(NullIf(nombre, Value('')), F(f'{prefijo}username'), output_field=CharField())
+
+
+COLUMNAS_COPY = {
+    'residentes': [
+        ('id', F('id')),
+        ('documento_identidad', F('documento_identidad')),
+        ('username', F('user__username')),
+        ('nombre', _nombre_usuario('user__')),
+        ('tipo', F('tipo')),
+        ('activo', _texto('activo')),
+        ('fecha_registro', _fecha('fecha_registro')),
+        ('familia', F('familia_id')),
+        ('familia_nombre', F('familia__nombre')),
+        ('torre', F('familia__torre')),
+        ('departamento', F('familia__departamento')),
+    ],
+    'familias': [
+        ('id', F('id')),
+        ('nombre', F('nombre')),
+        ('torre', F('torre')),
+        ('departamento', F('departamento')),
+        ('activo', _texto('activo')),
+        ('fecha_creacion', _fecha('fecha_creacion')),
+        ('residentes_count', F('residentes_count')),
+    ],
+    'reservas': [
+        ('id', F('id')),
+        ('fecha_creacion', _fecha('fecha_creacion')),
+        ('estado', F('estado')),
+        ('area', F('area_id')),
+        ('area_nombre', F('area__nombre')),
+        ('residente', F('residente_id')),
+        ('residente_documento', F('residente__documento_identidad')),
+        ('residente_nombre', _nombre_usuario('residente__user__')),
+        ('unidad', F('unidad_id')),
+        ('turno', F('turno_id')),
+        ('fecha_inicio', _fecha('fecha_inicio')),
+        ('fecha_fin', _fecha('fecha_fin')),
+        ('cupos', F('cupos')),
+    ],
+    'visitas': [
+        ('id', F('id')),
+        ('fecha_creacion', _fecha('fecha_creacion')),
+        ('status', F('status_efectivo')),
+        ('fecha_inicio', _fecha('fecha_inicio')),
+        ('fecha_fin', _fecha('fecha_fin')),
+        ('visitante_nombre', F('visitante__nombre_completo')),
+        ('visitante_doc', F('visitante__documento_identidad')),
+        ('autorizado_por_id', F('autorizado_por_id')),
+        ('autorizado_por_documento', F('autorizado_por__documento_identidad')),
+        ('familia_id', F('familia_id')),
+        ('codigo_qr', F('codigo_qr')),
+        ('entradas_permitidas', F('entradas_permitidas')),
+        ('entradas_consumidas', F('entradas_consumidas')),
+        ('dentro', _texto('dentro')),
+    ],
+}
+
+
+def sql_copy(queryset, columnas):
+    """Sentencia COPY ... TO STDOUT (CSV con cabecera) y sus parámetros para el queryset."""
+    # Alias c0..cN: evitan choques con nombres de campos y fijan el orden de las columnas
+    qs = queryset.values(**{f'c{i}': expr for i, (_, expr) in enumerate(columnas)})
+    sql, params = qs.query.sql_with_params()
+    q = connection.ops.quote_name
+    seleccion = ', '.join(f'{q(f"c{i}")} AS {q(nombre)}' for i, (nombre, _) in enumerate(columnas))
+    return f'COPY (SELECT {seleccion} FROM ({sql}) AS t) TO STDOUT WITH (FORMAT csv, HEADER true)', params
+
+
+def _copy(sentencia, params):
+    with connection.cursor() as cursor:
+        # cursor.cursor es el cursor de psycopg; los parámetros se combinan del lado del cliente
+        with cursor.cursor.copy(sentencia, params) as copy:
+            for bloque in copy:
+                yield bytes(bloque)
+
+
+# --- Serialización por lotes ------------------------------------------------
+
+def _serializar_accesos(filas):
+    # Resolver nuevo por lote: el mapa de identidad no crece con el total exportado
+    return RegistroAccesoReporteSerializer(filas, many=True, context={'personas': PersonaResolver()}).data
+
+
+SERIALIZADORES = {
+    'residentes': lambda filas: ResidenteReporteSerializer(filas, many=True).data,
+    'familias': lambda filas: FamiliaReporteSerializer(filas, many=True).data,
+    'accesos': _serializar_accesos,
+    'reservas': lambda filas: ReservaAreaReporteSerializer(filas, many=True).data,
+    'visitas': lambda filas: AutorizacionVisitaReporteSerializer(filas, many=True).data,
+}
+
+CAMPOS = {
+    'residentes': ResidenteReporteSerializer.Meta.fields,
+    'familias': FamiliaReporteSerializer.Meta.fields,
+    'accesos': RegistroAccesoReporteSerializer.Meta.fields,
+    'reservas': ReservaAreaReporteSerializer.Meta.fields,
+    'visitas': AutorizacionVisitaReporteSerializer.Meta.fields,
+}
+
+
+def lotes(queryset, tamano=TAMANO_LOTE):
+    """Listas de hasta `tamano` objetos leídas con un cursor del lado del servidor."""
+    it = queryset.iterator(chunk_size=tamano)
+    while True:
+        lote = list(islice(it, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def filas(reporte, queryset, tamano=TAMANO_LOTE):
+    """Filas serializadas (dicts) del reporte, lote por lote."""
+    serializar = SERIALIZADORES[reporte]
+    for lote in lotes(queryset, tamano):
+        yield from serializar(lote)
+
+
+def _celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'true' if valor else 'false'
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return valor
+
+
+def _csv(reporte, queryset, tamano):
+    columnas = CAMPOS[reporte]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columnas)
+    yield buf.getvalue()
+    for lote in lotes(queryset, tamano):
+        buf.seek(0)
+        buf.truncate()
+        for fila in SERIALIZADORES[reporte](lote):
+            writer.writerow([_celda(fila.get(c)) for c in columnas])
+        yield buf.getvalue()
+
+
+def _ndjson(reporte, queryset, tamano):
+    for lote in lotes(queryset, tamano):
+        yield ''.join(
+            json.dumps(fila, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+            for fila in SERIALIZADORES[reporte](lote)
+        )
+
+
+def contenido(reporte, queryset, fmt, tamano=TAMANO_LOTE):
+    """Generador con el cuerpo de la exportación (bytes o str)."""
+    if fmt == 'csv' and reporte in COLUMNAS_COPY and connection.vendor == 'postgresql':
+        return _copy(*sql_copy(queryset, COLUMNAS_COPY[reporte]))
+    if fmt == 'csv':
+        return _csv(reporte, queryset, tamano)
+    return _ndjson(reporte, queryset, tamano)
+
+
+def exportar(reporte, queryset, fmt, params=None):
+    if fmt == 'pdf':
+        # El PDF necesita la tabla de referencias cruzadas al final: se arma completo y se envía
+        cuerpo = pdf.renderizar(reporte, filas(reporte, queryset), pdf.describir_filtros(params or {}))
+        resp = HttpResponse(cuerpo, content_type=CONTENT_TYPES[fmt])
+    else:
+        resp = StreamingHttpResponse(contenido(reporte, queryset, fmt), content_type=CONTENT_TYPES[fmt])
+        # Evitar que un proxy intermedio acumule la respuesta completa
+        resp['X-Accel-Buffering'] = 'no'
+    resp['Content-Disposition'] = f'attachment; filename="reporte_{reporte}_{timezone.localdate():%Y%m%d}.{fmt}"'
+    return resp
@@ -0,0 +1,55 @@
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reportes import pdf
+
+
+def _filas_sinteticas(reporte, n):
+    base = timezone.localtime()
+    for i in range(n):
+        ts = (base - timedelta(minutes=i)).isoformat()
+        if reporte == 'accesos':
+            yield {
+                'id': i + 1, 'fecha_hora': ts, 'tipo_persona_label': 'Visitante',
+                'persona_nombre': f'Visitante de prueba {i % 500}', 'persona_documento': f'{7000000 + i % 500}',
+                'tipo_verificacion_label': 'Credencial', 'exitoso': i % 7 != 0,
+                'vehiculo_matricula': f'{1000 + i % 300}ABC' if i % 3 == 0 else None,
+            }
+        else:
+            yield {
+                'id': i + 1, 'fecha_creacion': ts, 'status': 'ACTIVA' if i % 4 else 'UTILIZADA',
+                'visitante_nombre': f'Visitante de prueba {i % 500}', 'visitante_doc': f'{7000000 + i % 500}',
+                'autorizado_por_documento': f'{5000000 + i % 80}', 'fecha_inicio': ts, 'fecha_fin': ts,
+                'entradas_consumidas': i % 2, 'dentro': False,
+            }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark del render PDF de reportes con filas sintéticas (sin base de datos): filas/s y memoria pico.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=5000)
+        parser.add_argument('--reporte', choices=['accesos', 'visitas'], default='accesos')
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **opts):
+        n = max(1, opts['filas'])
+        reporte = opts['reporte']
+        for rep in range(max(1, opts['repeticiones'])):
+            # La primera pasada incluye el armado de la plantilla y la caché de recortes vacía
+            t0 = time.perf_counter()
+            data = pdf.renderizar(reporte, _filas_sinteticas(reporte, n), max_filas=0)
+            dt = time.perf_counter() - t0
+            self.stdout.write(
+                f"Pasada {rep + 1}: {n} filas en {dt:.2f} s = {n / dt:,.0f} filas/s, {len(data) / 1024:.0f} KiB"
+            )
+        # Memoria en una pasada aparte: tracemalloc multiplica el tiempo de ejecución
+        tracemalloc.start()
+        pdf.renderizar(reporte, _filas_sinteticas(reporte, n), max_filas=0)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(f"Memoria pico: {pico / 1024 / 1024:.1f} MiB")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reportes import trabajos
+
+
+class Command(BaseCommand):
+    help = 'Elimina archivos y registros de trabajos de reportes vencidos. Pensado para cron/Cloud Scheduler.'
+
+    def handle(self, *args, **opts):
+        total = trabajos.limpiar_vencidos()
+        self.stdout.write(self.style.SUCCESS(f'Trabajos de reportes eliminados: {total}'))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reportes import trabajos
+from reportes.models import TrabajoReporte
+
+
+class Command(BaseCommand):
+    help = (
+        'Procesa trabajos de reportes PENDIENTES (para instancias con REPORTES_TRABAJOS_HILOS=0 '
+        'o para recuperar trabajos abandonados). Con --intervalo queda en bucle.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=int, default=0,
+                            help='Segundos entre pasadas; 0 ejecuta una sola pasada')
+
+    def handle(self, *args, **opts):
+        while True:
+            reencolados = trabajos.reencolar_abandonados()
+            if reencolados:
+                self.stdout.write(f'Trabajos abandonados reencolados: {reencolados}')
+            pendientes = list(
+                TrabajoReporte.objects.filter(estado='PENDIENTE').order_by('fecha_creacion').values_list('pk', flat=True)
+            )
+            for trabajo_id in pendientes:
+                try:
+                    trabajo = trabajos.ejecutar(trabajo_id)
+                except Exception as exc:
+                    self.stderr.write(f'{trabajo_id}: ERROR {exc}')
+                    continue
+                if trabajo is not None:
+                    self.stdout.write(f'{trabajo_id}: {trabajo.reporte}.{trabajo.formato} listo ({trabajo.tamano} bytes)')
+            if opts['intervalo'] <= 0:
+                return
+            time.sleep(opts['intervalo'])
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Duplicados en curso de antes de la restriccion: queda el mas nuevo de cada huella
+DESCARTAR_DUPLICADOS = """
+    UPDATE reportes_trabajoreporte t
+       SET estado = 'ERROR', error = 'Duplicado de otro trabajo en curso', fecha_fin = now()
+     WHERE t.estado IN ('PENDIENTE', 'EN_PROCESO')
+       AND EXISTS (
+            SELECT 1 FROM reportes_trabajoreporte o
+             WHERE o.huella = t.huella AND o.estado IN ('PENDIENTE', 'EN_PROCESO')
+               AND (o.fecha_creacion, o.id) > (t.fecha_creacion, t.id)
+       );
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(DESCARTAR_DUPLICADOS, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='trabajoreporte',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['PENDIENTE', 'EN_PROCESO'])), fields=('huella',), name='trabajo_reporte_huella_en_curso'),
+        ),
+    ]
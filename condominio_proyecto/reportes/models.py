@@ -0,0 +1,48 @@
+from django.db import models
+from django.contrib.auth.models import User
+import uuid
+
+
+class TrabajoReporte(models.Model):
+    """Generación asíncrona de un reporte a archivo (ver reportes/trabajos.py)."""
+    ESTADO_CHOICES = [
+        ('PENDIENTE', 'Pendiente'),
+        ('EN_PROCESO', 'En proceso'),
+        ('LISTO', 'Listo'),
+        ('ERROR', 'Error'),
+    ]
+    FORMATO_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+        ('pdf', 'PDF'),
+    ]
+    ESTADOS_EN_CURSO = ('PENDIENTE', 'EN_PROCESO')
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    reporte = models.CharField(max_length=20)
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True)
+    # sha256 de (reporte, formato, parametros normalizados): deduplica pedidos idénticos
+    huella = models.CharField(max_length=64, db_index=True)
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='PENDIENTE')
+    solicitado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='trabajos_reporte')
+    archivo = models.CharField(max_length=255, blank=True)
+    tamano = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    expira = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        constraints = [
+            # A lo sumo un trabajo en curso por huella (deduplicación de pedidos concurrentes)
+            models.UniqueConstraint(
+                fields=['huella'], condition=models.Q(estado__in=['PENDIENTE', 'EN_PROCESO']),
+                name='trabajo_reporte_huella_en_curso',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Reporte {self.reporte}.{self.formato} ({self.estado})"
@@ -0,0 +1,192 @@
+"""Render de reportes a PDF (``?format=pdf``) con reportlab.
+
+Se dibuja directo sobre el canvas, página por página, a partir de las filas
+serializadas por lotes (``export.filas``): nunca se arma la tabla completa en
+memoria ni se usa platypus (cuyo Table mide todas las filas antes de partir).
+La plantilla de cada reporte (columnas, anchos, posiciones) y el recorte de
+textos se calculan una vez por proceso y se reutilizan entre requests.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+FUENTE = 'Helvetica'
+FUENTE_NEGRITA = 'Helvetica-Bold'
+TAM_FUENTE = 7
+ALTO_FILA = 12
+MARGEN = 28
+PAGINA = landscape(A4)
+
+TITULOS = {
+    'residentes': 'Reporte de residentes',
+    'familias': 'Reporte de familias',
+    'accesos': 'Reporte de accesos',
+    'reservas': 'Reporte de reservas',
+    'visitas': 'Reporte de visitas',
+}
+
+# (campo del serializer, encabezado, ancho relativo)
+COLUMNAS = {
+    'residentes': [
+        ('id', 'ID', 1), ('documento_identidad', 'Documento', 2), ('nombre', 'Nombre', 4),
+        ('username', 'Usuario', 2.5), ('tipo', 'Tipo', 1.8), ('activo', 'Activo', 1),
+        ('familia_nombre', 'Familia', 3), ('torre', 'Torre', 1.2), ('departamento', 'Depto.', 1.2),
+        ('fecha_registro', 'Registro', 2.4),
+    ],
+    'familias': [
+        ('id', 'ID', 1), ('nombre', 'Nombre', 5), ('torre', 'Torre', 1.5), ('departamento', 'Depto.', 1.5),
+        ('activo', 'Activo', 1), ('residentes_count', 'Residentes', 1.3), ('fecha_creacion', 'Creación', 2.4),
+    ],
+    'accesos': [
+        ('id', 'ID', 1.2), ('fecha_hora', 'Fecha/hora', 2.4), ('tipo_persona_label', 'Tipo', 1.6),
+        ('persona_nombre', 'Persona', 4), ('persona_documento', 'Documento', 2),
+        ('tipo_verificacion_label', 'Verificación', 1.8), ('exitoso', 'Exitoso', 1.1),
+        ('vehiculo_matricula', 'Matrícula', 1.6),
+    ],
+    'reservas': [
+        ('id', 'ID', 1), ('fecha_creacion', 'Creación', 2.4), ('estado', 'Estado', 1.8),
+        ('area_nombre', 'Área', 3), ('residente_nombre', 'Residente', 3.5),
+        ('residente_documento', 'Documento', 2), ('fecha_inicio', 'Inicio', 2.4),
+        ('fecha_fin', 'Fin', 2.4), ('cupos', 'Cupos', 1),
+    ],
+    'visitas': [
+        ('id', 'ID', 1), ('fecha_creacion', 'Creación', 2.4), ('status', 'Estado', 1.8),
+        ('visitante_nombre', 'Visitante', 3.5), ('visitante_doc', 'Documento', 2),
+        ('autorizado_por_documento', 'Autorizado por', 2), ('fecha_inicio', 'Inicio', 2.4),
+        ('fecha_fin', 'Fin', 2.4), ('entradas_consumidas', 'Usos', 1), ('dentro', 'Dentro', 1),
+    ],
+}
+
+Plantilla = namedtuple('Plantilla', ['titulo', 'campos', 'encabezados', 'xs', 'anchos', 'filas_por_pagina'])
+
+
+@lru_cache(maxsize=None)
+def plantilla(reporte):
+    """Geometría de la tabla del reporte; se calcula una vez por proceso."""
+    columnas = COLUMNAS[reporte]
+    ancho_util = PAGINA[0] - 2 * MARGEN
+    total = sum(rel for _, _, rel in columnas)
+    anchos = tuple(ancho_util * rel / total for _, _, rel in columnas)
+    xs = []
+    x = MARGEN
+    for ancho in anchos:
+        xs.append(x)
+        x += ancho
+    # Cabecera (título + subtítulo + encabezados) arriba y pie abajo
+    alto_tabla = PAGINA[1] - 2 * MARGEN - 40 - ALTO_FILA - 14
+    return Plantilla(
+        TITULOS[reporte],
+        tuple(c for c, _, _ in columnas),
+        tuple(t for _, t, _ in columnas),
+        tuple(xs),
+        anchos,
+        int(alto_tabla // ALTO_FILA),
+    )
+
+
+@lru_cache(maxsize=8192)
+def _recortar(texto, ancho, fuente=FUENTE, tam=TAM_FUENTE):
+    """Recorta `texto` con '…' para que entre en `ancho` puntos."""
+    if stringWidth(texto, fuente, tam) <= ancho:
+        return texto
+    while texto and stringWidth(texto + '…', fuente, tam) > ancho:
+        texto = texto[:-1]
+    return texto + '…'
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    texto = str(valor)
+    # Fechas ISO del serializer -> 'YYYY-MM-DD HH:MM'
+    if len(texto) >= 16 and texto[4] == '-' and texto[10] == 'T':
+        return texto[:16].replace('T', ' ')
+    return texto
+
+
+def _encabezado(c, tpl, subtitulo, pagina):
+    ancho, alto = PAGINA
+    y = alto - MARGEN
+    c.setFont(FUENTE_NEGRITA, 12)
+    c.drawString(MARGEN, y - 12, tpl.titulo)
+    c.setFont(FUENTE, 7)
+    c.drawRightString(ancho - MARGEN, y - 12, subtitulo)
+    y -= 40
+    c.setFillGray(0.85)
+    c.rect(MARGEN, y - ALTO_FILA + 3, ancho - 2 * MARGEN, ALTO_FILA, stroke=0, fill=1)
+    c.setFillGray(0)
+    c.setFont(FUENTE_NEGRITA, TAM_FUENTE)
+    for x, w, titulo in zip(tpl.xs, tpl.anchos, tpl.encabezados):
+        c.drawString(x + 2, y - ALTO_FILA + 6, _recortar(titulo, w - 4, FUENTE_NEGRITA))
+    c.setFont(FUENTE, 7)
+    c.drawCentredString(ancho / 2, MARGEN / 2, f'Página {pagina}')
+    return y - ALTO_FILA
+
+
+def renderizar(reporte, filas, filtros='', max_filas=None):
+    """PDF (bytes) con las filas (dicts serializados) del reporte.
+
+    `filas` puede ser un generador: se consume una sola vez y cada página se
+    cierra (showPage) antes de leer las filas de la siguiente.
+    """
+    tpl = plantilla(reporte)
+    max_filas = max_filas if max_filas is not None else getattr(settings, 'REPORTES_PDF_MAX_FILAS', 20000)
+    generado = f"Generado {timezone.localtime():%Y-%m-%d %H:%M}"
+    subtitulo = f"{filtros}  ·  {generado}" if filtros else generado
+
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=PAGINA, pageCompression=1)
+    c.setTitle(tpl.titulo)
+    pagina = 1
+    y = _encabezado(c, tpl, subtitulo, pagina)
+    en_pagina = 0
+    total = 0
+    truncado = False
+    # Un solo objeto de texto por página: evita el costo de beginText/drawString por celda
+    texto = c.beginText()
+    texto.setFont(FUENTE, TAM_FUENTE)
+    for fila in filas:
+        if max_filas and total >= max_filas:
+            truncado = True
+            break
+        if en_pagina == tpl.filas_por_pagina:
+            c.drawText(texto)
+            c.showPage()
+            pagina += 1
+            y = _encabezado(c, tpl, subtitulo, pagina)
+            texto = c.beginText()
+            texto.setFont(FUENTE, TAM_FUENTE)
+            en_pagina = 0
+        if en_pagina % 2:
+            c.setFillGray(0.95)
+            c.rect(MARGEN, y - ALTO_FILA + 3, PAGINA[0] - 2 * MARGEN, ALTO_FILA, stroke=0, fill=1)
+            c.setFillGray(0)
+        for x, w, campo in zip(tpl.xs, tpl.anchos, tpl.campos):
+            texto.setTextOrigin(x + 2, y - ALTO_FILA + 6)
+            texto.textOut(_recortar(_texto(fila.get(campo)), w - 4))
+        y -= ALTO_FILA
+        en_pagina += 1
+        total += 1
+    c.drawText(texto)
+    c.setFont(FUENTE_NEGRITA if truncado else FUENTE, 7)
+    resumen = f'{total} filas'
+    if truncado:
+        resumen += f' (límite de {max_filas} alcanzado; use ?format=csv para el reporte completo)'
+    c.drawString(MARGEN, MARGEN / 2, resumen)
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def describir_filtros(params):
+    """Texto corto con los filtros aplicados, para el subtítulo."""
+    partes = [f'{k}={v}' for k, v in params.items() if k not in ('format', 'cursor', 'paginar', 'page_size') and v]
+    return ', '.join(partes)
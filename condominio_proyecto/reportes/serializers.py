@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from django.urls import reverse
 from accesos.models import Residente, Familia, RegistroAcceso, AutorizacionVisita, Visitante, Delivery
+from accesos.personas import PersonaResolver
+from accesos.services import AutorizacionService
 from areas.models import ReservaArea, AreaComun
+from .models import TrabajoReporte
 
 
 class ResidenteReporteSerializer(serializers.ModelSerializer):
@@ -28,6 +32,14 @@ class FamiliaReporteSerializer(serializers.ModelSerializer):
         fields = ['id','nombre','torre','departamento','activo','fecha_creacion','residentes_count']
 
 
+class RegistroAccesoReporteListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Precargar personas de toda la lista antes de serializar (evita N+1)
+        registros = list(data.all() if hasattr(data, 'all') else data)
+        self.child.personas.cargar(registros)
+        return super().to_representation(registros)
+
+
 class RegistroAccesoReporteSerializer(serializers.ModelSerializer):
     vehiculo_matricula = serializers.CharField(source='vehiculo.matricula', read_only=True)
     tipo_persona_label = serializers.CharField(source='get_tipo_persona_display', read_only=True)
@@ -35,44 +47,24 @@ class RegistroAccesoReporteSerializer(serializers.ModelSerializer):
     persona_nombre = serializers.SerializerMethodField()
     persona_documento = serializers.SerializerMethodField()
 
+    @property
+    def personas(self):
+        resolver = self.context.get('personas')
+        if resolver is None:
+            resolver = PersonaResolver.para_request(self.context.get('request'))
+            self.context['personas'] = resolver
+        return resolver
+
     def get_persona_nombre(self, obj):
-        # Use preloaded maps if provided to avoid N+1
-        res_map = self.context.get('res_map') or {}
-        vis_map = self.context.get('vis_map') or {}
-        del_map = self.context.get('del_map') or {}
-        if obj.tipo_persona == 'R':
-            r = res_map.get(obj.persona_id)
-            if r:
-                u = r.user
-                return ((u.first_name or '') + ' ' + (u.last_name or '')).strip() or u.username
-        elif obj.tipo_persona == 'V':
-            v = vis_map.get(obj.persona_id)
-            if v:
-                return v.nombre_completo
-        elif obj.tipo_persona == 'D':
-            d = del_map.get(obj.persona_id)
-            if d:
-                return d.nombre_completo
-        return ''
+        return self.personas.nombre(obj.tipo_persona, obj.persona_id)
 
     def get_persona_documento(self, obj):
-        res_map = self.context.get('res_map') or {}
-        vis_map = self.context.get('vis_map') or {}
-        del_map = self.context.get('del_map') or {}
-        if obj.tipo_persona == 'R':
-            r = res_map.get(obj.persona_id)
-            return r.documento_identidad if r else ''
-        elif obj.tipo_persona == 'V':
-            v = vis_map.get(obj.persona_id)
-            return v.documento_identidad if v else ''
-        elif obj.tipo_persona == 'D':
-            d = del_map.get(obj.persona_id)
-            return d.documento_identidad if d else ''
-        return ''
+        return self.personas.documento(obj.tipo_persona, obj.persona_id)
 
     class Meta:
         model = RegistroAcceso
         fields = ['id','fecha_hora','tipo_persona','tipo_persona_label','tipo_verificacion','tipo_verificacion_label','persona_id','persona_nombre','persona_documento','exitoso','vehiculo_matricula','detalles']
+        list_serializer_class = RegistroAccesoReporteListSerializer
 
 
 class ReservaAreaReporteSerializer(serializers.ModelSerializer):
@@ -93,7 +85,32 @@ class AutorizacionVisitaReporteSerializer(serializers.ModelSerializer):
     visitante_nombre = serializers.CharField(source='visitante.nombre_completo', read_only=True)
     visitante_doc = serializers.CharField(source='visitante.documento_identidad', read_only=True)
     autorizado_por_documento = serializers.CharField(source='autorizado_por.documento_identidad', read_only=True)
+    status = serializers.SerializerMethodField()
+
+    def get_status(self, obj):
+        return AutorizacionService.status_efectivo(obj)
 
     class Meta:
         model = AutorizacionVisita
         fields = ['id','fecha_creacion','status','fecha_inicio','fecha_fin','visitante_nombre','visitante_doc','autorizado_por_id','autorizado_por_documento','familia_id','codigo_qr','entradas_permitidas','entradas_consumidas','dentro']
+
+
+class TrabajoReporteSerializer(serializers.ModelSerializer):
+    url_estado = serializers.SerializerMethodField()
+    url_descarga = serializers.SerializerMethodField()
+
+    def _absoluta(self, path):
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request else path
+
+    def get_url_estado(self, obj):
+        return self._absoluta(reverse('reporte_trabajo', args=[obj.pk]))
+
+    def get_url_descarga(self, obj):
+        if obj.estado != 'LISTO':
+            return None
+        return self._absoluta(reverse('reporte_trabajo_descargar', args=[obj.pk]))
+
+    class Meta:
+        model = TrabajoReporte
+        fields = ['id','reporte','formato','parametros','estado','tamano','error','fecha_creacion','fecha_inicio','fecha_fin','expira','url_estado','url_descarga']
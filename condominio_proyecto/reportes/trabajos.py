@@ -0,0 +1,205 @@
+"""Trabajos asíncronos de reportes.
+
+El cliente crea un ``TrabajoReporte`` (POST /api/reportes/trabajos/), recibe su
+id y consulta el estado hasta poder descargar el archivo. La generación corre
+en un pool de hilos del mismo proceso (``REPORTES_TRABAJOS_HILOS``; en Cloud
+Run requiere CPU siempre asignada), y también la puede tomar el comando
+``procesar_trabajos_reporte`` en otra instancia o como Cloud Run job: el paso
+PENDIENTE -> EN_PROCESO es un UPDATE condicional, así que cada trabajo se
+ejecuta una sola vez.
+
+Los archivos se guardan en el almacenamiento ``reportes`` (``STORAGES``; Cloud
+Storage en producción), así cualquier instancia sirve la descarga.
+
+Pedidos idénticos (misma huella) reutilizan el trabajo en curso o el archivo
+aún vigente; la restricción ``trabajo_reporte_huella_en_curso`` garantiza un
+solo trabajo en curso por huella aunque dos pedidos lleguen a la vez. Los
+archivos vencen a los ``REPORTES_TRABAJOS_TTL`` segundos y se eliminan con
+``limpiar_trabajos_reporte``.
+"""
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import storages
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.http import QueryDict
+from django.utils import timezone
+
+from . import consultas, export, pdf
+from .models import TrabajoReporte
+
+logger = logging.getLogger(__name__)
+
+REPORTES = {
+    'residentes': consultas.residentes,
+    'familias': consultas.familias,
+    'accesos': consultas.accesos,
+    'reservas': consultas.reservas,
+    'visitas': consultas.visitas,
+}
+
+# Parámetros que no cambian el contenido del reporte
+_IGNORADOS = {'format', 'formato', 'cursor', 'paginar', 'page_size'}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hilos():
+    return getattr(settings, 'REPORTES_TRABAJOS_HILOS', 2)
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'REPORTES_TRABAJOS_TTL', 3600))
+
+
+def almacen():
+    return storages['reportes']
+
+
+def normalizar(parametros):
+    """Dict plano {str: str} sin vacíos ni parámetros de presentación."""
+    if isinstance(parametros, QueryDict):
+        parametros = parametros.dict()
+    return {
+        str(k): str(v).strip()
+        for k, v in (parametros or {}).items()
+        if k not in _IGNORADOS and v not in (None, '')
+    }
+
+
+def huella(reporte, formato, parametros):
+    crudo = json.dumps([reporte, formato, parametros], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(crudo.encode()).hexdigest()
+
+
+def encolar(reporte, formato, parametros, usuario=None):
+    """Devuelve (trabajo, creado). Reutiliza un trabajo idéntico en curso o vigente."""
+    parametros = normalizar(parametros)
+    h = huella(reporte, formato, parametros)
+    existente = _reutilizable(h)
+    if existente is not None:
+        return existente, False
+    try:
+        with transaction.atomic():
+            trabajo = TrabajoReporte.objects.create(
+                reporte=reporte, formato=formato, parametros=parametros, huella=h, solicitado_por=usuario,
+            )
+    except IntegrityError:
+        # Un pedido idéntico concurrente creó el trabajo en curso primero
+        existente = _reutilizable(h)
+        if existente is None:
+            raise
+        return existente, False
+    transaction.on_commit(lambda: _enviar(trabajo.pk))
+    return trabajo, True
+
+
+def _reutilizable(h):
+    return (
+        TrabajoReporte.objects
+        .filter(huella=h, estado__in=TrabajoReporte.ESTADOS_EN_CURSO + ('LISTO',))
+        .exclude(estado='LISTO', expira__lte=timezone.now())
+        .order_by('-fecha_creacion')
+        .first()
+    )
+
+
+def _enviar(trabajo_id):
+    global _pool
+    if _hilos() <= 0:
+        # Sin pool local: lo procesa `manage.py procesar_trabajos_reporte`
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_hilos(), thread_name_prefix='reportes')
+    _pool.submit(_ejecutar_en_hilo, trabajo_id)
+
+
+def _ejecutar_en_hilo(trabajo_id):
+    close_old_connections()
+    try:
+        ejecutar(trabajo_id)
+    except Exception:
+        logger.exception('Trabajo de reporte %s falló', trabajo_id)
+    finally:
+        connection.close()
+
+
+def tomar(trabajo_id):
+    """Marca el trabajo EN_PROCESO si seguía PENDIENTE. False si otro worker ya lo tomó."""
+    return TrabajoReporte.objects.filter(pk=trabajo_id, estado='PENDIENTE').update(
+        estado='EN_PROCESO', fecha_inicio=timezone.now(),
+    ) == 1
+
+
+def ejecutar(trabajo_id):
+    if not tomar(trabajo_id):
+        return None
+    trabajo = TrabajoReporte.objects.get(pk=trabajo_id)
+    try:
+        queryset = REPORTES[trabajo.reporte](trabajo.parametros)
+        # Se genera en un temporal local y se sube entero al almacenamiento compartido
+        with tempfile.TemporaryFile() as f:
+            if trabajo.formato == 'pdf':
+                f.write(pdf.renderizar(
+                    trabajo.reporte, export.filas(trabajo.reporte, queryset),
+                    pdf.describir_filtros(trabajo.parametros),
+                ))
+            else:
+                for bloque in export.contenido(trabajo.reporte, queryset, trabajo.formato):
+                    f.write(bloque.encode('utf-8') if isinstance(bloque, str) else bloque)
+            tamano = f.tell()
+            f.seek(0)
+            nombre = almacen().save(f'{trabajo.pk}.{trabajo.formato}', File(f))
+    except Exception as exc:
+        trabajo.estado = 'ERROR'
+        trabajo.error = str(exc)[:2000]
+        trabajo.fecha_fin = timezone.now()
+        trabajo.save(update_fields=['estado', 'error', 'fecha_fin'])
+        raise
+    ahora = timezone.now()
+    trabajo.estado = 'LISTO'
+    trabajo.archivo = nombre
+    trabajo.tamano = tamano
+    trabajo.fecha_fin = ahora
+    trabajo.expira = ahora + _ttl()
+    trabajo.save(update_fields=['estado', 'archivo', 'tamano', 'fecha_fin', 'expira'])
+    return trabajo
+
+
+def abrir(trabajo):
+    """Archivo del trabajo abierto para lectura, o None si ya no existe."""
+    if not trabajo.archivo or not almacen().exists(trabajo.archivo):
+        return None
+    return almacen().open(trabajo.archivo, 'rb')
+
+
+def reencolar_abandonados(limite=None):
+    """Vuelve a PENDIENTE los trabajos EN_PROCESO cuyo proceso murió (sin terminar tras `limite`)."""
+    limite = limite or timedelta(seconds=getattr(settings, 'REPORTES_TRABAJOS_TIMEOUT', 1800))
+    return TrabajoReporte.objects.filter(
+        estado='EN_PROCESO', fecha_inicio__lt=timezone.now() - limite,
+    ).update(estado='PENDIENTE', fecha_inicio=None)
+
+
+def limpiar_vencidos(ahora=None):
+    """Borra archivos y filas de trabajos vencidos o fallidos hace más de un TTL. Devuelve cuántos."""
+    ahora = ahora or timezone.now()
+    vencidos = TrabajoReporte.objects.filter(
+        estado='LISTO', expira__lte=ahora,
+    ) | TrabajoReporte.objects.filter(estado='ERROR', fecha_fin__lte=ahora - _ttl())
+    total = 0
+    for trabajo in vencidos.iterator():
+        if trabajo.archivo:
+            almacen().delete(trabajo.archivo)
+        trabajo.delete()
+        total += 1
+    return total
@@ -7,4 +7,7 @@ urlpatterns = [
     path('reportes/accesos/', views.reporte_accesos, name='reporte_accesos'),
     path('reportes/reservas/', views.reporte_reservas, name='reporte_reservas'),
     path('reportes/visitas/', views.reporte_visitas, name='reporte_visitas'),
+    path('reportes/trabajos/', views.crear_trabajo, name='reporte_trabajos'),
+    path('reportes/trabajos/<uuid:trabajo_id>/', views.estado_trabajo, name='reporte_trabajo'),
+    path('reportes/trabajos/<uuid:trabajo_id>/descargar/', views.descargar_trabajo, name='reporte_trabajo_descargar'),
 ]
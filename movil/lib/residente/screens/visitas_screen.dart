@@ -6,6 +6,7 @@ import '../../services/autorizaciones_service.dart';
 import '../../utils/datetime_format.dart';
 import '../../utils/gallery_saver.dart';
 import '../../utils/permissions.dart';
+import 'package:http/http.dart' as http;
 import 'package:image_picker/image_picker.dart';
 import 'package:image/image.dart' as img;
 import 'package:zxing2/qrcode.dart';
@@ -275,6 +276,7 @@ class _ResidentVisitasScreenState extends State<ResidentVisitasScreen> {
               final usadas = (a['entradas_consumidas'] as num?)?.toInt() ?? 0;
               final permitidas = (a['entradas_permitidas'] as num?)?.toInt() ?? 1;
               final qrImage = a['qr_image']?.toString();
+              final qrUrl = a['qr_url']?.toString();
               return ListTile(
                 leading: Icon(tipo == 'Vehicular' ? Icons.directions_car : Icons.directions_walk),
                 title: Text(nombre),
@@ -283,12 +285,12 @@ class _ResidentVisitasScreenState extends State<ResidentVisitasScreen> {
                 trailing: Row(
                   mainAxisSize: MainAxisSize.min,
                   children: [
-                    if (qrImage != null && qrImage.startsWith('data:image'))
+                    if ((qrImage != null && qrImage.startsWith('data:image')) || qrUrl != null)
                       IconButton(
                         tooltip: 'Ver QR',
                         icon: const Icon(Icons.qr_code),
                         onPressed: () {
-                          showDialog(context: context, builder: (_) => _QrDialog(dataUrl: qrImage));
+                          showDialog(context: context, builder: (_) => _QrDialog(dataUrl: qrImage ?? qrUrl!));
                         },
                       ),
                     // if (qrImage != null && qrImage.startsWith('data:image'))
@@ -304,7 +306,7 @@ class _ResidentVisitasScreenState extends State<ResidentVisitasScreen> {
                     //       );
                     //     },
                     //   ),
-                    if (qrImage != null && qrImage.startsWith('data:image'))
+                    if ((qrImage != null && qrImage.startsWith('data:image')) || qrUrl != null)
                       IconButton(
                         tooltip: 'Guardar en galería',
                         icon: const Icon(Icons.download),
@@ -317,7 +319,9 @@ class _ResidentVisitasScreenState extends State<ResidentVisitasScreen> {
                             );
                             return;
                           }
-                          final ok = await saveImageDataUrlToGallery(qrImage, album: 'Autorizaciones');
+                          // El listado trae solo qr_url: se descarga el PNG y se guarda como data URL
+                          final dataUrl = (qrImage != null && qrImage.startsWith('data:image')) ? qrImage : await _descargarQr(qrUrl!);
+                          final ok = dataUrl != null && await saveImageDataUrlToGallery(dataUrl, album: 'Autorizaciones');
                           if (!mounted) return;
                           ScaffoldMessenger.of(context).showSnackBar(
                             SnackBar(content: Text(ok ? 'Guardado en Galería/Fotos' : 'No se pudo guardar en galería')),
@@ -341,6 +345,16 @@ class _ResidentVisitasScreenState extends State<ResidentVisitasScreen> {
   }
 }
 
+Future<String?> _descargarQr(String url) async {
+  try {
+    final res = await http.get(Uri.parse(url));
+    if (res.statusCode != 200) return null;
+    return 'data:image/png;base64,${base64Encode(res.bodyBytes)}';
+  } catch (_) {
+    return null;
+  }
+}
+
 class _ScanResult {
   final String codigo;
   final String evento; // ENTRADA | SALIDA
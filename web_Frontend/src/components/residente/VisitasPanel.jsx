@@ -96,6 +96,25 @@ const VisitasPanel = () => {
     }
   };
 
+  // `download` no aplica a URLs de otro origen (la API): se baja el PNG y se guarda desde un object URL
+  const descargarQR = async (a) => {
+    try {
+      const res = await fetch(a.qr_url);
+      if (!res.ok) throw new Error(`HTTP ${res.status}`);
+      const blob = await res.blob();
+      const link = document.createElement('a');
+      const objectUrl = URL.createObjectURL(blob);
+      link.href = objectUrl;
+      link.download = `QR_${a.codigo_qr}.png`;
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      URL.revokeObjectURL(objectUrl);
+    } catch {
+      setMsg('No se pudo descargar el QR');
+    }
+  };
+
   const handleUploadScan = async (e) => {
     const file = e.target.files?.[0];
     if (!file) return;
@@ -215,8 +234,8 @@ const VisitasPanel = () => {
                 <div className="text-xs text-gray-600">Entradas: {a.entradas_consumidas}/{a.entradas_permitidas} {a.dentro ? '· Dentro' : ''}</div>
                 <div className="flex gap-2 mt-2 flex-wrap">
                   <button onClick={() => navigator.clipboard?.writeText(a.codigo_qr)} className="px-2 py-1 text-xs rounded border">Copiar código</button>
-                  {a.qr_image && (
-                    <a href={a.qr_image} download={`QR_${a.codigo_qr}.png`} className="px-2 py-1 text-xs rounded border">Descargar</a>
+                  {a.qr_url && (
+                    <button onClick={() => descargarQR(a)} className="px-2 py-1 text-xs rounded border">Descargar</button>
                   )}
                   <button onClick={() => cancelarAutorizacion(a.id)} className="px-2 py-1 text-xs rounded border text-red-600">Cancelar</button>
                 </div>